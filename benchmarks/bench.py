@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the ingestion and statistics hot paths.
+
+Synthetic logs are generated with ``meerkat.logs.generator`` (same seed,
+same lines), then each benchmark is timed at each number of rows, and the
+results are written as JSON. Comparing with the results of a previous
+version prints the ratios, and exits with status 1 on regressions::
+
+    python benchmarks/bench.py --rows 100000 1000000 --output new.json
+    python benchmarks/bench.py --rows 100000 --compare old.json
+
+The database is a temporary SQLite file unless ``--database`` is given.
+The temporary directory (database, generated logs) is removed at the end,
+unless ``--keep`` is given.
+The IP API handler is stubbed: ``get_ip_info`` measures the checks and the
+updates of request logs, not the network.
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess  # nosec
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from os.path import abspath, dirname, join
+
+POOL_SIZE = 100000
+INGESTION = ('parse_string', 'format_data', 'complete', 'parse_all')
+
+BENCHMARKS = INGESTION + (
+    'get_ip_info', 'status_codes_stats', 'status_codes_by_date_stats',
+    'most_visited_pages_stats', 'unique_visitors_stats',
+    'heavy_hitters_stats', 'latency_stats')
+
+# URL patterns of this script, used when statistics resolve URLs.
+urlpatterns = []
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the ingestion and statistics hot paths.')
+    parser.add_argument(
+        '--rows', type=int, nargs='+', default=[100000],
+        help='Numbers of rows (default: 100000).')
+    parser.add_argument(
+        '--only', nargs='+', choices=BENCHMARKS, metavar='NAME',
+        help='Run only these benchmarks (%s).' % ', '.join(BENCHMARKS))
+    parser.add_argument(
+        '--seed', type=int, default=0, help='Random seed (default: 0).')
+    parser.add_argument(
+        '--ips', type=int, default=10000,
+        help='Number of distinct IP addresses (default: 10000).')
+    parser.add_argument(
+        '--database', help='SQLite database file (default: temporary).')
+    parser.add_argument(
+        '--normalize', action='store_true',
+        help='Store URLs, user agents and referrers in dimension tables.')
+    parser.add_argument('--output', help='Write the results to this file.')
+    parser.add_argument(
+        '--compare', help='Compare with the results of this file.')
+    parser.add_argument(
+        '--threshold', type=float, default=1.2,
+        help='Ratio above which a benchmark is a regression (default: 1.2).')
+    parser.add_argument(
+        '--keep', action='store_true',
+        help='Keep the temporary directory (printed on standard error).')
+    return parser
+
+
+def setup_django(database, normalize=False):
+    from django.conf import settings
+
+    settings.configure(
+        USE_TZ=True,
+        DATABASES={
+            'default': {
+                'NAME': database,
+                'ENGINE': 'django.db.backends.sqlite3',
+            }
+        },
+        INSTALLED_APPS=[
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'django.contrib.sites',
+            'meerkat',
+        ],
+        SITE_ID=1,
+        ROOT_URLCONF=__name__,
+        STATIC_URL='/static/',
+        MIDDLEWARE_CLASSES=(),
+        MEERKAT_LOGS_NORMALIZE_STRINGS=normalize)
+
+    import django
+    sys.path.append(abspath(join(dirname(dirname(__file__)), 'src')))
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def version():
+    try:
+        return subprocess.check_output(  # nosec
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=dirname(abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def stub_ip_api():
+    from meerkat.utils.ip_info import ip_api_handler
+
+    def batch(ips):
+        # A few distinct answers, as when many addresses share a provider.
+        return [{'query': ip, 'reverse': '', 'as': 'AS%s' % (
+            sum(map(int, ip.split('.'))) % 50), 'isp': 'ISP', 'org': 'ORG',
+            'proxy': False, 'lat': 48.85, 'lon': 2.35, 'city': 'Paris',
+            'regionName': 'Ile-de-France', 'region': 'IDF',
+            'country': 'France', 'countryCode': 'FR'} for ip in ips]
+
+    ip_api_handler._batch = batch
+    ip_api_handler.rate = ip_api_handler.allowance = float('inf')
+
+
+class Benchmark(object):
+    """Run the benchmarks for one number of rows."""
+
+    def __init__(self, rows, options, directory):
+        from meerkat.logs.generator import LogGenerator
+        from meerkat.logs.parsers import get_nginx_parser
+
+        self.rows = rows
+        self.parser = get_nginx_parser()
+        self.log_file = join(directory, 'access.log')
+        generator = LogGenerator(seed=options.seed, ips=options.ips)
+        generator.write(self.log_file, rows)
+        with open(self.log_file) as f:
+            self.pool = list(itertools.islice(f, POOL_SIZE))
+
+    def lines(self):
+        """Cycle through the pool of lines up to the number of rows."""
+        return itertools.islice(itertools.cycle(self.pool), self.rows)
+
+    def parse_string(self):
+        for line in self.lines():
+            self.parser.parse_string(line)
+
+    def setup_format_data(self):
+        self.data = [self.parser.parse_string(line) for line in self.pool]
+
+    def format_data(self):
+        for data in itertools.islice(itertools.cycle(self.data), self.rows):
+            # format_data pops items: copying is part of the measure.
+            self.parser.format_data(dict(data))
+
+    def setup_complete(self):
+        from meerkat.logs.models import RequestLog
+
+        self.logs = [RequestLog(**self.parser.format_data(
+            self.parser.parse_string(line))) for line in self.pool]
+
+    def complete(self):
+        for log in itertools.islice(itertools.cycle(self.logs), self.rows):
+            log.complete(save=False)
+
+    def parse_all(self):
+        from meerkat.logs.models import RequestLog
+
+        RequestLog.parse_all(files=[self.log_file], progress=False)
+
+    def get_ip_info(self):
+        from meerkat.logs.models import RequestLog
+
+        RequestLog.get_ip_info(batch_size=100)
+
+    def status_codes_stats(self):
+        from meerkat.logs import stats
+        stats.status_codes_stats()
+
+    def status_codes_by_date_stats(self):
+        from meerkat.logs import stats
+        stats.status_codes_by_date_stats()
+
+    def most_visited_pages_stats(self):
+        from meerkat.logs import stats
+        stats.most_visited_pages_stats()
+
+    def unique_visitors_stats(self):
+        from meerkat.logs import stats
+        stats.unique_visitors_stats()
+
+    def heavy_hitters_stats(self):
+        from meerkat.logs import stats
+        stats.heavy_hitters_stats()
+
+    def latency_stats(self):
+        from meerkat.logs import stats
+        stats.latency_stats()
+
+    def run(self, names):
+        """
+        Time the benchmarks, in order (the statistics need parse_all).
+
+        Args:
+            names (list): the benchmarks to run.
+
+        Returns:
+            list: the results, dicts with name, rows, seconds and rate.
+        """
+        from django.core.management import call_command
+
+        call_command('flush', interactive=False, verbosity=0)
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            if 'parse_all' not in names and set(names) - set(INGESTION):
+                self.parse_all()
+        results = []
+        for name in BENCHMARKS:
+            if name not in names:
+                continue
+            setup = getattr(self, 'setup_' + name, None)
+            if setup is not None:
+                setup()
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                start = time.perf_counter()
+                getattr(self, name)()
+                seconds = time.perf_counter() - start
+            results.append({
+                'name': name, 'rows': self.rows,
+                'seconds': round(seconds, 4),
+                'rate': round(self.rows / seconds, 1)})
+            print('%-28s %10d rows %10.3f s %12.1f rows/s' % (
+                name, self.rows, seconds, self.rows / seconds))
+        return results
+
+
+def compare(results, previous, threshold):
+    """
+    Print the ratios between new and previous timings.
+
+    Args:
+        results (list): the new results.
+        previous (list): the previous results.
+        threshold (float): the ratio above which a result is a regression.
+
+    Returns:
+        bool: whether there are regressions.
+    """
+    old = {(r['name'], r['rows']): r['seconds'] for r in previous}
+    regressions = False
+    print('\n%-28s %10s %10s %10s %7s' % (
+        'benchmark', 'rows', 'old (s)', 'new (s)', 'ratio'))
+    for result in results:
+        key = (result['name'], result['rows'])
+        if key not in old:
+            continue
+        ratio = result['seconds'] / old[key] if old[key] else 0
+        flag = ''
+        if ratio > threshold:
+            flag = ' REGRESSION'
+            regressions = True
+        print('%-28s %10d %10.3f %10.3f %7.2f%s' % (
+            key[0], key[1], old[key], result['seconds'], ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    options = get_parser().parse_args(argv)
+    directory = tempfile.mkdtemp(prefix='meerkat-bench-')
+    try:
+        return run(options, directory)
+    finally:
+        if options.keep:
+            print('Temporary directory kept: %s' % directory,
+                  file=sys.stderr)
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def run(options, directory):
+    setup_django(options.database or join(directory, 'bench.sqlite3'),
+                 options.normalize)
+    stub_ip_api()
+
+    import django
+    names = options.only or BENCHMARKS
+    results = []
+    for rows in options.rows:
+        results.extend(Benchmark(rows, options, directory).run(names))
+
+    report = {
+        'version': version(),
+        'date': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'seed': options.seed,
+        'ips': options.ips,
+        'results': results,
+    }
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    if options.compare:
+        with open(options.compare) as previous:
+            if compare(results, json.load(previous)['results'],
+                       options.threshold):
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
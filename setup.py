@@ -73,8 +73,7 @@ setup(
         'django-app-settings', 'archan', 'dependenpy',
     ],
     extras_require={
-        # eg:
-        #   'rst': ['docutils>=0.11'],
-        #   ':python_version=="2.6"': ['argparse'],
+        'columnar': ['numpy'],
+        'signatures': ['pyahocorasick'],
     },
 )
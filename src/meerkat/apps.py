@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import ipaddress
 import re
 
 from django.apps import AppConfig
@@ -35,6 +36,22 @@ class RegexSetting(aps.Setting):
         return value
 
 
+class NetworksSetting(aps.Setting):
+    def checker(self, name, value):
+        if not isinstance(value, (list, tuple, set)):
+            raise ValueError('%s must be a list of networks' % name)
+        for network in value:
+            try:
+                ipaddress.ip_network(network, strict=False)
+            except ValueError:
+                raise ValueError('%s: %r is not a network (CIDR notation) '
+                                 'or an IP address' % (name, network))
+
+    def transform(self, value):
+        return tuple(ipaddress.ip_network(network, strict=False)
+                     for network in value)
+
+
 class URLWhitelistSetting(aps.Setting):
     def checker(self, name, value):
         if not (isinstance(value, dict) and
@@ -110,6 +127,25 @@ class AppSettings(aps.AppSettings):
     logs_format_regex = RegexSetting()
     logs_top_dir = aps.StringSetting(default=None)
     logs_start_daemon = aps.BooleanSetting(default=False)
+    logs_leader_lock_file = aps.StringSetting(default=None)
+    logs_hll_precision = aps.IntegerSetting(default=12, minimum=4, maximum=16)
+    logs_heavy_hitters_window = aps.PositiveIntegerSetting(default=300)
+    logs_heavy_hitters_capacity = aps.PositiveIntegerSetting(default=1000)
+    logs_heavy_hitters_top = aps.PositiveIntegerSetting(default=50)
+    logs_tdigest_compression = aps.PositiveIntegerSetting(default=200)
+    logs_visits_timeout = aps.PositiveIntegerSetting(default=1800)
+    logs_incidents_window = aps.PositiveIntegerSetting(default=60)
+    logs_incidents_capacity = aps.PositiveIntegerSetting(default=100000)
+    logs_incidents_thresholds = aps.DictSetting(default={
+        'all': 600, '4xx': 100, '5xx': 100})
+    logs_live_buffer_size = aps.PositiveIntegerSetting(default=1000)
+    logs_metrics_token = aps.StringSetting(default=None)
+    logs_chart_points = aps.PositiveIntegerSetting(default=500)
+    logs_columnar_engine = aps.BooleanSetting(default=False)
+    logs_columnar_snapshot = aps.StringSetting(default=None)
+    logs_normalize_strings = aps.BooleanSetting(default=False)
+    logs_normalize_cache_size = aps.PositiveIntegerSetting(default=100000)
+    logs_trusted_proxies = NetworksSetting(default=())
     logs_url_whitelist = URLWhitelistSetting(default={
         'ASSET': {
             'PREFIXES': (
@@ -1,27 +1,148 @@
 # -*- coding: utf-8 -*-
 
+from django.conf.urls import url
 from django.contrib import admin
+from django.contrib.admin.utils import display_for_field, unquote
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Case, Count, F, Max, Min, Q, Sum, When
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
 from django.urls import reverse
+from django.utils.encoding import force_text
+from django.utils.functional import cached_property
 from django.utils.html import format_html
+from django.utils.http import urlencode
 from django.utils.translation import ugettext_lazy as _
 
 from ..utils.geolocation import google_maps_geoloc_link
-from .models import IPInfo, IPInfoCheck, RequestLog
+from .dimensions import text, texts
+from .models import (
+    DailyRequestCount, Incident, IPInfo, IPInfoCheck, RequestLog, Visit)
+from .signatures import FAMILIES, FAMILIES_BY_NAME
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator avoiding exact counts of large tables.
+
+    When the queryset is not filtered, its count is estimated with the
+    PostgreSQL statistics, or else with the daily request counts rollup.
+    Small tables and filtered querysets are counted exactly, but only up to
+    ``count_limit`` rows.
+    """
+
+    exact_limit = 100000
+    count_limit = 1000000
+
+    def estimate(self):
+        """
+        Estimate the number of request logs.
+
+        Returns:
+            int: the estimation (None if not available).
+        """
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] > 0:
+                return int(row[0])
+        return DailyRequestCount.objects.aggregate(
+            Sum('count'))['count__sum']
+
+    @cached_property
+    def count(self):
+        """Return the (estimated) number of objects."""
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = self.estimate()
+            if estimate is not None and estimate > self.exact_limit:
+                return estimate
+        return queryset[:self.count_limit].count()
+
+
+class CachedAllValuesFieldListFilter(admin.AllValuesFieldListFilter):
+    """
+    Filter on the distinct values of a field, with cached values.
+
+    Distinct values need a scan of the whole table, so they are cached
+    instead of being computed each time the changelist is displayed.
+    """
+
+    cache_timeout = 3600
+
+    def __init__(self, field, request, params, model, model_admin,
+                 field_path):
+        super(CachedAllValuesFieldListFilter, self).__init__(
+            field, request, params, model, model_admin, field_path)
+        key = 'meerkat:distinct:%s:%s' % (model._meta.label_lower, field_path)
+        queryset = self.lookup_choices
+        self.lookup_choices = cache.get_or_set(
+            key, lambda: list(queryset), self.cache_timeout)
+
+
+class SignatureFamilyListFilter(admin.SimpleListFilter):
+    """
+    Filter on the attack signature families matched by request logs.
+
+    The indexed ``signatures > 0`` condition selects the few suspicious
+    request logs first, then the bit of the family is tested.
+    """
+
+    title = _('attack signatures')
+    parameter_name = 'signature_family'
+
+    def lookups(self, request, model_admin):
+        return [('any', _('Any'))] + [
+            (family.name, _(family.verbose_name)) for family in FAMILIES]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value is None:
+            return queryset
+        queryset = queryset.filter(signatures__gt=0)
+        family = FAMILIES_BY_NAME.get(value, None)
+        if family is None:
+            return queryset
+        return queryset.annotate(
+            signature_bit=F('signatures').bitand(family.bit)).filter(
+                signature_bit=family.bit)
 
 
 class RequestLogAdmin(admin.ModelAdmin):
     list_display = (
         'datetime', 'timezone', 'client_ip_address', 'ip_info_link',
-        'request', 'verb', 'url', 'protocol', 'suspicious',
-        'status_code', 'bytes_sent', 'file_type', 'port', 'https',
-        'user_agent', 'referrer', 'upstream', 'host', 'server',
+        'request', 'verb', 'url_text', 'protocol', 'suspicious',
+        'signature_families',
+        'status_code', 'bytes_sent', 'request_time', 'upstream_response_time',
+        'file_type', 'port', 'https',
+        'user_agent_text', 'referrer_text', 'upstream', 'host', 'server',
         'error', 'level', 'message',
     )
 
     list_filter = (
-        'status_code', 'verb', 'protocol', 'file_type', 'https', 'error',
-        'level', 'suspicious')
+        ('status_code', CachedAllValuesFieldListFilter),
+        ('verb', CachedAllValuesFieldListFilter),
+        ('protocol', CachedAllValuesFieldListFilter),
+        ('file_type', CachedAllValuesFieldListFilter),
+        'https', 'error',
+        ('level', CachedAllValuesFieldListFilter),
+        'suspicious', SignatureFamilyListFilter)
+
+    list_select_related = (
+        'ip_info', 'url_ref', 'user_agent_ref', 'referrer_ref')
+    raw_id_fields = ('url_ref', 'user_agent_ref', 'referrer_ref')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
+    # Drill-down is served from DailyRequestCount, see the change_list
+    # template in templates/admin/meerkat/requestlog.
     date_hierarchy = 'datetime'
 
     def ip_info_link(self, obj):
@@ -34,40 +155,165 @@ class RequestLogAdmin(admin.ModelAdmin):
         return format_html('<a href="{}">{}</a>', admin_url, instance)
     ip_info_link.short_description = 'IP information'
 
+    def signature_families(self, obj):
+        return ', '.join(
+            family.verbose_name for family in obj.get_signature_families())
+    signature_families.short_description = _('Attack signatures')
+
+    def get_queryset(self, request):
+        # Order strings on their text, normalized or not.
+        return super(RequestLogAdmin, self).get_queryset(request).annotate(
+            **texts('url', 'user_agent', 'referrer'))
+
+    def url_text(self, obj):
+        return obj.get_text('url')
+    url_text.short_description = _('URL')
+    url_text.admin_order_field = 'url_text'
+
+    def user_agent_text(self, obj):
+        return obj.get_text('user_agent')
+    user_agent_text.short_description = _('User agent')
+    user_agent_text.admin_order_field = 'user_agent_text'
+
+    def referrer_text(self, obj):
+        return obj.get_text('referrer')
+    referrer_text.short_description = _('Referrer')
+    referrer_text.admin_order_field = 'referrer_text'
+
 
 class IPInfoCheckAdmin(admin.ModelAdmin):
     list_display = ('date', 'ip_address', 'ip_info')
     date_hierarchy = 'date'
 
 
-class CheckInline(admin.TabularInline):
-    model = IPInfoCheck
-    extra = 0
-    fields = ('date', 'ip_address', 'ip_info')
-    readonly_fields = fields
+class LazyInline(object):
+    """
+    A read-only list of related objects, loaded page by page.
+
+    Unlike Django inlines, the related objects are not rendered with the
+    change form: a summary is computed with an aggregate query, and pages
+    are fetched in AJAX, using keyset pagination on (ordering_field, id)
+    by decreasing order. Large tables need an index on (fk_name,
+    ordering_field, id) for pages to be read without sorting.
+    """
+
+    name = None
+    model = None
+    fk_name = None
+    fields = ()
+    # Expressions displayed instead of the value of some fields (for
+    # example to follow a foreign key), by field name.
+    expressions = {}
+    ordering_field = None
+    page_size = 50
+    verbose_name_plural = None
+
+    def get_queryset(self, obj):
+        """
+        Return the objects related to an object.
+
+        Args:
+            obj (Model): the parent object.
 
-    def has_delete_permission(self, request, obj=None):
-        return False
+        Returns:
+            QuerySet: the related objects, ordered.
+        """
+        return self.model.objects.filter(**{self.fk_name: obj}).order_by(
+            '-%s' % self.ordering_field, '-id')
 
-    def has_add_permission(self, request):
-        return False
+    def get_summary_aggregates(self):
+        """
+        Return the aggregates to display as a summary.
 
+        Returns:
+            list: (name, label, aggregate expression) tuples.
+        """
+        return [('count', _('Total'), Count('id')),
+                ('first', _('First'), Min(self.ordering_field)),
+                ('last', _('Last'), Max(self.ordering_field))]
 
-class LogInline(admin.TabularInline):
+    def get_summary(self, queryset):
+        """
+        Return summary values of the related objects, in one query.
+
+        Args:
+            queryset (QuerySet): the related objects.
+
+        Returns:
+            list: (label, value) tuples.
+        """
+        aggregates = self.get_summary_aggregates()
+        values = queryset.order_by().aggregate(
+            **{name: expression for name, label, expression in aggregates})
+        return [(label, values[name])
+                for name, label, expression in aggregates]
+
+    def get_page(self, queryset, after=None):
+        """
+        Return a page of related objects.
+
+        Args:
+            queryset (QuerySet): the related objects (see ``get_queryset``).
+            after (int): the ID of the last object of the previous page.
+
+        Returns:
+            tuple: the rows (lists of displayed values) and the ID to use
+                to get the next page (None if this page is the last one).
+        """
+        if after is not None:
+            last = self.model.objects.filter(pk=after).values_list(
+                self.ordering_field, flat=True).first()
+            if last is not None:
+                queryset = queryset.filter(
+                    Q(**{'%s__lt' % self.ordering_field: last}) |
+                    Q(**{self.ordering_field: last, 'id__lt': after}))
+        if self.expressions:
+            queryset = queryset.annotate(**{
+                '%s_value' % name: expression
+                for name, expression in self.expressions.items()})
+        names = ['%s_value' % name if name in self.expressions else name
+                 for name in self.fields]
+        objects = list(queryset.values_list(
+            'id', *names)[:self.page_size + 1])
+        fields = [self.model._meta.get_field(f) for f in self.fields]
+        rows = [[force_text(display_for_field(value, field, '-'))
+                 for value, field in zip(values[1:], fields)]
+                for values in objects[:self.page_size]]
+        after = None
+        if len(objects) > self.page_size:
+            after = objects[self.page_size - 1][0]
+        return rows, after
+
+
+class CheckInline(LazyInline):
+    name = 'checks'
+    model = IPInfoCheck
+    fk_name = 'ip_info'
+    fields = ('date', 'ip_address')
+    ordering_field = 'date'
+    verbose_name_plural = _('IPInfo checks')
+
+
+class LogInline(LazyInline):
+    name = 'logs'
     model = RequestLog
-    extra = 0
+    fk_name = 'ip_info'
     fields = ('datetime', 'request', 'status_code', 'user_agent', 'referrer')
-    readonly_fields = fields
+    expressions = {'user_agent': text('user_agent'),
+                   'referrer': text('referrer')}
+    ordering_field = 'datetime'
+    verbose_name_plural = _('Request logs')
 
-    def has_delete_permission(self, request, obj=None):
-        return False
-
-    def has_add_permission(self, request):
-        return False
+    def get_summary_aggregates(self):
+        return super(LogInline, self).get_summary_aggregates() + [
+            ('client_errors', _('4xx responses'), Count(Case(When(
+                status_code__gte=400, status_code__lt=500, then=1)))),
+            ('server_errors', _('5xx responses'), Count(Case(When(
+                status_code__gte=500, then=1))))]
 
 
 class IPInfoAdmin(admin.ModelAdmin):
-    inlines = [CheckInline, LogInline]
+    lazy_inlines = [CheckInline(), LogInline()]
 
     list_display = (
         'ip_address', 'org', 'asn', 'isp', 'proxy', 'hostname', 'see_on_map',
@@ -98,7 +344,114 @@ class IPInfoAdmin(admin.ModelAdmin):
         return format_html('<a href="{}">{}</a>', geo_url, obj)
     see_on_map.short_description = _('See on map')
 
+    def get_urls(self):
+        info = (self.model._meta.app_label, self.model._meta.model_name)
+        return [
+            url(r'^(.+)/related/(\w+)/$',
+                self.admin_site.admin_view(self.related_view),
+                name='%s_%s_related' % info),
+        ] + super(IPInfoAdmin, self).get_urls()
+
+    def _get_lazy_inline(self, name):
+        for inline in self.lazy_inlines:
+            if inline.name == name:
+                return inline
+        raise Http404
+
+    def related_view(self, request, object_id, name):
+        """
+        Return a page of related objects in JSON.
+
+        Args:
+            request (HttpRequest): the request.
+            object_id (str): the ID of the parent object.
+            name (str): the name of the lazy inline.
+
+        Returns:
+            JsonResponse: rows and after (ID to get the next page).
+        """
+        obj = self.get_object(request, unquote(object_id))
+        if obj is None:
+            raise Http404
+        if not self.has_change_permission(request, obj):
+            raise PermissionDenied
+        inline = self._get_lazy_inline(name)
+        after = request.GET.get('after', None)
+        try:
+            after = int(after) if after else None
+        except ValueError:
+            return HttpResponseBadRequest()
+        rows, after = inline.get_page(inline.get_queryset(obj), after)
+        return JsonResponse({'rows': rows, 'after': after})
+
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        obj = self.get_object(request, unquote(object_id))
+        if obj is not None:
+            info = (self.model._meta.app_label, self.model._meta.model_name)
+            extra_context = extra_context or {}
+            extra_context['lazy_inlines'] = [{
+                'verbose_name_plural': inline.verbose_name_plural,
+                'name': inline.name,
+                'headers': [inline.model._meta.get_field(f).verbose_name
+                            for f in inline.fields],
+                'summary': inline.get_summary(inline.get_queryset(obj)),
+                'url': reverse('admin:%s_%s_related' % info,
+                               args=(obj.pk, inline.name),
+                               current_app=self.admin_site.name),
+            } for inline in self.lazy_inlines]
+        return super(IPInfoAdmin, self).change_view(
+            request, object_id, form_url, extra_context)
+
+
+def request_logs_link(obj):
+    """
+    Return a link to the request logs of an IP address during a period.
+
+    Args:
+        obj (Incident/Visit): an object with client_ip_address, start and
+            end attributes.
+
+    Returns:
+        str: the HTML link.
+    """
+    info = (RequestLog._meta.app_label, RequestLog._meta.model_name)
+    query = urlencode({
+        'client_ip_address': obj.client_ip_address,
+        'datetime__gte': obj.start.isoformat(),
+        'datetime__lte': obj.end.isoformat()})
+    return format_html(
+        '<a href="{}?{}">{}</a>',
+        reverse('admin:%s_%s_changelist' % info), query, _('Request logs'))
+
+
+class IncidentAdmin(admin.ModelAdmin):
+    list_display = (
+        'start', 'end', 'client_ip_address', 'kind', 'count', 'peak',
+        'threshold', 'window', 'request_logs_link')
+    list_filter = ('kind', )
+    search_fields = ('client_ip_address', )
+    date_hierarchy = 'start'
+
+    def request_logs_link(self, obj):
+        return request_logs_link(obj)
+    request_logs_link.short_description = _('Request logs')
+
+
+class VisitAdmin(admin.ModelAdmin):
+    list_display = (
+        'start', 'end', 'client_ip_address', 'hits', 'bytes_sent',
+        'entry_url', 'exit_url', 'closed', 'request_logs_link')
+    list_filter = ('closed', )
+    search_fields = ('client_ip_address', 'user_agent')
+    date_hierarchy = 'start'
+
+    def request_logs_link(self, obj):
+        return request_logs_link(obj)
+    request_logs_link.short_description = _('Request logs')
+
 
 admin.site.register(RequestLog, RequestLogAdmin)
 admin.site.register(IPInfoCheck, IPInfoCheckAdmin)
 admin.site.register(IPInfo, IPInfoAdmin)
+admin.site.register(Incident, IncidentAdmin)
+admin.site.register(Visit, VisitAdmin)
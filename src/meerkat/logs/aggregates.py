@@ -0,0 +1,468 @@
+# -*- coding: utf-8 -*-
+
+"""
+Aggregate models.
+
+These models store what is computed from the request logs instead of the
+request logs themselves: the rollups written by the collectors (see
+``meerkat.logs.collectors``), the incidents, the visits (see
+``meerkat.logs.visits``) and the state of the ingestion.
+"""
+
+from django.db import IntegrityError, models, transaction
+from django.utils.translation import ugettext_lazy as _
+
+from ..utils.db import bulk_update
+from ..utils.hyperloglog import HyperLogLog
+from ..utils.tdigest import TDigest
+from .dimensions import QUERY_SIZE, text_hash
+
+
+class UniqueVisitorsSketch(models.Model):
+    """
+    A model to store HyperLogLog sketches of client IP addresses.
+
+    One sketch is stored per day, host and URL bucket, an empty host or URL
+    meaning all hosts or all URLs. Sketches are merged to estimate the number
+    of unique visitors over any range of days without scanning request logs.
+    Buckets are unique by hash of their URL (see ``text_hash``), so that
+    long URLs are not indexed.
+    """
+
+    date = models.DateField(
+        verbose_name=_('Date'))
+    host = models.CharField(
+        verbose_name=_('Host'), max_length=255, blank=True)
+    url_hash = models.BigIntegerField(
+        verbose_name=_('URL hash'))
+    url = models.TextField(
+        verbose_name=_('URL'), blank=True)
+    precision = models.PositiveSmallIntegerField(
+        verbose_name=_('Precision'))
+    registers = models.BinaryField(
+        verbose_name=_('Registers'))
+
+    class Meta:
+        """Meta class for Django."""
+
+        unique_together = ('date', 'host', 'url_hash')
+        verbose_name = _('Unique visitors sketch')
+        verbose_name_plural = _('Unique visitors sketches')
+
+    def __str__(self):
+        return '%s %s %s' % (self.date, self.host, self.url)
+
+    @property
+    def sketch(self):
+        """
+        Return the stored sketch.
+
+        Returns:
+            HyperLogLog: the deserialized sketch.
+        """
+        return HyperLogLog.from_bytes(self.registers, self.precision)
+
+    @staticmethod
+    def merge_into(date, host, url, sketch):
+        """
+        Merge a sketch into the stored one, creating it if needed.
+
+        Args:
+            date (date): the day of the bucket.
+            host (str): the host of the bucket ('' for all hosts).
+            url (str): the URL of the bucket ('' for all URLs).
+            sketch (HyperLogLog): the sketch to merge. When its precision
+                differs from the stored one, the lowest precision is kept.
+        """
+        UniqueVisitorsSketch.merge_all({(date, host, url): sketch})
+
+    @staticmethod
+    def merge_all(sketches):
+        """
+        Merge sketches into the stored ones, creating them if needed.
+
+        Stored sketches are read in one query per day and chunk of URLs,
+        then updated and created in bulk.
+
+        Args:
+            sketches (dict): the sketches (HyperLogLog) to merge, by
+                (date, host, URL) bucket (see ``merge_into``).
+        """
+        by_key = {(date, host, text_hash(url)): (url, sketch)
+                  for (date, host, url), sketch in sketches.items()}
+        # Another process can create the same buckets: merge again into
+        # the rows it created.
+        for attempt in range(10):
+            try:
+                with transaction.atomic():
+                    UniqueVisitorsSketch._merge_all(by_key)
+                return
+            except IntegrityError:
+                if attempt == 9:
+                    raise
+
+    @staticmethod
+    def _merge_all(by_key):
+        missing_by_date = {}
+        for key in by_key:
+            missing_by_date.setdefault(key[0], set()).add(key)
+        changes = {}
+        for date, missing in missing_by_date.items():
+            hashes = sorted({key[2] for key in missing})
+            for start in range(0, len(hashes), QUERY_SIZE):
+                rows = UniqueVisitorsSketch.objects.select_for_update(
+                ).filter(date=date, url_hash__in=hashes[
+                    start:start + QUERY_SIZE])
+                for obj in rows:
+                    key = (obj.date, obj.host, obj.url_hash)
+                    if key in missing:
+                        merged = obj.sketch.merge(by_key[key][1])
+                        changes[obj.pk] = {'precision': merged.precision,
+                                           'registers': merged.to_bytes()}
+                        missing.remove(key)
+        bulk_update(UniqueVisitorsSketch, changes)
+        UniqueVisitorsSketch.objects.bulk_create([
+            UniqueVisitorsSketch(
+                date=key[0], host=key[1], url_hash=key[2],
+                url=by_key[key][0], precision=by_key[key][1].precision,
+                registers=by_key[key][1].to_bytes())
+            for missing in missing_by_date.values() for key in missing])
+
+
+class HeavyHitter(models.Model):
+    """
+    A model to store the top items of a dimension for a time window.
+
+    Counts are computed with the Space-Saving algorithm: the real number
+    of occurrences of a value is between ``count - error`` and ``count``.
+    """
+
+    DIMENSIONS = (
+        ('ip', _('IP address')),
+        ('url', _('URL')),
+        ('user_agent', _('User agent')))
+
+    window_start = models.DateTimeField(
+        verbose_name=_('Window start'))
+    dimension = models.CharField(
+        verbose_name=_('Dimension'), max_length=30, choices=DIMENSIONS)
+    value = models.TextField(
+        verbose_name=_('Value'))
+    count = models.PositiveIntegerField(
+        verbose_name=_('Count'))
+    error = models.PositiveIntegerField(
+        verbose_name=_('Error'), default=0)
+
+    class Meta:
+        """Meta class for Django."""
+
+        index_together = ('window_start', 'dimension')
+        verbose_name = _('Heavy hitter')
+        verbose_name_plural = _('Heavy hitters')
+
+    def __str__(self):
+        return '%s %s %s (%s)' % (
+            self.window_start, self.dimension, self.value, self.count)
+
+    @staticmethod
+    def save_snapshot(window_start, top):
+        """
+        Replace the snapshot of a time window.
+
+        Args:
+            window_start (datetime): the start of the time window.
+            top (dict): dimension as key, list of (value, count, error)
+                tuples as value (see ``SpaceSaving.top``).
+        """
+        with transaction.atomic():
+            HeavyHitter.objects.filter(
+                window_start=window_start,
+                dimension__in=top.keys()).delete()
+            HeavyHitter.objects.bulk_create([
+                HeavyHitter(window_start=window_start, dimension=dimension,
+                            value=value, count=count, error=error)
+                for dimension, items in top.items()
+                for value, count, error in items])
+
+
+class LatencyDigest(models.Model):
+    """
+    A model to store request time and response size t-digests.
+
+    One pair of digests is stored per hour and endpoint (URL without
+    query string), an empty endpoint meaning all endpoints. Digests are
+    merged to compute quantiles over any range of hours.
+    """
+
+    hour = models.DateTimeField(
+        verbose_name=_('Hour'))
+    endpoint = models.CharField(
+        verbose_name=_('Endpoint'), max_length=2047, blank=True)
+    count = models.PositiveIntegerField(
+        verbose_name=_('Count'), default=0)
+    request_time = models.BinaryField(
+        verbose_name=_('Request time digest'))
+    bytes_sent = models.BinaryField(
+        verbose_name=_('Bytes sent digest'))
+
+    class Meta:
+        """Meta class for Django."""
+
+        unique_together = ('hour', 'endpoint')
+        verbose_name = _('Latency digest')
+        verbose_name_plural = _('Latency digests')
+
+    def __str__(self):
+        return '%s %s' % (self.hour, self.endpoint)
+
+    @property
+    def request_time_digest(self):
+        """Return the request time digest (milliseconds)."""
+        return TDigest.from_bytes(self.request_time)
+
+    @property
+    def bytes_sent_digest(self):
+        """Return the response size digest (bytes)."""
+        return TDigest.from_bytes(self.bytes_sent)
+
+    @staticmethod
+    def merge_into(hour, endpoint, count, request_time, bytes_sent):
+        """
+        Merge digests into the stored ones, creating them if needed.
+
+        Args:
+            hour (datetime): the hour of the bucket.
+            endpoint (str): the endpoint of the bucket ('' for all).
+            count (int): the number of requests added to the digests.
+            request_time (TDigest): the request time digest to merge.
+            bytes_sent (TDigest): the response size digest to merge.
+        """
+        with transaction.atomic():
+            obj, created = LatencyDigest.objects.select_for_update(
+            ).get_or_create(
+                hour=hour, endpoint=endpoint[:2047],
+                defaults={'count': count,
+                          'request_time': request_time.to_bytes(),
+                          'bytes_sent': bytes_sent.to_bytes()})
+            if not created:
+                obj.count += count
+                obj.request_time = obj.request_time_digest.merge(
+                    request_time).to_bytes()
+                obj.bytes_sent = obj.bytes_sent_digest.merge(
+                    bytes_sent).to_bytes()
+                obj.save(update_fields=['count', 'request_time', 'bytes_sent'])
+
+
+class DailyRequestCount(models.Model):
+    """
+    A model to store the number of request logs per day.
+
+    Days are dates in the current timezone. This rollup is used to serve
+    the admin date drill-down and to estimate the number of request logs
+    without counting rows.
+    """
+
+    date = models.DateField(
+        verbose_name=_('Date'), unique=True)
+    count = models.PositiveIntegerField(
+        verbose_name=_('Count'), default=0)
+
+    class Meta:
+        """Meta class for Django."""
+
+        verbose_name = _('Daily request count')
+        verbose_name_plural = _('Daily request counts')
+
+    def __str__(self):
+        return '%s: %s' % (self.date, self.count)
+
+    @staticmethod
+    def merge_into(date, count):
+        """
+        Add a number of request logs to a day, creating it if needed.
+
+        Args:
+            date (date): the day.
+            count (int): the number of request logs to add.
+        """
+        with transaction.atomic():
+            updated = DailyRequestCount.objects.filter(date=date).update(
+                count=models.F('count') + count)
+            if not updated:
+                DailyRequestCount.objects.create(date=date, count=count)
+
+
+class IngestionState(models.Model):
+    """
+    A model to store named values of the ingestion, shared by processes.
+
+    The ``version`` value is incremented each time the collectors write
+    aggregated data, so that cached statistics can be invalidated without
+    reading the aggregated tables. The ``offset`` and ``inode`` values of a
+    log file tell where the ingestion daemon stopped reading it.
+    """
+
+    VERSION = 'version'
+
+    name = models.CharField(
+        verbose_name=_('Name'), max_length=255, unique=True)
+    value = models.BigIntegerField(
+        verbose_name=_('Value'), default=0)
+
+    class Meta:
+        """Meta class for Django."""
+
+        verbose_name = _('Ingestion state')
+        verbose_name_plural = _('Ingestion states')
+
+    def __str__(self):
+        return '%s: %s' % (self.name, self.value)
+
+    @staticmethod
+    def get_value(name, default=0):
+        """
+        Return a value.
+
+        Args:
+            name (str): the name of the value.
+            default (int): the value if it was never set.
+
+        Returns:
+            int: the value.
+        """
+        value = IngestionState.objects.filter(name=name).values_list(
+            'value', flat=True).first()
+        return default if value is None else value
+
+    @staticmethod
+    def key(kind, file_name):
+        """
+        Return the name of a value of a log file.
+
+        Args:
+            kind (str): the kind of value (for example ``offset``).
+            file_name (str): the path of the log file.
+
+        Returns:
+            str: the name of the value.
+        """
+        return ('%s:%s' % (kind, file_name))[:255]
+
+    @staticmethod
+    def set_value(name, value):
+        """
+        Set a value, creating it if needed.
+
+        Args:
+            name (str): the name of the value.
+            value (int): the value.
+        """
+        IngestionState.objects.update_or_create(
+            name=name, defaults={'value': value})
+
+    @staticmethod
+    def increment(name):
+        """
+        Increment a value, creating it if needed.
+
+        Args:
+            name (str): the name of the value.
+        """
+        with transaction.atomic():
+            updated = IngestionState.objects.filter(name=name).update(
+                value=models.F('value') + 1)
+            if not updated:
+                IngestionState.objects.create(name=name, value=1)
+
+
+class Incident(models.Model):
+    """
+    A model to store the incidents detected during the ingestion.
+
+    An incident is an IP address sending more requests than a threshold
+    during a sliding window, in total or for a class of status codes (see
+    ``IncidentsCollector``).
+    """
+
+    KINDS = (
+        ('all', _('All requests')),
+        ('1xx', _('1xx responses')),
+        ('2xx', _('2xx responses')),
+        ('3xx', _('3xx responses')),
+        ('4xx', _('4xx responses')),
+        ('5xx', _('5xx responses')))
+
+    client_ip_address = models.GenericIPAddressField(
+        verbose_name=_('Client IP address'), db_index=True)
+    kind = models.CharField(
+        verbose_name=_('Kind'), max_length=10, choices=KINDS)
+    start = models.DateTimeField(
+        verbose_name=_('Start'), db_index=True)
+    end = models.DateTimeField(
+        verbose_name=_('End'))
+    count = models.PositiveIntegerField(
+        verbose_name=_('Flagged requests'), default=0)
+    peak = models.PositiveIntegerField(
+        verbose_name=_('Peak requests per window'), default=0)
+    threshold = models.PositiveIntegerField(
+        verbose_name=_('Threshold'))
+    window = models.PositiveIntegerField(
+        verbose_name=_('Window (seconds)'))
+
+    class Meta:
+        """Meta class for Django."""
+
+        ordering = ('-start', )
+        verbose_name = _('Incident')
+        verbose_name_plural = _('Incidents')
+
+    def __str__(self):
+        return '%s %s (%s)' % (self.client_ip_address, self.kind, self.start)
+
+
+class Visit(models.Model):
+    """
+    A model to store the visits (sessions) of visitors.
+
+    A visitor is a client IP address with a user agent. Open visits can
+    still be extended by the next update (see ``meerkat.logs.visits``).
+    """
+
+    client_ip_address = models.GenericIPAddressField(
+        verbose_name=_('Client IP address'), db_index=True)
+    user_agent_hash = models.BigIntegerField(
+        verbose_name=_('User agent hash'))
+    user_agent = models.TextField(
+        verbose_name=_('User agent'), blank=True)
+    start = models.DateTimeField(
+        verbose_name=_('Start'), db_index=True)
+    end = models.DateTimeField(
+        verbose_name=_('End'))
+    hits = models.PositiveIntegerField(
+        verbose_name=_('Hits'), default=0)
+    bytes_sent = models.BigIntegerField(
+        verbose_name=_('Bytes sent'), default=0)
+    entry_url = models.URLField(
+        verbose_name=_('Entry URL'), max_length=2047, blank=True)
+    exit_url = models.URLField(
+        verbose_name=_('Exit URL'), max_length=2047, blank=True)
+    last_log_id = models.BigIntegerField(
+        verbose_name=_('Last request log ID'), db_index=True)
+    closed = models.BooleanField(
+        verbose_name=_('Closed'), default=False, db_index=True)
+
+    class Meta:
+        """Meta class for Django."""
+
+        ordering = ('-start', )
+        verbose_name = _('Visit')
+        verbose_name_plural = _('Visits')
+
+    def __str__(self):
+        return '%s %s (%s hits)' % (
+            self.client_ip_address, self.start, self.hits)
+
+    @property
+    def duration(self):
+        """Return the duration of the visit (timedelta)."""
+        return self.end - self.start
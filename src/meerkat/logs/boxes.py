@@ -11,6 +11,7 @@ django-suit-dashboard package.
 import json
 
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.utils.translation import get_language
 from django.utils.translation import ugettext as _
 
 from suit_dashboard import Box, Widget
@@ -18,10 +19,26 @@ from suit_dashboard import Box, Widget
 from ..utils.time import month_name_to_number
 from .charts import (
     most_visited_pages_charts, most_visited_pages_legend_chart,
-    status_codes_by_date_chart, status_codes_chart)
+    status_codes_by_date_chart, status_codes_by_date_series,
+    status_codes_chart, unique_visitors_chart)
 from .data import STATUS_CODES
-from .models import RequestLog
-from .stats import status_codes_by_date_stats
+from .models import HeavyHitter, RequestLog
+from .stats import (
+    heavy_hitters_stats, latency_stats, unique_visitors_stats)
+
+
+class AsyncBox(Box):
+    """
+    A box whose content is loaded asynchronously.
+
+    The page only contains a placeholder, then the content (the widgets, or
+    the content template if defined) is fetched from the ``logs_box_data``
+    JSON endpoint, identified by the box name.
+    """
+
+    name = None
+    template = 'meerkat/widgets/async_box.html'
+    content_template = None
 
 
 class BoxLogsLinks(Box):
@@ -36,10 +53,11 @@ class BoxLogsLinks(Box):
     template = 'meerkat/logs/links.html'
 
 
-class BoxLogsStatusCodes(Box):
+class BoxLogsStatusCodes(AsyncBox):
     """The status codes widget."""
 
     title = _('Status codes')
+    name = 'status_codes'
 
     @property
     def widgets(self):
@@ -58,61 +76,138 @@ class BoxLogsStatusCodes(Box):
         ]
 
 
-class BoxLogsStatusCodesByDate(Box):
+class BoxLogsStatusCodesByDate(AsyncBox):
     """The status codes by date widget."""
 
     title = _('Status codes by date')
-    template = 'meerkat/logs/status_codes_by_date.html'
+    name = 'status_codes_by_date'
+    content_template = 'meerkat/logs/status_codes_by_date.html'
 
     @property
     def context(self):
         """Get the context."""
-        stats = status_codes_by_date_stats()
-
-        attacks_data = [{
-            'type': 'line',
-            'zIndex': 9,
-            'name': _('Attacks'),
-            'data': [(v[0], v[1]['attacks'])
-                     for v in stats]
-        }]
-
-        codes_data = [{
-            'zIndex': 4,
-            'name': '2xx',
-            'data': [(v[0], v[1][200]) for v in stats]
-        }, {
-            'zIndex': 5,
-            'name': '3xx',
-            'data': [(v[0], v[1][300]) for v in stats]
-        }, {
-            'zIndex': 6,
-            'name': '4xx',
-            'data': [(v[0], v[1][400]) for v in stats]
-        }, {
-            'zIndex': 8,
-            'name': '5xx',
-            'data': [(v[0], v[1][500]) for v in stats]
-        }]
-
+        series = status_codes_by_date_series()
         return {'generic_chart': json.dumps(status_codes_by_date_chart()),
-                'attacks_data': json.dumps(attacks_data),
-                'codes_data': json.dumps(codes_data)}
+                'attacks_data': json.dumps(series['attacks_data']),
+                'codes_data': json.dumps(series['codes_data'])}
+
+
+class BoxLogsUniqueVisitors(AsyncBox):
+    """The unique visitors widget."""
+
+    title = _('Unique visitors')
+    name = 'unique_visitors'
+    description = _(
+        'Unique visitors are distinct client IP addresses. They are '
+        'estimated with HyperLogLog sketches updated while logs are '
+        'parsed, so the numbers are approximations: the relative standard '
+        'error is given below, and about 95% of the estimations are within '
+        'twice this error of the exact value.')
+
+    @property
+    def widgets(self):
+        stats = unique_visitors_stats()
+        return [
+            Widget(html_id='unique-visitors',
+                   content=json.dumps(unique_visitors_chart(stats)),
+                   template='meerkat/widgets/highcharts.html'),
+            Widget(html_id='unique-visitors-total',
+                   content=[
+                       (_('Unique visitors (whole range)'), stats['total']),
+                       (_('Relative standard error'),
+                        '%.2f%%' % (stats['error'] * 100))],
+                   template='meerkat/widgets/table.html',
+                   classes='table-hover table-striped')
+        ]
+
+
+class BoxLogsHeavyHitters(AsyncBox):
+    """The top IP addresses, URLs and user agents widget."""
+
+    title = _('Heavy hitters')
+    name = 'heavy_hitters'
+    description = _(
+        'Most frequent IP addresses, URLs and user agents during the last '
+        'time window, counted while logs are parsed with a bounded amount '
+        'of memory. A count can be overestimated by at most its error.')
+
+    @property
+    def widgets(self):
+        stats = heavy_hitters_stats()
+        return [
+            Widget(html_id='heavy-hitters-%s' % dimension,
+                   name=name,
+                   content=[(value, count, '± %s' % error if error else '')
+                            for value, count, error in stats[dimension]],
+                   template='meerkat/widgets/table.html',
+                   classes='table-hover table-striped')
+            for dimension, name in HeavyHitter.DIMENSIONS
+        ]
+
+
+class BoxLogsLatency(AsyncBox):
+    """The request time and response size quantiles widget."""
+
+    title = _('Latency')
+    name = 'latency'
+    description = _(
+        'Request time (milliseconds) and response size (bytes) quantiles '
+        'for the whole site and for the most requested endpoints. '
+        'Quantiles are estimated with t-digests updated while logs are '
+        'parsed. Request time is only available if the log format contains '
+        'the $request_time variable.')
+
+    @property
+    def widgets(self):
+        def fmt(value):
+            return '' if value is None else '%.0f' % value
+
+        return [Widget(
+            html_id='latency',
+            content=[(_('Endpoint'), _('Requests'),
+                      _('Time p50'), _('Time p95'), _('Time p99'),
+                      _('Size p50'), _('Size p95'), _('Size p99'))] + [
+                (s['endpoint'] or _('All endpoints'), s['count']) +
+                tuple(fmt(v) for v in s['time'] + s['size'])
+                for s in latency_stats()],
+            template='meerkat/widgets/table.html',
+            classes='table-hover table-striped')]
+
+
+class BoxLogsLive(Box):
+    """The live tail of request logs."""
+
+    title = _('Live requests')
+    description = _(
+        'Request logs are displayed as soon as they are ingested. '
+        'Only the most recent ones are kept in the table.')
+    template = 'meerkat/logs/live.html'
+    max_rows = 200
 
 
 class BoxLogsMostVisitedPagesLegend(Box):
     """The most visited pages legend."""
 
-    widgets = [Widget(
-        html_id='legend_chart',
-        content=json.dumps(most_visited_pages_legend_chart()),
-        template='meerkat/widgets/highcharts.html')]
+    _widgets_by_language = {}
+
+    @property
+    def widgets(self):
+        """Get the widgets, built once per language."""
+        language = get_language()
+        widgets = self._widgets_by_language.get(language, None)
+        if widgets is None:
+            widgets = self._widgets_by_language[language] = [Widget(
+                html_id='legend_chart',
+                content=json.dumps(most_visited_pages_legend_chart()),
+                template='meerkat/widgets/highcharts.html')]
+        return widgets
 
 
-class BoxLogsMostVisitedPages(Box):
+class BoxLogsMostVisitedPages(AsyncBox):
     """The most visited pages legend."""
 
     title = _('Most visited pages')
+    name = 'most_visited_pages'
 
     @property
     def widgets(self):
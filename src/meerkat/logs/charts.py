@@ -9,11 +9,17 @@ from data.
 
 from django.utils.translation import ugettext as _
 
+from ..apps import AppSettings
+from ..utils.downsample import lttb, lttb_indices
 from ..utils.url import (
     ASSET, COMMON_ASSET, FALSE_NEGATIVE, OLD_ASSET, OLD_PROJECT,
     PROJECT, SUSPICIOUS)
 from .data import STATUS_CODES
-from .stats import most_visited_pages_stats, status_codes_stats
+from .stats import (
+    bucket_size, datetime_range, most_visited_pages_stats,
+    status_codes_by_date_stats, status_codes_stats, unique_visitors_stats)
+
+app_settings = AppSettings()
 
 
 def status_codes_chart():
@@ -86,6 +92,82 @@ def status_codes_by_date_chart():
     }
 
 
+def status_codes_by_date_series(start=None, end=None, points=None):
+    """
+    Series for status codes by date, downsampled to a number of points.
+
+    The bucket size is chosen from the range so that there are at most
+    four times the number of points, then the series are downsampled
+    with LTTB: the 2xx to 5xx series are stacked, so they keep the
+    points selected on the total number of requests, while the attacks
+    series selects its own points.
+
+    Args:
+        start (datetime): beginning of the range (default: first log).
+        end (datetime): end of the range, excluded (default: after last log).
+        points (int): maximum number of points per series
+            (default to MEERKAT_LOGS_CHART_POINTS setting).
+
+    Returns:
+        dict: bucket (size in seconds), codes_data and attacks_data (lists
+            of Highcharts series).
+    """
+    if points is None:
+        points = app_settings.logs_chart_points
+    first, last = datetime_range()
+    bucket = 86400
+    if first is not None:
+        bucket = bucket_size(start or first, end or last, 4 * points)
+    stats = status_codes_by_date_stats(start, end, bucket)
+
+    x = [v[0] for v in stats]
+    total = [sum(v[1][code] for code in (200, 300, 400, 500)) for v in stats]
+    indices = lttb_indices(x, total, points)
+    codes_data = [{
+        'zIndex': z_index,
+        'name': name,
+        'data': [(stats[i][0], stats[i][1][code]) for i in indices]
+    } for z_index, name, code in (
+        (4, '2xx', 200), (5, '3xx', 300), (6, '4xx', 400), (8, '5xx', 500))]
+
+    attacks_data = [{
+        'type': 'line',
+        'zIndex': 9,
+        'name': _('Attacks'),
+        'data': lttb([(v[0], v[1]['attacks']) for v in stats], points)
+    }]
+
+    return {'bucket': bucket,
+            'codes_data': codes_data,
+            'attacks_data': attacks_data}
+
+
+def unique_visitors_chart(stats=None):
+    """
+    Chart for unique visitors by date.
+
+    Args:
+        stats (dict): result of ``unique_visitors_stats`` (computed if None).
+    """
+    if stats is None:
+        stats = unique_visitors_stats()
+    return {
+        'chart': {
+            'type': 'line',
+            'zoomType': 'x'
+        },
+        'title': {'text': None},
+        'xAxis': {'type': 'datetime'},
+        'yAxis': {'title': {'text': None}, 'min': 0},
+        'legend': {'enabled': False},
+        'credits': {'enabled': False},
+        'series': [{
+            'name': _('Unique visitors'),
+            'data': stats['by_date']
+        }]
+    }
+
+
 URL_TYPE_COLOR = {
     PROJECT: '#AFE4FD',
     ASSET: '#DBDBDB',
@@ -0,0 +1,585 @@
+# -*- coding: utf-8 -*-
+
+"""
+Ingestion collectors.
+
+Collectors are fed with every request log ingested by ``RequestLog.parse_all``
+or by the daemon thread. They aggregate data in memory and write it
+to the database when flushed, so that dashboards can read small
+pre-aggregated tables instead of scanning the request logs.
+"""
+
+import datetime
+import time
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from ..apps import AppSettings
+from ..utils.hyperloglog import HyperLogLog, hash64
+from ..utils.sliding_window import SlidingWindowCounters
+from ..utils.space_saving import SpaceSaving
+from ..utils.tdigest import TDigest
+from . import metrics
+from .dimensions import denormalize
+from .live import get_buffer
+from .signatures import RATE_EXCEEDED
+
+app_settings = AppSettings()
+
+
+class Collector(object):
+    """
+    Base class for collectors.
+
+    Subclasses must implement ``update`` and ``write``. The ``flush`` method
+    only calls ``write`` when enough logs are pending or when the last write
+    is old enough, unless forced.
+    """
+
+    max_pending = 100000
+    max_delay = 60
+
+    def __init__(self):
+        """Init method."""
+        self.pending = 0
+        self.last_write = time.time()
+
+    def update(self, log):
+        """
+        Update the collector with a request log.
+
+        Args:
+            log (RequestLog): the ingested request log (maybe not saved).
+        """
+        raise NotImplementedError
+
+    def write(self):
+        """Write the aggregated data to the database and reset it."""
+        raise NotImplementedError
+
+    def collect(self, log):
+        """
+        Update the collector and count the log as pending.
+
+        Args:
+            log (RequestLog): the ingested request log (maybe not saved).
+        """
+        self.update(log)
+        self.pending += 1
+
+    def flush(self, force=False):
+        """
+        Write the aggregated data if needed.
+
+        Args:
+            force (bool): write even if thresholds are not reached.
+
+        Returns:
+            bool: whether data was written.
+        """
+        if not self.pending:
+            return False
+        now = time.time()
+        if (force or self.pending >= self.max_pending or
+                now - self.last_write >= self.max_delay):
+            self.write()
+            self.pending = 0
+            self.last_write = now
+            return True
+        return False
+
+
+class UniqueVisitorsCollector(Collector):
+    """
+    Collect unique visitors in HyperLogLog sketches.
+
+    Client IP addresses are added to three kinds of buckets per day (in the
+    current timezone): all hosts and URLs, per host, and per host and URL.
+    """
+
+    def __init__(self, precision=None):
+        """
+        Init method.
+
+        Args:
+            precision (int): the sketches precision
+                (default to MEERKAT_LOGS_HLL_PRECISION setting).
+        """
+        super(UniqueVisitorsCollector, self).__init__()
+        if precision is None:
+            precision = app_settings.logs_hll_precision
+        self.precision = precision
+        self.sketches = {}
+
+    def _sketch(self, key):
+        sketch = self.sketches.get(key, None)
+        if sketch is None:
+            sketch = self.sketches[key] = HyperLogLog(self.precision)
+        return sketch
+
+    def update(self, log):
+        if not log.client_ip_address or not log.datetime:
+            return
+        hashed = hash64(log.client_ip_address)
+        date = log.datetime
+        if timezone.is_aware(date):
+            date = timezone.localtime(date)
+        date = date.date()
+        host = log.host or ''
+        url = log.url or ''
+        keys = {(date, '', ''), (date, host, ''), (date, host, url)}
+        for key in keys:
+            self._sketch(key).add_hash(hashed)
+
+    def write(self):
+        from .models import UniqueVisitorsSketch
+        UniqueVisitorsSketch.merge_all(self.sketches)
+        self.sketches.clear()
+
+
+class HeavyHittersCollector(Collector):
+    """
+    Collect the top IP addresses, URLs and user agents per time window.
+
+    Each dimension is counted with a Space-Saving summary, so memory stays
+    bounded whatever the traffic volume. When a window is over, or when the
+    collector is flushed, the top items of the window are written to the
+    database, replacing the previous snapshot of the same window.
+
+    Late request logs are counted in their own window while it is not
+    written yet. Once it is, they are dropped (and counted in
+    ``dropped``), since they would replace its snapshot.
+    """
+
+    max_delay = 10
+    dimensions = (
+        ('ip', 'client_ip_address'),
+        ('url', 'url'),
+        ('user_agent', 'user_agent'))
+
+    def __init__(self, window=None, capacity=None, top=None):
+        """
+        Init method.
+
+        Args:
+            window (int): the window length in seconds
+                (default to MEERKAT_LOGS_HEAVY_HITTERS_WINDOW setting).
+            capacity (int): the number of monitored items per dimension
+                (default to MEERKAT_LOGS_HEAVY_HITTERS_CAPACITY setting).
+            top (int): the number of items stored per window and dimension
+                (default to MEERKAT_LOGS_HEAVY_HITTERS_TOP setting).
+        """
+        super(HeavyHittersCollector, self).__init__()
+        if window is None:
+            window = app_settings.logs_heavy_hitters_window
+        if capacity is None:
+            capacity = app_settings.logs_heavy_hitters_capacity
+        if top is None:
+            top = app_settings.logs_heavy_hitters_top
+        self.window = window
+        self.capacity = capacity
+        self.top = top
+        self.window_start = None
+        self.summaries = self._new_summaries()
+        self.finished = []
+        self.dropped = 0
+
+    def _new_summaries(self):
+        return {name: SpaceSaving(self.capacity)
+                for name, _ in self.dimensions}
+
+    def _window_start(self, dt):
+        timestamp = dt.timestamp()
+        return datetime.datetime.fromtimestamp(
+            timestamp - timestamp % self.window, datetime.timezone.utc)
+
+    def _summaries(self, window_start):
+        # The summaries of a window, None if it is not in memory.
+        if window_start == self.window_start:
+            return self.summaries
+        for finished_start, summaries in self.finished:
+            if finished_start == window_start:
+                return summaries
+        return None
+
+    def update(self, log):
+        if not log.datetime:
+            return
+        window_start = self._window_start(log.datetime)
+        if self.window_start is None:
+            self.window_start = window_start
+        elif window_start > self.window_start:
+            self.finished.append((self.window_start, self.summaries))
+            self.window_start = window_start
+            self.summaries = self._new_summaries()
+        summaries = self._summaries(window_start)
+        if summaries is None:
+            self.dropped += 1
+            return
+        for name, attr in self.dimensions:
+            value = getattr(log, attr)
+            if value:
+                summaries[name].add(value)
+
+    def _top(self, summaries):
+        return {name: summary.top(self.top)
+                for name, summary in summaries.items()}
+
+    def write(self):
+        from .models import HeavyHitter
+        for window_start, summaries in self.finished:
+            HeavyHitter.save_snapshot(window_start, self._top(summaries))
+        self.finished = []
+        if self.window_start is not None:
+            HeavyHitter.save_snapshot(
+                self.window_start, self._top(self.summaries))
+
+
+class LatencyCollector(Collector):
+    """
+    Collect request times and response sizes in t-digests.
+
+    Digests are kept per hour and endpoint (URL without query string),
+    and per hour for all endpoints.
+    """
+
+    def __init__(self, compression=None):
+        """
+        Init method.
+
+        Args:
+            compression (int): the digests compression
+                (default to MEERKAT_LOGS_TDIGEST_COMPRESSION setting).
+        """
+        super(LatencyCollector, self).__init__()
+        if compression is None:
+            compression = app_settings.logs_tdigest_compression
+        self.compression = compression
+        self.digests = {}
+
+    def update(self, log):
+        if log.request_time is None or not log.datetime:
+            return
+        hour = log.datetime
+        if timezone.is_aware(hour):
+            hour = hour.astimezone(timezone.utc)
+        hour = hour.replace(minute=0, second=0, microsecond=0)
+        endpoint = (log.url or '').split('?')[0]
+        for key in {(hour, ''), (hour, endpoint)}:
+            bucket = self.digests.get(key, None)
+            if bucket is None:
+                bucket = self.digests[key] = [
+                    0, TDigest(self.compression), TDigest(self.compression)]
+            bucket[0] += 1
+            bucket[1].add(log.request_time)
+            if log.bytes_sent is not None:
+                bucket[2].add(int(log.bytes_sent))
+
+    def write(self):
+        from .models import LatencyDigest
+        for (hour, endpoint), bucket in self.digests.items():
+            LatencyDigest.merge_into(hour, endpoint, *bucket)
+        self.digests.clear()
+
+
+class DailyCountCollector(Collector):
+    """Count request logs per day (in the current timezone)."""
+
+    def __init__(self):
+        """Init method."""
+        super(DailyCountCollector, self).__init__()
+        self.counts = {}
+
+    def update(self, log):
+        if not log.datetime:
+            return
+        date = log.datetime
+        if timezone.is_aware(date):
+            date = timezone.localtime(date)
+        date = date.date()
+        self.counts[date] = self.counts.get(date, 0) + 1
+
+    def write(self):
+        from .models import DailyRequestCount
+        for date, count in self.counts.items():
+            DailyRequestCount.merge_into(date, count)
+        self.counts.clear()
+
+
+class IncidentsCollector(Collector):
+    """
+    Detect IP addresses sending too many requests, and record incidents.
+
+    Requests are counted per IP address over a sliding window, in total and
+    per class of status codes. While an IP address exceeds a threshold, its
+    request logs are flagged as suspicious (with the ``rate_exceeded``
+    signature family): this collector must see request logs before they
+    are saved. An incident is recorded per IP address and exceeded
+    threshold; it ends when the address stays a whole window under the
+    threshold.
+    """
+
+    max_delay = 10
+    KINDS = ('all', '1xx', '2xx', '3xx', '4xx', '5xx')
+
+    def __init__(self, window=None, thresholds=None, capacity=None):
+        """
+        Init method.
+
+        Args:
+            window (int): the window length in seconds
+                (default to MEERKAT_LOGS_INCIDENTS_WINDOW setting).
+            thresholds (dict): the maximum number of requests per window,
+                by kind (``all`` or a class of status codes like ``4xx``)
+                (default to MEERKAT_LOGS_INCIDENTS_THRESHOLDS setting).
+            capacity (int): the maximum number of tracked IP addresses
+                (default to MEERKAT_LOGS_INCIDENTS_CAPACITY setting).
+        """
+        super(IncidentsCollector, self).__init__()
+        if window is None:
+            window = app_settings.logs_incidents_window
+        if thresholds is None:
+            thresholds = app_settings.logs_incidents_thresholds
+        if capacity is None:
+            capacity = app_settings.logs_incidents_capacity
+        self.window = window
+        self.limits = [(self.KINDS.index(kind), kind, limit)
+                       for kind, limit in sorted(thresholds.items())]
+        self.counters = SlidingWindowCounters(
+            window, len(self.KINDS), capacity)
+        self.incidents = {}
+
+    def update(self, log):
+        if not log.client_ip_address or not log.datetime:
+            return
+        second = int(log.datetime.timestamp())
+        # Parsed request logs are collected before being saved: the status
+        # code can still be a string.
+        status_class = int(log.status_code or 0) // 100
+        slots = (0, status_class) if 1 <= status_class <= 5 else (0, )
+        totals = self.counters.add(log.client_ip_address, second, slots)
+        for slot, kind, limit in self.limits:
+            if totals[slot] > limit:
+                self._flag(log, second, kind, totals[slot], limit)
+
+    def _flag(self, log, second, kind, total, limit):
+        log.suspicious = True
+        log.signatures = (log.signatures or 0) | RATE_EXCEEDED
+        key = (log.client_ip_address, kind)
+        incident = self.incidents.get(key, None)
+        if incident is None or incident['last'] <= second - self.window:
+            incident = self.incidents[key] = {
+                'id': None, 'client_ip_address': log.client_ip_address,
+                'kind': kind, 'start': log.datetime, 'count': 0, 'peak': 0,
+                'threshold': limit, 'last': second}
+            metrics.incidents_opened.inc(kind=kind)
+        if second >= incident['last']:
+            incident['end'] = log.datetime
+            incident['last'] = second
+        incident['count'] += 1
+        incident['peak'] = max(incident['peak'], total)
+        incident['changed'] = True
+
+    def write(self):
+        from .models import Incident
+        limit = (self.counters.now or 0) - self.window
+        for key, incident in list(self.incidents.items()):
+            if incident['changed']:
+                incident['changed'] = False
+                if incident['id'] is None:
+                    incident['id'] = Incident.objects.create(
+                        client_ip_address=incident['client_ip_address'],
+                        kind=incident['kind'], start=incident['start'],
+                        end=incident['end'], count=incident['count'],
+                        peak=incident['peak'],
+                        threshold=incident['threshold'],
+                        window=self.window).id
+                else:
+                    Incident.objects.filter(id=incident['id']).update(
+                        end=incident['end'], count=incident['count'],
+                        peak=incident['peak'])
+            if incident['last'] <= limit:
+                del self.incidents[key]
+
+
+class LiveTailCollector(Collector):
+    """Publish ingested request logs in the live tail buffer."""
+
+    def __init__(self):
+        """Init method."""
+        super(LiveTailCollector, self).__init__()
+        self.buffer = get_buffer()
+
+    def update(self, log):
+        self.buffer.append(log)
+
+    def write(self):
+        pass
+
+
+COLLECTORS = []
+
+
+def get_collectors():
+    """
+    Return the collectors instances, creating them on first call.
+
+    Returns:
+        list: the collectors used by the ingestion process.
+    """
+    if not COLLECTORS:
+        COLLECTORS.extend([
+            # Flags request logs: must be the first one.
+            IncidentsCollector(),
+            UniqueVisitorsCollector(),
+            HeavyHittersCollector(),
+            LatencyCollector(),
+            DailyCountCollector(),
+            LiveTailCollector()])
+    return COLLECTORS
+
+
+def flush_collectors(force=False):
+    """
+    Flush every collector.
+
+    Args:
+        force (bool): write even if thresholds are not reached.
+
+    Returns:
+        bool: whether data was written by at least one collector.
+    """
+    from .models import IngestionState
+    written = False
+    for collector in get_collectors():
+        written = collector.flush(force=force) or written
+    if written:
+        IngestionState.increment(IngestionState.VERSION)
+    return written
+
+
+# Aggregates which can be rebuilt from the request logs: collector class,
+# model name, key field, and whether the key is a date or a datetime.
+AGGREGATES = {
+    'daily_count': (DailyCountCollector, 'DailyRequestCount', 'date', 'date'),
+    'unique_visitors': (UniqueVisitorsCollector, 'UniqueVisitorsSketch',
+                        'date', 'date'),
+    'latency': (LatencyCollector, 'LatencyDigest', 'hour', 'datetime'),
+    'heavy_hitters': (HeavyHittersCollector, 'HeavyHitter', 'window_start',
+                      'datetime'),
+}
+
+
+def _day_start(day):
+    if day is None:
+        return None
+    start = datetime.datetime.combine(day, datetime.time.min)
+    if settings.USE_TZ:
+        start = timezone.make_aware(start)
+    return start
+
+
+def _local_date(value):
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date()
+
+
+def logs_days_range():
+    """
+    Return the range of days covering all request logs.
+
+    Returns:
+        tuple: first day and day after the last one (None if no logs).
+    """
+    from .models import RequestLog
+    bounds = RequestLog.objects.aggregate(
+        first=models.Min('datetime'), last=models.Max('datetime'))
+    if bounds['first'] is None:
+        return None, None
+    return (_local_date(bounds['first']),
+            _local_date(bounds['last']) + datetime.timedelta(days=1))
+
+
+def _aggregate_rows(name, since, until, low, high):
+    from . import models as logs_models
+    _, model_name, field, kind = AGGREGATES[name]
+    if kind == 'datetime':
+        since, until = low, high
+    rows = getattr(logs_models, model_name).objects.all()
+    if since is not None:
+        rows = rows.filter(**{'%s__gte' % field: since})
+    if until is not None:
+        rows = rows.filter(**{'%s__lt' % field: until})
+    return rows
+
+
+def _range_logs(low, high):
+    from .models import RequestLog
+    logs = RequestLog.objects.select_related(
+        'url_ref', 'user_agent_ref').only(
+            'datetime', 'client_ip_address', 'host', 'url', 'user_agent',
+            'request_time', 'bytes_sent', 'url_ref__value',
+            'user_agent_ref__value').order_by('datetime', 'id')
+    if low is not None:
+        logs = logs.filter(datetime__gte=low)
+    if high is not None:
+        logs = logs.filter(datetime__lt=high)
+    return logs
+
+
+def rebuild_aggregates(since=None, until=None, names=None, batch_size=10000,
+                       dry_run=False):
+    """
+    Rebuild pre-aggregated tables from the request logs.
+
+    Aggregates of the days from since to until are deleted, then the
+    request logs of these days are read again, in chronological order, and
+    fed to new collectors, in one transaction. Without since and until,
+    aggregates are rebuilt entirely.
+
+    Args:
+        since (date): the first day (default: no bound).
+        until (date): the day after the last one (default: no bound).
+        names (list): the names of the aggregates to rebuild
+            (keys of AGGREGATES, default: all).
+        batch_size (int): number of request logs collected between two
+            writes of the aggregates.
+        dry_run (bool): only count the rows to delete and the request logs.
+
+    Returns:
+        dict: numbers of deleted aggregate rows and read request logs.
+    """
+    from .models import IngestionState
+    if names is None:
+        names = sorted(AGGREGATES.keys())
+    stats = {'deleted': 0, 'logs': 0}
+    low, high = _day_start(since), _day_start(until)
+    if dry_run:
+        stats['deleted'] = sum(
+            _aggregate_rows(name, since, until, low, high).count()
+            for name in names)
+        stats['logs'] = _range_logs(low, high).count()
+        return stats
+    # Readers never see the aggregates deleted but not rebuilt yet.
+    with transaction.atomic():
+        collectors = []
+        for name in names:
+            stats['deleted'] += _aggregate_rows(
+                name, since, until, low, high).delete()[0]
+            collector = AGGREGATES[name][0]()
+            collector.max_pending = batch_size
+            collector.max_delay = float('inf')
+            collectors.append(collector)
+        for log in _range_logs(low, high).iterator():
+            stats['logs'] += 1
+            denormalize(log)
+            for collector in collectors:
+                collector.collect(log)
+                collector.flush()
+        for collector in collectors:
+            collector.flush(force=True)
+        IngestionState.increment(IngestionState.VERSION)
+    return stats
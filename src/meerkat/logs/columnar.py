@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+
+"""
+Columnar analytics engine.
+
+Request logs are loaded once as typed NumPy arrays (one array per column)
+and aggregated with vectorized operations instead of iterating over ORM
+rows. Text columns with few distinct values (URL, verb, user agent) are
+dictionary-encoded: the column stores integer codes, and the distinct values
+are kept in a separate list of categories.
+
+Loaded columns can be saved as a snapshot directory (one ``.npy`` file per
+column, plus the categories in JSON) and memory-mapped back, so that a new
+process does not have to read the whole table again: only the request logs
+created after the snapshot are loaded from the database.
+
+Columns are only refreshed with the request logs of greater IDs: updated and
+deleted request logs are not seen until ``reset_columnar_logs`` is called,
+which also deletes the snapshot. New rows are appended to buffers which grow
+geometrically, so that refreshes do not copy the loaded rows each time
+(memory-mapped columns are copied once, on the first refresh which loads
+new request logs).
+
+NumPy is an optional dependency (``pip install django-meerkat[columnar]``).
+"""
+
+import datetime
+import json
+import os
+import shutil
+import threading
+
+from django.utils import timezone
+
+from ..apps import AppSettings
+from ..utils.ip import ip_to_int
+from .dimensions import DIMENSIONS, texts
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+app_settings = AppSettings()
+
+FIELDS = (
+    ('id', 'id', 'int64'),
+    ('timestamp', 'datetime', 'int64'),
+    ('status_code', 'status_code', 'uint16'),
+    ('ip_high', 'client_ip_address', 'uint64'),
+    ('ip_low', None, 'uint64'),
+    ('bytes_sent', 'bytes_sent', 'int64'),
+    ('url', 'url', 'int32'),
+    ('verb', 'verb', 'int32'),
+    ('user_agent', 'user_agent', 'int32'),
+    ('signatures', 'signatures', 'uint32'),
+)
+CATEGORICAL = ('url', 'verb', 'user_agent')
+
+_LOW_MASK = (1 << 64) - 1
+
+# Minimum number of new request logs before the snapshot is saved again.
+SNAPSHOT_ROWS = 10000
+
+
+def check_numpy():
+    """Raise an ImportError if NumPy is not installed."""
+    if np is None:
+        raise ImportError(
+            'The columnar engine requires NumPy: '
+            'pip install django-meerkat[columnar]')
+
+
+class ColumnarLogs(object):
+    """Request logs stored as NumPy column arrays."""
+
+    def __init__(self, columns=None, categories=None):
+        """
+        Init method.
+
+        Args:
+            columns (dict): NumPy arrays by column name (empty by default).
+            categories (dict): list of distinct values by categorical
+                column name (empty by default).
+        """
+        check_numpy()
+        if columns is None:
+            columns = {name: np.empty(0, dtype=dtype)
+                       for name, _, dtype in FIELDS}
+        if categories is None:
+            categories = {name: [] for name in CATEGORICAL}
+        self.columns = columns
+        self.categories = categories
+        self._codes = {name: {value: code for code, value in enumerate(cat)}
+                       for name, cat in categories.items()}
+        # Columns are views of the first rows of these buffers.
+        self._buffers = dict(columns)
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def last_id(self):
+        """
+        Return the highest request log ID loaded.
+
+        Returns:
+            int: the ID (0 if nothing is loaded).
+        """
+        ids = self.columns['id']
+        return int(ids.max()) if len(ids) else 0
+
+    def _encode(self, name, value):
+        codes = self._codes[name]
+        code = codes.get(value, None)
+        if code is None:
+            code = codes[value] = len(self.categories[name])
+            self.categories[name].append(value)
+        return code
+
+    def _append(self, name, values):
+        length = len(self.columns[name])
+        buffer = self._buffers[name]
+        if length + len(values) > len(buffer):
+            buffer = np.empty(max(2 * len(buffer), length + len(values)),
+                              dtype=buffer.dtype)
+            buffer[:length] = self.columns[name]
+            self._buffers[name] = buffer
+        buffer[length:length + len(values)] = values
+        self.columns[name] = buffer[:length + len(values)]
+
+    def extend(self, queryset):
+        """
+        Load request logs from a queryset and append them to the columns.
+
+        Args:
+            queryset (QuerySet): the request logs to load.
+
+        Returns:
+            int: the number of loaded request logs.
+        """
+        # Normalized strings are read from their dimension.
+        fields = ['%s_text' % attr if attr in DIMENSIONS else attr
+                  for _, attr, _ in FIELDS if attr]
+        rows = {name: [] for name, _, _ in FIELDS}
+        ip_cache = {}
+        queryset = queryset.annotate(**texts('url', 'user_agent'))
+        for (id_, dt, status_code, ip, bytes_sent, url, verb, user_agent,
+             signatures) in queryset.values_list(*fields).iterator():
+            rows['id'].append(id_)
+            rows['timestamp'].append(int(dt.timestamp()))
+            rows['status_code'].append(status_code or 0)
+            ip_value = ip_cache.get(ip, None)
+            if ip_value is None:
+                ip_value = ip_cache[ip] = ip_to_int(ip)
+            rows['ip_high'].append(ip_value >> 64)
+            rows['ip_low'].append(ip_value & _LOW_MASK)
+            rows['bytes_sent'].append(bytes_sent or 0)
+            rows['url'].append(self._encode('url', url))
+            rows['verb'].append(self._encode('verb', verb))
+            rows['user_agent'].append(self._encode('user_agent', user_agent))
+            rows['signatures'].append(signatures or 0)
+        if rows['id']:
+            for name, _, dtype in FIELDS:
+                self._append(name, np.array(rows[name], dtype=dtype))
+        return len(rows['id'])
+
+    @classmethod
+    def from_queryset(cls, queryset=None):
+        """
+        Load request logs from the database.
+
+        Args:
+            queryset (QuerySet): the request logs to load (default: all).
+
+        Returns:
+            ColumnarLogs: the loaded logs.
+        """
+        if queryset is None:
+            from .models import RequestLog
+            queryset = RequestLog.objects.all()
+        logs = cls()
+        logs.extend(queryset.order_by('id'))
+        return logs
+
+    def save(self, path):
+        """
+        Save the columns as a snapshot directory.
+
+        Files are written under a temporary name then renamed, so that
+        arrays memory-mapped from a previous snapshot stay valid.
+
+        Args:
+            path (str): the directory (created if needed).
+        """
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for name, _, _ in FIELDS:
+            file_path = os.path.join(path, '%s.npy' % name)
+            with open(file_path + '.tmp', 'wb') as stream:
+                np.save(stream, self.columns[name])
+            os.replace(file_path + '.tmp', file_path)
+        file_path = os.path.join(path, 'categories.json')
+        with open(file_path + '.tmp', 'w') as stream:
+            json.dump(self.categories, stream)
+        os.replace(file_path + '.tmp', file_path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load the columns from a snapshot directory.
+
+        Columns missing from the snapshot (saved by a previous version) are
+        filled with zeros.
+
+        Args:
+            path (str): the directory (see ``save``).
+            mmap (bool): memory-map the arrays instead of reading them.
+
+        Returns:
+            ColumnarLogs: the loaded logs.
+        """
+        mmap_mode = 'r' if mmap else None
+        columns = {}
+        for name, _, dtype in FIELDS:
+            file_path = os.path.join(path, '%s.npy' % name)
+            if os.path.exists(file_path):
+                columns[name] = np.load(file_path, mmap_mode=mmap_mode)
+            else:
+                columns[name] = np.zeros(len(columns['id']), dtype=dtype)
+        with open(os.path.join(path, 'categories.json')) as stream:
+            categories = json.load(stream)
+        return cls(columns, categories)
+
+    def filter(self, mask):
+        """
+        Return the logs matching a mask.
+
+        Args:
+            mask (array): boolean array (or array of indices).
+
+        Returns:
+            ColumnarLogs: a new instance sharing the same categories.
+        """
+        logs = ColumnarLogs.__new__(ColumnarLogs)
+        logs.columns = {name: column[mask]
+                        for name, column in self.columns.items()}
+        logs.categories = self.categories
+        logs._codes = self._codes
+        logs._buffers = dict(logs.columns)
+        return logs
+
+    def between(self, name, low=None, high=None):
+        """
+        Build a mask for values in a half-open interval.
+
+        Args:
+            name (str): the column name.
+            low (int): the lower bound, included (default: no bound).
+            high (int): the upper bound, excluded (default: no bound).
+
+        Returns:
+            array: the boolean mask.
+        """
+        column = self.columns[name]
+        mask = np.ones(len(column), dtype=bool)
+        if low is not None:
+            mask &= column >= low
+        if high is not None:
+            mask &= column < high
+        return mask
+
+    def isin(self, name, values):
+        """
+        Build a mask for values belonging to a set.
+
+        For categorical columns, values are the decoded values.
+
+        Args:
+            name (str): the column name.
+            values (iterable): the values to match.
+
+        Returns:
+            array: the boolean mask.
+        """
+        if name in self.categories:
+            codes = self._codes[name]
+            values = [codes[v] for v in values if v in codes]
+        return np.isin(self.columns[name], list(values))
+
+    def group_count(self, name, mask=None):
+        """
+        Count the rows for each distinct value of a column.
+
+        Args:
+            name (str): the column name.
+            mask (array): only count the rows matching this mask.
+
+        Returns:
+            dict: number of rows by value (decoded for categorical columns).
+        """
+        column = self.columns[name]
+        if mask is not None:
+            column = column[mask]
+        if name in self.categories:
+            categories = self.categories[name]
+            counts = np.bincount(column, minlength=len(categories))
+            nonzero = np.flatnonzero(counts)
+            return {categories[code]: int(counts[code]) for code in nonzero}
+        values, counts = np.unique(column, return_counts=True)
+        return {int(v): int(c) for v, c in zip(values, counts)}
+
+    def histogram(self, name, bins, mask=None):
+        """
+        Count the rows in bins of values.
+
+        Args:
+            name (str): the column name.
+            bins (array): the sorted bins edges: bin i is
+                [bins[i], bins[i + 1]).
+            mask (array): only count the rows matching this mask.
+
+        Returns:
+            array: the number of rows in each bin (len(bins) - 1 items).
+        """
+        column = self.columns[name]
+        if mask is not None:
+            column = column[mask]
+        indices = np.searchsorted(bins, column, side='right') - 1
+        indices = indices[(indices >= 0) & (indices < len(bins) - 1)]
+        return np.bincount(indices, minlength=len(bins) - 1)
+
+    def day_bins(self, tz=None):
+        """
+        Compute the midnights covering the loaded timestamps.
+
+        Args:
+            tz (tzinfo): the timezone of the days (default: current one).
+
+        Returns:
+            tuple: list of days (date) and array of their midnight
+                timestamps, with one extra item for the last day end.
+        """
+        timestamps = self.columns['timestamp']
+        if not len(timestamps):
+            return [], np.empty(0, dtype='int64')
+        if tz is None:
+            tz = timezone.get_current_timezone()
+        first = datetime.datetime.fromtimestamp(
+            int(timestamps.min()), tz).date()
+        last = datetime.datetime.fromtimestamp(
+            int(timestamps.max()), tz).date()
+        days = [first + datetime.timedelta(n)
+                for n in range((last - first).days + 2)]
+        edges = np.array([int(timezone.make_aware(
+            datetime.datetime.combine(day, datetime.time.min), tz
+        ).timestamp()) for day in days], dtype='int64')
+        return days[:-1], edges
+
+    def local_timestamps(self, tz=None):
+        """
+        Convert the timestamps to local time (seconds since local epoch).
+
+        UTC offsets are computed once per distinct hour, so daylight saving
+        time changes are taken into account.
+
+        Args:
+            tz (tzinfo): the local timezone (default: current one).
+
+        Returns:
+            array: the local timestamps.
+        """
+        timestamps = self.columns['timestamp']
+        if tz is None:
+            tz = timezone.get_current_timezone()
+        hours, inverse = np.unique(timestamps // 3600, return_inverse=True)
+        offsets = np.array([int(datetime.datetime.fromtimestamp(
+            int(hour) * 3600, tz).utcoffset().total_seconds())
+            for hour in hours], dtype='int64')
+        return timestamps + offsets[inverse]
+
+
+_columnar_logs = None
+_columnar_lock = threading.Lock()
+_snapshot_len = 0
+
+
+def get_columnar_logs():
+    """
+    Return the shared columnar logs, loading new request logs first.
+
+    On first call, the columns are loaded from the snapshot directory
+    (MEERKAT_LOGS_COLUMNAR_SNAPSHOT setting) if it exists, else from the
+    database. Next calls only load request logs with a greater ID: updated
+    or deleted request logs are not seen (see ``reset_columnar_logs``). The
+    snapshot is saved again once SNAPSHOT_ROWS new request logs are loaded.
+
+    Returns:
+        ColumnarLogs: the columnar logs.
+    """
+    global _columnar_logs, _snapshot_len
+    from .models import RequestLog
+    check_numpy()
+    snapshot = app_settings.logs_columnar_snapshot
+    with _columnar_lock:
+        if _columnar_logs is None:
+            if snapshot and os.path.isdir(snapshot):
+                _columnar_logs = ColumnarLogs.load(snapshot)
+                _snapshot_len = len(_columnar_logs)
+            else:
+                _columnar_logs = ColumnarLogs()
+                _snapshot_len = 0
+        _columnar_logs.extend(RequestLog.objects.filter(
+            id__gt=_columnar_logs.last_id).order_by('id'))
+        if snapshot and len(_columnar_logs) - _snapshot_len >= SNAPSHOT_ROWS:
+            _columnar_logs.save(snapshot)
+            _snapshot_len = len(_columnar_logs)
+        return _columnar_logs
+
+
+def reset_columnar_logs():
+    """
+    Forget the shared columnar logs and delete their snapshot.
+
+    It must be called after request logs are updated or deleted, since
+    refreshes only load new request logs.
+    """
+    global _columnar_logs
+    with _columnar_lock:
+        _columnar_logs = None
+        snapshot = app_settings.logs_columnar_snapshot
+        if snapshot and os.path.isdir(snapshot):
+            shutil.rmtree(snapshot)
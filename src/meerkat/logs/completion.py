@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+
+"""
+Request logs completion.
+
+The request line of a log (``GET /path?query HTTP/1.1``) is parsed once
+into a ``Request`` record, from which the verb, URL, protocol, file type and
+port are derived in a single pass. The URL (or the request line when it
+cannot be parsed), the user agent and the referrer are then matched against
+the attack signatures (see ``meerkat.logs.signatures``).
+
+Completion works on plain dictionaries (the parsed data of a log line,
+before the request log is instantiated) and on request logs, through
+``RequestLog.complete``. Request lines and URLs repeat a lot in logs:
+parsing results are cached.
+"""
+
+import collections
+import functools
+import operator
+import re
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+
+from . import signatures
+
+VERBS = ['CONNECT', 'GET', 'HEAD', 'OPTIONS', 'POST',
+         'PUT', 'TRACE', 'DELETE', 'PATCH']
+PROTOCOLS = ['HTTP/1.0', 'HTTP/1.1', 'HTTP/2.0', 'RTSP/1.0', 'SIP/2.0']
+
+REQUEST_REGEX = re.compile(
+    r'(?P<verb>%s) (?P<url>[^\s]+?) (?P<protocol>%s)' % (
+        '|'.join(VERBS), '|'.join(PROTOCOLS)))
+# File types end at path parameters, fragments, encoded characters or ports.
+FILE_TYPE_END = re.compile(r'[;#%:]')
+FILE_TYPE_REGEX = re.compile(r'[A-Z0-9]{1,10}')
+
+FIELDS = ('verb', 'url', 'protocol', 'https', 'file_type', 'port',
+          'suspicious', 'signatures')
+ALL_FIELDS = frozenset(FIELDS)
+REQUEST_FIELDS = ALL_FIELDS - {'suspicious', 'signatures'}
+get_values = operator.attrgetter(*FIELDS)
+
+CACHE_SIZE = 4096
+
+Request = collections.namedtuple('Request', 'verb url protocol')
+
+url_validator = URLValidator()
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def parse_request(request):
+    """
+    Parse a request line (results are cached).
+
+    Args:
+        request (str): the request line.
+
+    Returns:
+        Request: verb, URL and protocol, or None if the line is invalid.
+    """
+    if not request:
+        return None
+    match = REQUEST_REGEX.match(request)
+    if match is None:
+        return None
+    return Request(*match.group('verb', 'url', 'protocol'))
+
+
+def validate_url(url):
+    """
+    Check that a URL (absolute, or a path) is valid.
+
+    Args:
+        url (str): the URL.
+
+    Returns:
+        bool: whether the URL is valid.
+    """
+    for u in (url, 'http://localhost/%s' % url):
+        try:
+            url_validator(u)
+            return True
+        except ValidationError:
+            pass
+    return False
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def url_details(url):
+    """
+    Return the file type and the port found at the end of a URL.
+
+    Only the last segment of the path is considered, for example
+    ``/static/app.js`` gives ``('JS', None)`` and ``http://host/page:8080``
+    gives ``('', 8080)`` (results are cached). Path parameters, fragments
+    and encoded characters are not part of the file type
+    (``/item.jsp;jsessionid=1`` gives ``'JSP'``), and file types of more
+    than 10 letters and digits are ignored, so that clients cannot create
+    any number of them.
+
+    Args:
+        url (str): the URL.
+
+    Returns:
+        tuple: the file type (upper case, or empty string) and the port (or
+            None).
+    """
+    if not url:
+        return '', None
+    if '?' in url:
+        url = url.split('?', 1)[0]
+    elif '%3F' in url:
+        url = url.split('%3F', 1)[0]
+    end = url.rsplit('/', 1)[-1]
+    file_type, port = '', None
+    if '.' in end:
+        file_type = FILE_TYPE_END.split(end.rsplit('.', 1)[-1], 1)[0].upper()
+        if not FILE_TYPE_REGEX.fullmatch(file_type):
+            file_type = ''
+    if ':' in end:
+        try:
+            port = int(end.rsplit(':', 1)[-1])
+        except ValueError:
+            pass
+    return file_type, port
+
+
+def complete(request, values, rewrite=True, strict_url=False,
+             fields=None, user_agent=None, referrer=None):
+    """
+    Compute the completed fields of a request log.
+
+    A field is completed when it is empty, or when it differs from the
+    computed value and must be rewritten.
+
+    Args:
+        request (str/Request): the request line, or the parsed request.
+        values (list): the current values of the fields, in FIELDS order.
+        rewrite (bool/list): rewrite the already completed fields, for all
+            fields or for each one (in FIELDS order).
+        strict_url (bool): only complete valid URLs.
+        fields (set): only complete these fields (default: all).
+        user_agent (str): the user agent, matched against the signatures.
+        referrer (str): the referrer, matched against the signatures.
+
+    Returns:
+        list: the modified fields, as (field, value) pairs.
+    """
+    if rewrite is True or rewrite is False:
+        rewrite = (rewrite, ) * len(FIELDS)
+    if fields is None:
+        fields = ALL_FIELDS
+    raw_request = request
+    if request.__class__ is not Request:
+        request = parse_request(request)
+    else:
+        raw_request = None
+    url = values[1]
+    changes = []
+    if request is not None:
+        url = _complete_request(
+            request, values, rewrite, strict_url, fields, changes)
+    _complete_details(url, values, rewrite, fields, changes)
+    if 'suspicious' in fields or 'signatures' in fields:
+        _complete_signatures(url or raw_request, user_agent, referrer,
+                             values, rewrite, fields, changes)
+    return changes
+
+
+def _complete_request(request, values, rewrite, strict_url, fields,
+                      changes):
+    # Verb, URL and protocol: the (completed) URL.
+    verb, url, protocol = values[:3]
+    new_verb, new_url, new_protocol = request
+    if 'verb' in fields and verb != new_verb and (not verb or rewrite[0]):
+        changes.append(('verb', new_verb))
+    if 'url' in fields and url != new_url and (not url or rewrite[1]) and (
+            not strict_url or validate_url(new_url)):
+        changes.append(('url', new_url))
+        url = new_url
+    if 'protocol' in fields and protocol != new_protocol and (
+            not protocol or rewrite[2]):
+        changes.append(('protocol', new_protocol))
+    return url or new_url
+
+
+def _complete_details(url, values, rewrite, fields, changes):
+    # HTTPS, file type and port.
+    https, file_type, port = values[3:6]
+    # TODO: implement https completion
+    if 'https' in fields and https is not None and (
+            not https or rewrite[3]):
+        changes.append(('https', None))
+    new_file_type, new_port = url_details(url)
+    if 'file_type' in fields and file_type != new_file_type and (
+            not file_type or rewrite[4]):
+        changes.append(('file_type', new_file_type))
+    if 'port' in fields and port != new_port and (not port or rewrite[5]):
+        changes.append(('port', new_port))
+
+
+def _complete_signatures(text, user_agent, referrer, values, rewrite,
+                         fields, changes):
+    # Suspicious flag and signatures, keeping the detected families.
+    suspicious, mask = values[6:]
+    new_mask = signatures.match(text, user_agent, referrer) | (
+        (mask or 0) & signatures.DETECTED)
+    new_suspicious = bool(new_mask)
+    if 'suspicious' in fields and suspicious != new_suspicious and (
+            suspicious is None or rewrite[6]):
+        changes.append(('suspicious', new_suspicious))
+    if 'signatures' in fields and mask != new_mask and (
+            not mask or rewrite[7]):
+        changes.append(('signatures', new_mask))
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _complete_new(request):
+    return tuple(complete(
+        request, (None, ) * len(FIELDS), fields=REQUEST_FIELDS))
+
+
+def complete_data(data, **kwargs):
+    """
+    Complete the parsed data of a log line, in place.
+
+    Args:
+        data (dict): the parsed data.
+        **kwargs: arguments passed to ``complete``.
+
+    Returns:
+        dict: the same data.
+    """
+    request = data.get('request')
+    user_agent, referrer = data.get('user_agent'), data.get('referrer')
+    if not kwargs and ALL_FIELDS.isdisjoint(data):
+        # Nothing completed yet: the request fields only depend on the
+        # request, and signatures are cached by field.
+        data.update(_complete_new(request))
+        mask = signatures.match(
+            data.get('url') or request, user_agent, referrer)
+        data['suspicious'] = bool(mask)
+        data['signatures'] = mask
+    else:
+        data.update(complete(
+            request, tuple(map(data.get, FIELDS)), user_agent=user_agent,
+            referrer=referrer, **kwargs))
+    return data
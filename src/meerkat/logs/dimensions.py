@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+
+"""
+Dimension tables.
+
+Request logs repeat a few long strings on many rows: URLs, user agents and
+referrers. When the MEERKAT_LOGS_NORMALIZE_STRINGS setting is enabled, each
+distinct string is stored once in a dimension table (``URL``,
+``UserAgent``, ``Referrer``), keyed by its 64-bits hash, and request logs
+only hold a foreign key to it, their text column being left empty.
+
+Strings are interned during ingestion through an in-process cache
+(``Interner``): known strings cost no query, and the missing strings of a
+batch of request logs are fetched and inserted with a few queries.
+
+Reads follow the foreign keys: ``text`` returns the expression of a string
+whether the request log is normalized or not, and ``denormalize`` fills
+the text attributes of request logs loaded with their dimensions.
+"""
+
+import collections
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Coalesce
+from django.utils.translation import ugettext_lazy as _
+
+from ..apps import AppSettings
+from ..utils.db import bulk_update
+from ..utils.hyperloglog import hash64
+
+app_settings = AppSettings()
+
+#: Names of the normalized fields of request logs.
+DIMENSIONS = ('url', 'user_agent', 'referrer')
+
+# Maximum number of hashes in one query (SQLite limits the number of
+# parameters).
+QUERY_SIZE = 500
+
+
+class Dimension(models.Model):
+    """
+    An abstract model to store distinct strings of request logs once.
+
+    See ``meerkat.logs.dimensions``.
+    """
+
+    hash = models.BigIntegerField(
+        verbose_name=_('Hash'), unique=True)
+    value = models.TextField(
+        verbose_name=_('Value'))
+
+    class Meta:
+        """Meta class for Django."""
+
+        abstract = True
+
+    def __str__(self):
+        return self.value
+
+
+class URL(Dimension):
+    """A model to store the distinct URLs of request logs."""
+
+    class Meta:
+        """Meta class for Django."""
+
+        verbose_name = _('URL')
+        verbose_name_plural = _('URLs')
+
+
+class UserAgent(Dimension):
+    """A model to store the distinct user agents of request logs."""
+
+    class Meta:
+        """Meta class for Django."""
+
+        verbose_name = _('User agent')
+        verbose_name_plural = _('User agents')
+
+
+class Referrer(Dimension):
+    """A model to store the distinct referrers of request logs."""
+
+    class Meta:
+        """Meta class for Django."""
+
+        verbose_name = _('Referrer')
+        verbose_name_plural = _('Referrers')
+
+
+def text_hash(value):
+    """
+    Hash a string to a signed 64-bits integer.
+
+    Args:
+        value (str): the string.
+
+    Returns:
+        int: the 63-bits hash (fits in a big integer column).
+    """
+    return hash64(value) >> 1
+
+
+def ref_name(name):
+    """
+    Return the name of the foreign key of a normalized field.
+
+    Args:
+        name (str): the field name (see DIMENSIONS).
+
+    Returns:
+        str: the foreign key name.
+    """
+    return '%s_ref' % name
+
+
+def text(name):
+    """
+    Return the expression of a string, normalized or not.
+
+    Args:
+        name (str): the field name (see DIMENSIONS).
+
+    Returns:
+        Coalesce: the value of the dimension, or the text column.
+    """
+    return Coalesce(F('%s__value' % ref_name(name)), F(name),
+                    output_field=models.TextField())
+
+
+def texts(*names):
+    """
+    Return the annotations of strings, normalized or not.
+
+    Args:
+        *names (str): the field names (default: all DIMENSIONS).
+
+    Returns:
+        dict: the ``text`` expressions, by ``<name>_text`` alias.
+    """
+    return {'%s_text' % name: text(name) for name in names or DIMENSIONS}
+
+
+def get_text(log, name):
+    """
+    Return a string of a request log, normalized or not.
+
+    Args:
+        log (RequestLog): the request log.
+        name (str): the field name (see DIMENSIONS).
+
+    Returns:
+        str: the string.
+    """
+    value = getattr(log, name)
+    if not value and getattr(log, '%s_id' % ref_name(name)) is not None:
+        value = getattr(log, ref_name(name)).value
+    return value
+
+
+def count_texts(queryset, name):
+    """
+    Count request logs by string, normalized or not.
+
+    Request logs are grouped by text column and foreign key in the
+    database, then the values of the distinct foreign keys are fetched,
+    which is cheaper than joining the dimension on each row.
+
+    Args:
+        queryset (QuerySet): the request logs.
+        name (str): the field name (see DIMENSIONS).
+
+    Returns:
+        Counter: the numbers of request logs by string.
+    """
+    counter = collections.Counter()
+    refs = {}
+    for value, value_id, count in queryset.order_by().values_list(
+            name, ref_name(name)).annotate(count=Count('id')):
+        if value_id is None:
+            counter[value] += count
+        else:
+            refs[value_id] = refs.get(value_id, 0) + count
+    model = queryset.model._meta.get_field(ref_name(name)).related_model
+    value_ids = list(refs)
+    for start in range(0, len(value_ids), QUERY_SIZE):
+        for value_id, value in model.objects.filter(
+                id__in=value_ids[start:start + QUERY_SIZE]).values_list(
+                    'id', 'value'):
+            counter[value] += refs[value_id]
+    return counter
+
+
+def denormalize(log):
+    """
+    Fill the text attributes of a normalized request log, to read it.
+
+    The dimensions are fetched if they were not selected with the request
+    log (see ``select_related``). The request log must not be saved after.
+
+    Args:
+        log (RequestLog): the request log.
+    """
+    for name in DIMENSIONS:
+        setattr(log, name, get_text(log, name))
+
+
+class Interner(object):
+    """Map the strings of a dimension to the IDs of their rows."""
+
+    def __init__(self, model, capacity=None):
+        """
+        Init method.
+
+        Args:
+            model (Model): the dimension model.
+            capacity (int): the maximum number of cached strings
+                (default to MEERKAT_LOGS_NORMALIZE_CACHE_SIZE setting).
+        """
+        if capacity is None:
+            capacity = app_settings.logs_normalize_cache_size
+        self.model = model
+        self.capacity = capacity
+        self.cache = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.cache)
+
+    def get_ids(self, values):
+        """
+        Return the IDs of strings, inserting the missing ones.
+
+        Strings whose hash is already used by another string (collision)
+        have no ID: they are stored inline.
+
+        Args:
+            values (iterable): the strings.
+
+        Returns:
+            dict: the IDs (or None) by string.
+        """
+        ids = {}
+        missing = {}
+        cache = self.cache
+        for value in values:
+            value_id = cache.get(value, None)
+            if value_id is None:
+                missing[text_hash(value)] = value
+            else:
+                cache.move_to_end(value)
+                ids[value] = value_id
+        if not missing:
+            return ids
+        rows = self._fetch(missing)
+        new = [self.model(hash=hash_, value=value)
+               for hash_, value in missing.items() if hash_ not in rows]
+        if new:
+            try:
+                with transaction.atomic():
+                    self.model.objects.bulk_create(new)
+            except IntegrityError:
+                # Inserted concurrently by another process.
+                for instance in new:
+                    self.model.objects.get_or_create(
+                        hash=instance.hash,
+                        defaults={'value': instance.value})
+            rows.update(self._fetch({instance.hash: instance.value
+                                     for instance in new}))
+        resolved = {}
+        for hash_, value in missing.items():
+            value_id, stored = rows[hash_]
+            ids[value] = resolved[value] = (
+                value_id if stored == value else None)
+        # Rows inserted in a transaction which is rolled back must not be
+        # cached: only remember them once committed.
+        transaction.on_commit(lambda: self._remember(resolved))
+        return ids
+
+    def _fetch(self, hashes):
+        hashes = list(hashes)
+        rows = {}
+        for start in range(0, len(hashes), QUERY_SIZE):
+            for hash_, value_id, value in self.model.objects.filter(
+                    hash__in=hashes[start:start + QUERY_SIZE]).values_list(
+                        'hash', 'id', 'value'):
+                rows[hash_] = (value_id, value)
+        return rows
+
+    def _remember(self, ids):
+        cache = self.cache
+        for value, value_id in ids.items():
+            if value_id is not None:
+                cache[value] = value_id
+        while len(cache) > self.capacity:
+            cache.popitem(last=False)
+
+
+_interners = {}
+
+
+def get_interner(name):
+    """
+    Return the interner of a normalized field, shared by the process.
+
+    Args:
+        name (str): the field name (see DIMENSIONS).
+
+    Returns:
+        Interner: the interner.
+    """
+    interner = _interners.get(name, None)
+    if interner is None:
+        from .models import RequestLog
+        model = RequestLog._meta.get_field(ref_name(name)).related_model
+        interner = _interners[name] = Interner(model)
+    return interner
+
+
+def clear_interners():
+    """Forget the cached IDs, for example after deleting dimensions."""
+    _interners.clear()
+
+
+def normalize(logs, force=False):
+    """
+    Replace the strings of request logs by foreign keys to dimensions.
+
+    Request logs are modified in place, not saved.
+
+    Args:
+        logs (list): the request logs.
+        force (bool): normalize even if the MEERKAT_LOGS_NORMALIZE_STRINGS
+            setting is disabled.
+
+    Returns:
+        int: the number of normalized strings.
+    """
+    if not (force or app_settings.logs_normalize_strings):
+        return 0
+    count = 0
+    for name in DIMENSIONS:
+        ids = get_interner(name).get_ids(
+            {getattr(log, name) for log in logs} - {None, ''})
+        attname = '%s_id' % ref_name(name)
+        for log in logs:
+            value_id = ids.get(getattr(log, name), None)
+            if value_id is not None:
+                setattr(log, attname, value_id)
+                setattr(log, name, '')
+                count += 1
+    return count
+
+
+def normalize_logs(queryset, batch_size=10000, dry_run=False):
+    """
+    Normalize the strings of request logs already in the database.
+
+    Request logs are read by batches of increasing IDs.
+
+    Args:
+        queryset (QuerySet): the request logs.
+        batch_size (int): number of request logs read at once.
+        dry_run (bool): only count the request logs to read.
+
+    Returns:
+        dict: numbers of read and modified request logs, and of
+            normalized strings.
+    """
+    from .models import RequestLog
+    stats = {'logs': 0, 'modified': 0, 'strings': 0}
+    queryset = queryset.filter(
+        models.Q(url__gt='') | models.Q(user_agent__gt='') |
+        models.Q(referrer__gt='')).order_by('id')
+    if dry_run:
+        stats['logs'] = queryset.count()
+        return stats
+    last_id = 0
+    while True:
+        logs = list(queryset.filter(id__gt=last_id).only(
+            'id', *DIMENSIONS + tuple(map(ref_name, DIMENSIONS)))[
+                :batch_size])
+        if not logs:
+            break
+        last_id = logs[-1].id
+        with transaction.atomic():
+            stats['strings'] += normalize(logs, force=True)
+            changes = {}
+            for log in logs:
+                values = {}
+                for name in DIMENSIONS:
+                    value_id = getattr(log, '%s_id' % ref_name(name))
+                    if not getattr(log, name) and value_id is not None:
+                        values[name] = ''
+                        values[ref_name(name)] = value_id
+                if values:
+                    changes[log.id] = values
+            bulk_update(RequestLog, changes)
+        stats['logs'] += len(logs)
+        stats['modified'] += len(changes)
+    return stats
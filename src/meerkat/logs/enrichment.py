@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+"""
+IP address information.
+
+Request logs are enriched with information about their client IP address
+(organization, location...), obtained from an IP API (see
+``meerkat.utils.ip_info``). ``IPInfo`` stores each distinct information
+once, and ``IPInfoCheck`` records which information an IP address had when
+it was checked. ``get_ip_info`` checks the IP addresses of request logs by
+batches and links the request logs to their information.
+"""
+
+import datetime
+import logging
+import sys
+
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+from ..exceptions import RateExceededError
+from ..utils.ip_info import ip_api_handler
+from ..utils.progress import ProgressBar
+from ..utils.thread import map_in_threads
+from . import metrics
+from .networks import IPHalfField
+
+logger = logging.getLogger(__name__)
+
+
+class IPInfo(models.Model):
+    """A model to store IP address information."""
+
+    # Even if we have a paid account on some ip info service,
+    # an IP address had unique information at the time of the
+    # request. Therefore, this information must be stored in the DB
+    # if we want to compute statistical data about it. We cannot query
+    # web-services each time we want to do this (data changed over time).
+    ip_address = models.GenericIPAddressField(
+        verbose_name=_('IP address'))
+    org = models.CharField(
+        verbose_name=_('Organization'), max_length=255, blank=True)
+    asn = models.CharField(
+        verbose_name=_('Autonomous System'), max_length=255, blank=True)
+    isp = models.CharField(
+        verbose_name=_('Internet Service Provider'),
+        max_length=255, blank=True)
+    proxy = models.NullBooleanField(
+        verbose_name=_('Proxy'))
+    hostname = models.CharField(
+        verbose_name=_('Hostname'), max_length=255, blank=True)
+    continent = models.CharField(
+        verbose_name=_('Continent'), max_length=255, blank=True)
+    continent_code = models.CharField(
+        verbose_name=_('Continent code'), max_length=255, blank=True)
+    country = models.CharField(
+        verbose_name=_('Country'), max_length=255, blank=True)
+    country_code = models.CharField(
+        verbose_name=_('Country code'), max_length=255, blank=True)
+    region = models.CharField(
+        verbose_name=_('Region'), max_length=255, blank=True)
+    region_code = models.CharField(
+        verbose_name=_('Region code'), max_length=255, blank=True)
+    city = models.CharField(
+        verbose_name=_('City'), max_length=255, blank=True)
+    city_code = models.CharField(
+        verbose_name=_('City code'), max_length=255, blank=True)
+    # TODO: maybe store latitude and longitude as Float?
+    latitude = models.CharField(
+        verbose_name=_('Latitude'), max_length=255, blank=True)
+    longitude = models.CharField(
+        verbose_name=_('Longitude'), max_length=255, blank=True)
+
+    class Meta:
+        """Meta class for Django."""
+
+        unique_together = (
+            'ip_address',
+            'continent', 'continent_code',
+            'country', 'country_code',
+            'region', 'region_code',
+            'city', 'city_code',
+            'latitude', 'longitude',
+            'org', 'asn', 'isp', 'proxy', 'hostname')
+        verbose_name = _('IP address information')
+        verbose_name_plural = _('IP address information')
+
+    def __str__(self):
+        for attr in (self.org, self.hostname, self.asn, self.isp, self.city,
+                     self.city_code, self.region, self.region_code,
+                     self.country, self.country_code):
+            if attr:
+                return attr
+        if self.latitude and self.longitude:
+            return '%s,%s' % (self.latitude, self.longitude)
+        return repr(self)
+
+    @staticmethod
+    def get_or_create_from_ip(ip):
+        """
+        Get or create an entry using obtained information from an IP.
+
+        Args:
+            ip (str): IP address xxx.xxx.xxx.xxx.
+
+        Returns:
+            ip_info: an instance of IPInfo.
+        """
+        data = ip_api_handler.get(ip)
+        metrics.observe_ip_api()
+        if data and any(v for v in data.values()):
+            if data.get('ip_address', None) is None or not data['ip_address']:
+                data['ip_address'] = ip
+            return IPInfo.objects.get_or_create(**data)
+        return None, False
+
+    def ip_addresses(self):
+        return list(IPInfoCheck.objects.filter(
+            ip_info=self).values_list('ip_address', flat=True))
+
+
+class IPInfoCheck(models.Model):
+    """
+    A model to keep track of the ip_info objects given IP address.
+
+    IPInfo objects are generated from an IP address. They may already
+    exist, so we don't want duplicates. This model attaches an IP to an
+    ip_info object. It also adds the date of the check, because an IP will
+    not always be related to the same ip_info, which changes over time.
+    """
+
+    ip_address = models.GenericIPAddressField(
+        verbose_name=_('IP address'), unique=True)
+    # Integer value of the IP address, for network queries (see
+    # meerkat.logs.networks).
+    ip_high = IPHalfField(
+        verbose_name=_('IP address (high bits)'), source='ip_address',
+        half='high')
+    ip_low = IPHalfField(
+        verbose_name=_('IP address (low bits)'), source='ip_address',
+        half='low')
+    date = models.DateField(
+        verbose_name=_('Date'), default=datetime.date.today)
+    ip_info = models.ForeignKey(
+        IPInfo, verbose_name=_('IPInfo'), related_name='ip_check')
+
+    class Meta:
+        """Meta class for Django."""
+
+        index_together = ('ip_high', 'ip_low')
+        verbose_name = _('IPInfo check')
+        verbose_name_plural = _('IPInfo checks')
+
+    def __str__(self):
+        return '%s %s %s' % (self.ip_address, self.date, self.ip_info)
+
+    @staticmethod
+    def check_ip(ip):
+        ip_info, _ = IPInfo.get_or_create_from_ip(ip)
+        if ip_info:
+            IPInfoCheck.objects.create(ip_address=ip, ip_info=ip_info)
+            return ip_info
+        return None
+
+    @staticmethod
+    def check_ips(ips, data=None):
+        """
+        Check several IP addresses at once.
+
+        Args:
+            ips (list): the IP addresses.
+            data (dict): information by IP address, as returned by
+                ``ip_api_handler.batch`` (requested if None).
+
+        Returns:
+            int: the number of created checks.
+        """
+        if data is None:
+            data = ip_api_handler.batch(ips)
+            metrics.observe_ip_api()
+        checks = []
+        for ip in ips:
+            ip_data = (data or {}).get(ip, None)
+            if ip_data and any(v for v in ip_data.values()):
+                if not ip_data.get('ip_address', None):
+                    ip_data['ip_address'] = ip
+                ip_info, _ = IPInfo.objects.get_or_create(**ip_data)
+                checks.append(IPInfoCheck(ip_address=ip, ip_info=ip_info))
+        IPInfoCheck.objects.bulk_create(checks)
+        return len(checks)
+
+
+def get_ip_info(only_update=False, since=None, until=None,
+                batch_size=100, workers=1, dry_run=False):
+    """
+    Check the IP addresses of request logs and link logs to their info.
+
+    Unchecked IP addresses are sent to the IP API by batches, in several
+    threads if workers is greater than 1 (the API rate limit still
+    applies). Then request logs without IP info are updated with one
+    query per batch of IP addresses sharing the same info.
+
+    Args:
+        only_update (bool): do not check new IP addresses.
+        since (datetime): only handle request logs from this date.
+        until (datetime): only handle request logs before this date.
+        batch_size (int): number of IP addresses per API request or
+            per update query.
+        workers (int): number of threads sending API requests.
+        dry_run (bool): only count the IP addresses to check.
+
+    Returns:
+        dict: numbers of IP addresses to check, checked IP addresses and
+            updated request logs.
+    """
+    from .models import RequestLog
+    logs = RequestLog.objects.all()
+    if since is not None:
+        logs = logs.filter(datetime__gte=since)
+    if until is not None:
+        logs = logs.filter(datetime__lt=until)
+    stats = {'ips': 0, 'checked': 0, 'updated': 0}
+    if not only_update:
+        not_checked_ips = _not_checked_ips(logs)
+        stats['ips'] = len(not_checked_ips)
+        logger.info('Checking IP addresses information (%s)',
+                    len(not_checked_ips))
+        if not dry_run:
+            stats['checked'] = _check_ips(
+                not_checked_ips, batch_size, workers)
+    if not dry_run:
+        stats['updated'] = _link_ip_info(logs, batch_size)
+    return stats
+
+
+def _not_checked_ips(logs):
+    unique_ips = set(logs.order_by().values_list(
+        'client_ip_address', flat=True).distinct())
+    unique_ips.discard(None)
+    checked_ips = set(IPInfoCheck.objects.values_list(
+        'ip_address', flat=True))
+    return sorted(unique_ips - checked_ips)
+
+
+def _check_ips(ips, batch_size, workers):
+    size = min(batch_size, ip_api_handler.max_batch_size)
+    batches = [ips[i:i + size] for i in range(0, len(ips), size)]
+    progress_bar = ProgressBar(sys.stdout, len(batches))
+    checked = 0
+    try:
+        # Batches are submitted as they are consumed, and the pending
+        # ones are cancelled when the rate is exceeded.
+        for count, (batch, data) in enumerate(map_in_threads(
+                ip_api_handler.batch, batches, workers), 1):
+            metrics.observe_ip_api()
+            checked += IPInfoCheck.check_ips(batch, data)
+            progress_bar.update(count)
+    except RateExceededError:
+        logger.warning('IP API rate exceeded: %s IP addresses checked',
+                       checked)
+    return checked
+
+
+def _link_ip_info(logs, batch_size):
+    no_ip_info = logs.filter(ip_info=None)
+    no_ip_info_ips = set(no_ip_info.order_by().values_list(
+        'client_ip_address', flat=True).distinct())
+    ips_by_info = {}
+    for ip, ip_info_id in IPInfoCheck.objects.values_list(
+            'ip_address', 'ip_info_id').iterator():
+        if ip in no_ip_info_ips:
+            ips_by_info.setdefault(ip_info_id, []).append(ip)
+    logger.info("Updating request logs' IP info (%s related checks)",
+                sum(len(ips) for ips in ips_by_info.values()))
+    progress_bar = ProgressBar(sys.stdout, len(ips_by_info))
+    updated = 0
+    for count, (ip_info_id, ips) in enumerate(ips_by_info.items(), 1):
+        for i in range(0, len(ips), batch_size):
+            updated += no_ip_info.filter(
+                client_ip_address__in=ips[i:i + batch_size]
+            ).update(ip_info=ip_info_id)
+        progress_bar.update(count)
+    return updated
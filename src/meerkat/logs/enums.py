@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+"""
+Enumerated fields.
+
+Some columns of request logs repeat a handful of short strings on every
+row: verb, protocol, timezone, file type. ``EnumField`` stores them as
+small integer codes, and decodes them transparently: request logs still
+get and set strings, lookups and list filters still use strings, while
+the database compares and groups integers.
+
+Code 0 is the empty string. Codes 1 to N are the ``values`` given to the
+field (for example ``VERBS``): this list must only be appended to, since
+codes are stored in the rows. Any other value, for example a new file type,
+gets a code above N, recorded in the ``EnumValue`` table the first time it
+is saved. Codes are cached in each process. Since some values come from
+the clients (for example file types), an enumeration gets at most
+``MAX_VALUES`` codes above N: newer values are all stored with the
+``OTHER`` code, and read as ``OTHER_VALUE``.
+"""
+
+import threading
+
+from django import forms
+from django.apps import apps
+from django.db import IntegrityError, models, transaction
+from django.utils.translation import ugettext_lazy as _
+
+# Maximum length of a value (longer values are truncated).
+MAX_LENGTH = 255
+# Code of the values which are not known yet, in lookups.
+UNKNOWN = -1
+# Maximum number of codes above the seeds of an enumeration.
+MAX_VALUES = 1000
+# Code and value of the values without code of their own.
+OTHER = 32767
+OTHER_VALUE = '(other)'
+
+
+def get_codes(model, enum, values, offset, create=True):
+    """
+    Return the codes of values missing from an enumeration's seeds.
+
+    Args:
+        model (Model): the EnumValue model (historical in migrations).
+        enum (str): the name of the enumeration.
+        values (iterable): the values.
+        offset (int): the last seed code: new codes are greater.
+        create (bool): create the codes of unknown values.
+
+    Returns:
+        dict: the codes by value (values without code are missing). Values
+        which could not get a code of their own, because the enumeration
+        has MAX_VALUES codes or because of concurrent writes, have the
+        OTHER code.
+    """
+    values = {value[:MAX_LENGTH] for value in values}
+    rows = model.objects.filter(enum=enum)
+    codes = dict(rows.filter(value__in=values).values_list('value', 'code'))
+    for value in sorted(values - set(codes)) if create else ():
+        # Another process can take the same code: try the next one.
+        for attempt in range(10):
+            last = max(rows.aggregate(
+                last=models.Max('code'))['last'] or 0, offset)
+            if last >= offset + MAX_VALUES:
+                codes[value] = OTHER
+                break
+            try:
+                with transaction.atomic():
+                    codes[value] = model.objects.create(
+                        enum=enum, value=value, code=last + 1).code
+                break
+            except IntegrityError:
+                existing = rows.filter(value=value).first()
+                if existing is not None:
+                    codes[value] = existing.code
+                    break
+        else:
+            codes[value] = OTHER
+    return codes
+
+
+class Enumeration(object):
+    """The codes of an enumeration, cached in the process."""
+
+    def __init__(self, name, values):
+        """
+        Init method.
+
+        Args:
+            name (str): the name of the enumeration.
+            values (list): the seed values (codes 1 to N).
+        """
+        self.name = name
+        self.values = list(values)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget the codes which are not seeds."""
+        self.codes = {'': 0, OTHER_VALUE: OTHER}
+        self.codes.update(
+            (value, code) for code, value in enumerate(self.values, 1))
+        self.decoded = {code: value for value, code in self.codes.items()}
+
+    def _remember(self, codes):
+        with self.lock:
+            for value, code in codes.items():
+                # Values without a code of their own are not cached, so
+                # that the cache stays bounded.
+                if code == OTHER:
+                    continue
+                self.codes[value] = code
+                self.decoded[code] = value
+
+    def _fetch(self, values=None, create=False):
+        model = apps.get_model('meerkat', 'EnumValue')
+        if values is None:
+            codes = dict(model.objects.filter(enum=self.name).values_list(
+                'value', 'code'))
+        else:
+            codes = get_codes(model, self.name, values, len(self.values),
+                              create=create)
+        # Codes created in a transaction which is rolled back must not be
+        # cached: only remember them once committed.
+        transaction.on_commit(lambda: self._remember(codes))
+        return codes
+
+    def encode(self, value, create=True):
+        """
+        Return the code of a value.
+
+        Args:
+            value (str): the value.
+            create (bool): create the code if the value is unknown.
+
+        Returns:
+            int: the code (UNKNOWN if the value is unknown and not created).
+        """
+        code = self.codes.get(value, None)
+        if code is None:
+            code = self._fetch((value, ), create).get(
+                value[:MAX_LENGTH], UNKNOWN)
+        return code
+
+    def decode(self, code):
+        """
+        Return the value of a code.
+
+        Args:
+            code (int): the code.
+
+        Returns:
+            str: the value.
+        """
+        value = self.decoded.get(code, None)
+        if value is None:
+            values = {code: value for value, code in self._fetch().items()}
+            value = values.get(code, str(code))
+        return value
+
+
+_enumerations = {}
+
+
+def get_enumeration(name, values=()):
+    """
+    Return an enumeration, shared by the process.
+
+    Args:
+        name (str): the name of the enumeration.
+        values (list): the seed values.
+
+    Returns:
+        Enumeration: the enumeration.
+    """
+    enumeration = _enumerations.get(name, None)
+    if enumeration is None:
+        enumeration = _enumerations[name] = Enumeration(name, values)
+    return enumeration
+
+
+def clear_enumerations():
+    """Forget the cached codes, for example after deleting EnumValues."""
+    for enumeration in _enumerations.values():
+        enumeration.reset()
+
+
+class EnumField(models.Field):
+    """
+    A string field stored as a small integer code.
+
+    It is not an integer field for Django: forms and the admin display its
+    values as strings.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Init method.
+
+        Args:
+            enum (str): the name of the enumeration (as key of its codes).
+            values (list): the seed values, with codes 1 to N.
+            *args: positional arguments of Field.
+            **kwargs: keyword arguments of Field.
+        """
+        self.enum = kwargs.pop('enum')
+        self.values = list(kwargs.pop('values', ()))
+        kwargs.setdefault('default', '')
+        super(EnumField, self).__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(EnumField, self).deconstruct()
+        kwargs['enum'] = self.enum
+        if self.values:
+            kwargs['values'] = self.values
+        if kwargs.get('default') == '':
+            del kwargs['default']
+        return name, path, args, kwargs
+
+    def get_internal_type(self):
+        return 'SmallIntegerField'
+
+    @property
+    def enumeration(self):
+        return get_enumeration(self.enum, self.values)
+
+    def from_db_value(self, value, expression, connection, *args):
+        if value is None:
+            return value
+        return self.enumeration.decode(value)
+
+    def to_python(self, value):
+        if isinstance(value, int):
+            return self.enumeration.decode(value)
+        return '' if value is None else str(value)
+
+    def get_prep_value(self, value):
+        # Lookups: unknown values match nothing.
+        if value is None or isinstance(value, int):
+            return value
+        return self.enumeration.encode(str(value), create=False)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        # Saves (and update expressions): unknown values get a new code.
+        if not prepared and not (value is None or isinstance(value, int)):
+            value = self.enumeration.encode(str(value))
+        return value
+
+    def formfield(self, **kwargs):
+        defaults = {'form_class': forms.CharField, 'max_length': MAX_LENGTH}
+        defaults.update(kwargs)
+        return super(EnumField, self).formfield(**defaults)
+
+
+class EnumValue(models.Model):
+    """
+    A model to store the codes of enumerated values.
+
+    Only the values which are not seeds of their field are stored here (see
+    ``meerkat.logs.enums``).
+    """
+
+    enum = models.CharField(
+        verbose_name=_('Enumeration'), max_length=30)
+    code = models.SmallIntegerField(
+        verbose_name=_('Code'))
+    value = models.CharField(
+        verbose_name=_('Value'), max_length=MAX_LENGTH)
+
+    class Meta:
+        """Meta class for Django."""
+
+        unique_together = (('enum', 'code'), ('enum', 'value'))
+        verbose_name = _('Enumerated value')
+        verbose_name_plural = _('Enumerated values')
+
+    def __str__(self):
+        return '%s %s: %s' % (self.enum, self.code, self.value)
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+"""
+Synthetic logs generator.
+
+Generate realistic NginX access and error logs, for tests and benchmarks.
+The output only depends on the seed and the options: two generators built
+with the same arguments write the same lines.
+
+Visitors and pages follow Zipf distributions (a few IP addresses and pages
+get most of the requests). A share of the requests comes from a small set
+of attackers, scanning for well-known vulnerabilities.
+"""
+
+import bisect
+import datetime
+import itertools
+import random
+
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep',
+          'Oct', 'Nov', 'Dec')
+
+USER_AGENTS = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/69.0.3497.100 Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:62.0) Gecko/20100101 Firefox/62.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_13_6) AppleWebKit/605.1.15 '
+    '(KHTML, like Gecko) Version/12.0 Safari/605.1.15',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 12_0 like Mac OS X) '
+    'AppleWebKit/605.1.15 (KHTML, like Gecko) Version/12.0 Mobile/15E148 '
+    'Safari/604.1',
+    'Mozilla/5.0 (compatible; Googlebot/2.1; '
+    '+http://www.google.com/bot.html)',
+    'Mozilla/5.0 (compatible; bingbot/2.0; '
+    '+http://www.bing.com/bingbot.htm)',
+)
+
+ATTACK_USER_AGENTS = (
+    'curl/7.58.0', 'python-requests/2.19.1', 'Go-http-client/1.1',
+    'sqlmap/1.2.9#stable (http://sqlmap.org)', 'Nikto/2.1.6', 'masscan/1.0',
+)
+
+ATTACK_URLS = (
+    '/wp-login.php', '/wp-admin/admin-ajax.php', '/xmlrpc.php',
+    '/phpmyadmin/index.php', '/pma/scripts/setup.php', '/.env',
+    '/.git/config', '/admin/config.php', '/cgi-bin/php5',
+    '/index.php?id=1%27%20OR%201=1', '/search?q=%3Cscript%3Ealert(1)'
+    '%3C/script%3E', '/../../../../etc/passwd', '/shell.php?cmd=id',
+    '/manager/html', '/HNAP1/', '/boaform/admin/formLogin',
+)
+
+STATUS_CODES = ((200, 85), (304, 6), (301, 2), (302, 2), (404, 4),
+                (500, 1))
+
+ERROR_MESSAGES = (
+    'open() "/srv/www%s" failed (2: No such file or directory)',
+    'upstream timed out (110: Connection timed out) while reading '
+    'response header from upstream',
+    'access forbidden by rule',
+)
+
+
+def _cumulative(weights):
+    return list(itertools.accumulate(weights))
+
+
+def zipf_weights(size, exponent):
+    """
+    Return the cumulative weights of a Zipf distribution.
+
+    Args:
+        size (int): the number of ranks.
+        exponent (float): the exponent (1 is the classic Zipf law, higher
+            values concentrate the weight on the first ranks).
+
+    Returns:
+        list: the cumulative weights, rank 1 first.
+    """
+    return _cumulative(1.0 / rank ** exponent for rank in range(1, size + 1))
+
+
+class LogGenerator(object):
+    """Deterministic generator of NginX log lines."""
+
+    def __init__(self, seed=0, ips=1000, urls=500, zipf=1.1, attacks=0.02,
+                 start=None, interval=1.0, host='example.com'):
+        """
+        Init method.
+
+        Args:
+            seed (int): the random seed.
+            ips (int): the number of distinct visitor IP addresses.
+            urls (int): the number of distinct pages and assets.
+            zipf (float): the exponent of the IP and URL distributions.
+            attacks (float): the share of requests sent by attackers.
+            start (datetime): the date of the first line (default: the
+                first of January 2018, UTC).
+            interval (float): the mean number of seconds between two lines.
+            host (str): the host name, used in referrers and error logs.
+        """
+        self.random = random.Random(seed)
+        self.attacks = attacks
+        self.interval = interval
+        self.host = host
+        if start is None:
+            start = datetime.datetime(
+                2018, 1, 1, tzinfo=datetime.timezone.utc)
+        self.time = start
+        self.ips = [self._ip() for _ in range(ips)]
+        self.ip_weights = zipf_weights(ips, zipf)
+        self.attackers = [self._ip() for _ in range(max(ips // 100, 1))]
+        self.urls = [self._url(rank) for rank in range(urls)]
+        self.url_weights = zipf_weights(urls, zipf)
+        self.status_codes, weights = zip(*STATUS_CODES)
+        self.status_weights = _cumulative(weights)
+        self.error_count = 0
+
+    def _ip(self):
+        first = self.random.choice(
+            [n for n in range(1, 224) if n not in (10, 127, 172, 192)])
+        return '.'.join(str(n) for n in [first] + [
+            self.random.randrange(256) for _ in range(3)])
+
+    def _url(self, rank):
+        kind = self.random.random()
+        if rank == 0:
+            return '/'
+        elif kind < 0.4:
+            return '/blog/%s-%s/' % (
+                self.random.choice(('news', 'post', 'article', 'release')),
+                rank)
+        elif kind < 0.5:
+            return '/search/?q=%s&page=%s' % (
+                self.random.choice(('django', 'nginx', 'logs', 'python')),
+                self.random.randrange(1, 10))
+        directory, name, extension = self.random.choice((
+            ('css', 'style', 'css'), ('js', 'app', 'js'),
+            ('img', 'photo', 'png'), ('img', 'icon', 'svg'),
+            ('fonts', 'font', 'woff2')))
+        return '/static/%s/%s-%s.%s' % (directory, name, rank, extension)
+
+    def _choose(self, population, cum_weights):
+        return population[bisect.bisect(
+            cum_weights, self.random.random() * cum_weights[-1])]
+
+    def _tick(self):
+        self.time += datetime.timedelta(
+            seconds=self.random.expovariate(1 / self.interval))
+        return self.time
+
+    def request(self):
+        """
+        Return the information of a new request.
+
+        Returns:
+            dict: IP address, verb, URL, status code, bytes sent, user agent
+                and referrer of the request, and whether it is an attack.
+        """
+        if self.random.random() < self.attacks:
+            return {
+                'ip': self.random.choice(self.attackers),
+                'verb': self.random.choice(('GET', 'GET', 'POST')),
+                'url': self.random.choice(ATTACK_URLS),
+                'status_code': self.random.choice((403, 404, 404, 400)),
+                'bytes_sent': self.random.randrange(150, 600),
+                'user_agent': self.random.choice(ATTACK_USER_AGENTS),
+                'referrer': '-',
+                'attack': True}
+        url = self._choose(self.urls, self.url_weights)
+        status_code = self._choose(self.status_codes, self.status_weights)
+        bytes_sent = 0 if status_code == 304 else int(
+            self.random.lognormvariate(8, 1.2))
+        referrer = '-'
+        if self.random.random() < 0.6:
+            referrer = 'https://%s%s' % (
+                self.host, self._choose(self.urls, self.url_weights))
+        return {
+            'ip': self._choose(self.ips, self.ip_weights),
+            'verb': 'POST' if self.random.random() < 0.03 else 'GET',
+            'url': url,
+            'status_code': status_code,
+            'bytes_sent': bytes_sent,
+            'user_agent': self.random.choice(USER_AGENTS),
+            'referrer': referrer,
+            'attack': False}
+
+    def access_line(self):
+        """
+        Return a new access log line (combined format, with request times).
+
+        Returns:
+            str: the line, without trailing newline.
+        """
+        request = self.request()
+        when = self._tick()
+        request_time = self.random.expovariate(20)
+        upstream_time = '-'
+        if not request['url'].startswith('/static/'):
+            upstream_time = '%.3f' % (request_time * 0.9)
+        return ('%s - - [%02d/%s/%d:%02d:%02d:%02d +0000] "%s %s HTTP/1.1" '
+                '%s %s "%s" "%s" %.3f %s') % (
+            request['ip'], when.day, MONTHS[when.month - 1], when.year,
+            when.hour, when.minute, when.second, request['verb'],
+            request['url'], request['status_code'], request['bytes_sent'],
+            request['referrer'], request['user_agent'], request_time,
+            upstream_time)
+
+    def error_line(self):
+        """
+        Return a new error log line.
+
+        Returns:
+            str: the line, without trailing newline.
+        """
+        request = self.request()
+        when = self._tick()
+        self.error_count += 1
+        message = self.random.choice(ERROR_MESSAGES)
+        if '%s' in message:
+            message = message % request['url'].split('?')[0]
+        return ('%d/%02d/%02d %02d:%02d:%02d [error] %s#0: *%s %s, '
+                'client: %s, server: %s, request: %s %s HTTP/1.1, '
+                'host: %s') % (
+            when.year, when.month, when.day, when.hour, when.minute,
+            when.second, 1000 + self.error_count % 4, self.error_count,
+            message, request['ip'], self.host, request['verb'],
+            request['url'], self.host)
+
+    def lines(self, count, kind='access'):
+        """
+        Yield new log lines.
+
+        Args:
+            count (int): the number of lines.
+            kind (str): ``access`` or ``error``.
+
+        Yields:
+            str: the lines, without trailing newline.
+        """
+        line = self.error_line if kind == 'error' else self.access_line
+        for _ in range(count):
+            yield line()
+
+    def write(self, path, count, kind='access'):
+        """
+        Write new log lines in a file.
+
+        Args:
+            path (str): the file path (overwritten).
+            count (int): the number of lines.
+            kind (str): ``access`` or ``error``.
+
+        Returns:
+            int: the number of written lines.
+        """
+        with open(path, 'w') as output:
+            for line in self.lines(count, kind):
+                output.write(line + '\n')
+        return count
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+"""
+Live tail of ingested request logs.
+
+Ingested request logs are published in an in-process ring buffer, read by
+the Server-Sent Events stream of the live view. When the ingestion does
+not run in the current process (standalone ingester, other web workers),
+one thread per process polls the new request logs and publishes them, only
+while at least one browser is connected.
+"""
+
+import json
+import threading
+import time
+
+from ..apps import AppSettings
+from ..utils.ring_buffer import RingBuffer
+from ..utils.thread import StoppableThread
+
+app_settings = AppSettings()
+
+BATCH_DELAY = 0.25
+KEEPALIVE_DELAY = 15
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """
+    Return the ring buffer of the process, creating it on first call.
+
+    Returns:
+        RingBuffer: the buffer of request logs.
+    """
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = RingBuffer(app_settings.logs_live_buffer_size)
+        return _buffer
+
+
+def _int(value):
+    # Parsed request logs are published before being saved: numeric fields
+    # can still be strings.
+    return int(value) if value not in (None, '') else None
+
+
+def serialize(log):
+    """
+    Serialize a request log for the live view.
+
+    Args:
+        log (RequestLog): the request log.
+
+    Returns:
+        dict: the displayed fields.
+    """
+    return {
+        'datetime': log.datetime.isoformat() if log.datetime else None,
+        'client_ip_address': log.client_ip_address,
+        'host': log.host,
+        'verb': log.verb,
+        'url': log.get_text('url'),
+        'status_code': _int(log.status_code),
+        'bytes_sent': _int(log.bytes_sent),
+        'user_agent': log.get_text('user_agent')}
+
+
+class DatabasePoller(StoppableThread):
+    """
+    Thread publishing new request logs read from the database.
+
+    It stops by itself when nobody subscribed for a while.
+    """
+
+    idle_timeout = 60
+
+    def __init__(self, buffer, *args, **kwargs):
+        """
+        Init method.
+
+        Args:
+            buffer (RingBuffer): the buffer to publish in.
+        """
+        super(DatabasePoller, self).__init__(*args, **kwargs)
+        self.buffer = buffer
+        self.lock = threading.Lock()
+        self.subscribers = 0
+        self.last_subscriber = time.time()
+        self.finished = False
+        self.last_id = None
+
+    def add_subscriber(self):
+        """
+        Register a subscriber.
+
+        Returns:
+            bool: False if the thread is finishing and cannot be used.
+        """
+        with self.lock:
+            if self.finished:
+                return False
+            self.subscribers += 1
+            return True
+
+    def remove_subscriber(self):
+        """Unregister a subscriber."""
+        with self.lock:
+            self.subscribers -= 1
+            self.last_subscriber = time.time()
+
+    def _idle(self):
+        from .models import RequestLog
+        with self.lock:
+            if RequestLog.daemon is not None and RequestLog.daemon.is_alive():
+                # This process became the leader: logs are published by the
+                # collector.
+                self.finished = True
+            elif (not self.subscribers and
+                    time.time() - self.last_subscriber > self.idle_timeout):
+                self.finished = True
+            return self.finished
+
+    def run(self):
+        from .models import RequestLog
+        if self.last_id is None:
+            self.last_id = RequestLog.objects.order_by(
+                '-id').values_list('id', flat=True).first() or 0
+        while not self.stopped() and not self._idle():
+            logs = list(RequestLog.objects.filter(
+                id__gt=self.last_id).select_related(
+                    'url_ref', 'user_agent_ref').order_by('id')[:1000])
+            if logs:
+                self.last_id = logs[-1].id
+                self.buffer.extend(logs)
+            time.sleep(BATCH_DELAY)
+
+
+_poller = None
+_poller_lock = threading.Lock()
+
+
+def subscribe():
+    """
+    Register a reader of the buffer, starting the poller if needed.
+
+    The poller is not started if the ingestion daemon runs in this process,
+    since the ingested request logs are then published by the collector.
+
+    Returns:
+        DatabasePoller: the poller (None if not needed).
+    """
+    global _poller
+    from .models import RequestLog
+    if RequestLog.daemon is not None and RequestLog.daemon.is_alive():
+        return None
+    with _poller_lock:
+        if _poller is None or not _poller.add_subscriber():
+            _poller = DatabasePoller(get_buffer(), daemon=True)
+            _poller.add_subscriber()
+            _poller.start()
+        return _poller
+
+
+def matches(log, status=None, host=None, ip=None):
+    """
+    Check if a request log matches filters.
+
+    Args:
+        log (RequestLog): the request log.
+        status (list): status classes to keep (for example [4, 5]).
+        host (str): host to keep.
+        ip (str): client IP address to keep.
+
+    Returns:
+        bool: whether the request log matches.
+    """
+    if status and (_int(log.status_code) or 0) // 100 not in status:
+        return False
+    if host and log.host != host:
+        return False
+    if ip and log.client_ip_address != ip:
+        return False
+    return True
+
+
+def event_id(buffer, seq):
+    """
+    Return the id of an event, sent back by reconnecting browsers.
+
+    Args:
+        buffer (RingBuffer): the buffer of request logs.
+        seq (int): the last sequence number of the event.
+
+    Returns:
+        str: the event id.
+    """
+    return '%s-%d' % (buffer.token, seq)
+
+
+def resume_seq(buffer, last_event_id):
+    """
+    Return the sequence number to resume a stream from.
+
+    The sequence numbers of a buffer are only valid in its process: an
+    event id of another buffer (another web worker, or before a restart)
+    resumes with the new request logs only, instead of the wrong ones.
+
+    Args:
+        buffer (RingBuffer): the buffer of request logs.
+        last_event_id (str): the Last-Event-ID header (see ``event_id``).
+
+    Returns:
+        int: the sequence number (0 to start with the whole buffer).
+    """
+    if not last_event_id:
+        return 0
+    token, _, seq = last_event_id.partition('-')
+    try:
+        seq = int(seq)
+    except ValueError:
+        seq = -1
+    return buffer.resume(seq, token)
+
+
+def event_stream(last_event_id=None, **filters):
+    """
+    Generate Server-Sent Events for new request logs.
+
+    New request logs are sent by batches: after being woken up, the stream
+    waits BATCH_DELAY seconds before sending everything that arrived.
+    A comment is sent every KEEPALIVE_DELAY seconds without data.
+
+    Args:
+        last_event_id (str): the last event id received by the client
+            (None to start with the whole buffer).
+        **filters: status, host and ip filters (see ``matches``).
+
+    Yields:
+        str: the events.
+    """
+    buffer = get_buffer()
+    last_seq = resume_seq(buffer, last_event_id)
+    poller = subscribe()
+    try:
+        yield 'retry: 2000\n\n'
+        while True:
+            if not buffer.wait(last_seq, KEEPALIVE_DELAY):
+                yield ': keepalive\n\n'
+                continue
+            time.sleep(BATCH_DELAY)
+            last_seq, items = buffer.since(last_seq)
+            items = [serialize(log) for log in items
+                     if matches(log, **filters)]
+            if items:
+                yield 'id: %s\ndata: %s\n\n' % (
+                    event_id(buffer, last_seq), json.dumps(items))
+    finally:
+        if poller is not None:
+            poller.remove_subscriber()
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+"""
+Ingestion metrics.
+
+The ingestion pipeline (``RequestLog.parse_file``, ``RequestLog.autocomplete``
+and the daemon thread) counts the lines it reads, parses and inserts, and
+times each stage of the processing of a line. Metrics are kept in the
+processes running the ingestion, which publish a snapshot in the Django
+cache from time to time, each one under its own key (listed in an index
+key): the metrics view of any process merges them with its own metrics (a
+cache shared between processes is needed for this, for example Memcached,
+Redis or the database cache).
+"""
+
+import os
+import socket
+import time
+
+from django.core.cache import cache
+
+from ..utils.ip_info import ip_api_handler
+from ..utils.metrics import Registry
+
+CACHE_KEY = 'meerkat:metrics:%s'
+INDEX_KEY = 'meerkat:metrics:pids'
+CACHE_TIMEOUT = 3600
+PUBLISH_DELAY = 10
+
+STAGES = ('read', 'regex', 'format_data', 'complete', 'ip_lookup',
+          'collect', 'db_flush')
+
+registry = Registry()
+
+lines_read = registry.counter(
+    'meerkat_ingest_lines_read_total', 'Number of log lines read.')
+lines_parsed = registry.counter(
+    'meerkat_ingest_lines_parsed_total', 'Number of log lines parsed.')
+lines_failed = registry.counter(
+    'meerkat_ingest_lines_failed_total',
+    'Number of log lines which could not be parsed.')
+logs_inserted = registry.counter(
+    'meerkat_ingest_logs_inserted_total',
+    'Number of request logs inserted in database.')
+logs_completed = registry.counter(
+    'meerkat_ingest_logs_completed_total',
+    'Number of request logs completed by autocomplete.')
+bytes_read = registry.counter(
+    'meerkat_ingest_bytes_read_total', 'Number of bytes read.')
+stage_seconds = registry.histogram(
+    'meerkat_ingest_stage_seconds',
+    'Time spent in each stage of the ingestion of a line (or of a batch '
+    'for db_flush).', labelnames=('stage', ))
+daemon_offset = registry.gauge(
+    'meerkat_ingest_daemon_offset_bytes',
+    'Offset of the last line committed by the daemon in the log file.',
+    labelnames=('file', ))
+daemon_lag = registry.gauge(
+    'meerkat_ingest_daemon_lag_bytes',
+    'Size of the log file minus the offset of the last committed line.',
+    labelnames=('file', ))
+last_line_time = registry.gauge(
+    'meerkat_ingest_last_line_timestamp_seconds',
+    'Timestamp of the last ingested line.')
+incidents_opened = registry.counter(
+    'meerkat_ingest_incidents_total',
+    'Number of incidents (IP addresses exceeding a request rate threshold).',
+    labelnames=('kind', ))
+ip_api_requests = registry.counter(
+    'meerkat_ip_api_requests_total', 'Number of IP API requests.')
+ip_api_allowance = registry.gauge(
+    'meerkat_ip_api_allowance',
+    'Number of IP API hits left in the current rate interval.')
+
+_last_publish = 0
+
+
+class Stopwatch(object):
+    """Time consecutive stages of a loop."""
+
+    def __init__(self, profiler=None):
+        """
+        Init method.
+
+        Args:
+            profiler (Profiler): also add the timings to this profiler.
+        """
+        self.profiler = profiler
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        """
+        Observe the time elapsed since the previous lap.
+
+        Args:
+            stage (str): the stage which just ended (see STAGES).
+        """
+        now = time.perf_counter()
+        stage_seconds.observe(now - self.last, stage=stage)
+        if self.profiler is not None:
+            self.profiler.add(stage, now - self.last)
+        self.last = now
+
+    def reset(self):
+        """Restart without observing anything."""
+        self.last = time.perf_counter()
+
+
+def observe_line(line):
+    """
+    Count a line read.
+
+    Args:
+        line (str): the line.
+
+    Returns:
+        int: the size of the line in bytes.
+    """
+    size = len(line.encode('utf-8', 'surrogateescape'))
+    lines_read.inc()
+    bytes_read.inc(size)
+    return size
+
+
+def observe_offset(file_name, offset):
+    """
+    Update the offset of the daemon in a log file.
+
+    Args:
+        file_name (str): the path of the log file.
+        offset (int): the offset of the last committed line.
+    """
+    daemon_offset.set(offset, file=file_name)
+    last_line_time.set(time.time())
+
+
+def _lag(values, offsets):
+    for (file_name, ), offset in offsets.items():
+        try:
+            size = os.path.getsize(file_name)
+        except OSError:
+            continue
+        values[(file_name, )] = max(size - offset, 0)
+    return values
+
+
+def observe_ip_api(number=1):
+    """
+    Count IP API requests and update the quota gauge.
+
+    Args:
+        number (int): the number of requests.
+    """
+    ip_api_requests.inc(number)
+    ip_api_allowance.set(ip_api_handler.allowance)
+
+
+def process_id():
+    """
+    Return the ID of this process, unique among the hosts sharing the cache.
+
+    Returns:
+        str: the host name and the process ID.
+    """
+    return '%s:%s' % (socket.gethostname(), os.getpid())
+
+
+def publish(force=False):
+    """
+    Publish a snapshot of the metrics of this process in the cache.
+
+    Args:
+        force (bool): publish even if the last publication is recent.
+    """
+    global _last_publish
+    now = time.time()
+    if force or now - _last_publish >= PUBLISH_DELAY:
+        _last_publish = now
+        pid = process_id()
+        cache.set(CACHE_KEY % pid, registry.snapshot(), CACHE_TIMEOUT)
+        # The index is not updated atomically: the process registers again
+        # on each publication if another one overwrote it.
+        pids = cache.get(INDEX_KEY, [])
+        if pid not in pids:
+            cache.set(INDEX_KEY, pids + [pid], CACHE_TIMEOUT)
+
+
+def published_snapshots():
+    """
+    Return the snapshots published by the other processes.
+
+    Processes whose snapshot expired are removed from the index.
+
+    Returns:
+        list: the snapshots.
+    """
+    pids = [pid for pid in cache.get(INDEX_KEY, []) if pid != process_id()]
+    if not pids:
+        return []
+    published = cache.get_many([CACHE_KEY % pid for pid in pids])
+    alive = [pid for pid in pids if CACHE_KEY % pid in published]
+    if len(alive) < len(pids):
+        expired = set(pids) - set(alive)
+        cache.set(INDEX_KEY, [pid for pid in cache.get(INDEX_KEY, [])
+                              if pid not in expired], CACHE_TIMEOUT)
+    return [published[CACHE_KEY % pid] for pid in alive]
+
+
+def render():
+    """
+    Render the metrics in Prometheus text format.
+
+    Metrics of this process are merged with the snapshots published by the
+    other ingesting processes. The daemon lag is computed from the current
+    size of the log files.
+
+    Returns:
+        str: the rendered metrics.
+    """
+    # The lag is computed now, so that it grows even if the daemon is stuck.
+    for (file_name, ), lag in _lag({}, daemon_offset.snapshot()).items():
+        daemon_lag.set(lag, file=file_name)
+    snapshots = published_snapshots()
+    for snapshot in snapshots:
+        lag = snapshot.setdefault(daemon_lag.name, {})
+        _lag(lag, snapshot.get(daemon_offset.name, {}))
+    return registry.render(*snapshots)
@@ -9,200 +9,85 @@ files every time.
 
 Of course, these tables have to be updated in the background and in real-time,
 which is the difficulty here. Work is in progress.
+
+The request logs are defined here. The other models are defined with the
+code using them, and imported here: IP address information in
+``enrichment``, strings of request logs in ``dimensions`` and ``enums``,
+and aggregates in ``aggregates``.
 """
 
 import datetime
-import re
+import logging
+import os
 import sys
+import time
 
-from django.core.exceptions import ValidationError
-from django.core.validators import URLValidator
 from django.db import models, transaction
 from django.utils.translation import ugettext_lazy as _
 
-from ..exceptions import RateExceededError
+from ..apps import AppSettings
+from ..utils.db import bulk_update
 from ..utils.file import count_lines, follow
-from ..utils.ip_info import ip_api_handler
+from ..utils.leader import LeaderElector, get_lock
+from ..utils.progress import ProgressBar
 from ..utils.thread import StoppableThread
+from . import completion, dimensions, enrichment, metrics
+from .aggregates import (
+    DailyRequestCount, HeavyHitter, Incident, IngestionState, LatencyDigest,
+    UniqueVisitorsSketch, Visit)
+from .collectors import flush_collectors, get_collectors
+from .dimensions import URL, Referrer, UserAgent
+from .enrichment import IPInfo, IPInfoCheck
+from .enums import EnumField, EnumValue
+from .networks import IPHalfField
 from .parsers import get_nginx_parser
+from .profiling import Profiler
+from .signatures import get_families
 
-try:
-    from django.core.serializers.base import ProgressBar
-except ImportError:
-    class ProgressBar(object):
-        progress_width = 75
+__all__ = ['DailyRequestCount', 'EnumValue', 'HeavyHitter', 'Incident',
+           'IngestionState', 'IPInfo', 'IPInfoCheck', 'LatencyDigest',
+           'Referrer', 'RequestLog', 'UniqueVisitorsSketch', 'URL',
+           'UserAgent', 'Visit']
 
-        def __init__(self, output, total_count):
-            self.output = output
-            self.total_count = total_count
-            self.prev_done = 0
-
-        def update(self, count):
-            if not self.output:
-                return
-            perc = count * 100 // self.total_count
-            done = perc * self.progress_width // 100
-            if self.prev_done >= done:
-                return
-            self.prev_done = done
-            cr = '' if self.total_count == 1 else '\r'
-            self.output.write(cr + '[' + '.' * done + ' ' * (self.progress_width - done) + ']')  # noqa
-            if done == self.progress_width:
-                self.output.write('\n')
-            self.output.flush()
+app_settings = AppSettings()
+logger = logging.getLogger(__name__)
 
+URL_INDEX = completion.FIELDS.index('url')
+# Completion fields, with the URL following its dimension.
+URL_TEXT_FIELDS = tuple(
+    'url_text' if field == 'url' else field for field in completion.FIELDS)
 
 # Define what information retrievable from the logs are pertinent
 # so we can have universal log models (nginx, apache, uwsgi, ...).
 # Remember our goal is security audit, not performance audit.
 
 
-class IPInfo(models.Model):
-    """A model to store IP address information."""
-
-    # Even if we have a paid account on some ip info service,
-    # an IP address had unique information at the time of the
-    # request. Therefore, this information must be stored in the DB
-    # if we want to compute statistical data about it. We cannot query
-    # web-services each time we want to do this (data changed over time).
-    ip_address = models.GenericIPAddressField(
-        verbose_name=_('IP address'))
-    org = models.CharField(
-        verbose_name=_('Organization'), max_length=255, blank=True)
-    asn = models.CharField(
-        verbose_name=_('Autonomous System'), max_length=255, blank=True)
-    isp = models.CharField(
-        verbose_name=_('Internet Service Provider'),
-        max_length=255, blank=True)
-    proxy = models.NullBooleanField(
-        verbose_name=_('Proxy'))
-    hostname = models.CharField(
-        verbose_name=_('Hostname'), max_length=255, blank=True)
-    continent = models.CharField(
-        verbose_name=_('Continent'), max_length=255, blank=True)
-    continent_code = models.CharField(
-        verbose_name=_('Continent code'), max_length=255, blank=True)
-    country = models.CharField(
-        verbose_name=_('Country'), max_length=255, blank=True)
-    country_code = models.CharField(
-        verbose_name=_('Country code'), max_length=255, blank=True)
-    region = models.CharField(
-        verbose_name=_('Region'), max_length=255, blank=True)
-    region_code = models.CharField(
-        verbose_name=_('Region code'), max_length=255, blank=True)
-    city = models.CharField(
-        verbose_name=_('City'), max_length=255, blank=True)
-    city_code = models.CharField(
-        verbose_name=_('City code'), max_length=255, blank=True)
-    # TODO: maybe store latitude and longitude as Float?
-    latitude = models.CharField(
-        verbose_name=_('Latitude'), max_length=255, blank=True)
-    longitude = models.CharField(
-        verbose_name=_('Longitude'), max_length=255, blank=True)
-
-    class Meta:
-        """Meta class for Django."""
-
-        unique_together = (
-            'ip_address',
-            'continent', 'continent_code',
-            'country', 'country_code',
-            'region', 'region_code',
-            'city', 'city_code',
-            'latitude', 'longitude',
-            'org', 'asn', 'isp', 'proxy', 'hostname')
-        verbose_name = _('IP address information')
-        verbose_name_plural = _('IP address information')
-
-    def __str__(self):
-        for attr in (self.org, self.hostname, self.asn, self.isp, self.city,
-                     self.city_code, self.region, self.region_code,
-                     self.country, self.country_code):
-            if attr:
-                return attr
-        if self.latitude and self.longitude:
-            return '%s,%s' % (self.latitude, self.longitude)
-        return repr(self)
-
-    @staticmethod
-    def get_or_create_from_ip(ip):
-        """
-        Get or create an entry using obtained information from an IP.
-
-        Args:
-            ip (str): IP address xxx.xxx.xxx.xxx.
-
-        Returns:
-            ip_info: an instance of IPInfo.
-        """
-        data = ip_api_handler.get(ip)
-        if data and any(v for v in data.values()):
-            if data.get('ip_address', None) is None or not data['ip_address']:
-                data['ip_address'] = ip
-            return IPInfo.objects.get_or_create(**data)
-        return None, False
-
-    def ip_addresses(self):
-        return list(IPInfoCheck.objects.filter(
-            ip_info=self).values_list('ip_address', flat=True))
-
-
-class IPInfoCheck(models.Model):
-    """
-    A model to keep track of the ip_info objects given IP address.
-
-    IPInfo objects are generated from an IP address. They may already
-    exist, so we don't want duplicates. This model attaches an IP to an
-    ip_info object. It also adds the date of the check, because an IP will
-    not always be related to the same ip_info, which changes over time.
-    """
-
-    ip_address = models.GenericIPAddressField(
-        verbose_name=_('IP address'), unique=True)
-    date = models.DateField(
-        verbose_name=_('Date'), default=datetime.date.today)
-    ip_info = models.ForeignKey(
-        IPInfo, verbose_name=_('IPInfo'), related_name='ip_check')
-
-    class Meta:
-        """Meta class for Django."""
-
-        verbose_name = _('IPInfo check')
-        verbose_name_plural = _('IPInfo checks')
-
-    def __str__(self):
-        return '%s %s %s' % (self.ip_address, self.date, self.ip_info)
-
-    @staticmethod
-    def check_ip(ip):
-        ip_info, _ = IPInfo.get_or_create_from_ip(ip)
-        if ip_info:
-            IPInfoCheck.objects.create(ip_address=ip, ip_info=ip_info)
-            return ip_info
-        return None
-
-
 class RequestLog(models.Model):
     """A model to store the request logs."""
 
-    VERBS = ['CONNECT', 'GET', 'HEAD', 'OPTIONS', 'POST',
-             'PUT' 'TRACE', 'DELETE', 'PATCH']
-    PROTOCOLS = ['HTTP/1.0', 'HTTP/1.1', 'HTTP/2.0', 'RTSP/1.0', 'SIP/2.0']
+    VERBS = completion.VERBS
+    PROTOCOLS = completion.PROTOCOLS
+    REQUEST_REGEX = completion.REQUEST_REGEX
 
-    REQUEST_REGEX = re.compile(
-        r'(?P<verb>%s) (?P<url>[^\s]+?) (?P<protocol>%s)' % (
-            '|'.join(VERBS), '|'.join(PROTOCOLS)))
-
-    url_validator = URLValidator()
+    url_validator = completion.url_validator
     daemon = None
+    elector = None
 
     # General info
     client_ip_address = models.GenericIPAddressField(
         verbose_name=_('Client IP address'), blank=True, null=True)
+    # Integer value of the IP address, for network queries (see
+    # meerkat.logs.networks).
+    client_ip_high = IPHalfField(
+        verbose_name=_('Client IP address (high bits)'),
+        source='client_ip_address', half='high')
+    client_ip_low = IPHalfField(
+        verbose_name=_('Client IP address (low bits)'),
+        source='client_ip_address', half='low')
     datetime = models.DateTimeField(
         verbose_name=_('Datetime'), blank=True)
-    timezone = models.CharField(
-        verbose_name=_('Timezone'), max_length=10, blank=True)
+    timezone = EnumField(
+        verbose_name=_('Timezone'), enum='timezone', blank=True)
     url = models.URLField(
         verbose_name=_('URL'), max_length=2047, blank=True)
     status_code = models.SmallIntegerField(
@@ -217,14 +102,16 @@ class RequestLog(models.Model):
         verbose_name=_('Host'), blank=True)
     server = models.TextField(
         verbose_name=_('Server'), blank=True)
-    verb = models.CharField(
-        verbose_name=_('Verb'), max_length=30, blank=True)
-    protocol = models.CharField(
-        verbose_name=_('Protocol'), max_length=30, blank=True)
+    verb = EnumField(
+        verbose_name=_('Verb'), enum='verb', values=completion.VERBS,
+        blank=True)
+    protocol = EnumField(
+        verbose_name=_('Protocol'), enum='protocol',
+        values=completion.PROTOCOLS, blank=True)
     port = models.PositiveIntegerField(
         verbose_name=_('Port'), blank=True, null=True)
-    file_type = models.CharField(
-        verbose_name=_('File type'), max_length=30, blank=True)
+    file_type = EnumField(
+        verbose_name=_('File type'), enum='file_type', blank=True)
     https = models.NullBooleanField(
         verbose_name=_('HTTPS'))
     bytes_sent = models.IntegerField(
@@ -246,12 +133,31 @@ class RequestLog(models.Model):
     ip_info = models.ForeignKey(
         IPInfo, verbose_name=_('IP Info'), null=True)
 
+    # Normalized strings, the text columns are then empty
+    # (see meerkat.logs.dimensions)
+    url_ref = models.ForeignKey(
+        URL, verbose_name=_('URL (normalized)'), null=True, blank=True,
+        related_name='+', on_delete=models.PROTECT)
+    user_agent_ref = models.ForeignKey(
+        UserAgent, verbose_name=_('User agent (normalized)'), null=True,
+        blank=True, related_name='+', on_delete=models.PROTECT)
+    referrer_ref = models.ForeignKey(
+        Referrer, verbose_name=_('Referrer (normalized)'), null=True,
+        blank=True, related_name='+', on_delete=models.PROTECT)
+
     # Other
     suspicious = models.NullBooleanField(
         verbose_name=_('Suspicious'))
+    signatures = models.PositiveIntegerField(
+        verbose_name=_('Attack signatures'), default=0, db_index=True)
+
+    # Timings (milliseconds)
+    request_time = models.PositiveIntegerField(
+        verbose_name=_('Request time (ms)'), blank=True, null=True)
+    upstream_response_time = models.PositiveIntegerField(
+        verbose_name=_('Upstream response time (ms)'), blank=True, null=True)
 
     # Not really useful for now
-    # response_time = models.TimeField()
     # response_header = models.TextField()
     # response_body = models.TextField()
     #
@@ -285,47 +191,141 @@ class RequestLog(models.Model):
     # upstream_header_time = models.CharField(max_length=255)
     # upstream_http = models.CharField(max_length=255)
     # upstream_response_length = models.CharField(max_length=255)
-    # upstream_response_time = models.CharField(max_length=255)
     # upstream_status = models.CharField(max_length=255)
 
     class Meta:
         """Meta class for Django."""
 
+        # The second index serves the keyset pagination of the request
+        # logs of an IPInfo in the admin.
+        index_together = (('client_ip_high', 'client_ip_low'),
+                          ('ip_info', 'datetime', 'id'))
         verbose_name = _('Request log')
         verbose_name_plural = _('Request logs')
 
     class ParseToDBThread(StoppableThread):
-        def __init__(self, parser, *args, **kwargs):
+        """
+        Thread following a log file and inserting its lines in database.
+
+        With resume, the offset of the last inserted line is saved (at most
+        every OFFSET_DELAY seconds), and the next thread following the file
+        (for example a new leader) starts from it, unless the file was
+        rotated. Lines inserted after the last saved offset are inserted
+        again, instead of being lost.
+        """
+
+        OFFSET_DELAY = 1
+
+        def __init__(self, parser, file_name=None, seek_end=True,
+                     dry_run=False, resume=False, *args, **kwargs):
             super(RequestLog.ParseToDBThread, self).__init__(*args, **kwargs)
             self.parser = parser
-
-        def run(self):
+            self.file_name = file_name
+            self.seek_end = seek_end
+            self.dry_run = dry_run
+            self.resume = resume and not dry_run
+            self.stats = {'lines': 0, 'created': 0, 'errors': 0}
+            self.collectors = []
+            self.last_save = 0
+            self.inode = None
+
+        def _file_name(self):
+            if self.file_name is not None:
+                return self.file_name
             matching_files = self.parser.matching_files()
             if len(matching_files) > 1:
-                print('Meerkat logs: more than 1 matching log file, '
-                      'cannot follow')
-                return
+                logger.warning('More than 1 matching log file, '
+                               'cannot follow')
+                return None
             elif not matching_files:
-                print('Meerkat logs: no matching log files, cannot follow')
+                logger.warning('No matching log files, cannot follow')
+                return None
+            return matching_files[0]
+
+        def _start_offset(self, file_name):
+            if self.resume:
+                offset = IngestionState.get_value(
+                    IngestionState.key('offset', file_name), None)
+                if offset is not None:
+                    stat = os.stat(file_name)
+                    inode = IngestionState.get_value(
+                        IngestionState.key('inode', file_name))
+                    if stat.st_ino == inode and offset <= stat.st_size:
+                        return offset
+                    # The file was rotated: the new one was never read.
+                    return 0
+            return os.path.getsize(file_name) if self.seek_end else 0
+
+        def _save_offset(self, file_name, offset, force=False):
+            now = time.time()
+            if not self.resume or (
+                    not force and now - self.last_save < self.OFFSET_DELAY):
+                return
+            self.last_save = now
+            with transaction.atomic():
+                IngestionState.set_value(
+                    IngestionState.key('offset', file_name), offset)
+                IngestionState.set_value(
+                    IngestionState.key('inode', file_name), self.inode)
+
+        def _insert_line(self, line):
+            # Time spent waiting for new lines is not observed.
+            watch = metrics.Stopwatch()
+            try:
+                data = self.parser.parse_string(line)
+            except AttributeError:
+                logger.warning("Can't parse log line: %r", line)
+                self.stats['errors'] += 1
+                metrics.lines_failed.inc()
                 return
-            file_name = matching_files[0]
-            seek_end = True
+            watch.lap('regex')
+            metrics.lines_parsed.inc()
+            data = self.parser.format_data(data)
+            watch.lap('format_data')
+            log_object = RequestLog(**completion.complete_data(data))
+            if self.dry_run:
+                return
+            watch.lap('complete')
+            # Collectors can flag the log: collect it before saving.
+            for collector in self.collectors:
+                collector.collect(log_object)
+            watch.lap('collect')
+            dimensions.normalize([log_object])
+            log_object.save()
+            watch.lap('db_flush')
+            log_object.update_ip_info(save=True)
+            watch.lap('ip_lookup')
+            self.stats['created'] += 1
+            metrics.logs_inserted.inc()
+            if flush_collectors():
+                watch.lap('db_flush')
+
+        def run(self):
+            file_name = self._file_name()
+            if file_name is None:
+                return
+            self.collectors = [] if self.dry_run else get_collectors()
+            offset = self._start_offset(file_name)
             while True:
-                for line in follow(file_name, seek_end, 1, self.stopped):
-                    try:
-                        data = self.parser.parse_string(line)
-                    except AttributeError:
-                        # TODO: log the line
-                        print("Meerkat: can't parse log line: %s" % line)
-                        continue
-                    log_object = RequestLog(**self.parser.format_data(data))
-                    log_object.complete()
-                    log_object.update_ip_info(save=True)
+                self.inode = os.stat(file_name).st_ino
+                for line in follow(file_name, False, 1, self.stopped,
+                                   offset=offset):
+                    offset += metrics.observe_line(line)
+                    self.stats['lines'] += 1
+                    self._insert_line(line)
+                    metrics.observe_offset(file_name, offset)
+                    self._save_offset(file_name, offset)
+                    metrics.publish()
                     if self.stopped():
                         break
                 if self.stopped():
                     break
-                seek_end = False
+                # The file was truncated or rotated: read the new one.
+                offset = 0
+            if not self.dry_run:
+                flush_collectors(force=True)
+                self._save_offset(file_name, offset, force=True)
+                metrics.publish(force=True)
 
     def __str__(self):
         return str(self.datetime)
@@ -389,19 +389,40 @@ class RequestLog(models.Model):
     def validate_url(self, url=None):
         if url is None:
             url = self.url
-        for u in (url, 'http://localhost/%s' % url):
-            try:
-                self.url_validator(u)
-                return True
-            except ValidationError:
-                pass
-        return False
+        return completion.validate_url(url)
 
     def _request_to_verb_url_protocol(self):
-        try:
-            return re.match(self.REQUEST_REGEX, self.request).groupdict()
-        except AttributeError:
-            return {}
+        request = completion.parse_request(self.request)
+        return request._asdict() if request is not None else {}
+
+    def get_text(self, name):
+        """
+        Return a string of the request log, even if it is normalized.
+
+        Args:
+            name (str): the field name (see ``meerkat.logs.dimensions``).
+
+        Returns:
+            str: the string.
+        """
+        return dimensions.get_text(self, name)
+
+    def _complete(self, fields=None, rewrite=True, save=True, data=None,
+                  strict_url=False):
+        values = list(completion.get_values(self))
+        values[URL_INDEX] = self.get_text('url')
+        changes = completion.complete(
+            completion.Request(**data) if data else self.request,
+            values, rewrite=rewrite, strict_url=strict_url, fields=fields,
+            user_agent=self.get_text('user_agent'),
+            referrer=self.get_text('referrer'))
+        for field, value in changes:
+            setattr(self, field, value)
+            if field == 'url':
+                self.url_ref = None
+        if changes and save:
+            self.save()
+        return bool(changes)
 
     def complete_verb_url_protocol(self,
                                    rewrite_verb=True,
@@ -409,260 +430,327 @@ class RequestLog(models.Model):
                                    rewrite_url=True,
                                    strict_url=False,
                                    save=True):
-        data = self._request_to_verb_url_protocol()
-        if not data:
-            return False
-        modified_verb = self.complete_verb(
-            data=data, rewrite=rewrite_verb, save=False)
-        modified_url = self.complete_url(
-            data=data, strict=strict_url, rewrite=rewrite_url, save=False)
-        modified_protocol = self.complete_protocol(
-            data=data, rewrite=rewrite_protocol, save=False)
-
-        modified = modified_verb | modified_url | modified_protocol
-        if modified and save:
-            self.save()
-        return modified
+        return self._complete(
+            ('verb', 'url', 'protocol'),
+            rewrite=(rewrite_verb, rewrite_url, rewrite_protocol) +
+            (True, ) * (len(completion.FIELDS) - 3), save=save,
+            strict_url=strict_url)
 
     def complete_verb(self, data=None, rewrite=True, save=True):
-        modified = False
-        if not data:
-            data = self._request_to_verb_url_protocol()
-            if not data:
-                return False
-        if not self.verb or (rewrite and self.verb != data['verb']):
-            self.verb = data['verb']
-            modified = True
-        if modified and save:
-            self.save()
-        return modified
+        return self._complete(('verb', ), rewrite, save, data)
 
     def complete_url(self, data=None, strict=False, rewrite=True, save=True):
-        modified = False
-        if not data:
-            data = self._request_to_verb_url_protocol()
-            if not data:
-                return False
-        if not self.url or (rewrite and self.url != data['url']):
-            if strict:
-                if self.validate_url(data['url']):
-                    self.url = data['url']
-                    modified = True
-            else:
-                self.url = data['url']
-                modified = True
-        if modified and save:
-            self.save()
-        return modified
+        return self._complete(('url', ), rewrite, save, data, strict)
 
     def complete_protocol(self, data=None, rewrite=True, save=True):
-        modified = False
-        if not data:
-            data = self._request_to_verb_url_protocol()
-            if not data:
-                return False
-        if not self.protocol or (
-                rewrite and self.protocol != data['protocol']):
-            self.protocol = data['protocol']
-            modified = True
-        if modified and save:
-            self.save()
-        return modified
+        return self._complete(('protocol', ), rewrite, save, data)
 
     def complete_https(self, rewrite=True, save=True):
-        modified = False
-        https = None  # TODO: implement complete_https
-        if not self.https or (rewrite and self.https != https):
-            self.https = https
-            modified = True
-        if modified and save:
-            self.save()
-        return modified
-
-    # FIXME: use urllib parse_url?
-    def _url_end(self, contains=''):
-        url = self.url
-        if not url:
-            url = self._request_to_verb_url_protocol().get('url', None)
-        if url and contains in url:
-            end = url
-            if '?' in url:
-                end = end.split('?')[0]
-            elif '%3F' in url:
-                end = end.split('%3F')[0]
-            return end.split('/')[-1]
-        return ''
+        return self._complete(('https', ), rewrite, save)
 
     def complete_file_type(self, rewrite=True, save=True):
-        modified = False
-        file_type = ''
-        end = self._url_end(contains='.')
-        if '.' in end:
-            file_type = end.split('.')[-1].upper()
-            file_type = file_type.split(':')[0]
-        if not self.file_type or (rewrite and self.file_type != file_type):
-            self.file_type = file_type
-            modified = True
-        if modified and save:
-            self.save()
-        return modified
+        return self._complete(('file_type', ), rewrite, save)
 
     def complete_port(self, rewrite=True, save=True):
-        modified = False
-        port = None
-        end = self._url_end(contains=':')
-        if ':' in end:
-            port = end.split(':')[-1].upper()
-            try:
-                port = int(port)
-            except ValueError:
-                port = None
-        if not self.port or (rewrite and self.port != port):
-            self.port = port
-            modified = True
-        if modified and save:
-            self.save()
-        return modified
+        return self._complete(('port', ), rewrite, save)
 
     def complete_suspicious(self, rewrite=True, save=True):
-        modified = False
-        suspicious = None  # TODO: implement complete_suspicious
-        if not self.suspicious or (rewrite and self.suspicious != suspicious):
-            self.suspicious = suspicious
-            modified = True
-        if modified and save:
-            self.save()
-        return modified
+        return self._complete(('suspicious', 'signatures'), rewrite, save)
+
+    def get_signature_families(self):
+        """
+        Return the attack signature families matched by the request log.
+
+        Returns:
+            list: the families (see ``meerkat.logs.signatures``).
+        """
+        return get_families(self.signatures)
 
     def complete(self, rewrite=True, save=True, **kwargs):
-        rewrite_verb = kwargs.pop('rewrite_verb', rewrite)
-        rewrite_url = kwargs.pop('rewrite_url', rewrite)
-        rewrite_protocol = kwargs.pop('rewrite_protocol', rewrite)
-        rewrite_https = kwargs.pop('rewrite_https', rewrite)
-        rewrite_file_type = kwargs.pop('rewrite_file_type', rewrite)
-        rewrite_suspicious = kwargs.pop('rewrite_suspicious', rewrite)
-        strict_url = kwargs.pop('strict_url', False)
+        """
+        Complete the information derived from the request line.
 
-        modified_vup = self.complete_verb_url_protocol(
-            rewrite_verb=rewrite_verb,
-            rewrite_url=rewrite_url,
-            rewrite_protocol=rewrite_protocol,
-            strict_url=strict_url,
-            save=False)
-        modified_https = self.complete_https(
-            rewrite=rewrite_https, save=False)
-        modified_file_type = self.complete_file_type(
-            rewrite=rewrite_file_type, save=False)
-        modified_port = self.complete_port(
-            rewrite=rewrite_file_type, save=False)
-        modified_suspicious = self.complete_suspicious(
-            rewrite=rewrite_suspicious, save=False)
-
-        modified = any((
-            modified_vup, modified_https, modified_file_type,
-            modified_port, modified_suspicious))
-        if modified and save:
-            self.save()
-        return modified
+        The request line is parsed once (see ``meerkat.logs.completion``).
+
+        Args:
+            rewrite (bool): rewrite the already completed information.
+            save (bool): save the request log if it was modified.
+            **kwargs: ``rewrite_<field>`` to override ``rewrite`` for a
+                field, and ``strict_url`` to only complete valid URLs.
+
+        Returns:
+            bool: whether the request log was modified.
+        """
+        strict_url = kwargs.pop('strict_url', False)
+        if kwargs:
+            rewrite = [kwargs.pop('rewrite_%s' % field, rewrite)
+                       for field in completion.FIELDS]
+        return self._complete(rewrite=rewrite, save=save,
+                              strict_url=strict_url)
 
     @staticmethod
-    def autocomplete(queryset, batch_size=512, rewrite=True, progress=True, **kwargs):  # noqa
-        # perf improvement: avoid QuerySet.__getitem__ when doing qs[i]
-        # FIXME: though we may need to buffer because the queryset can be huge
+    def autocomplete(queryset, batch_size=512, rewrite=True, progress=True,
+                     dry_run=False, **kwargs):
+        """
+        Complete the information of request logs.
+
+        Request logs are read by batches of increasing IDs (keyset
+        pagination), as tuples of values rather than model instances. Only
+        the changed fields of the modified logs are written, with a few
+        queries per batch (see ``meerkat.utils.db.bulk_update``).
+
+        Args:
+            queryset (QuerySet): the request logs to complete.
+            batch_size (int): number of request logs completed per
+                transaction.
+            rewrite (bool): rewrite the already completed information.
+            progress (bool): display a progress bar.
+            dry_run (bool): compute the information without saving it.
+            **kwargs: ``rewrite_<field>`` and ``strict_url``, as for
+                ``complete``.
+
+        Returns:
+            dict: numbers of read and modified request logs.
+        """
+        strict_url = kwargs.pop('strict_url', False)
+        rewrite = [kwargs.pop('rewrite_%s' % field, rewrite)
+                   for field in completion.FIELDS]
+        queryset = queryset.order_by('pk')
         total = queryset.count()
         progress_bar = ProgressBar(sys.stdout if progress else None, total)
-        print('Completing information for %s request logs' % total)
-        count = 0
+        logger.info('Completing information for %s request logs', total)
+        stats = {'logs': 0, 'modified': 0}
+        last_pk = None
 
         start = datetime.datetime.now()
-        while count < total:
-            buffer = queryset[count:count+batch_size]
-            with transaction.atomic():  # is this a real improvement?
-                for obj in buffer:
-                    obj.complete(rewrite=rewrite, **kwargs)
-                    count += 1
-                    progress_bar.update(count)
-            # end transaction
+        while True:
+            batch = queryset
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            rows = list(batch.annotate(**dimensions.texts()).values_list(
+                'pk', 'request', 'user_agent_text', 'referrer_text',
+                *URL_TEXT_FIELDS)[:batch_size])
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            changes = {}
+            for row in rows:
+                modified = completion.complete(
+                    row[1], row[4:], rewrite=rewrite, strict_url=strict_url,
+                    user_agent=row[2], referrer=row[3])
+                if modified:
+                    changes[row[0]] = dict(modified)
+                    if 'url' in changes[row[0]]:
+                        changes[row[0]]['url_ref'] = None
+            if changes and not dry_run:
+                with metrics.stage_seconds.time(stage='db_flush'), \
+                        transaction.atomic():
+                    bulk_update(RequestLog, changes)
+            stats['logs'] += len(rows)
+            stats['modified'] += len(changes)
+            metrics.logs_completed.inc(len(rows))
+            progress_bar.update(stats['logs'])
         end = datetime.datetime.now()
-        print('Elapsed time: %s' % (end - start))
+        logger.info('Elapsed time: %s', end - start)
+        return stats
 
     @staticmethod
-    def parse_all(buffer_size=512, progress=True):
-        parser = get_nginx_parser()
+    def parse_file(log_file, parser=None, buffer_size=512, progress=True,
+                   since=None, until=None, dry_run=False, profile=False):
+        """
+        Parse a log file and insert its lines in database.
+
+        Args:
+            log_file (str): path to the log file.
+            parser (GenericParser): the parser (default: NginX parser).
+            buffer_size (int): number of request logs inserted at once.
+            progress (bool): display a progress bar.
+            since (datetime): ignore lines older than this date.
+            until (datetime): ignore lines from this date on.
+            dry_run (bool): parse the lines without writing anything.
+            profile (bool/Profiler): accumulate the time spent in each stage
+                and print a summary at the end (see ``Profiler``). When a
+                profiler is given, the caller prints its report.
+
+        Returns:
+            dict: numbers of read lines, parsed lines, created request logs,
+                skipped lines (out of the date range) and errors (unparsable
+                lines).
+        """
+        if parser is None:
+            parser = get_nginx_parser()
+        profiler = Profiler() if profile is True else profile or None
+        collectors = [] if dry_run else get_collectors()
+        stats = {'files': 1, 'lines': 0, 'parsed': 0, 'created': 0,
+                 'skipped': 0, 'errors': 0}
         buffer = []
+        n_lines = count_lines(log_file)
+        progress_bar = ProgressBar(sys.stdout if progress else None, n_lines)
+        logger.info('Reading log file %s: %s lines', log_file, n_lines)
+        with open(log_file) as f:
+            watch = metrics.Stopwatch(profiler)
+            for count, line in enumerate(f, 1):
+                watch.lap('read')
+                log_object = RequestLog._parse_line(
+                    parser, line, since, until, stats, watch, profiler)
+                if log_object is None:
+                    watch.reset()
+                    continue
+                if dry_run:
+                    continue
+                for collector in collectors:
+                    collector.collect(log_object)
+                buffer.append(log_object)
+                watch.lap('collect')
+                if len(buffer) >= buffer_size:
+                    RequestLog._insert_batch(
+                        buffer, stats, log_file, profiler, watch)
+                progress_bar.update(count)
+                watch.reset()
+        if not dry_run:
+            RequestLog._insert_batch(
+                buffer, stats, log_file, profiler, watch, force=True)
+        elif profiler is not None:
+            profiler.end_batch(log_file)
+        if profile is True:
+            profiler.report()
+        return stats
+
+    @staticmethod
+    def _parse_line(parser, line, since, until, stats, watch, profiler):
+        # The completed request log of a line, or None if the line cannot
+        # be parsed or is out of the date range.
+        if profiler is not None:
+            profiler.tick()
+        metrics.observe_line(line)
+        stats['lines'] += 1
+        try:
+            data = parser.parse_string(line)
+        except AttributeError:
+            logger.warning("Can't parse log line: %r", line)
+            stats['errors'] += 1
+            metrics.lines_failed.inc()
+            return None
+        watch.lap('regex')
+        metrics.lines_parsed.inc()
+        data = parser.format_data(data)
+        watch.lap('format_data')
+        log_datetime = data.get('datetime', None)
+        if log_datetime is not None and (
+                (since is not None and log_datetime < since) or
+                (until is not None and log_datetime >= until)):
+            stats['skipped'] += 1
+            return None
+        log_object = RequestLog(**completion.complete_data(data))
+        stats['parsed'] += 1
+        watch.lap('complete')
+        return log_object
+
+    @staticmethod
+    def _insert_batch(buffer, stats, log_file, profiler, watch,
+                      force=False):
+        # Insert the buffered request logs and flush the collectors (at
+        # the end of the file, force the flush).
+        if buffer:
+            RequestLog._insert(buffer, stats)
+        flush_collectors(force=force)
+        watch.lap('db_flush')
+        metrics.publish(force=force)
+        if profiler is not None:
+            profiler.end_batch(log_file)
+
+    @staticmethod
+    def _insert(buffer, stats):
+        dimensions.normalize(buffer)
+        RequestLog.objects.bulk_create(buffer)
+        stats['created'] += len(buffer)
+        metrics.logs_inserted.inc(len(buffer))
+        buffer.clear()
+
+    @staticmethod
+    def parse_all(buffer_size=512, progress=True, files=None, since=None,
+                  until=None, dry_run=False, profile=False):
+        """
+        Parse log files and insert their lines in database.
+
+        Args:
+            buffer_size (int): number of request logs inserted at once.
+            progress (bool): display a progress bar.
+            files (list): paths of the log files (default: matching files).
+            since (datetime): ignore lines older than this date.
+            until (datetime): ignore lines from this date on.
+            dry_run (bool): parse the lines without writing anything.
+            profile (bool/Profiler): accumulate the time spent in each stage
+                of all files and print a summary at the end.
+
+        Returns:
+            dict: the sums of ``parse_file`` statistics.
+        """
+        parser = get_nginx_parser()
+        profiler = Profiler() if profile is True else profile or None
+        if files is None:
+            files = parser.matching_files()
+        stats = {'files': 0, 'lines': 0, 'parsed': 0, 'created': 0,
+                 'skipped': 0, 'errors': 0}
         start = datetime.datetime.now()
-        for log_file in parser.matching_files():
-            n_lines = count_lines(log_file)
-            progress_bar = ProgressBar(sys.stdout if progress else None, n_lines)  # noqa
-            print('Reading log file %s: %s lines' % (log_file, n_lines))
-            with open(log_file) as f:
-                for count, line in enumerate(f, 1):
-                    try:
-                        data = parser.parse_string(line)
-                    except AttributeError:
-                        # TODO: log the line
-                        print('Error while parsing log line: %s' % line)
-                        continue
-                    log_object = RequestLog(**parser.format_data(data))
-                    log_object.complete(save=False)
-                    buffer.append(log_object)
-                    if len(buffer) >= buffer_size:
-                        RequestLog.objects.bulk_create(buffer)
-                        buffer.clear()
-                    progress_bar.update(count)
-                if len(buffer) > 0:
-                    RequestLog.objects.bulk_create(buffer)
-                    buffer.clear()
+        for log_file in files:
+            file_stats = RequestLog.parse_file(
+                log_file, parser, buffer_size=buffer_size, progress=progress,
+                since=since, until=until, dry_run=dry_run, profile=profiler)
+            for key, value in file_stats.items():
+                stats[key] += value
         end = datetime.datetime.now()
-        print('Elapsed time: %s' % (end - start))
+        logger.info('Elapsed time: %s', end - start)
+        if profile is True:
+            profiler.report()
+        return stats
 
-    @staticmethod
-    def get_ip_info(only_update=False):
-        param = 'client_ip_address'
-        if not only_update:
-            unique_ips = set(RequestLog.objects.distinct(param).values_list(param, flat=True))  # noqa
-            checked_ips = set(IPInfoCheck.objects.values_list('ip_address', flat=True))  # noqa
-            not_checked_ips = unique_ips - checked_ips
-            print('Checking IP addresses information (%s)' % len(not_checked_ips))
-            check_progress_bar = ProgressBar(sys.stdout, len(not_checked_ips))
-            for count, ip in enumerate(not_checked_ips, 1):
-                try:
-                    IPInfoCheck.check_ip(ip)
-                except RateExceededError:
-                    print(' Rate exceeded')
-                    break
-                check_progress_bar.update(count)
-        no_ip_info = RequestLog.objects.filter(ip_info=None)
-        no_ip_info_ip = set(no_ip_info.distinct(param).values_list(param, flat=True))  # noqa
-        checks = IPInfoCheck.objects.filter(ip_address__in=no_ip_info_ip)
-        print('Updating request logs\' IP info (%s)' % no_ip_info.count())
-        print('%s related checks' % checks.count())
-        logs_progress_bar = ProgressBar(sys.stdout, checks.count())
-        for count, check in enumerate(checks, 1):
-            no_ip_info.filter(
-                client_ip_address=check.ip_address
-            ).update(ip_info=check.ip_info)
-            logs_progress_bar.update(count)
+    # See ``meerkat.logs.enrichment``.
+    get_ip_info = staticmethod(enrichment.get_ip_info)
 
     @staticmethod
     def start_daemon():
         """
         Start a thread to continuously read log files and append lines in DB.
 
-        Work in progress. Currently the thread doesn't append anything,
-        it only print the information parsed from each line read.
+        Only one process ingests the log file at a time: each process runs
+        a leader election thread, and the process holding the ingestion lock
+        (see ``get_ingestion_lock``) runs the reading thread. When the
+        leader dies, another process takes over within a few seconds, and
+        resumes reading from the last saved offset.
 
         Returns:
-            thread: the started thread.
+            thread: the started leader election thread.
         """
-        if RequestLog.daemon is None:
-            parser = get_nginx_parser()
-            RequestLog.daemon = RequestLog.ParseToDBThread(parser, daemon=True)
-        RequestLog.daemon.start()
-        return RequestLog.daemon
+        if RequestLog.elector is None or not RequestLog.elector.is_alive():
+            RequestLog.elector = LeaderElector(
+                RequestLog.get_ingestion_lock(), RequestLog._new_daemon,
+                daemon=True)
+            RequestLog.elector.start()
+        return RequestLog.elector
 
     @staticmethod
     def stop_daemon():
-        if hasattr(RequestLog, 'daemon'):
-            RequestLog.daemon.stop()
-            RequestLog.daemon.join()
+        """Stop the leader election thread and the reading thread."""
+        if RequestLog.elector is not None:
+            RequestLog.elector.stop()
+            RequestLog.elector.join()
+            RequestLog.elector = None
+
+    @staticmethod
+    def get_ingestion_lock():
+        """
+        Return the lock elected ingesters must hold.
+
+        Returns:
+            AdvisoryLock/FileLock: a PostgreSQL advisory lock, or a lock on
+                the MEERKAT_LOGS_LEADER_LOCK_FILE file for other databases.
+        """
+        return get_lock('meerkat-ingest',
+                        path=app_settings.logs_leader_lock_file)
+
+    @staticmethod
+    def _new_daemon():
+        RequestLog.daemon = RequestLog.ParseToDBThread(
+            get_nginx_parser(), resume=True, daemon=True)
+        return RequestLog.daemon
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+"""
+Network queries.
+
+IP address fields are stored as strings, which cannot be compared by
+network. Each one is doubled by two ``IPHalfField`` columns holding its
+128-bits integer value (see ``meerkat.utils.ip``), filled when the row is
+saved and indexed together.
+
+``filter_networks`` then filters the rows of networks (CIDR blocks, for
+example the prefixes announced by an autonomous system) with range scans
+on this index, and ``count_networks`` counts rows by network prefix with
+integer masks, to find the networks sending most requests.
+"""
+
+import collections
+import functools
+import ipaddress
+import operator
+
+from django.db import models
+from django.db.models import Count, F, Q
+
+from ..utils.ip import (
+    join_int, network_masks, network_range, network_to_str, parse_network,
+    split_int, split_ip)
+
+HALVES = ('high', 'low')
+
+# IPv4 addresses, in the IPv6 space.
+IPV4_NETWORK = '::ffff:0:0/96'
+
+
+class IPHalfField(models.BigIntegerField):
+    """
+    Half of the integer value of an IP address field.
+
+    The value is computed from the IP address field when the row is saved,
+    even in bulk. The IP address must not be changed with ``update``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Init method.
+
+        Args:
+            source (str): the name of the IP address field.
+            half (str): ``'high'`` or ``'low'`` 64 bits.
+            *args: positional arguments of BigIntegerField.
+            **kwargs: keyword arguments of BigIntegerField.
+        """
+        self.source = kwargs.pop('source')
+        self.half = kwargs.pop('half')
+        if self.half not in HALVES:
+            raise ValueError('half must be one of %s' % (HALVES, ))
+        kwargs.setdefault('null', True)
+        kwargs.setdefault('blank', True)
+        kwargs['editable'] = False
+        super(IPHalfField, self).__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(IPHalfField, self).deconstruct()
+        kwargs['source'] = self.source
+        kwargs['half'] = self.half
+        del kwargs['editable']
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = split_ip(getattr(model_instance, self.source))[
+            HALVES.index(self.half)]
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+def get_halves(model, field):
+    """
+    Return the names of the halves of an IP address field.
+
+    Args:
+        model (Model): the model.
+        field (str): the name of the IP address field.
+
+    Returns:
+        tuple: the names of the high and low ``IPHalfField``.
+
+    Raises:
+        ValueError: if the field has no halves.
+    """
+    halves = {f.half: f.name for f in model._meta.fields
+              if isinstance(f, IPHalfField) and f.source == field}
+    if len(halves) != 2:
+        raise ValueError('%s.%s has no IPHalfField' % (
+            model.__name__, field))
+    return halves['high'], halves['low']
+
+
+def network_q(model, network, field='client_ip_address'):
+    """
+    Return the condition of the rows of a network, as a range scan.
+
+    Args:
+        model (Model): the model.
+        network (str): the network in CIDR notation, or an IP address.
+        field (str): the name of the IP address field.
+
+    Returns:
+        Q: the condition.
+    """
+    high, low = get_halves(model, field)
+    prefix = parse_network(network)[1]
+    (first_high, first_low), (last_high, last_low) = map(
+        split_int, network_range(network))
+    if prefix == 0:
+        # Signed halves only keep the order within a network of prefix
+        # length 1 or more.
+        return Q(**{'%s__isnull' % high: False})
+    if prefix <= 64:
+        return Q(**{'%s__range' % high: (first_high, last_high)})
+    return Q(**{high: first_high,
+                '%s__range' % low: (first_low, last_low)})
+
+
+def collapse_networks(networks):
+    """
+    Merge overlapping and adjacent networks.
+
+    Args:
+        networks (iterable): the networks in CIDR notation.
+
+    Returns:
+        list: the merged networks, as strings.
+    """
+    by_version = {}
+    for network in networks:
+        network = ipaddress.ip_network(network)
+        by_version.setdefault(network.version, []).append(network)
+    return [str(network)
+            for version in sorted(by_version)
+            for network in ipaddress.collapse_addresses(by_version[version])]
+
+
+def filter_networks(queryset, networks, field='client_ip_address'):
+    """
+    Filter the rows whose IP address belongs to one of several networks.
+
+    Args:
+        queryset (QuerySet): the rows, with halves of the field.
+        networks (iterable): the networks in CIDR notation, or IP
+            addresses (for example all the prefixes of an ASN).
+        field (str): the name of the IP address field.
+
+    Returns:
+        QuerySet: the filtered rows (none if networks is empty).
+    """
+    conditions = [network_q(queryset.model, network, field)
+                  for network in collapse_networks(networks)]
+    if not conditions:
+        return queryset.none()
+    return queryset.filter(functools.reduce(operator.or_, conditions))
+
+
+def count_networks(queryset, ipv4_prefix=24, ipv6_prefix=48,
+                   field='client_ip_address'):
+    """
+    Count rows by network prefix of their IP address.
+
+    Args:
+        queryset (QuerySet): the rows, with halves of the field.
+        ipv4_prefix (int): the prefix length of IPv4 networks.
+        ipv6_prefix (int): the prefix length of IPv6 networks.
+        field (str): the name of the IP address field.
+
+    Returns:
+        Counter: the numbers of rows by network, in CIDR notation.
+    """
+    high, low = get_halves(queryset.model, field)
+    ipv4 = network_q(queryset.model, IPV4_NETWORK, field)
+    counter = collections.Counter()
+    for condition, prefix in (
+            (ipv4, 96 + ipv4_prefix),
+            (~ipv4 & Q(**{'%s__isnull' % high: False}), ipv6_prefix)):
+        mask_high, mask_low = network_masks(prefix)
+        rows = queryset.filter(condition).order_by().annotate(
+            network_high=F(high).bitand(mask_high),
+            network_low=F(low).bitand(mask_low)).values_list(
+                'network_high', 'network_low').annotate(count=Count('id'))
+        for network_high, network_low, count in rows:
+            counter[network_to_str(
+                join_int(network_high, network_low), prefix)] += count
+    return counter
@@ -9,11 +9,13 @@ expressions to find the log files and to parse them.
 
 import re
 from os import walk
-from os.path import abspath, join, relpath, sep
+from os.path import abspath, getmtime, join, relpath, sep
+from string import ascii_letters
 
 from dateutil import parser as dateutil_parser
 
 from ..apps import AppSettings
+from ..utils.ip import forwarded_ip, normalize_ip
 from ..utils.time import month_name_to_number
 
 
@@ -61,6 +63,10 @@ class GenericParser(object):
         """
         Find files.
 
+        Files are sorted chronologically (oldest modification first), so
+        that rotated files are read before the current one, whatever the
+        directory order.
+
         Returns:
             list: the list of matching files.
         """
@@ -81,7 +87,7 @@ class GenericParser(object):
                 if matcher.match(filename):
                     matching.append(abspath(join(root, filename)))
 
-        return matching
+        return sorted(matching, key=lambda path: (getmtime(path), path))
 
     def parse_files(self):
         """
@@ -115,20 +121,260 @@ class GenericParser(object):
         raise NotImplementedError
 
 
+# Characters of the access log regex classes, the non-ASCII ones being
+# checked with the class itself (IGNORECASE and Unicode digits).
+_IP_CHARS = frozenset('0123456789abcdefABCDEF.:')
+_IP_CHAR = re.compile(r'[\da-f.:]', re.IGNORECASE).match
+_MONTH_CHARS = frozenset(ascii_letters)
+_MONTH_CHAR = re.compile(r'[a-z]', re.IGNORECASE).match
+
+
+def _in_class(value, chars, match):
+    return chars.issuperset(value) or all(
+        c in chars or (c > '\x7f' and match(c)) for c in value)
+
+
+def _decimals_end(line, start):
+    # End of \d*
+    end = start
+    length = len(line)
+    while end < length and line[end].isdecimal():
+        end += 1
+    return end
+
+
+def _number_end(line, start):
+    # End of \d+(\.\d+)?, or start if there is no digit
+    end = _decimals_end(line, start)
+    if end > start and line.startswith('.', end):
+        fraction_end = _decimals_end(line, end + 1)
+        if fraction_end > end + 1:
+            end = fraction_end
+    return end
+
+
+def _time_end(line, start, several=False):
+    # End of \d+(\.\d+)?|- (several: numbers separated by ", " or " : "),
+    # or None
+    end = _number_end(line, start)
+    if end == start:
+        return start + 1 if line.startswith('-', start) else None
+    while several:
+        if line.startswith(', ', end):
+            next_start = end + 2
+        elif line.startswith(' : ', end):
+            next_start = end + 3
+        else:
+            break
+        next_end = _number_end(line, next_start)
+        if next_end == next_start:
+            break
+        end = next_end
+    return end
+
+
+def _client_end(line):
+    # $remote_addr - $remote_user [: the IP address and the end of the
+    # user, or None
+    end = line.find(' ')
+    ip_address = line[:end]
+    if end < 1 or not _in_class(ip_address, _IP_CHARS, _IP_CHAR):
+        return None
+    if not line.startswith(' - ', end):
+        return None
+    start = end + 3
+    end = line.find(' ', start)
+    user = line[start:end]
+    if end < 0 or not (user == '-' or user and all(
+            c.isalnum() or c == '_' for c in user)):
+        return None
+    return ip_address, end
+
+
+def _time_local(line, end):
+    # [$time_local] " (fixed width: [dd/Mon/yyyy:hh:mm:ss +zzzz] "), or None
+    time = line[end + 1:end + 31]
+    if len(time) < 30 or not (
+            time[0] + time[3] + time[7] + time[12] + time[15] + time[18] +
+            time[21] + time[27:] == '[//::: ] "' and time[22] in '+-' and
+            (time[1:3] + time[8:12] + time[13:15] + time[16:18] +
+             time[19:21] + time[23:27]).isdecimal() and
+            _in_class(time[4:7], _MONTH_CHARS, _MONTH_CHAR)):
+        return None
+    return time
+
+
+def _request_end(line, start):
+    # $request" $status $body_bytes_sent ": the values and the end of the
+    # bytes sent, or None
+    end = line.find('"', start)
+    if end < 0 or not line.startswith(' ', end + 1):
+        return None
+    request = line[start:end]
+    status_code = line[end + 2:end + 5]
+    if not (len(status_code) == 3 and status_code.isdecimal() and
+            line.startswith(' ', end + 5)):
+        return None
+    start = end + 6
+    end = line.find(' ', start)
+    bytes_sent = line[start:end]
+    if end < 0 or not (bytes_sent.isdecimal() and
+                       line.startswith('"', end + 1)):
+        return None
+    return request, status_code, bytes_sent, end
+
+
+def _agents_end(line, end):
+    # $http_referer" "$http_user_agent": the values and the end of the user
+    # agent, or None
+    start = end + 2
+    end = line.find('"', start)
+    if end < 0 or not line.startswith('" "', end):
+        return None
+    referrer = line[start:end] or None
+    start = end + 3
+    end = line.find('"', start)
+    if end < 0:
+        return None
+    return referrer, line[start:end] or None, end + 1
+
+
+def _optional_fields(line, start):
+    # Optional fields, taken when present like the regex optional groups.
+    forwarded_for = request_time = upstream_response_time = None
+    if line.startswith(' "', start):
+        end = line.find('"', start + 2)
+        if end >= 0:
+            forwarded_for = line[start + 2:end]
+            start = end + 1
+    if line.startswith(' ', start):
+        end = _time_end(line, start + 1)
+        if end is not None:
+            request_time = line[start + 1:end]
+            start = end
+            if line.startswith(' ', start):
+                end = _time_end(line, start + 1, several=True)
+                if end is not None:
+                    upstream_response_time = line[start + 1:end]
+    return forwarded_for, request_time, upstream_response_time
+
+
+def tokenize_access_line(line):
+    """
+    Split an access log line without regex, in linear time.
+
+    Each character is read a bounded number of times, whatever the line:
+    quoted fields are found with ``str.find``, and no field is ever read
+    again to try another split, unlike a backtracking regex. The result
+    is the one of ``NginXAccessLogParser.log_format_regex``.
+
+    Args:
+        line (str): the log line.
+
+    Returns:
+        dict: the values of the regex groups (None if a group did not
+            match), or None if the line does not match.
+    """
+    client = _client_end(line)
+    if client is None:
+        return None
+    ip_address, end = client
+    time = _time_local(line, end)
+    if time is None:
+        return None
+    request = _request_end(line, end + 31)
+    if request is None:
+        return None
+    request, status_code, bytes_sent, end = request
+    agents = _agents_end(line, end)
+    if agents is None:
+        return None
+    referrer, user_agent, start = agents
+    forwarded_for, request_time, upstream_response_time = _optional_fields(
+        line, start)
+    return {
+        'ip_address': ip_address, 'day': time[1:3], 'month': time[4:7],
+        'year': time[8:12], 'hour': time[13:15], 'minute': time[16:18],
+        'second': time[19:21], 'timezone': time[22:27], 'request': request,
+        'status_code': status_code, 'bytes_sent': bytes_sent,
+        'referrer': referrer, 'user_agent': user_agent,
+        'forwarded_for': forwarded_for, 'request_time': request_time,
+        'upstream_response_time': upstream_response_time}
+
+
 class NginXAccessLogParser(GenericParser):
     """Parser for NginX logs."""
 
     file_path_regex = re.compile(r'access.log')
     # coderwall.com/p/snn1ag/regex-to-parse-your-default-nginx-access-logs
+    # IPv4 or IPv6 address, validated and normalized in format_data.
+    # NginX escapes quotes in variables: quoted fields end at the next quote.
     log_format_regex = re.compile(
-        r'(?P<ip_address>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}) - (-|(\w+)) '
+        r'(?P<ip_address>[\da-f.:]+) - (-|(\w+)) '
         r'\[(?P<day>\d{2})/(?P<month>[a-z]{3})/(?P<year>\d{4})'
         r':(?P<hour>\d{2}):(?P<minute>\d{2}):(?P<second>\d{2}) '
         r'(?P<timezone>([+-])\d{4})\] "(?P<request>[^"]*?)" '
         r'(?P<status_code>\d{3}) (?P<bytes_sent>\d+) '
-        r'"(?P<referrer>(-)|(.+))?" "(?P<user_agent>.+)?"',
+        r'"(?P<referrer>(-)|([^"]+))?" "(?P<user_agent>[^"]+)?"'
+        # Optional $http_x_forwarded_for (NginX "main" format)
+        r'( "(?P<forwarded_for>[^"]*)")?'
+        # Optional $request_time and $upstream_response_time
+        r'( (?P<request_time>\d+(\.\d+)?|-))?'
+        r'( (?P<upstream_response_time>\d+(\.\d+)?'
+        r'((, | : )\d+(\.\d+)?)*|-))?',
         re.IGNORECASE)
     top_dir = '/var/log/nginx'
+    trusted_proxies = ()
+
+    def __init__(self, file_path_regex=None, log_format_regex=None,
+                 top_dir=None, trusted_proxies=None):
+        """
+        Init method.
+
+        Args:
+            file_path_regex (regex): the regex to find the log files.
+            log_format_regex (regex): the regex to parse the log files.
+            top_dir (str): the path to the root directory containing the logs.
+            trusted_proxies (tuple): the networks of the proxies (load
+                balancers) whose X-Forwarded-For headers are trusted
+                (``ipaddress`` objects).
+        """
+        super(NginXAccessLogParser, self).__init__(
+            file_path_regex, log_format_regex, top_dir)
+        if trusted_proxies is not None:
+            self.trusted_proxies = tuple(trusted_proxies)
+
+    def parse_string(self, string):
+        """
+        Parse just a string.
+
+        The default log format is split by ``tokenize_access_line``,
+        custom log formats by their regex.
+
+        Args:
+            string (str): the log line to parse.
+
+        Returns:
+            dict: parsed information with regex groups as keys.
+
+        Raises:
+            AttributeError: if the line does not match the log format (like
+                a regex which does not match).
+        """
+        if self.log_format_regex is not NginXAccessLogParser.log_format_regex:
+            return super(NginXAccessLogParser, self).parse_string(string)
+        data = tokenize_access_line(string)
+        if data is None:
+            raise AttributeError('cannot parse log line: %r' % string)
+        return data
+
+    @staticmethod
+    def _seconds_to_ms(value):
+        # Upstream times of several servers are separated by commas/colons.
+        if value is None or value == '-':
+            return None
+        return int(round(sum(
+            float(v) for v in re.split(r', | : ', value)) * 1000))
 
     def format_data(self, data):
         log_datetime = '%s%s%sT%s%s%s%s' % (
@@ -140,7 +386,13 @@ class NginXAccessLogParser(GenericParser):
             data.pop('second'),
             data.get('timezone'))
         data['datetime'] = dateutil_parser.parse(log_datetime)
-        data['client_ip_address'] = data.pop('ip_address')
+        data['client_ip_address'] = forwarded_ip(
+            normalize_ip(data.pop('ip_address')),
+            data.pop('forwarded_for', None), self.trusted_proxies)
+        data['request_time'] = self._seconds_to_ms(
+            data.pop('request_time', None))
+        data['upstream_response_time'] = self._seconds_to_ms(
+            data.pop('upstream_response_time', None))
         data = {k: v for k, v in data.items() if v is not None}
         return data
 
@@ -198,4 +450,5 @@ def get_nginx_parser():
     return NginXAccessLogParser(
         file_path_regex=file_path_regex if file_path_regex else None,
         log_format_regex=log_format_regex,
-        top_dir=top_dir)
+        top_dir=top_dir,
+        trusted_proxies=app_settings.logs_trusted_proxies)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+"""
+Ingestion profiling.
+
+A profiler accumulates the time spent in each stage of the ingestion (see
+``metrics.STAGES``) when ``RequestLog.parse_file`` or ``parse_all`` is
+called with ``profile=True`` (or ``meerkat_import --profile``). It can also
+run cProfile and tracemalloc on the first lines, and writes a summary table
+and the ``.pstats`` and ``.tracemalloc`` files at the end.
+
+External tools can subscribe to the timings of each batch with the
+``batch_profiled`` signal::
+
+    from meerkat.logs.profiling import batch_profiled
+
+    def receiver(sender, file_name, batch, lines, timings, **kwargs):
+        # timings: seconds spent in each stage for this batch
+        ...
+
+    batch_profiled.connect(receiver)
+"""
+
+import cProfile
+import os
+import time
+import tracemalloc
+
+from django.dispatch import Signal
+
+from .metrics import STAGES
+
+batch_profiled = Signal(
+    providing_args=['file_name', 'batch', 'lines', 'timings'])
+
+
+class Profiler(object):
+    """Accumulate stage timings, and optionally profile the first lines."""
+
+    def __init__(self, lines=0, memory=False, output_dir=None,
+                 name='meerkat-profile'):
+        """
+        Init method.
+
+        Args:
+            lines (int): number of lines to run cProfile on (0 to disable).
+            memory (bool): also trace memory allocations on these lines.
+            output_dir (str): directory of the written files (default: the
+                current directory).
+            name (str): prefix of the written files.
+        """
+        self.lines = lines
+        self.memory = memory
+        self.output_dir = output_dir or os.getcwd()
+        self.name = name
+        self.totals = {}
+        self.batch_totals = {}
+        self.batches = 0
+        self.batch_lines = 0
+        self.count = 0
+        self.profile = None
+        self.snapshot = None
+        self.peak_memory = None
+
+    def add(self, stage, seconds):
+        """
+        Add time spent in a stage.
+
+        Args:
+            stage (str): the stage.
+            seconds (float): the elapsed time.
+        """
+        for totals in (self.totals, self.batch_totals):
+            calls, total = totals.get(stage, (0, 0))
+            totals[stage] = (calls + 1, total + seconds)
+
+    def tick(self):
+        """Count a line, and start or stop the profilers."""
+        self.count += 1
+        self.batch_lines += 1
+        if self.count == 1 and self.lines > 0:
+            if self.memory:
+                tracemalloc.start()
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        elif self.count == self.lines + 1:
+            self.stop()
+
+    def stop(self):
+        """Stop the profilers if they are running."""
+        if self.profile is not None and self.snapshot is None:
+            self.profile.disable()
+            if self.memory and tracemalloc.is_tracing():
+                self.snapshot = tracemalloc.take_snapshot()
+                self.peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            else:
+                self.snapshot = False
+
+    def end_batch(self, file_name):
+        """
+        Send the timings of the current batch to the subscribers.
+
+        Args:
+            file_name (str): the log file being read.
+        """
+        if not self.batch_lines and not self.batch_totals:
+            return
+        self.batches += 1
+        timings = {stage: total
+                   for stage, (calls, total) in self.batch_totals.items()}
+        batch_profiled.send(
+            sender=self.__class__, file_name=file_name, batch=self.batches,
+            lines=self.batch_lines, timings=timings)
+        self.batch_totals = {}
+        self.batch_lines = 0
+
+    def summary(self):
+        """
+        Return a table of the time spent in each stage.
+
+        Returns:
+            str: the summary table.
+        """
+        grand_total = sum(total for calls, total in self.totals.values())
+        rows = ['%-12s %10s %12s %12s %7s' % (
+            'stage', 'calls', 'total (s)', 'mean (us)', 'share')]
+        stages = [s for s in STAGES if s in self.totals] + sorted(
+            set(self.totals) - set(STAGES))
+        for stage in stages:
+            calls, total = self.totals[stage]
+            rows.append('%-12s %10d %12.3f %12.1f %6.1f%%' % (
+                stage, calls, total, total / calls * 1e6,
+                total / grand_total * 100 if grand_total else 0))
+        rows.append('%-12s %10d %12.3f' % ('total', self.count, grand_total))
+        if self.peak_memory is not None:
+            rows.append('peak traced memory: %.1f KiB' % (
+                self.peak_memory / 1024))
+        return '\n'.join(rows)
+
+    def dump(self):
+        """
+        Write the cProfile statistics and the tracemalloc snapshot.
+
+        Returns:
+            list: the paths of the written files.
+        """
+        self.stop()
+        if self.profile is None:
+            return []
+        prefix = os.path.join(self.output_dir, '%s-%s-%s' % (
+            self.name, time.strftime('%Y%m%d-%H%M%S'), os.getpid()))
+        paths = [prefix + '.pstats']
+        self.profile.dump_stats(paths[0])
+        if self.snapshot:
+            paths.append(prefix + '.tracemalloc')
+            self.snapshot.dump(paths[1])
+        return paths
+
+    def report(self):
+        """
+        Print the summary table and write the profiling files.
+
+        Returns:
+            list: the paths of the written files.
+        """
+        paths = self.dump()
+        print(self.summary())
+        for path in paths:
+            print('Profile written to %s' % path)
+        return paths
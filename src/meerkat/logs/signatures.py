@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+
+"""
+Attack signatures.
+
+Request logs are matched against signatures of well-known attacks (path
+traversal, SQL injection, scanners...), grouped in families. Each family is
+a bit: the result of a match is the bitmask of the matched families, stored
+in the ``signatures`` column of request logs (0 when nothing matched).
+
+Signatures are compiled once per field (URL, user agent, referrer) into a
+single automaton: the literals of all families are matched in one pass with
+Aho-Corasick when ``pyahocorasick`` is installed (``pip install
+django-meerkat[signatures]``), and the regular expressions are merged into
+one pattern, used as a pre-filter: the regular expressions of each family
+only run when the merged pattern matched. Without ``pyahocorasick``, the
+literals are merged with the regular expressions.
+
+Texts are matched in lower case, and percent-encoded texts are matched both
+as is and decoded (twice, to catch double encoding). Values repeat a lot in
+logs: results are cached for each field.
+"""
+
+import collections
+import functools
+import re
+from urllib.parse import unquote, unquote_plus
+
+try:
+    import ahocorasick
+except ImportError:  # pragma: no cover
+    ahocorasick = None
+
+CACHE_SIZE = 4096
+
+URL = 'url'
+USER_AGENT = 'user_agent'
+REFERRER = 'referrer'
+TARGETS = (URL, USER_AGENT, REFERRER)
+
+PATH_TRAVERSAL = 1 << 0
+SQL_INJECTION = 1 << 1
+XSS = 1 << 2
+SCANNER_PATH = 1 << 3
+SCANNER_AGENT = 1 << 4
+COMMAND_INJECTION = 1 << 5
+FILE_INCLUSION = 1 << 6
+EXPRESSION_INJECTION = 1 << 7
+HEADER_INJECTION = 1 << 8
+RATE_EXCEEDED = 1 << 9
+
+# Start of the path of a URL (absolute or not), at the beginning of the raw
+# or decoded text (see ``normalize``), for signatures of root paths only.
+ROOT = r'(?:^|\n)(?:[a-z][a-z0-9+.-]*://[^/\n]*)?/'
+
+# Families set by detectors instead of being matched: they are kept when
+# request logs are completed again.
+DETECTED = RATE_EXCEEDED
+
+Family = collections.namedtuple(
+    'Family', 'bit name verbose_name targets literals regexes')
+
+FAMILIES = (
+    Family(
+        PATH_TRAVERSAL, 'path_traversal', 'Path traversal', TARGETS,
+        literals=(
+            '../', '..\\', '/etc/passwd', '/etc/shadow', '/etc/group',
+            '/etc/hosts', '/etc/issue', '/proc/self/', '/proc/version',
+            'boot.ini', 'win.ini', 'system.ini', 'c:\\windows',
+            'c:/windows', '/windows/system32', '\\windows\\system32',
+            '%c0%ae', '%c1%9c', '%u002e', '%uff0e', '%252e%252e',
+            'web-inf/web.xml', '/.ssh/', 'id_rsa', '/.bash_history',
+        ),
+        regexes=(
+            r'(?:\.|%2e){2}(?:/|\\|%2f|%5c)',
+        )),
+    Family(
+        SQL_INJECTION, 'sql_injection', 'SQL injection', TARGETS,
+        literals=(
+            'information_schema', 'pg_sleep', 'sleep(', 'benchmark(',
+            'waitfor delay', '@@version', 'load_file(', 'into outfile',
+            'into dumpfile', 'xp_cmdshell', 'concat(0x', 'group_concat(',
+            'extractvalue(', 'updatexml(', 'sysobjects', 'syscolumns',
+            'pg_catalog', 'sqlite_master', 'dbms_pipe', 'utl_http',
+            'unhex(', 'char(39)', 'order by 1--', "' or '1'='1",
+            '" or "1"="1', "' or ''='", "admin'--",
+        ),
+        regexes=(
+            r'\bunion\b[\s/*()+]+(?:all[\s/*()+]+|distinct[\s/*()+]+)?'
+            r'select\b',
+            r'[\'"`)]\s*(?:or|and|xor)\s+[\'"\w(]+\s*(?:=|<|>|like\b)',
+            r'\b(?:or|and)\s+\d+\s*=\s*\d+\b',
+            r';\s*(?:drop|delete|insert|update|shutdown|exec|declare)\s',
+            r'\bselect\b[\s(]+(?:\*|null\b|count\(|@@|0x|[\w.]+\s*,\s*\w)',
+            r'[\'"]\s*(?:--|#|/\*)',
+        )),
+    Family(
+        XSS, 'xss', 'Cross-site scripting', TARGETS,
+        literals=(
+            '<script', '</script', 'javascript:', 'vbscript:', 'livescript:',
+            '<iframe', '<frame', '<object', '<embed', '<applet', '<svg',
+            '<img', '<body', '<meta', '<base', '<form', '<isindex',
+            'document.cookie', 'document.domain', 'document.write(',
+            'window.location', 'alert(', 'prompt(', 'confirm(',
+            'fromcharcode', 'expression(', 'srcdoc=', 'onerror=',
+            'onload=', 'onmouseover=', 'onfocus=', 'onanimationstart=',
+            '-moz-binding', 'data:text/html',
+        ),
+        regexes=(
+            r'<[a-z]+[^>]*\bon[a-z]+\s*=',
+            r'\bon(?:error|load|mouseover|focus|toggle|begin)\s*=',
+            r'\beval\s*\(',
+        )),
+    Family(
+        SCANNER_PATH, 'scanner_path', 'Vulnerability scanner path', (URL, ),
+        literals=(
+            '/wp-login.php', '/wp-admin', '/xmlrpc.php', '/wp-config',
+            '/wp-content/plugins/', '/wp-includes/', '/phpmyadmin',
+            '/pma/', '/myadmin', '/mysqladmin', '/dbadmin', '/sqladmin',
+            '/.env', '/.git/', '/.svn/', '/.hg/', '/.bzr/', '/.ds_store',
+            '/.htaccess', '/.htpasswd', '/.aws/', '/.docker', '/.npmrc',
+            '/.vscode/', '/.idea/', '/config.php', '/configuration.php',
+            '/manager/html', '/hnap1', '/boaform', '/gponform',
+            '/setup.cgi', '/solr/admin', '/actuator', '/jmx-console',
+            '/invoker/', '/web-console', '/vendor/phpunit',
+            'eval-stdin.php', '/setup.php', '/install.php', '/shell.php',
+            '/cmd.php', '/c99.php', '/r57.php', '/wso.php', '/webshell',
+            '/server-status', '/server-info', '/telescope/', '/_ignition/',
+            '/debug/default/view', '/mgmt/tm/', '/tmui/', '/dana-na/',
+            '/remote/login', '/sslvpn', '/global-protect/', '/owa/auth',
+            '/autodiscover/', '/ecp/', '/api/jsonws', '/wls-wsat/',
+            '/_async/', '/level/15/', '/latest/meta-data',
+            '169.254.169.254', 'invokefunction', '/think/app',
+            '/console/login', '/elmah.axd', '/trace.axd', '/phpinfo',
+            '/adminer', '/laravel-filemanager',
+            '/storage/logs/', '/druid/', '/nacos/', '/jenkins/script',
+            '/script/groovy', '/cf_scripts/', '/fckeditor', '/ckfinder',
+            '/kcfinder', '/elfinder', '/uploadify', '/timthumb',
+        ),
+        regexes=(
+            r'(?:\.(?:bak|old|orig|save|swp)|~)(?:$|[?#])',
+            r'/(?:backup|dump|db|database|site|www)\.(?:sql|zip|tar)',
+            # Configuration files and test scripts at the root only.
+            ROOT + r'(?:config\.(?:json|yml)|settings\.py|test\.php|'
+            r'info\.php)(?:$|[?#\n])',
+            # Scripts exploited in CGI directories, not any CGI script.
+            r'/cgi-bin/(?:php[\d-]*(?:cgi)?|test-cgi|printenv|luci|'
+            r'bash|sh|nph-\w+)(?:$|[/?#.\n])',
+        )),
+    Family(
+        SCANNER_AGENT, 'scanner_agent', 'Vulnerability scanner user agent',
+        (USER_AGENT, ),
+        literals=(
+            'sqlmap', 'nikto', 'masscan', 'zgrab', 'nuclei', 'dirbuster',
+            'gobuster', 'wfuzz', 'ffuf', 'acunetix', 'netsparker',
+            'w3af', 'openvas', 'nessus', 'qualys', 'wpscan', 'joomscan',
+            'whatweb', 'zmeu', 'morfeus', 'webinspect', 'appscan',
+            'arachni', 'skipfish', 'fimap', 'commix', 'xsser', 'jorgee',
+            'libwww-perl', 'censysinspect', 'l9explore', 'l9tcpid',
+            'expanse', 'nimbostratus', 'project25499', 'internet-measurement',
+            'zmap', 'hello, world', 'mozila/',
+        ),
+        regexes=(
+            r'\b(?:nmap|dirb|burp(?:suite)?|paros|hydra|havij|vega|grabber|'
+            r'owasp|metasploit|zap)\b',
+        )),
+    Family(
+        COMMAND_INJECTION, 'command_injection', 'Command injection',
+        TARGETS,
+        literals=(
+            '() {', '/bin/sh', '/bin/bash', '/bin/busybox', 'cmd.exe',
+            'powershell', '/dev/tcp/', 'nc -e', 'ncat -e', 'chmod 777',
+            'chmod +x', 'base64 -d', '`id`', '$(id)', '$(whoami)',
+            'shell_exec(', 'passthru(', 'proc_open(', 'popen(',
+            'phpinfo(', 'die(md5', 'print(md5', 'system(', 'exec(',
+            'assert(', 'create_function', 'call_user_func', 'wget http',
+            'curl http', 'tftp -', 'mkfifo', 'rm -rf',
+        ),
+        regexes=(
+            r'(?:[;|`]|&&)\s*(?:id|uname|whoami|ls|cat|wget|curl|nc|bash|sh|'
+            r'ping|nslookup|echo|sleep|busybox|chmod)\b(?!\s*=)',
+            r'\bcmd=(?:id|uname|whoami|ls|cat|wget|curl|nc|bash|sh|ping|'
+            r'echo|pwd|ifconfig|ipconfig|net|dir|type)\b',
+        )),
+    Family(
+        FILE_INCLUSION, 'file_inclusion', 'File inclusion', TARGETS,
+        literals=(
+            'php://', 'file://', 'expect://', 'data://', 'zip://',
+            'phar://', 'glob://', 'ogg://', 'dict://', 'gopher://',
+            'jar:http', 'jar:file', 'allow_url_include', 'auto_prepend_file',
+            'auto_append_file', 'input_file=',
+        ),
+        regexes=(
+            r'\b(?:page|file|include|inc|path|template|doc|document|folder|'
+            r'root|pg|style|pdf|cat|dir|action|board|date|detail|download|'
+            r'prefix|mod|conf|show|view|site|content|layout|module)='
+            # Remote scripts (or URLs truncated by a trailing '?' or null
+            # byte), not any URL passed as a parameter.
+            r'(?:https?|ftp)://[^&#\s]*?(?:\.(?:txt|php\d?|phtml|inc|sh|'
+            r'pl|cgi)|\?|%00|\x00)(?:$|[?&#\n])',
+        )),
+    Family(
+        EXPRESSION_INJECTION, 'expression_injection',
+        'Expression injection (Log4Shell, templates, OGNL)', TARGETS,
+        literals=(
+            '${jndi:', '${lower:', '${upper:', '${env:', '${sys:',
+            '${java:', '${date:', '${::-', '{{7*7}}', '{{config',
+            '{{self', '{{request', '${7*7}', '#{7*7}', '<%= 7*7',
+            '%{(', '@java.lang', 'java.lang.runtime', 'ognl',
+            'class.module.classloader',
+            '__class__', '__globals__', '__builtins__', '__import__',
+        ),
+        regexes=(
+            r'\$\{[^}]*\$\{',
+            r'\$\{\s*(?:jndi|ldap|rmi|dns)\b',
+        )),
+    Family(
+        HEADER_INJECTION, 'header_injection',
+        'Header or null byte injection', TARGETS,
+        literals=(
+            '%0d%0a', '\r\n', '%00', '\x00', 'set-cookie:',
+        ),
+        regexes=()),
+    Family(
+        RATE_EXCEEDED, 'rate_exceeded', 'Request rate exceeded', (),
+        literals=(), regexes=()),
+)
+
+FAMILIES_BY_BIT = collections.OrderedDict(
+    (family.bit, family) for family in FAMILIES)
+FAMILIES_BY_NAME = collections.OrderedDict(
+    (family.name, family) for family in FAMILIES)
+
+
+def get_families(mask):
+    """
+    Return the families of a bitmask.
+
+    Args:
+        mask (int): the bitmask of families.
+
+    Returns:
+        list: the families (Family tuples) whose bit is set.
+    """
+    if not mask:
+        return []
+    return [family for family in FAMILIES if mask & family.bit]
+
+
+def normalize(text):
+    """
+    Normalize a text before matching.
+
+    The text is lower-cased. When it contains encoded characters, the text
+    decoded twice is appended to it (after a newline), so that both the raw
+    and the decoded forms are matched.
+
+    Args:
+        text (str): the text.
+
+    Returns:
+        str: the normalized text.
+    """
+    text = text.lower()
+    if '%' in text or '+' in text:
+        decoded = unquote_plus(unquote(text)).lower()
+        if decoded != text:
+            text = '%s\n%s' % (text, decoded)
+    return text
+
+
+class Matcher(object):
+    """Compiled signatures of the families matched against a field."""
+
+    def __init__(self, families=FAMILIES, cache_size=CACHE_SIZE):
+        """
+        Init method.
+
+        Args:
+            families (list): the families.
+            cache_size (int): the number of cached results (0 to disable
+                the cache).
+        """
+        self.families = tuple(families)
+        self.automaton = None
+        if ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for family in self.families:
+                for literal in family.literals:
+                    self.automaton.add_word(literal, self.automaton.get(
+                        literal, 0) | family.bit)
+            if len(self.automaton):
+                self.automaton.make_automaton()
+            else:
+                self.automaton = None
+        patterns = {}
+        for family in self.families:
+            family_patterns = list(family.regexes)
+            if ahocorasick is None:
+                family_patterns.extend(map(re.escape, family.literals))
+            if family_patterns:
+                patterns[family.bit] = family_patterns
+        self.regexes = [(bit, re.compile('|'.join(
+            '(?:%s)' % pattern for pattern in family_patterns)))
+            for bit, family_patterns in patterns.items()]
+        self.prefilter = None
+        if patterns:
+            self.prefilter = re.compile('|'.join(
+                '(?:%s)' % pattern for family_patterns in patterns.values()
+                for pattern in family_patterns))
+        if cache_size:
+            self.match = functools.lru_cache(maxsize=cache_size)(self.match)
+
+    def match(self, text):
+        """
+        Match a text.
+
+        Args:
+            text (str): the text.
+
+        Returns:
+            int: the bitmask of the matched families.
+        """
+        if not text:
+            return 0
+        text = normalize(text)
+        mask = 0
+        if self.automaton is not None:
+            for _, bits in self.automaton.iter(text):
+                mask |= bits
+        if self.prefilter is None or self.prefilter.search(text) is None:
+            return mask
+        for bit, regex in self.regexes:
+            if not mask & bit and regex.search(text) is not None:
+                mask |= bit
+        return mask
+
+
+_matchers = {}
+
+
+def get_matcher(target):
+    """
+    Return the compiled signatures of a field (compiled on first call).
+
+    Args:
+        target (str): ``url``, ``user_agent`` or ``referrer``.
+
+    Returns:
+        Matcher: the matcher.
+    """
+    matcher = _matchers.get(target, None)
+    if matcher is None:
+        matcher = _matchers[target] = Matcher(
+            family for family in FAMILIES if target in family.targets)
+    return matcher
+
+
+def match(url=None, user_agent=None, referrer=None):
+    """
+    Match the fields of a request log against the signatures.
+
+    Args:
+        url (str): the URL, or the request line if it could not be parsed.
+        user_agent (str): the user agent.
+        referrer (str): the referrer.
+
+    Returns:
+        int: the bitmask of the matched families (0 if nothing matched).
+    """
+    mask = 0
+    if url:
+        mask |= get_matcher(URL).match(url)
+    if user_agent:
+        mask |= get_matcher(USER_AGENT).match(user_agent)
+    if referrer and referrer != '-':
+        mask |= get_matcher(REFERRER).match(referrer)
+    return mask
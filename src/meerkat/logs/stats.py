@@ -10,15 +10,42 @@ Typically, these data will be used in series for Highcharts charts.
 from collections import Counter
 from datetime import datetime
 
+from django.db.models import Case, Count, Max, Min, Q, Sum, When
+from django.db.models.functions import Trunc
 from django.utils.timezone import make_naive
 
+from ..apps import AppSettings
 from ..utils.time import ms_since_epoch
 from ..utils.url import (
     ASSET, COMMON_ASSET, FALSE_NEGATIVE, IGNORED, OLD_ASSET, OLD_PROJECT,
     PROJECT, SUSPICIOUS, URL_TYPE, URL_TYPE_REVERSE, url_is_asset,
     url_is_common_asset, url_is_false_negative, url_is_ignored,
     url_is_old_project, url_is_project)
-from .models import RequestLog
+from .columnar import get_columnar_logs, np
+from .dimensions import count_texts, text_hash
+from .models import (
+    HeavyHitter, IngestionState, LatencyDigest, RequestLog,
+    UniqueVisitorsSketch)
+
+app_settings = AppSettings()
+
+
+def ingestion_watermark():
+    """
+    Get a value that changes whenever ingested data changes.
+
+    It is built from the last request log ID and from the version of the
+    aggregated tables, incremented each time the collectors write them
+    (which can happen after the request logs themselves). Both are read
+    with an index lookup.
+
+    Returns:
+        str: the watermark.
+    """
+    return '%s-%s' % (
+        RequestLog.objects.order_by('-id').values_list(
+            'id', flat=True).first(),
+        IngestionState.get_value(IngestionState.VERSION))
 
 
 def status_codes_stats():
@@ -31,123 +58,346 @@ def status_codes_stats():
     Returns:
         dict: status code as key, number of apparition as value.
     """
+    if app_settings.logs_columnar_engine:
+        return get_columnar_logs().group_count('status_code')
     return dict(Counter(list(RequestLog.objects.values_list(
         'status_code', flat=True))))  # noqa
 
 
-def status_codes_by_date_stats():
+BUCKET_SIZES = (
+    60, 5 * 60, 15 * 60, 30 * 60, 3600, 3 * 3600, 6 * 3600, 12 * 3600,
+    86400, 7 * 86400)
+
+
+def bucket_size(start, end, points):
+    """
+    Choose the smallest bucket size giving at most a number of points.
+
+    Args:
+        start (datetime): beginning of the range.
+        end (datetime): end of the range.
+        points (int): maximum number of points.
+
+    Returns:
+        int: the bucket size in seconds (one week at most).
+    """
+    seconds = (end - start).total_seconds()
+    for size in BUCKET_SIZES:
+        if seconds / size <= points:
+            return size
+    return BUCKET_SIZES[-1]
+
+
+def datetime_range():
+    """
+    Get the datetimes of the first and last request logs.
+
+    Returns:
+        tuple: first and last datetimes (None if there are no logs).
+    """
+    limits = RequestLog.objects.aggregate(Min('datetime'), Max('datetime'))
+    return limits['datetime__min'], limits['datetime__max']
+
+
+ATTACK_STATUS_CODES = (400, 444, 502)
+
+# Number of request logs of each type of status code, as aggregates:
+# 5xx includes greater codes, and attacks match signatures or status codes.
+STATUS_CODE_COUNTS = {
+    'count_2xx': Count(Case(When(
+        status_code__gte=200, status_code__lt=300, then=1))),
+    'count_3xx': Count(Case(When(
+        status_code__gte=300, status_code__lt=400, then=1))),
+    'count_4xx': Count(Case(When(
+        status_code__gte=400, status_code__lt=500, then=1))),
+    'count_5xx': Count(Case(When(status_code__gte=500, then=1))),
+    'count_attacks': Count(Case(When(
+        Q(signatures__gt=0) | Q(status_code__in=ATTACK_STATUS_CODES),
+        then=1))),
+}
+STATUS_CODE_TYPES = (
+    ('count_2xx', 200), ('count_3xx', 300), ('count_4xx', 400),
+    ('count_5xx', 500), ('count_attacks', 'attacks'))
+
+
+def status_codes_by_date_stats(start=None, end=None, bucket=86400):
     """
     Get stats for status codes by date.
 
+    Attacks are the requests matching attack signatures (see
+    ``meerkat.logs.signatures``), or resulting in status codes 400, 444 or
+    502.
+
+    Args:
+        start (datetime): first datetime to include (default: no limit).
+        end (datetime): datetime limit, excluded (default: no limit).
+        bucket (int): the size of the time buckets in seconds
+            (default: one day). Buckets are aligned on local time.
+
     Returns:
         list: status codes + date grouped by type: 2xx, 3xx, 4xx, 5xx, attacks.
     """
+    if app_settings.logs_columnar_engine:
+        return _columnar_status_codes_by_date_stats(start, end, bucket)
 
-    def date_counter(queryset):
-        return dict(Counter(map(
-            lambda dt: ms_since_epoch(datetime.combine(
-                make_naive(dt), datetime.min.time())),
-            list(queryset.values_list('datetime', flat=True)))))
-
-    codes = {low: date_counter(
-        RequestLog.objects.filter(status_code__gte=low, status_code__lt=high))
-        for low, high in ((200, 300), (300, 400), (400, 500))}
-    codes[500] = date_counter(RequestLog.objects.filter(status_code__gte=500))
-    codes['attacks'] = date_counter(RequestLog.objects.filter(
-        status_code__in=(400, 444, 502)))
+    queryset = RequestLog.objects.all()
+    if start is not None:
+        queryset = queryset.filter(datetime__gte=start)
+    if end is not None:
+        queryset = queryset.filter(datetime__lt=end)
 
+    # Count in SQL per local minute, hour or day, then sum in buckets.
+    if bucket % 86400 == 0:
+        kind = 'day'
+    elif bucket % 3600 == 0:
+        kind = 'hour'
+    else:
+        kind = 'minute'
+    epoch = datetime(1970, 1, 1)
     stats = {}
-    for code in (200, 300, 400, 500, 'attacks'):
-        for date, count in codes[code].items():
-            if stats.get(date, None) is None:
-                stats[date] = {200: 0, 300: 0, 400: 0, 500: 0, 'attacks': 0}
-            stats[date][code] += count
+    for row in queryset.annotate(period=Trunc('datetime', kind)).values(
+            'period').annotate(**STATUS_CODE_COUNTS).order_by():
+        if row['period'] is None or not any(
+                row[name] for name in STATUS_CODE_COUNTS):
+            continue
+        seconds = (make_naive(row['period']) - epoch).total_seconds()
+        key = (seconds - seconds % bucket) * 1000
+        counts = stats.get(key, None)
+        if counts is None:
+            counts = stats[key] = {
+                200: 0, 300: 0, 400: 0, 500: 0, 'attacks': 0}
+        for name, code_type in STATUS_CODE_TYPES:
+            counts[code_type] += row[name]
 
     stats = sorted([(k, v) for k, v in stats.items()], key=lambda x: x[0])
     return stats
 
 
-def most_visited_pages_stats():
+def _columnar_status_codes_by_date_stats(start, end, bucket):
+    logs = get_columnar_logs()
+    if start is not None or end is not None:
+        logs = logs.filter(logs.between(
+            'timestamp',
+            start.timestamp() if start is not None else None,
+            end.timestamp() if end is not None else None))
+    local = logs.local_timestamps()
+    keys = local - local % bucket
+    masks = (
+        (200, logs.between('status_code', 200, 300)),
+        (300, logs.between('status_code', 300, 400)),
+        (400, logs.between('status_code', 400, 500)),
+        (500, logs.between('status_code', 500)),
+        ('attacks', (logs['signatures'] > 0) |
+         logs.isin('status_code', ATTACK_STATUS_CODES)))
+
+    stats = {}
+    for code_type, mask in masks:
+        values, counts = np.unique(keys[mask], return_counts=True)
+        for key, count in zip(values.tolist(), counts.tolist()):
+            if key not in stats:
+                stats[key] = {200: 0, 300: 0, 400: 0, 500: 0, 'attacks': 0}
+            stats[key][code_type] = count
+
+    return [(key * 1000, stats[key]) for key in sorted(stats)]
+
+
+def get_url_type(url):
     """
-    Get stats for most visited pages.
+    Get the type of a URL.
 
     Args:
-        logs (list): logs data to use.
+        url (str): the URL.
 
     Returns:
-        dict: more_than_10 and less_than_10: list of dict (bound + url list).
+        int: the URL type (see ``meerkat.utils.url.URL_TYPE``).
+    """
+    if url_is_project(url):
+        return ASSET if url_is_asset(url) else PROJECT
+    if url_is_asset(url):
+        return OLD_ASSET
+    if url_is_common_asset(url):
+        return COMMON_ASSET
+    if url_is_old_project(url):
+        return OLD_PROJECT
+    if url_is_false_negative(url):
+        return FALSE_NEGATIVE
+    return SUSPICIOUS
+
+
+def most_visited_pages_stats():
     """
-    stats = {'more_than_10': [], 'less_than_10': {}}
+    Get stats for most visited pages.
+
+    URLs visited at least 100 times are listed by bound (10000, 1000 and
+    100 visits) with their type, the other ones are only counted by type.
 
-    counter = Counter(list(RequestLog.objects.values_list('url', flat=True)))
-    most_visited_pages = counter.most_common()
-    bounds = (10000, 1000, 100, 10)
+    Returns:
+        dict: more_than_10 (list of dict: bound and list of [url, count,
+            type]) and less_than_10 (distinct URLs and total visits by
+            type).
+    """
+    if app_settings.logs_columnar_engine:
+        counter = Counter(get_columnar_logs().group_count('url'))
+    else:
+        counter = count_texts(RequestLog.objects.all(), 'url')
+    bounds = (10000, 1000, 100)
     subsets = [[] for _ in bounds]
+    occurrences = {name: {'distinct': 0, 'total': 0}
+                   for name in set(URL_TYPE.keys()) - {IGNORED}}
 
-    for u, c in most_visited_pages:
+    for u, c in counter.most_common():
         if url_is_ignored(u):
             continue
-        if c >= bounds[0]:
-            subsets[0].append([u, c])
-        elif c < bounds[-1]:
-            subsets[-1].append([u, c])
+        for bound, subset in zip(bounds, subsets):
+            if c >= bound:
+                subset.append([u, c, get_url_type(u)])
+                break
         else:
-            for i, bound in enumerate(bounds[:-1]):
-                if bound > c >= bounds[i+1]:
-                    subsets[i+1].append([u, c])
-                    break
-
-    stats['more_than_10'] = [
-        {'bound': bound, 'subset': subset}
-        for bound, subset in zip(bounds[:-1], subsets[:-1])]
-
-    for subset in subsets[:-1]:
-        for uc in subset:
-            if url_is_project(uc[0]):
-                if url_is_asset(uc[0]):
-                    uc.append(ASSET)
-                else:
-                    uc.append(PROJECT)
-            else:
-                if url_is_asset(uc[0]):
-                    uc.append(OLD_ASSET)
-                elif url_is_common_asset(uc[0]):
-                    uc.append(COMMON_ASSET)
-                elif url_is_old_project(uc[0]):
-                    uc.append(OLD_PROJECT)
-                elif url_is_false_negative(uc[0]):
-                    uc.append(FALSE_NEGATIVE)
-                else:
-                    uc.append(SUSPICIOUS)
+            occurrence = occurrences[get_url_type(u)]
+            occurrence['distinct'] += 1
+            occurrence['total'] += c
 
-    occurrences = {name: {'distinct': 0, 'total': 0}
-                   for name in set(URL_TYPE.keys()) - {IGNORED}}
+    return {
+        'more_than_10': [{'bound': bound, 'subset': subset}
+                         for bound, subset in zip(bounds, subsets)],
+        'less_than_10': occurrences}
 
-    for u, c in subsets[-1]:
-        if url_is_project(u):
-            if url_is_asset(u):
-                occurrences[ASSET]['distinct'] += 1
-                occurrences[ASSET]['total'] += c
-            else:
-                occurrences[PROJECT]['distinct'] += 1
-                occurrences[PROJECT]['total'] += c
+
+def _visitors_sketches(start, end, host, url):
+    # The sketches of a host and URL (see UniqueVisitorsSketch) in a range.
+    queryset = UniqueVisitorsSketch.objects.all()
+    if url:
+        queryset = queryset.filter(url_hash=text_hash(url))
+        if host:
+            queryset = queryset.filter(host=host)
+    else:
+        queryset = queryset.filter(host=host, url_hash=text_hash(''))
+    if start is not None:
+        queryset = queryset.filter(date__gte=start)
+    if end is not None:
+        queryset = queryset.filter(date__lte=end)
+    return queryset
+
+
+def _merge_sketches(queryset):
+    # The union of all the sketches (None if there are none), and the
+    # estimate of the union of each day, as (date, estimate) pairs.
+    total = None
+    by_date = []
+    current_date, current = None, None
+    for obj in queryset.order_by('date').iterator():
+        sketch = obj.sketch
+        if total is None:
+            total = obj.sketch
         else:
-            if url_is_asset(u):
-                occurrences[OLD_ASSET]['distinct'] += 1
-                occurrences[OLD_ASSET]['total'] += c
-            elif url_is_common_asset(u):
-                occurrences[COMMON_ASSET]['distinct'] += 1
-                occurrences[COMMON_ASSET]['total'] += c
-            elif url_is_old_project(u):
-                occurrences[OLD_PROJECT]['distinct'] += 1
-                occurrences[OLD_PROJECT]['total'] += c
-            elif url_is_false_negative(u):
-                occurrences[FALSE_NEGATIVE]['distinct'] += 1
-                occurrences[FALSE_NEGATIVE]['total'] += c
-            else:
-                occurrences[SUSPICIOUS]['distinct'] += 1
-                occurrences[SUSPICIOUS]['total'] += c
+            total.merge(sketch)
+        if obj.date != current_date:
+            if current is not None:
+                by_date.append((current_date, current.count()))
+            current_date, current = obj.date, sketch
+        else:
+            current.merge(sketch)
+    if current is not None:
+        by_date.append((current_date, current.count()))
+    return total, by_date
 
-    stats['less_than_10'] = occurrences
 
+def unique_visitors_stats(start=None, end=None, host='', url=''):
+    """
+    Get stats for unique visitors, estimated with HyperLogLog sketches.
+
+    Args:
+        start (date): first day to include (default: no lower limit).
+        end (date): last day to include (default: no upper limit).
+        host (str): only count visitors of this host ('' for all hosts).
+        url (str): only count visitors of this URL ('' for all URLs).
+
+    Returns:
+        dict: by_date (list of date/estimate pairs), total (estimate over
+            the whole range) and error (relative standard error).
+    """
+    total, by_date = _merge_sketches(
+        _visitors_sketches(start, end, host, url))
+    if total is None:
+        return {'by_date': [], 'total': 0, 'error': 0}
+    return {
+        'by_date': [(ms_since_epoch(datetime.combine(d, datetime.min.time())),
+                     c) for d, c in by_date],
+        'total': total.count(),
+        'error': total.error}
+
+
+def heavy_hitters_stats(since=None, limit=50):
+    """
+    Get the top IP addresses, URLs and user agents.
+
+    Args:
+        since (datetime): aggregate the windows starting from this datetime
+            (default: only the last window).
+        limit (int): number of items to return for each dimension.
+
+    Returns:
+        dict: since (datetime) and, for each dimension, a list of
+            (value, count, error) tuples by decreasing count.
+    """
+    if since is None:
+        since = HeavyHitter.objects.aggregate(
+            Max('window_start'))['window_start__max']
+    stats = {'since': since}
+    for dimension, _ in HeavyHitter.DIMENSIONS:
+        stats[dimension] = []
+    if since is None:
+        return stats
+    queryset = HeavyHitter.objects.filter(window_start__gte=since)
+    for dimension, _ in HeavyHitter.DIMENSIONS:
+        stats[dimension] = list(queryset.filter(
+            dimension=dimension
+        ).values('value').annotate(
+            total=Sum('count'), total_error=Sum('error')
+        ).order_by('-total').values_list(
+            'value', 'total', 'total_error')[:limit])
+    return stats
+
+
+def latency_stats(start=None, end=None, limit=50):
+    """
+    Get request time and response size quantiles per endpoint.
+
+    Args:
+        start (datetime): first hour to include (default: no lower limit).
+        end (datetime): last hour to include (default: no upper limit).
+        limit (int): number of endpoints to return, by decreasing count.
+
+    Returns:
+        list: dicts with endpoint ('' for all endpoints), count, time
+            (p50, p95, p99 in milliseconds) and size (p50, p95, p99 in bytes).
+    """
+    queryset = LatencyDigest.objects.all()
+    if start is not None:
+        queryset = queryset.filter(hour__gte=start)
+    if end is not None:
+        queryset = queryset.filter(hour__lte=end)
+
+    endpoints = list(queryset.exclude(endpoint='').values(
+        'endpoint').annotate(total=Sum('count')).order_by(
+        '-total').values_list('endpoint', flat=True)[:limit])
+
+    stats = []
+    for endpoint in [''] + endpoints:
+        count, request_time, bytes_sent = 0, None, None
+        for obj in queryset.filter(endpoint=endpoint).iterator():
+            count += obj.count
+            if request_time is None:
+                request_time = obj.request_time_digest
+                bytes_sent = obj.bytes_sent_digest
+            else:
+                request_time.merge(obj.request_time_digest)
+                bytes_sent.merge(obj.bytes_sent_digest)
+        if not count:
+            continue
+        stats.append({
+            'endpoint': endpoint,
+            'count': count,
+            'time': [request_time.quantile(q) for q in (0.5, 0.95, 0.99)],
+            'size': [bytes_sent.quantile(q) for q in (0.5, 0.95, 0.99)]})
     return stats
@@ -5,15 +5,19 @@
 from django.conf.urls import url
 
 from .views import (
-    LogsMenu, LogsMostVisitedPages, LogsStatusCodes, LogsStatusCodesByDate)
+    LogsHeavyHitters, LogsLatency, LogsLive, LogsMenu, LogsMostVisitedPages,
+    LogsStatusCodes, LogsStatusCodesByDate, LogsUniqueVisitors, box_data,
+    live_stream, status_codes_by_date_data)
 
 
-def logs_urlpatterns(admin_view=lambda x: x):
+def logs_urlpatterns(admin_view=lambda x, cacheable=False: x):
     """
     Return the URL patterns for the logs views.
 
     Args:
         admin_view (callable): admin_view method from an AdminSite instance.
+            Data views are wrapped with ``cacheable=True`` so that browsers
+            can revalidate them with their ETag.
 
     Returns:
         list: the URL patterns for the logs views.
@@ -28,9 +32,30 @@ def logs_urlpatterns(admin_view=lambda x: x):
         url(r'^status_codes_by_date$',
             admin_view(LogsStatusCodesByDate.as_view()),
             name='logs_status_codes_by_date'),
+        url(r'^status_codes_by_date/data$',
+            admin_view(status_codes_by_date_data, cacheable=True),
+            name='logs_status_codes_by_date_data'),
         url(r'^most_visited_pages$',
             admin_view(LogsMostVisitedPages.as_view()),
-            name='logs_most_visited_pages')
+            name='logs_most_visited_pages'),
+        url(r'^unique_visitors$',
+            admin_view(LogsUniqueVisitors.as_view()),
+            name='logs_unique_visitors'),
+        url(r'^heavy_hitters$',
+            admin_view(LogsHeavyHitters.as_view()),
+            name='logs_heavy_hitters'),
+        url(r'^latency$',
+            admin_view(LogsLatency.as_view()),
+            name='logs_latency'),
+        url(r'^live$',
+            admin_view(LogsLive.as_view()),
+            name='logs_live'),
+        url(r'^live/stream$',
+            admin_view(live_stream),
+            name='logs_live_stream'),
+        url(r'^box/(?P<name>\w+)$',
+            admin_view(box_data, cacheable=True),
+            name='logs_box_data')
     ]
 
 
@@ -2,21 +2,96 @@
 
 """Views for logs submodule."""
 
+import hashlib
+import re
+from functools import wraps
+
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, JsonResponse,
+    StreamingHttpResponse)
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.text import compress_string
+from django.utils.timezone import make_aware
+from django.utils.translation import get_language
 from django.utils.translation import ugettext_lazy as _
+from django.views.decorators.http import condition
 
 from suit_dashboard import Column, Grid, Row
 
-from ..views import HomeView
+from ..apps import AppSettings
+from ..utils.time import datetime_from_ms
+from ..views import HomeView, LazyGrid
+from . import metrics
 from .boxes import (
-    BoxLogsLinks, BoxLogsMostVisitedPages, BoxLogsMostVisitedPagesLegend,
-    BoxLogsStatusCodes, BoxLogsStatusCodesByDate)
+    BoxLogsHeavyHitters, BoxLogsLatency, BoxLogsLinks, BoxLogsLive,
+    BoxLogsMostVisitedPages, BoxLogsMostVisitedPagesLegend,
+    BoxLogsStatusCodes, BoxLogsStatusCodesByDate, BoxLogsUniqueVisitors)
+from .charts import status_codes_by_date_series
+from .live import event_stream
+from .stats import ingestion_watermark
+
+app_settings = AppSettings()
+
+re_accepts_gzip = re.compile(r'\bgzip\b')
+
+ASYNC_BOXES = {box.name: box for box in (
+    BoxLogsHeavyHitters, BoxLogsLatency, BoxLogsMostVisitedPages,
+    BoxLogsStatusCodes, BoxLogsStatusCodesByDate, BoxLogsUniqueVisitors)}
+
+
+def _accepts_gzip(request):
+    return bool(re_accepts_gzip.search(
+        request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+
+def _data_etag(request, *args, **kwargs):
+    key = '|'.join((request.path, request.GET.urlencode(),
+                    get_language() or '', ingestion_watermark()))
+    etag = hashlib.md5(key.encode('utf-8')).hexdigest()  # nosec
+    if _accepts_gzip(request):
+        etag += '-gzip'
+    return '"%s"' % etag
+
+
+def data_view(func):
+    """
+    Decorator for JSON data views.
+
+    The response gets a strong ETag built from the ingestion watermark, so
+    that requests with a matching If-None-Match header get a 304 response
+    without computing anything. Content is gzipped if the client accepts it
+    (with a distinct ETag, so that the ETag stays strong), and clients must
+    revalidate it on each use.
+
+    Args:
+        func (callable): the view function.
+
+    Returns:
+        callable: the decorated view.
+    """
+    conditional_func = condition(etag_func=_data_etag)(func)
+
+    @wraps(func)
+    def inner(request, *args, **kwargs):
+        response = conditional_func(request, *args, **kwargs)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        patch_cache_control(response, private=True, no_cache=True)
+        if response.status_code == 200 and _accepts_gzip(request):
+            response.content = compress_string(response.content)
+            response['Content-Encoding'] = 'gzip'
+            response['Content-Length'] = str(len(response.content))
+        return response
+
+    return inner
 
 
 class LogsMenu(HomeView):
     """View for logs menu."""
 
     crumbs = ({'name': 'Logs analysis', 'url': 'admin:logs'}, )
-    grid = Grid(Row(Column(BoxLogsLinks())))
+    grid = LazyGrid(lambda: Grid(Row(Column(BoxLogsLinks()))))
 
 
 class LogsStatusCodes(LogsMenu):
@@ -25,7 +100,8 @@ class LogsStatusCodes(LogsMenu):
     crumbs = (
         {'name': _('Status codes'), 'url': 'admin:logs_status_codes'},
     )
-    grid = Grid(Row(Column(BoxLogsLinks(), BoxLogsStatusCodes())))
+    grid = LazyGrid(lambda: Grid(
+        Row(Column(BoxLogsLinks(), BoxLogsStatusCodes()))))
 
 
 class LogsStatusCodesByDate(LogsMenu):
@@ -33,8 +109,55 @@ class LogsStatusCodesByDate(LogsMenu):
 
     crumbs = ({'name': _('Status codes by date'),
                'url': 'admin:logs_status_code_by_date'},)
-    grid = Grid(Row(Column(BoxLogsLinks())),
-                Row(Column(BoxLogsStatusCodesByDate())))
+    grid = LazyGrid(lambda: Grid(Row(Column(BoxLogsLinks())),
+                                 Row(Column(BoxLogsStatusCodesByDate()))))
+
+
+@data_view
+def box_data(request, name):
+    """
+    Return the rendered content of an asynchronous box, in JSON.
+
+    Args:
+        request (HttpRequest): the request.
+        name (str): the name of the box.
+
+    Returns:
+        JsonResponse: the box content HTML.
+    """
+    box_class = ASYNC_BOXES.get(name, None)
+    if box_class is None:
+        raise Http404
+    html = render_to_string(
+        'meerkat/widgets/box_content.html', {'box': box_class()}, request)
+    return JsonResponse({'html': html})
+
+
+@data_view
+def status_codes_by_date_data(request):
+    """
+    Return the status codes by date series for a range, in JSON.
+
+    The start and end GET parameters are milliseconds since epoch, in local
+    time, as given by Highcharts when zooming. Without them, the whole range
+    is returned. Local times which are ambiguous or do not exist, because of
+    daylight saving time changes, are read as standard time.
+
+    Args:
+        request (HttpRequest): the request.
+
+    Returns:
+        JsonResponse: bucket size, codes_data and attacks_data series.
+    """
+    try:
+        start, end = (
+            make_aware(datetime_from_ms(float(request.GET[name])),
+                       is_dst=False)
+            if request.GET.get(name) else None
+            for name in ('start', 'end'))
+    except (OverflowError, ValueError):
+        return HttpResponseBadRequest()
+    return JsonResponse(status_codes_by_date_series(start, end))
 
 
 class LogsMostVisitedPages(LogsMenu):
@@ -42,6 +165,115 @@ class LogsMostVisitedPages(LogsMenu):
 
     crumbs = ({'name': _('Most visited pages'),
                'url': 'admin:logs_most_visited_pages'}, )
-    grid = Grid(Row(Column(BoxLogsLinks(), width=5),
-                    Column(BoxLogsMostVisitedPagesLegend(), width=7)),
-                Row(Column(BoxLogsMostVisitedPages())))
+    grid = LazyGrid(lambda: Grid(
+        Row(Column(BoxLogsLinks(), width=5),
+            Column(BoxLogsMostVisitedPagesLegend(), width=7)),
+        Row(Column(BoxLogsMostVisitedPages()))))
+
+
+class LogsUniqueVisitors(LogsMenu):
+    """View for unique visitors."""
+
+    crumbs = ({'name': _('Unique visitors'),
+               'url': 'admin:logs_unique_visitors'}, )
+    grid = LazyGrid(lambda: Grid(Row(Column(BoxLogsLinks())),
+                                 Row(Column(BoxLogsUniqueVisitors()))))
+
+
+class LogsHeavyHitters(LogsMenu):
+    """View for heavy hitters."""
+
+    crumbs = ({'name': _('Heavy hitters'),
+               'url': 'admin:logs_heavy_hitters'}, )
+    grid = LazyGrid(lambda: Grid(Row(Column(BoxLogsLinks())),
+                                 Row(Column(BoxLogsHeavyHitters()))))
+
+
+class LogsLatency(LogsMenu):
+    """View for request time and response size quantiles."""
+
+    crumbs = ({'name': _('Latency'), 'url': 'admin:logs_latency'}, )
+    grid = LazyGrid(lambda: Grid(Row(Column(BoxLogsLinks())),
+                                 Row(Column(BoxLogsLatency()))))
+
+
+class LogsLive(LogsMenu):
+    """View for the live tail of request logs."""
+
+    crumbs = ({'name': _('Live requests'), 'url': 'admin:logs_live'}, )
+    grid = LazyGrid(lambda: Grid(Row(Column(BoxLogsLinks())),
+                                 Row(Column(BoxLogsLive()))))
+
+
+def live_stream(request):
+    """
+    Stream the new request logs as Server-Sent Events.
+
+    The status GET parameter is a comma-separated list of status classes
+    (for example ``4,5``), host and ip GET parameters filter on exact values.
+    The Last-Event-ID header sent by reconnecting browsers is used to resume
+    the stream without losing request logs still in the buffer.
+
+    Args:
+        request (HttpRequest): the request.
+
+    Returns:
+        StreamingHttpResponse: the event stream.
+    """
+    try:
+        status = [int(s) for s in request.GET.get('status', '').split(',')
+                  if s.strip()]
+    except ValueError:
+        return HttpResponseBadRequest()
+    response = StreamingHttpResponse(
+        event_stream(request.META.get('HTTP_LAST_EVENT_ID'), status=status,
+                     host=request.GET.get('host', '').strip(),
+                     ip=request.GET.get('ip', '').strip()),
+        content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Prevent proxies from buffering events (see also
+    # meerkat.middleware.GZipMiddleware).
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def metrics_data(request):
+    """
+    Return the ingestion metrics in Prometheus text format.
+
+    Args:
+        request (HttpRequest): the request.
+
+    Returns:
+        HttpResponse: the metrics.
+    """
+    return HttpResponse(
+        metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def metrics_view(admin_view):
+    """
+    Build the metrics view, protected by an admin site.
+
+    Scrapers which cannot log in can instead send the value of the
+    MEERKAT_LOGS_METRICS_TOKEN setting in an ``Authorization: Bearer``
+    header.
+
+    Args:
+        admin_view (callable): admin_view method from an AdminSite instance.
+
+    Returns:
+        callable: the view.
+    """
+    protected_view = admin_view(metrics_data)
+
+    def view(request):
+        token = app_settings.logs_metrics_token
+        if token and constant_time_compare(
+                request.META.get('HTTP_AUTHORIZATION', ''),
+                'Bearer %s' % token):
+            return metrics_data(request)
+        return protected_view(request)
+
+    return view
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+
+"""
+Visits (sessions).
+
+A visit is a sequence of requests sent by the same visitor, a client IP
+address with a user agent, without inactivity longer than a timeout
+(MEERKAT_LOGS_VISITS_TIMEOUT setting, 30 minutes by default). Request logs
+are read in datetime order and fed to a ``Sessionizer``, which only keeps
+the active sessions in memory: a session is closed as soon as the stream
+is past its end plus the timeout.
+
+Visits are updated incrementally, from the request logs created since the
+last update (``update_visits``): sessions still active at the end of an
+update are saved as open visits, and resumed by the next update. They can
+also be rebuilt from scratch (``rebuild_visits``), by partitions of client
+IP addresses which can be processed in parallel, since visits never mix
+IP addresses.
+"""
+
+import collections
+import datetime
+
+from django.db import transaction
+from django.db.models import Max, Min, Q
+
+from ..apps import AppSettings
+from ..utils.db import bulk_update
+from ..utils.hyperloglog import hash64
+from .dimensions import texts
+
+app_settings = AppSettings()
+
+LOG_FIELDS = ('id', 'client_ip_address', 'user_agent_text', 'datetime',
+              'url_text', 'bytes_sent')
+VISIT_FIELDS = ('client_ip_address', 'user_agent_hash', 'user_agent', 'start',
+                'end', 'hits', 'bytes_sent', 'entry_url', 'exit_url',
+                'last_log_id', 'closed')
+
+
+def user_agent_hash(user_agent):
+    """
+    Hash a user agent to a signed 64-bits integer.
+
+    Args:
+        user_agent (str): the user agent.
+
+    Returns:
+        int: the 63-bits hash (fits in a big integer column).
+    """
+    return hash64(user_agent or '') >> 1
+
+
+class Session(object):
+    """The summary of the requests of an active visit."""
+
+    __slots__ = VISIT_FIELDS + ('visit_id', )
+
+    def __init__(self, client_ip_address, user_agent, **fields):
+        """
+        Init method.
+
+        Args:
+            client_ip_address (str): the client IP address.
+            user_agent (str): the user agent.
+            **fields: the other fields (see VISIT_FIELDS), and ``visit_id``
+                for a session resumed from an open visit.
+        """
+        self.client_ip_address = client_ip_address
+        self.user_agent = user_agent or ''
+        self.user_agent_hash = fields.get(
+            'user_agent_hash', user_agent_hash(user_agent))
+        self.start = fields.get('start', None)
+        self.end = fields.get('end', None)
+        self.hits = fields.get('hits', 0)
+        self.bytes_sent = fields.get('bytes_sent', 0)
+        self.entry_url = fields.get('entry_url', '')
+        self.exit_url = fields.get('exit_url', '')
+        self.last_log_id = fields.get('last_log_id', 0)
+        self.closed = False
+        self.visit_id = fields.get('visit_id', None)
+
+    @property
+    def key(self):
+        """Return the key of the visitor."""
+        return self.client_ip_address, self.user_agent_hash
+
+    def add(self, log_id, dt, url, bytes_sent):
+        """
+        Add a request to the session.
+
+        Args:
+            log_id (int): the ID of the request log.
+            dt (datetime): the datetime of the request.
+            url (str): the URL.
+            bytes_sent (int): the number of bytes sent.
+        """
+        if self.start is None or dt < self.start:
+            self.start = dt
+            self.entry_url = url or ''
+        if self.end is None or dt >= self.end:
+            self.end = dt
+            self.exit_url = url or ''
+        self.hits += 1
+        self.bytes_sent += bytes_sent or 0
+        self.last_log_id = max(self.last_log_id, log_id)
+
+    def values(self):
+        """
+        Return the fields of the visit.
+
+        Returns:
+            dict: the values by field name (see VISIT_FIELDS).
+        """
+        return {name: getattr(self, name) for name in VISIT_FIELDS}
+
+
+class Sessionizer(object):
+    """Split a stream of request logs into visits."""
+
+    def __init__(self, timeout=None):
+        """
+        Init method.
+
+        Args:
+            timeout (int): the inactivity timeout in seconds
+                (default to MEERKAT_LOGS_VISITS_TIMEOUT setting).
+        """
+        if timeout is None:
+            timeout = app_settings.logs_visits_timeout
+        self.timeout = datetime.timedelta(seconds=timeout)
+        # Sessions by visitor, least recently active first.
+        self.sessions = collections.OrderedDict()
+        self.closed = []
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def resume(self, session):
+        """
+        Resume a session, for example from an open visit.
+
+        Sessions must be resumed in order of last activity (end), like
+        they are kept for ``expire``.
+
+        Args:
+            session (Session): the session.
+        """
+        self.sessions[session.key] = session
+
+    def add(self, log_id, client_ip_address, user_agent, dt, url,
+            bytes_sent):
+        """
+        Add a request log, expected in datetime order.
+
+        Args:
+            log_id (int): the ID of the request log.
+            client_ip_address (str): the client IP address.
+            user_agent (str): the user agent.
+            dt (datetime): the datetime of the request.
+            url (str): the URL.
+            bytes_sent (int): the number of bytes sent.
+        """
+        key = (client_ip_address, user_agent_hash(user_agent))
+        session = self.sessions.get(key, None)
+        if session is not None and (
+                dt > session.end + self.timeout or
+                dt < session.start - self.timeout):
+            self._close(self.sessions.pop(key))
+            session = None
+        if session is None:
+            session = self.sessions[key] = Session(
+                client_ip_address, user_agent, user_agent_hash=key[1])
+        else:
+            self.sessions.move_to_end(key)
+        session.add(log_id, dt, url, bytes_sent)
+        self.expire(dt)
+
+    def expire(self, now):
+        """
+        Close the sessions inactive since more than the timeout.
+
+        Args:
+            now (datetime): the datetime of the stream.
+        """
+        limit = now - self.timeout
+        sessions = self.sessions
+        while sessions:
+            key, session = next(iter(sessions.items()))
+            if session.end >= limit:
+                break
+            self._close(sessions.pop(key))
+
+    def _close(self, session):
+        session.closed = True
+        self.closed.append(session)
+
+    def pop_closed(self):
+        """
+        Return and forget the closed sessions.
+
+        Returns:
+            list: the closed sessions.
+        """
+        closed, self.closed = self.closed, []
+        return closed
+
+
+def save_sessions(sessions):
+    """
+    Save sessions as visits: new ones are created, resumed ones updated.
+
+    Args:
+        sessions (list): the sessions.
+
+    Returns:
+        int: the number of created visits.
+    """
+    from .models import Visit
+    new = [Visit(**session.values()) for session in sessions
+           if session.visit_id is None]
+    Visit.objects.bulk_create(new)
+    bulk_update(Visit, {session.visit_id: session.values()
+                        for session in sessions
+                        if session.visit_id is not None})
+    return len(new)
+
+
+def visit_logs(since=None, until=None):
+    """
+    Return the request logs of visits (without errors, with an IP address).
+
+    Args:
+        since (datetime): only return request logs from this date.
+        until (datetime): only return request logs before this date.
+
+    Returns:
+        QuerySet: the request logs.
+    """
+    from .models import RequestLog
+    logs = RequestLog.objects.filter(
+        error=False, client_ip_address__isnull=False).annotate(
+            **texts('url', 'user_agent'))
+    if since is not None:
+        logs = logs.filter(datetime__gte=since)
+    if until is not None:
+        logs = logs.filter(datetime__lt=until)
+    return logs
+
+
+def rebuild_range(since=None, until=None):
+    """
+    Widen a range of dates so that no visit crosses its bounds.
+
+    Visits starting before the range but ending in it (or starting in it
+    but ending after it) are rebuilt entirely: their request logs out of
+    the range would otherwise be counted again in new visits. The range is
+    widened until no visit crosses its bounds.
+
+    Args:
+        since (datetime): the start of the range (None: no start).
+        until (datetime): the end of the range, excluded (None: no end).
+
+    Returns:
+        tuple: the widened since and until.
+    """
+    from .models import Visit
+    while since is not None or until is not None:
+        crossing = Q()
+        if since is not None:
+            crossing |= Q(start__lt=since, end__gte=since)
+        if until is not None:
+            crossing |= Q(start__lt=until, end__gte=until)
+        bounds = Visit.objects.filter(crossing).aggregate(
+            Min('start'), Max('end'))
+        if bounds['start__min'] is None:
+            break
+        if since is not None:
+            since = min(since, bounds['start__min'])
+        if until is not None:
+            until = max(until, bounds['end__max'] + datetime.timedelta(
+                microseconds=1))
+    return since, until
+
+
+def update_visits(timeout=None, batch_size=10000, dry_run=False):
+    """
+    Update the visits with the request logs created since the last update.
+
+    Request logs are read by batches of increasing IDs, each batch being
+    sorted by datetime. Request logs ingested out of datetime order across
+    two batches can split a visit in two: rebuild the visits to fix it.
+    The update runs in a transaction.
+
+    Args:
+        timeout (int): the inactivity timeout in seconds
+            (default to MEERKAT_LOGS_VISITS_TIMEOUT setting).
+        batch_size (int): number of request logs read at once.
+        dry_run (bool): only count the request logs to read.
+
+    Returns:
+        dict: numbers of read request logs, created visits, and visits
+            left open.
+    """
+    from .models import Visit
+    stats = {'logs': 0, 'visits': 0, 'open': 0}
+    last_id = Visit.objects.aggregate(Max('last_log_id'))[
+        'last_log_id__max'] or 0
+    logs = visit_logs().filter(id__gt=last_id).order_by('id')
+    if dry_run:
+        stats['logs'] = logs.count()
+        return stats
+    sessionizer = Sessionizer(timeout)
+    with transaction.atomic():
+        # Open visits are resumed in order of last activity, as expected
+        # by Sessionizer.expire.
+        for visit in Visit.objects.filter(closed=False).order_by(
+                'end', 'id').iterator():
+            values = {name: getattr(visit, name) for name in VISIT_FIELDS}
+            values['visit_id'] = visit.id
+            sessionizer.resume(Session(**values))
+        while True:
+            rows = list(logs.filter(id__gt=last_id).values_list(
+                *LOG_FIELDS)[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            rows.sort(key=lambda row: (row[3], row[0]))
+            for row in rows:
+                sessionizer.add(*row)
+            stats['logs'] += len(rows)
+            stats['visits'] += save_sessions(sessionizer.pop_closed())
+        stats['visits'] += save_sessions(list(sessionizer.sessions.values()))
+        stats['open'] = len(sessionizer)
+    return stats
+
+
+def rebuild_visits(ips, since=None, until=None, timeout=None,
+                   batch_size=500, now=None, dry_run=False):
+    """
+    Rebuild the visits of some client IP addresses.
+
+    Existing visits must have been deleted. The request logs of each batch
+    of IP addresses are read in datetime order. Sessions still active at
+    the end are saved as open visits.
+
+    Args:
+        ips (list): the client IP addresses.
+        since (datetime): only read request logs from this date.
+        until (datetime): only read request logs before this date.
+        timeout (int): the inactivity timeout in seconds
+            (default to MEERKAT_LOGS_VISITS_TIMEOUT setting).
+        batch_size (int): number of IP addresses read at once.
+        now (datetime): close the sessions inactive at this datetime, for
+            example the datetime of the last request log (default: only
+            close sessions followed by later requests of each batch).
+        dry_run (bool): only count the request logs to read.
+
+    Returns:
+        dict: numbers of read request logs, created visits, and visits
+            left open.
+    """
+    stats = {'logs': 0, 'visits': 0, 'open': 0}
+    logs = visit_logs(since, until)
+    for start in range(0, len(ips), batch_size):
+        batch = logs.filter(client_ip_address__in=ips[
+            start:start + batch_size])
+        if dry_run:
+            stats['logs'] += batch.count()
+            continue
+        sessionizer = Sessionizer(timeout)
+        for row in batch.order_by('datetime', 'id').values_list(
+                *LOG_FIELDS).iterator():
+            sessionizer.add(*row)
+            stats['logs'] += 1
+        if now is not None:
+            sessionizer.expire(now)
+        stats['open'] += len(sessionizer)
+        stats['visits'] += save_sessions(
+            sessionizer.pop_closed() + list(sessionizer.sessions.values()))
+    return stats
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+"""
+Base class and helpers for management commands.
+
+Commands print their progress on the standard error, and one line of JSON
+statistics on the standard output when they are done, for example::
+
+    {"command": "meerkat_import", "created": 1000, "dry_run": false,
+     "elapsed": 0.52, "rate": 1923.1, "workers": 1, ...}
+
+The ``rate`` item is the number of processed items per second.
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import sys
+import time
+from contextlib import redirect_stdout
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+def datetime_argument(value):
+    """
+    Parse a date or datetime command argument.
+
+    Args:
+        value (str): an ISO date (midnight) or datetime, in the current
+            timezone if it has no offset.
+
+    Returns:
+        datetime: the parsed datetime.
+
+    Raises:
+        ArgumentTypeError: when the value is not a valid date or datetime.
+    """
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is not None:
+                parsed = datetime.datetime.combine(day, datetime.time.min)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise argparse.ArgumentTypeError(
+            '%s is not a valid date or datetime' % value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def run_in_workers(func, tasks, workers=1):
+    """
+    Run a function on each task, in several processes if needed.
+
+    Processes are forked, so the function must be a module-level function
+    and the tasks must be picklable. Database connections are closed before
+    forking: each process opens its own.
+
+    Args:
+        func (callable): the function, taking a task as only argument.
+        tasks (list): the tasks.
+        workers (int): the number of processes.
+
+    Returns:
+        list: the results of the function, in the order of the tasks.
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        return [func(task) for task in tasks]
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    with context.Pool(min(workers, len(tasks))) as pool:
+        return pool.map(func, tasks, chunksize=1)
+
+
+def sum_stats(stats_list):
+    """
+    Sum statistics dictionaries.
+
+    Args:
+        stats_list (list): the dictionaries of numbers.
+
+    Returns:
+        dict: the sums by key.
+    """
+    total = {}
+    for stats in stats_list:
+        for key, value in stats.items():
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+class MeerkatCommand(BaseCommand):
+    """
+    Base class for commands emitting throughput statistics.
+
+    Subclasses implement ``run`` (returning a dictionary of numbers), and
+    choose their common options in ``arguments``. ``rate_key`` is the
+    statistic divided by the elapsed time to compute the rate.
+    """
+
+    arguments = ('batch_size', 'dry_run')
+    default_batch_size = 512
+    rate_key = None
+
+    def add_arguments(self, parser):
+        if 'files' in self.arguments:
+            parser.add_argument(
+                '--files', nargs='+', metavar='FILE',
+                help='Log files to read (default: the files matching '
+                     'MEERKAT_LOGS_FILE_PATH_REGEX in MEERKAT_LOGS_TOP_DIR).')
+        if 'range' in self.arguments:
+            parser.add_argument(
+                '--since', type=datetime_argument,
+                help='Only handle request logs from this date or datetime.')
+            parser.add_argument(
+                '--until', type=datetime_argument,
+                help='Only handle request logs before this date or '
+                     'datetime.')
+        if 'workers' in self.arguments:
+            parser.add_argument(
+                '--workers', type=int, default=1,
+                help='Number of parallel workers (default: 1). SQLite does '
+                     'not support concurrent writers: only 1 is used unless '
+                     '--dry-run is given.')
+        if 'batch_size' in self.arguments:
+            parser.add_argument(
+                '--batch-size', type=int, default=self.default_batch_size,
+                help='Number of items handled at once (default: %s).' %
+                     self.default_batch_size)
+        if 'dry_run' in self.arguments:
+            parser.add_argument(
+                '--dry-run', action='store_true',
+                help='Read and count, but do not write anything.')
+
+    def run(self, **options):
+        """
+        Run the command.
+
+        Args:
+            **options: the command options.
+
+        Returns:
+            dict: the statistics.
+        """
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        if (options.get('workers', 1) > 1 and not options.get('dry_run') and
+                connection.vendor == 'sqlite'):
+            # SQLite fails instead of waiting when concurrent transactions
+            # both read then write.
+            self.stderr.write('SQLite does not support concurrent writers, '
+                              'using 1 worker')
+            options['workers'] = 1
+        start = time.time()
+        # Progress messages go to stderr, stdout only gets the statistics.
+        with redirect_stdout(sys.stderr):
+            stats = self.run(**options)
+        elapsed = time.time() - start
+        stats.update(
+            command=self.__module__.rsplit('.', 1)[-1],
+            elapsed=round(elapsed, 3),
+            dry_run=options.get('dry_run', False),
+            workers=options.get('workers', 1))
+        if self.rate_key is not None:
+            stats['rate'] = round(
+                stats.get(self.rate_key, 0) / elapsed, 1) if elapsed else 0
+        self.stdout.write(json.dumps(stats, sort_keys=True))
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""
+Autocomplete command.
+
+Complete the information of request logs (verb, URL, protocol, port, file
+type...). With several workers, request logs are split in ranges of IDs,
+one per worker process.
+"""
+
+from django.db.models import Max, Min
+
+from ...logs.models import RequestLog
+from ..base import MeerkatCommand, run_in_workers, sum_stats
+
+
+def get_queryset(since=None, until=None):
+    queryset = RequestLog.objects.all()
+    if since is not None:
+        queryset = queryset.filter(datetime__gte=since)
+    if until is not None:
+        queryset = queryset.filter(datetime__lt=until)
+    return queryset
+
+
+def autocomplete_range(task):
+    low, high, options = task
+    queryset = get_queryset(options['since'], options['until']).filter(
+        id__gte=low, id__lt=high)
+    return RequestLog.autocomplete(
+        queryset, batch_size=options['batch_size'],
+        rewrite=options['rewrite'], progress=options['workers'] <= 1,
+        dry_run=options['dry_run'])
+
+
+class Command(MeerkatCommand):
+    help = 'Complete the information of request logs.'
+    arguments = ('range', 'workers', 'batch_size', 'dry_run')
+    rate_key = 'logs'
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--no-rewrite', action='store_false', dest='rewrite',
+            help='Only complete missing information.')
+
+    def run(self, **options):
+        ids = get_queryset(options['since'], options['until']).aggregate(
+            low=Min('id'), high=Max('id'))
+        if ids['low'] is None:
+            return {'logs': 0, 'modified': 0}
+        workers = max(options['workers'], 1)
+        step = (ids['high'] - ids['low']) // workers + 1
+        task_options = {key: options[key] for key in (
+            'batch_size', 'since', 'until', 'dry_run', 'rewrite', 'workers')}
+        tasks = [(low, low + step, task_options)
+                 for low in range(ids['low'], ids['high'] + 1, step)]
+        return sum_stats(run_in_workers(
+            autocomplete_range, tasks, workers))
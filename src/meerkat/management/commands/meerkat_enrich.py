@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""
+Enrich command.
+
+Check the IP addresses of request logs against the IP information API, and
+link request logs to the obtained information.
+"""
+
+from ...logs.models import RequestLog
+from ..base import MeerkatCommand
+
+
+class Command(MeerkatCommand):
+    help = 'Get IP addresses information and link it to request logs.'
+    arguments = ('range', 'workers', 'batch_size', 'dry_run')
+    default_batch_size = 100
+    rate_key = 'checked'
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--only-update', action='store_true',
+            help='Do not check new IP addresses, only link request logs to '
+                 'already checked ones.')
+
+    def run(self, **options):
+        return RequestLog.get_ip_info(
+            only_update=options['only_update'], since=options['since'],
+            until=options['until'], batch_size=options['batch_size'],
+            workers=options['workers'], dry_run=options['dry_run'])
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+"""
+Follow command.
+
+Follow a log file and insert new lines in database until interrupted
+(Ctrl-C or SIGTERM). Unlike ``meerkat_ingest``, no ingestion lock is
+acquired: make sure only one process follows a given file.
+"""
+
+import signal
+
+from django.core.management.base import CommandError
+
+from ...logs.models import RequestLog
+from ...logs.parsers import get_nginx_parser
+from ..base import MeerkatCommand
+
+
+class Command(MeerkatCommand):
+    help = 'Follow a log file and insert new lines in database.'
+    arguments = ('files', 'dry_run')
+    rate_key = 'lines'
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--from-start', action='store_true',
+            help='Read the file from the start instead of the end.')
+
+    def run(self, **options):
+        parser = get_nginx_parser()
+        files = options['files'] or parser.matching_files()
+        if len(files) != 1:
+            raise CommandError(
+                'Exactly one log file can be followed, got %s' % len(files))
+        thread = RequestLog.ParseToDBThread(
+            parser, file_name=files[0], seek_end=not options['from_start'],
+            dry_run=options['dry_run'])
+        previous_handler = signal.signal(
+            signal.SIGTERM, lambda signum, frame: thread.stop())
+        thread.start()
+        try:
+            while thread.is_alive():
+                thread.join(1)
+        except KeyboardInterrupt:
+            thread.stop()
+            thread.join()
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+        return dict(thread.stats)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""
+Generate command.
+
+Write a synthetic NginX log file (see ``meerkat.logs.generator``), for
+example to try the dashboard or to benchmark the ingestion.
+"""
+
+from ...logs.generator import LogGenerator
+from ..base import MeerkatCommand, datetime_argument
+
+
+class Command(MeerkatCommand):
+    help = 'Write a synthetic NginX log file.'
+    arguments = ()
+    rate_key = 'lines'
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument('path', help='The file to write (overwritten).')
+        parser.add_argument(
+            '--lines', type=int, default=100000,
+            help='Number of lines (default: 100000).')
+        parser.add_argument(
+            '--kind', choices=('access', 'error'), default='access',
+            help='Access or error log (default: access).')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Random seed: the same seed writes the same lines.')
+        parser.add_argument(
+            '--ips', type=int, default=1000,
+            help='Number of distinct visitor IP addresses (default: 1000).')
+        parser.add_argument(
+            '--urls', type=int, default=500,
+            help='Number of distinct URLs (default: 500).')
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Exponent of the Zipf distribution of IP addresses and '
+                 'URLs (default: 1.1).')
+        parser.add_argument(
+            '--attacks', type=float, default=0.02,
+            help='Share of requests sent by attackers (default: 0.02).')
+        parser.add_argument(
+            '--start', type=datetime_argument,
+            help='Date or datetime of the first line (default: '
+                 '2018-01-01).')
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Mean number of seconds between two lines (default: 1).')
+
+    def run(self, **options):
+        generator = LogGenerator(
+            seed=options['seed'], ips=options['ips'], urls=options['urls'],
+            zipf=options['zipf'], attacks=options['attacks'],
+            start=options['start'], interval=options['interval'])
+        lines = generator.write(
+            options['path'], options['lines'], options['kind'])
+        return {'lines': lines}
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+"""
+Import command.
+
+Parse log files and insert their lines in database, one file per worker
+process. Each worker feeds its own collectors, which merge their data into
+the aggregates tables.
+
+With ``--profile``, the time spent in each stage is printed for each file,
+and cProfile (and tracemalloc with ``--profile-memory``) can be run on the
+first ``--profile-lines`` lines of each file.
+"""
+
+import os
+
+from ...logs.models import RequestLog
+from ...logs.parsers import get_nginx_parser
+from ...logs.profiling import Profiler
+from ..base import MeerkatCommand, run_in_workers, sum_stats
+
+
+def import_file(task):
+    log_file, options = task
+    profiler = None
+    if options['profile']:
+        profiler = Profiler(
+            lines=options['profile_lines'],
+            memory=options['profile_memory'],
+            output_dir=options['profile_dir'],
+            name='meerkat-profile-%s' % os.path.basename(log_file))
+    stats = RequestLog.parse_file(
+        log_file, buffer_size=options['batch_size'],
+        progress=options['workers'] <= 1, since=options['since'],
+        until=options['until'], dry_run=options['dry_run'],
+        profile=profiler)
+    if profiler is not None:
+        print('Profile of %s:' % log_file)
+        profiler.report()
+    return stats
+
+
+class Command(MeerkatCommand):
+    help = 'Parse log files and insert their lines in database.'
+    arguments = ('files', 'range', 'workers', 'batch_size', 'dry_run')
+    rate_key = 'lines'
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--profile', action='store_true',
+            help='Print the time spent in each stage of the ingestion.')
+        parser.add_argument(
+            '--profile-lines', type=int, default=0, metavar='N',
+            help='Run cProfile on the first N lines of each file and write '
+                 'a .pstats file (implies --profile).')
+        parser.add_argument(
+            '--profile-memory', action='store_true',
+            help='Also trace memory allocations on these lines and write a '
+                 '.tracemalloc snapshot.')
+        parser.add_argument(
+            '--profile-dir',
+            help='Directory of the profiling files (default: the current '
+                 'directory).')
+
+    def run(self, **options):
+        files = options['files'] or get_nginx_parser().matching_files()
+        task_options = {key: options[key] for key in (
+            'batch_size', 'since', 'until', 'dry_run', 'workers',
+            'profile_lines', 'profile_memory', 'profile_dir')}
+        task_options['profile'] = (
+            options['profile'] or options['profile_lines'] > 0)
+        stats = sum_stats(run_in_workers(
+            import_file, [(f, task_options) for f in files],
+            options['workers']))
+        stats.setdefault('files', 0)
+        return stats
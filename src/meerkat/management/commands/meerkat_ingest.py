@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+"""
+Ingestion command.
+
+Run the log ingestion in a standalone process, instead of a thread in each
+web worker (MEERKAT_LOGS_START_DAEMON setting). Several instances can run
+for failover: only the one holding the ingestion lock reads the log file.
+"""
+
+from django.core.management.base import BaseCommand
+
+from ...logs.models import RequestLog
+from ...utils.leader import LeaderElector
+
+
+class Command(BaseCommand):
+    help = 'Follow the log file and ingest new request logs in database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=5,
+            help='Seconds between two attempts to become the leader.')
+
+    def handle(self, *args, **options):
+        elector = LeaderElector(
+            RequestLog.get_ingestion_lock(), self.new_daemon,
+            interval=options['interval'])
+        RequestLog.elector = elector
+        self.stdout.write('Waiting for the ingestion lock...')
+        try:
+            elector.run()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping...')
+        finally:
+            elector.stop()
+            RequestLog.elector = None
+
+    def new_daemon(self):
+        self.stdout.write('Ingestion lock acquired, following log file.')
+        return RequestLog._new_daemon()
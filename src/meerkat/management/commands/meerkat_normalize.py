@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+"""
+Normalize command.
+
+Move the URLs, user agents and referrers of request logs already in the
+database to the dimension tables (see ``meerkat.logs.dimensions``), for
+example after enabling the MEERKAT_LOGS_NORMALIZE_STRINGS setting.
+"""
+
+from ...logs.dimensions import normalize_logs
+from ...logs.models import RequestLog
+from ..base import MeerkatCommand
+
+
+class Command(MeerkatCommand):
+    help = 'Move the strings of request logs to the dimension tables.'
+    arguments = ('range', 'batch_size', 'dry_run')
+    default_batch_size = 10000
+    rate_key = 'logs'
+
+    def run(self, **options):
+        queryset = RequestLog.objects.all()
+        if options['since'] is not None:
+            queryset = queryset.filter(datetime__gte=options['since'])
+        if options['until'] is not None:
+            queryset = queryset.filter(datetime__lt=options['until'])
+        return normalize_logs(
+            queryset, batch_size=options['batch_size'],
+            dry_run=options['dry_run'])
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+"""
+Rollup command.
+
+Rebuild the aggregates tables (daily counts, unique visitors sketches,
+latency digests, heavy hitters) from the request logs, for example after
+importing or deleting request logs without the collectors. The range is
+extended to whole days. With several workers, days are split in
+contiguous ranges, one per worker process.
+"""
+
+import datetime
+
+from django.utils import timezone
+
+from ...logs.collectors import AGGREGATES, logs_days_range, rebuild_aggregates
+from ..base import MeerkatCommand, run_in_workers, sum_stats
+
+
+def to_day(value, ceil=False):
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    day = value.date()
+    if ceil and value.time() != datetime.time.min:
+        day += datetime.timedelta(days=1)
+    return day
+
+
+def rollup_days(task):
+    since, until, options = task
+    return rebuild_aggregates(
+        since, until, names=options['aggregates'],
+        batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+
+class Command(MeerkatCommand):
+    help = 'Rebuild the aggregates tables from the request logs.'
+    arguments = ('range', 'workers', 'batch_size', 'dry_run')
+    default_batch_size = 10000
+    rate_key = 'logs'
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--aggregates', nargs='+', choices=sorted(AGGREGATES.keys()),
+            help='Aggregates to rebuild (default: all).')
+
+    def run(self, **options):
+        since = to_day(options['since'])
+        until = to_day(options['until'], ceil=True)
+        workers = max(options['workers'], 1)
+        task_options = {key: options[key] for key in (
+            'aggregates', 'batch_size', 'dry_run')}
+        if workers == 1:
+            return rollup_days((since, until, task_options))
+        first, last = logs_days_range()
+        if first is None:
+            return {'deleted': 0, 'logs': 0}
+        since = since or first
+        until = until or last
+        step = max(-(-(until - since).days // workers), 1)
+        tasks = []
+        day = since
+        while day < until:
+            next_day = min(day + datetime.timedelta(days=step), until)
+            tasks.append((day, next_day, task_options))
+            day = next_day
+        return sum_stats(run_in_workers(rollup_days, tasks, workers))
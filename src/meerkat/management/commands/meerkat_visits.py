@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""
+Visits command.
+
+Update the visits with the request logs created since the last update, or
+rebuild them from scratch with ``--rebuild`` (in the given range only, if
+any, widened so that no visit crosses its bounds). With ``--rebuild``, the
+batch size is the number of client IP addresses read at once, instead of
+the number of request logs. With several workers, the client IP addresses
+are partitioned by hash, one partition per worker process: a visit never
+mixes IP addresses, so partitions are independent.
+"""
+
+from django.db.models import Max
+
+from ...logs.models import Visit
+from ...logs.visits import (
+    rebuild_range, rebuild_visits, update_visits, visit_logs)
+from ...utils.hyperloglog import hash64
+from ..base import MeerkatCommand, run_in_workers, sum_stats
+
+
+def rebuild_partition(task):
+    ips, options = task
+    return rebuild_visits(ips, **options)
+
+
+class Command(MeerkatCommand):
+    help = 'Update the visits (sessions) from the request logs.'
+    arguments = ('range', 'workers', 'batch_size', 'dry_run')
+    default_batch_size = 10000
+    rate_key = 'logs'
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--rebuild', action='store_true', dest='rebuild',
+            help='Delete and rebuild the visits.')
+        parser.add_argument(
+            '--timeout', type=int, dest='timeout',
+            help='Inactivity timeout in seconds '
+                 '(default: MEERKAT_LOGS_VISITS_TIMEOUT setting).')
+
+    def run(self, **options):
+        if not options['rebuild']:
+            return update_visits(
+                timeout=options['timeout'],
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'])
+        since, until = rebuild_range(options['since'], options['until'])
+        workers = max(options['workers'], 1)
+        visits = Visit.objects.all()
+        if since is not None:
+            visits = visits.filter(start__gte=since)
+        if until is not None:
+            visits = visits.filter(start__lt=until)
+        if options['dry_run']:
+            deleted = visits.count()
+        else:
+            deleted = visits.delete()[0]
+        logs = visit_logs(since, until)
+        ips = list(logs.order_by().values_list(
+            'client_ip_address', flat=True).distinct())
+        partitions = [[] for _ in range(workers)]
+        for ip in ips:
+            partitions[hash64(ip) % workers].append(ip)
+        task_options = {
+            'since': since, 'until': until, 'timeout': options['timeout'],
+            'now': logs.aggregate(Max('datetime'))['datetime__max'],
+            'batch_size': options['batch_size'],
+            'dry_run': options['dry_run']}
+        tasks = [(partition, task_options)
+                 for partition in partitions if partition]
+        stats = sum_stats(run_in_workers(rebuild_partition, tasks, workers))
+        stats.setdefault('logs', 0)
+        stats['deleted'] = deleted
+        return stats
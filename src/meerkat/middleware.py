@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+"""
+Middlewares.
+
+Django's ``GZipMiddleware`` also compresses streaming responses, and its
+gzip stream is only flushed when full: the events of the live view would
+be held back. Use ``meerkat.middleware.GZipMiddleware`` in place of
+``django.middleware.gzip.GZipMiddleware`` to compress everything else.
+"""
+
+from django.middleware.gzip import GZipMiddleware as BaseGZipMiddleware
+
+#: Content types which are never compressed.
+UNCOMPRESSED_CONTENT_TYPES = ('text/event-stream', )
+
+
+class GZipMiddleware(BaseGZipMiddleware):
+    """GZip middleware skipping Server-Sent Events."""
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '').split(';')[0]
+        if content_type.strip() in UNCOMPRESSED_CONTENT_TYPES:
+            return response
+        return super(GZipMiddleware, self).process_response(
+            request, response)
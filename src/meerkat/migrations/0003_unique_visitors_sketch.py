@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 16:44
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meerkat', '0002_auto_20170515_1230'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UniqueVisitorsSketch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('host', models.CharField(blank=True, max_length=255, verbose_name='Host')),
+                ('url', models.CharField(blank=True, max_length=2047, verbose_name='URL')),
+                ('precision', models.PositiveSmallIntegerField(verbose_name='Precision')),
+                ('registers', models.BinaryField(verbose_name='Registers')),
+            ],
+            options={
+                'verbose_name': 'Unique visitors sketch',
+                'verbose_name_plural': 'Unique visitors sketches',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='uniquevisitorssketch',
+            unique_together=set([('date', 'host', 'url')]),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 16:46
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meerkat', '0003_unique_visitors_sketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HeavyHitter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_start', models.DateTimeField(verbose_name='Window start')),
+                ('dimension', models.CharField(choices=[('ip', 'IP address'), ('url', 'URL'), ('user_agent', 'User agent')], max_length=30, verbose_name='Dimension')),
+                ('value', models.TextField(verbose_name='Value')),
+                ('count', models.PositiveIntegerField(verbose_name='Count')),
+                ('error', models.PositiveIntegerField(default=0, verbose_name='Error')),
+            ],
+            options={
+                'verbose_name': 'Heavy hitter',
+                'verbose_name_plural': 'Heavy hitters',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='heavyhitter',
+            index_together=set([('window_start', 'dimension')]),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 16:47
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meerkat', '0004_heavy_hitter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatencyDigest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Hour')),
+                ('endpoint', models.CharField(blank=True, max_length=2047, verbose_name='Endpoint')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Count')),
+                ('request_time', models.BinaryField(verbose_name='Request time digest')),
+                ('bytes_sent', models.BinaryField(verbose_name='Bytes sent digest')),
+            ],
+            options={
+                'verbose_name': 'Latency digest',
+                'verbose_name_plural': 'Latency digests',
+            },
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='request_time',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Request time (ms)'),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='upstream_response_time',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Upstream response time (ms)'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='latencydigest',
+            unique_together=set([('hour', 'endpoint')]),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 16:58
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meerkat', '0005_latency_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRequestCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Date')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Count')),
+            ],
+            options={
+                'verbose_name': 'Daily request count',
+                'verbose_name_plural': 'Daily request counts',
+            },
+        ),
+    ]
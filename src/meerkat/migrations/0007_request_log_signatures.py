@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 17:47
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meerkat', '0006_daily_request_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requestlog',
+            name='signatures',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='Attack signatures'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 17:55
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meerkat', '0007_request_log_signatures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Incident',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client_ip_address', models.GenericIPAddressField(db_index=True, verbose_name='Client IP address')),
+                ('kind', models.CharField(choices=[('all', 'All requests'), ('1xx', '1xx responses'), ('2xx', '2xx responses'), ('3xx', '3xx responses'), ('4xx', '4xx responses'), ('5xx', '5xx responses')], max_length=10, verbose_name='Kind')),
+                ('start', models.DateTimeField(db_index=True, verbose_name='Start')),
+                ('end', models.DateTimeField(verbose_name='End')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Flagged requests')),
+                ('peak', models.PositiveIntegerField(default=0, verbose_name='Peak requests per window')),
+                ('threshold', models.PositiveIntegerField(verbose_name='Threshold')),
+                ('window', models.PositiveIntegerField(verbose_name='Window (seconds)')),
+            ],
+            options={
+                'verbose_name': 'Incident',
+                'verbose_name_plural': 'Incidents',
+                'ordering': ('-start',),
+            },
+        ),
+    ]
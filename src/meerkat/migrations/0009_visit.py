@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 18:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meerkat', '0008_incident'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Visit',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client_ip_address', models.GenericIPAddressField(db_index=True, verbose_name='Client IP address')),
+                ('user_agent_hash', models.BigIntegerField(verbose_name='User agent hash')),
+                ('user_agent', models.TextField(blank=True, verbose_name='User agent')),
+                ('start', models.DateTimeField(db_index=True, verbose_name='Start')),
+                ('end', models.DateTimeField(verbose_name='End')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Hits')),
+                ('bytes_sent', models.BigIntegerField(default=0, verbose_name='Bytes sent')),
+                ('entry_url', models.URLField(blank=True, max_length=2047, verbose_name='Entry URL')),
+                ('exit_url', models.URLField(blank=True, max_length=2047, verbose_name='Exit URL')),
+                ('last_log_id', models.BigIntegerField(db_index=True, verbose_name='Last request log ID')),
+                ('closed', models.BooleanField(db_index=True, default=False, verbose_name='Closed')),
+            ],
+            options={
+                'verbose_name': 'Visit',
+                'verbose_name_plural': 'Visits',
+                'ordering': ('-start',),
+            },
+        ),
+    ]
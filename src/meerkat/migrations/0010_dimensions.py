@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 18:07
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meerkat', '0009_visit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Referrer',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.BigIntegerField(unique=True, verbose_name='Hash')),
+                ('value', models.TextField(verbose_name='Value')),
+            ],
+            options={
+                'verbose_name': 'Referrer',
+                'verbose_name_plural': 'Referrers',
+            },
+        ),
+        migrations.CreateModel(
+            name='URL',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.BigIntegerField(unique=True, verbose_name='Hash')),
+                ('value', models.TextField(verbose_name='Value')),
+            ],
+            options={
+                'verbose_name': 'URL',
+                'verbose_name_plural': 'URLs',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.BigIntegerField(unique=True, verbose_name='Hash')),
+                ('value', models.TextField(verbose_name='Value')),
+            ],
+            options={
+                'verbose_name': 'User agent',
+                'verbose_name_plural': 'User agents',
+            },
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='referrer_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='meerkat.Referrer', verbose_name='Referrer (normalized)'),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='url_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='meerkat.URL', verbose_name='URL (normalized)'),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='user_agent_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='meerkat.UserAgent', verbose_name='User agent (normalized)'),
+        ),
+    ]
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 18:18
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Case, Max, Min, Value, When
+
+import meerkat.logs.enums
+
+ENUMS = (
+    ('verb', ['CONNECT', 'GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'TRACE',
+              'DELETE', 'PATCH']),
+    ('protocol', ['HTTP/1.0', 'HTTP/1.1', 'HTTP/2.0', 'RTSP/1.0', 'SIP/2.0']),
+    ('timezone', []),
+    ('file_type', []),
+)
+# Rows updated per query.
+BATCH_SIZE = 10000
+# Values converted per query (SQLite limits the number of parameters).
+VALUES_SIZE = 300
+
+
+def convert(apps, schema_editor, reverse=False):
+    request_logs = apps.get_model('meerkat', 'RequestLog').objects.using(
+        schema_editor.connection.alias)
+    enum_value_model = apps.get_model('meerkat', 'EnumValue')
+    enum_values = enum_value_model.objects.using(
+        schema_editor.connection.alias)
+    ids = request_logs.aggregate(low=Min('id'), high=Max('id'))
+    if ids['low'] is None:
+        return
+    for name, seeds in ENUMS:
+        codes = {value: code for code, value in enumerate(seeds, 1)}
+        if reverse:
+            source, target = '%s_code' % name, name
+            codes.update(enum_values.filter(enum=name).values_list(
+                'value', 'code'))
+            pairs = [(code, value) for value, code in codes.items()]
+            output_field = models.CharField()
+        else:
+            # Empty values already have the default code (0).
+            source, target = name, '%s_code' % name
+            values = set(request_logs.exclude(**{name: ''}).values_list(
+                name, flat=True).distinct())
+            codes.update(meerkat.logs.enums.get_codes(
+                enum_value_model, name, values - set(codes), len(seeds)))
+            pairs = [(value, codes[value[:meerkat.logs.enums.MAX_LENGTH]])
+                     for value in sorted(values)]
+            output_field = models.SmallIntegerField()
+        for start in range(0, len(pairs), VALUES_SIZE):
+            chunk = pairs[start:start + VALUES_SIZE]
+            case = Case(*[When(**{source: old, 'then': Value(new)})
+                          for old, new in chunk], output_field=output_field)
+            for low in range(ids['low'], ids['high'] + 1, BATCH_SIZE):
+                request_logs.filter(**{
+                    'id__gte': low, 'id__lt': low + BATCH_SIZE,
+                    '%s__in' % source: [old for old, new in chunk]}).update(
+                        **{target: case})
+
+
+def convert_back(apps, schema_editor):
+    convert(apps, schema_editor, reverse=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meerkat', '0010_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnumValue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enum', models.CharField(max_length=30, verbose_name='Enumeration')),
+                ('code', models.SmallIntegerField(verbose_name='Code')),
+                ('value', models.CharField(max_length=255, verbose_name='Value')),
+            ],
+            options={
+                'verbose_name': 'Enumerated value',
+                'verbose_name_plural': 'Enumerated values',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='enumvalue',
+            unique_together=set([('enum', 'code'), ('enum', 'value')]),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='verb_code',
+            field=meerkat.logs.enums.EnumField(blank=True, enum='verb', values=['CONNECT', 'GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'TRACE', 'DELETE', 'PATCH'], verbose_name='Verb'),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='protocol_code',
+            field=meerkat.logs.enums.EnumField(blank=True, enum='protocol', values=['HTTP/1.0', 'HTTP/1.1', 'HTTP/2.0', 'RTSP/1.0', 'SIP/2.0'], verbose_name='Protocol'),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='timezone_code',
+            field=meerkat.logs.enums.EnumField(blank=True, enum='timezone', verbose_name='Timezone'),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='file_type_code',
+            field=meerkat.logs.enums.EnumField(blank=True, enum='file_type', verbose_name='File type'),
+        ),
+        migrations.RunPython(convert, convert_back),
+        migrations.RemoveField(
+            model_name='requestlog',
+            name='verb',
+        ),
+        migrations.RemoveField(
+            model_name='requestlog',
+            name='protocol',
+        ),
+        migrations.RemoveField(
+            model_name='requestlog',
+            name='timezone',
+        ),
+        migrations.RemoveField(
+            model_name='requestlog',
+            name='file_type',
+        ),
+        migrations.RenameField(
+            model_name='requestlog',
+            old_name='verb_code',
+            new_name='verb',
+        ),
+        migrations.RenameField(
+            model_name='requestlog',
+            old_name='protocol_code',
+            new_name='protocol',
+        ),
+        migrations.RenameField(
+            model_name='requestlog',
+            old_name='timezone_code',
+            new_name='timezone',
+        ),
+        migrations.RenameField(
+            model_name='requestlog',
+            old_name='file_type_code',
+            new_name='file_type',
+        ),
+    ]
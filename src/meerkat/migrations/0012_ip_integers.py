@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 18:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+import meerkat.logs.networks
+import meerkat.utils.ip
+
+FIELDS = (
+    ('IPInfoCheck', 'ip_address', 'ip_high', 'ip_low'),
+    ('RequestLog', 'client_ip_address', 'client_ip_high', 'client_ip_low'),
+)
+# IP addresses converted per query (SQLite limits the number of parameters).
+VALUES_SIZE = 300
+
+
+def fill(apps, schema_editor):
+    for model_name, field, high, low in FIELDS:
+        rows = apps.get_model('meerkat', model_name).objects.using(
+            schema_editor.connection.alias)
+        ips = sorted(set(rows.exclude(**{'%s__isnull' % field: True}).order_by(
+            ).values_list(field, flat=True).distinct()) - {''})
+        for start in range(0, len(ips), VALUES_SIZE):
+            chunk = ips[start:start + VALUES_SIZE]
+            halves = {ip: meerkat.utils.ip.split_ip(ip) for ip in chunk}
+            rows.filter(**{'%s__in' % field: chunk}).update(**{
+                name: Case(*[When(**{field: ip, 'then': Value(half[index])})
+                             for ip, half in halves.items()],
+                           output_field=models.BigIntegerField())
+                for index, name in enumerate((high, low))})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meerkat', '0011_enums'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ipinfocheck',
+            name='ip_high',
+            field=meerkat.logs.networks.IPHalfField(blank=True, half='high', null=True, source='ip_address', verbose_name='IP address (high bits)'),
+        ),
+        migrations.AddField(
+            model_name='ipinfocheck',
+            name='ip_low',
+            field=meerkat.logs.networks.IPHalfField(blank=True, half='low', null=True, source='ip_address', verbose_name='IP address (low bits)'),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='client_ip_high',
+            field=meerkat.logs.networks.IPHalfField(blank=True, half='high', null=True, source='client_ip_address', verbose_name='Client IP address (high bits)'),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='client_ip_low',
+            field=meerkat.logs.networks.IPHalfField(blank=True, half='low', null=True, source='client_ip_address', verbose_name='Client IP address (low bits)'),
+        ),
+        migrations.RunPython(fill, migrations.RunPython.noop),
+        migrations.AlterIndexTogether(
+            name='ipinfocheck',
+            index_together=set([('ip_high', 'ip_low')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='requestlog',
+            index_together=set([('client_ip_high', 'client_ip_low')]),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 19:01
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meerkat', '0013_ingestion_state'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='requestlog',
+            index_together=set([('client_ip_high', 'client_ip_low'),
+                                ('ip_info', 'datetime', 'id')]),
+        ),
+    ]
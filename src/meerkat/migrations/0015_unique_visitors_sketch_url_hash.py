@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 21:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+import meerkat.logs.dimensions
+
+
+def fill(apps, schema_editor):
+    rows = apps.get_model('meerkat', 'UniqueVisitorsSketch').objects.using(
+        schema_editor.connection.alias)
+    urls = rows.order_by().values_list('url', flat=True).distinct()
+    for url in urls.iterator():
+        rows.filter(url=url).update(
+            url_hash=meerkat.logs.dimensions.text_hash(url))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meerkat', '0014_request_log_ip_info_index'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='uniquevisitorssketch',
+            unique_together=set([]),
+        ),
+        migrations.AddField(
+            model_name='uniquevisitorssketch',
+            name='url_hash',
+            field=models.BigIntegerField(default=0, verbose_name='URL hash'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='uniquevisitorssketch',
+            name='url',
+            field=models.TextField(blank=True, verbose_name='URL'),
+        ),
+        migrations.RunPython(fill, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='uniquevisitorssketch',
+            unique_together=set([('date', 'host', 'url_hash')]),
+        ),
+    ]
@@ -2,6 +2,9 @@
 
 """Models."""
 
-from .logs.models import IPInfo, IPInfoCheck, RequestLog
+from .logs.models import (
+    DailyRequestCount, HeavyHitter, IPInfo, IPInfoCheck, LatencyDigest,
+    RequestLog, UniqueVisitorsSketch)
 
-__all__ = ['IPInfoCheck', 'IPInfo', 'RequestLog']
+__all__ = ['DailyRequestCount', 'HeavyHitter', 'IPInfoCheck', 'IPInfo',
+           'LatencyDigest', 'RequestLog', 'UniqueVisitorsSketch']
@@ -14,6 +14,7 @@ from django.contrib.admin.sites import AdminSite
 from suit_dashboard import get_realtime_urls
 
 from .logs.urls import logs_urlpatterns
+from .logs.views import metrics_view
 from .views import HomeView
 
 
@@ -33,6 +34,9 @@ class DashboardSite(AdminSite):
                 self.admin_view(HomeView.as_view()),
                 name='index'),
             url(r'^logs/', include(logs_urlpatterns(self.admin_view))),
+            url(r'^metrics$',
+                metrics_view(self.admin_view),
+                name='metrics'),
         ]
 
         custom_urls += get_realtime_urls(self.admin_view)
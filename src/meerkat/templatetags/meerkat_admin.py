@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""
+Admin template tags.
+
+The ``rollup_date_hierarchy`` tag replaces the ``date_hierarchy`` tag of
+Django admin for request logs: years, months and days are read from the
+DailyRequestCount rollup instead of DISTINCT queries on the whole table.
+Other filters of the changelist are not taken into account, so a choice
+can lead to an empty list.
+"""
+
+import datetime
+
+from django import template
+from django.db.models import Max, Min
+from django.utils import formats
+from django.utils.text import capfirst
+from django.utils.translation import ugettext as _
+
+from ..logs.models import DailyRequestCount
+
+register = template.Library()
+
+
+@register.inclusion_tag('admin/date_hierarchy.html')
+def rollup_date_hierarchy(cl):
+    """
+    Display the date hierarchy using the daily request counts.
+
+    Args:
+        cl (ChangeList): the admin changelist.
+
+    Returns:
+        dict: the context for the admin date hierarchy template.
+    """
+    if not cl.date_hierarchy:
+        return {}
+    field_name = cl.date_hierarchy
+    year_field = '%s__year' % field_name
+    month_field = '%s__month' % field_name
+    day_field = '%s__day' % field_name
+    field_generic = '%s__' % field_name
+    year_lookup = cl.params.get(year_field)
+    month_lookup = cl.params.get(month_field)
+    day_lookup = cl.params.get(day_field)
+    days = DailyRequestCount.objects.filter(count__gt=0)
+
+    def link(filters):
+        return cl.get_query_string(filters, [field_generic])
+
+    if not (year_lookup or month_lookup or day_lookup):
+        date_range = days.aggregate(first=Min('date'), last=Max('date'))
+        if date_range['first'] and date_range['last']:
+            if date_range['first'].year == date_range['last'].year:
+                year_lookup = date_range['first'].year
+                if date_range['first'].month == date_range['last'].month:
+                    month_lookup = date_range['first'].month
+
+    if year_lookup and month_lookup and day_lookup:
+        day = datetime.date(
+            int(year_lookup), int(month_lookup), int(day_lookup))
+        return {
+            'show': True,
+            'back': {
+                'link': link({year_field: year_lookup,
+                              month_field: month_lookup}),
+                'title': capfirst(formats.date_format(
+                    day, 'YEAR_MONTH_FORMAT'))
+            },
+            'choices': [{'title': capfirst(formats.date_format(
+                day, 'MONTH_DAY_FORMAT'))}]
+        }
+    elif year_lookup and month_lookup:
+        month_days = days.filter(
+            date__year=year_lookup, date__month=month_lookup).dates(
+            'date', 'day')
+        return {
+            'show': True,
+            'back': {
+                'link': link({year_field: year_lookup}),
+                'title': str(year_lookup)
+            },
+            'choices': [{
+                'link': link({year_field: year_lookup,
+                              month_field: month_lookup,
+                              day_field: day.day}),
+                'title': capfirst(formats.date_format(day, 'MONTH_DAY_FORMAT'))
+            } for day in month_days]
+        }
+    elif year_lookup:
+        months = days.filter(date__year=year_lookup).dates('date', 'month')
+        return {
+            'show': True,
+            'back': {
+                'link': link({}),
+                'title': _('All dates')
+            },
+            'choices': [{
+                'link': link({year_field: year_lookup,
+                              month_field: month.month}),
+                'title': capfirst(formats.date_format(
+                    month, 'YEAR_MONTH_FORMAT'))
+            } for month in months]
+        }
+    years = days.dates('date', 'year')
+    return {
+        'show': True,
+        'choices': [{
+            'link': link({year_field: str(year.year)}),
+            'title': str(year.year),
+        } for year in years]
+    }
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+"""Database utils."""
+
+from django.db import connections
+from django.db.models import Case, F, Value, When
+
+
+def bulk_update(model, changes, using='default'):
+    """
+    Update different values in different rows with few queries.
+
+    Each query updates a chunk of rows with ``UPDATE ... SET field = CASE
+    WHEN id IN (...) THEN value ... ELSE field END``, only for the changed
+    fields, with one ``WHEN`` per distinct value. Chunks are sized to fit
+    the query parameters limit of the backend.
+
+    Args:
+        model (Model): the model class.
+        changes (dict): values (hashable) to write by field name, by
+            primary key.
+        using (str): the database alias.
+
+    Returns:
+        int: the number of updated rows.
+    """
+    if not changes:
+        return 0
+    fields = sorted({field for values in changes.values()
+                     for field in values})
+    pks = sorted(changes)
+    # Each row needs its primary key in the WHERE clause, and a key and a
+    # value for each of its changed fields.
+    chunk_size = max(connections[using].ops.bulk_batch_size(
+        ['pk'] + fields * 2, pks), 1)
+    updated = 0
+    for start in range(0, len(pks), chunk_size):
+        chunk = pks[start:start + chunk_size]
+        cases = {}
+        for name in fields:
+            field = model._meta.get_field(name)
+            pks_by_value = {}
+            for pk in chunk:
+                if name in changes[pk]:
+                    pks_by_value.setdefault(
+                        changes[pk][name], []).append(pk)
+            whens = [When(pk__in=value_pks,
+                          then=Value(value, output_field=field))
+                     for value, value_pks in pks_by_value.items()]
+            if whens:
+                cases[name] = Case(*whens, default=F(name),
+                                   output_field=field)
+        updated += model.objects.using(using).filter(
+            pk__in=chunk).update(**cases)
+    return updated
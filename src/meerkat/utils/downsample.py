@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+"""
+Downsampling utils.
+
+Largest-Triangle-Three-Buckets (LTTB) reduces a time series to a given
+number of points while keeping its visual shape: the first and last points
+are kept, the other points are split in buckets, and in each bucket the
+point forming the largest triangle with the previously selected point and
+the average of the next bucket is selected. Unlike averaging, spikes are
+preserved.
+"""
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Select the indices of the points to keep.
+
+    Args:
+        x (list): the x values, sorted.
+        y (list): the y values.
+        threshold (int): the number of points to keep.
+
+    Returns:
+        list: the sorted indices of the selected points.
+    """
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return list(range(length))
+    indices = [0]
+    every = (length - 2) / float(threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, length)
+        next_count = next_end - next_start
+        avg_x = sum(x[next_start:next_end]) / next_count
+        avg_y = sum(y[next_start:next_end]) / next_count
+        start = int(i * every) + 1
+        end = next_start
+        ax, ay = x[a], y[a]
+        max_area, selected = -1, start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (y[j] - ay) - (ax - x[j]) * (avg_y - ay))
+            if area > max_area:
+                max_area, selected = area, j
+        indices.append(selected)
+        a = selected
+    indices.append(length - 1)
+    return indices
+
+
+def lttb(points, threshold):
+    """
+    Downsample a time series.
+
+    Args:
+        points (list): the (x, y) points, sorted by x.
+        threshold (int): the number of points to keep.
+
+    Returns:
+        list: the selected points.
+    """
+    x = [p[0] for p in points]
+    y = [p[1] for p in points]
+    return [points[i] for i in lttb_indices(x, y, threshold)]
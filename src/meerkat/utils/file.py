@@ -4,10 +4,13 @@ import os
 import time
 
 
-def follow(file_name, seek_end, wait=1, stop_condition=lambda: False):
+def follow(file_name, seek_end, wait=1, stop_condition=lambda: False,
+           offset=0):
     with open(file_name) as f:
         if seek_end:
             f.seek(0, 2)
+        elif offset:
+            f.seek(offset)
         while True:
             if stop_condition():
                 break
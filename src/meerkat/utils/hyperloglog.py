@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+"""
+HyperLogLog utils.
+
+A HyperLogLog sketch estimates the number of distinct elements of a stream
+using a fixed amount of memory (2^precision one-byte registers). Sketches
+can be merged to estimate the cardinality of the union of their streams,
+sketches of different precisions being merged at the lowest one.
+
+Small sketches are kept sparse (a dictionary of non-zero registers) until
+they fill a sixteenth of their registers, so that keeping a lot of sketches
+with few elements in memory stays cheap.
+"""
+
+import hashlib
+import math
+import zlib
+
+
+def hash64(value):
+    """
+    Hash a value to a 64-bits integer.
+
+    Args:
+        value (str): the value to hash.
+
+    Returns:
+        int: the 64-bits hash.
+    """
+    digest = hashlib.sha1(str(value).encode('utf-8')).digest()  # nosec
+    return int.from_bytes(digest[:8], 'big')
+
+
+class HyperLogLog(object):
+    """HyperLogLog cardinality estimator."""
+
+    def __init__(self, precision=12, registers=None):
+        """
+        Init method.
+
+        Args:
+            precision (int): number of bits used to index the registers,
+                between 4 and 16.
+            registers (bytes): initial registers (length 2^precision).
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError('precision must be between 4 and 16')
+        self.precision = precision
+        self.size = 1 << precision
+        self.sparse_limit = self.size >> 4
+        self._registers = None
+        self._sparse = {}
+        if registers is not None:
+            if len(registers) != self.size:
+                raise ValueError('registers length must be 2^precision')
+            self._registers = bytearray(registers)
+            self._sparse = None
+
+    @property
+    def registers(self):
+        """
+        Return the dense registers, converting a sparse sketch if needed.
+
+        Returns:
+            bytearray: the registers.
+        """
+        if self._registers is None:
+            self._registers = self._sparse_to_dense()
+            self._sparse = None
+        return self._registers
+
+    def _sparse_to_dense(self):
+        registers = bytearray(self.size)
+        for index, rank in self._sparse.items():
+            registers[index] = rank
+        return registers
+
+    @property
+    def error(self):
+        """
+        Return the relative standard error of the estimation.
+
+        Returns:
+            float: 1.04 / sqrt(number of registers).
+        """
+        return 1.04 / math.sqrt(self.size)
+
+    def add(self, value):
+        """
+        Add a value to the sketch.
+
+        Args:
+            value (str): the value to add.
+        """
+        self.add_hash(hash64(value))
+
+    def add_hash(self, hashed):
+        """
+        Add an already hashed value to the sketch.
+
+        Args:
+            hashed (int): a 64-bits hash (see ``hash64``).
+        """
+        index = hashed >> (64 - self.precision)
+        remaining_bits = 64 - self.precision
+        rest = hashed & ((1 << remaining_bits) - 1)
+        rank = remaining_bits - rest.bit_length() + 1
+        sparse = self._sparse
+        if sparse is not None:
+            if rank > sparse.get(index, 0):
+                sparse[index] = rank
+                if len(sparse) > self.sparse_limit:
+                    self._registers = self._sparse_to_dense()
+                    self._sparse = None
+        elif rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def merge(self, other):
+        """
+        Merge another sketch into this one.
+
+        When the precisions differ, the sketch with the highest precision is
+        reduced to the other one first (see ``reduce``), so this sketch can
+        lose precision.
+
+        Args:
+            other (HyperLogLog): a sketch.
+
+        Returns:
+            HyperLogLog: self, updated.
+        """
+        if other.precision > self.precision:
+            other = other.reduce(self.precision)
+        elif other.precision < self.precision:
+            reduced = self.reduce(other.precision)
+            self.precision, self.size, self.sparse_limit = (
+                reduced.precision, reduced.size, reduced.sparse_limit)
+            self._registers, self._sparse = reduced._registers, None
+        if other._sparse is not None:
+            registers = self.registers
+            for index, rank in other._sparse.items():
+                if rank > registers[index]:
+                    registers[index] = rank
+        else:
+            self._registers = bytearray(
+                map(max, self.registers, other.registers))
+        return self
+
+    def reduce(self, precision):
+        """
+        Return this sketch with a lower precision.
+
+        The lowest bits of the index of each register become the highest
+        bits of its hash: the result is the sketch built with this precision
+        from the same values.
+
+        Args:
+            precision (int): the precision, lower or equal to this one.
+
+        Returns:
+            HyperLogLog: a new sketch.
+        """
+        if precision > self.precision:
+            raise ValueError('cannot increase the precision of a sketch')
+        result = HyperLogLog(precision)
+        registers = result.registers
+        shift = self.precision - precision
+        mask = (1 << shift) - 1
+        if self._sparse is not None:
+            ranks = self._sparse.items()
+        else:
+            ranks = ((index, rank) for index, rank in enumerate(
+                self._registers) if rank)
+        for index, rank in ranks:
+            low = index & mask
+            rank = shift - low.bit_length() + 1 if low else rank + shift
+            index >>= shift
+            if rank > registers[index]:
+                registers[index] = rank
+        return result
+
+    def count(self):
+        """
+        Estimate the number of distinct values added to the sketch.
+
+        Returns:
+            int: the estimated cardinality.
+        """
+        size = self.size
+        if size == 16:
+            alpha = 0.673
+        elif size == 32:
+            alpha = 0.697
+        elif size == 64:
+            alpha = 0.709
+        else:
+            alpha = 0.7213 / (1 + 1.079 / size)
+        if self._sparse is not None:
+            ranks = self._sparse.values()
+            zeros = size - len(self._sparse)
+        else:
+            ranks = [r for r in self._registers if r]
+            zeros = size - len(ranks)
+        estimate = alpha * size * size / (
+            zeros + sum(2.0 ** -r for r in ranks))
+        if estimate <= 2.5 * size:
+            if zeros:
+                estimate = size * math.log(size / float(zeros))
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+    def to_bytes(self):
+        """
+        Serialize the registers (compressed).
+
+        Returns:
+            bytes: the compressed registers.
+        """
+        if self._sparse is not None:
+            return zlib.compress(bytes(self._sparse_to_dense()))
+        return zlib.compress(bytes(self._registers))
+
+    @classmethod
+    def from_bytes(cls, data, precision=12):
+        """
+        Build a sketch from serialized registers.
+
+        Args:
+            data (bytes): the compressed registers (see ``to_bytes``).
+            precision (int): the precision of the serialized sketch.
+
+        Returns:
+            HyperLogLog: the sketch.
+        """
+        return cls(precision, zlib.decompress(bytes(data)))
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+"""
+IP address utils.
+
+IP addresses are converted to 128-bits integers, IPv4 addresses being
+mapped into the IPv6 space (``::ffff:a.b.c.d``), so that both families
+share one representation. A network is then a range of integers.
+
+Databases have no 128-bits integer type: integers are split into two
+signed 64-bits halves (see ``split_int``). Within a network of prefix
+length 1 or more, the order of the signed halves is the order of the
+addresses, so a network is still a range of (high, low) pairs.
+"""
+
+import functools
+import ipaddress
+
+_IPV4_MAPPED = 0xffff << 32
+_LOW_MASK = (1 << 64) - 1
+_SIGN_BIT = 1 << 63
+
+
+def ip_to_int(ip):
+    """
+    Convert an IP address to a 128-bits integer.
+
+    IPv4 addresses are mapped into the IPv6 space (``::ffff:a.b.c.d``).
+
+    Args:
+        ip (str): the IP address.
+
+    Returns:
+        int: the integer value (0 if ip is empty).
+    """
+    if not ip:
+        return 0
+    address = ipaddress.ip_address(ip)
+    if address.version == 4:
+        return _IPV4_MAPPED | int(address)
+    return int(address)
+
+
+def int_to_ip(value):
+    """
+    Convert a 128-bits integer back to an IP address.
+
+    Args:
+        value (int): the integer value (see ``ip_to_int``).
+
+    Returns:
+        str: the IP address (None if value is 0).
+    """
+    if not value:
+        return None
+    if value >> 32 == 0xffff:
+        return str(ipaddress.IPv4Address(value & 0xffffffff))
+    return str(ipaddress.IPv6Address(value))
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize_ip(ip):
+    """
+    Return the canonical form of an IP address.
+
+    IPv6 addresses are compressed and lower-cased, and IPv4-mapped IPv6
+    addresses (``::ffff:a.b.c.d``) are unmapped, so that one address always
+    has the same key.
+
+    Args:
+        ip (str): the IP address.
+
+    Returns:
+        str: the canonical IP address (None if ip is not an IP address).
+    """
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return str(address)
+
+
+@functools.lru_cache(maxsize=4096)
+def in_networks(ip, networks):
+    """
+    Tell if an IP address belongs to one of several networks.
+
+    Args:
+        ip (str): the canonical IP address (see ``normalize_ip``).
+        networks (tuple): the networks (``ipaddress`` objects).
+
+    Returns:
+        bool: True if one of the networks contains the IP address.
+    """
+    address = ipaddress.ip_address(ip)
+    return any(address in network for network in networks)
+
+
+def forwarded_ip(remote_ip, forwarded_for, trusted_proxies):
+    """
+    Return the IP address of the client of a proxied request.
+
+    The addresses of the X-Forwarded-For chain are read from right to left,
+    skipping the trusted proxies: the first other address is the client.
+    The chain is only read if the request comes from a trusted proxy,
+    since clients can send any X-Forwarded-For header.
+
+    Args:
+        remote_ip (str): the canonical IP address of the peer.
+        forwarded_for (str): the X-Forwarded-For header, comma-separated.
+        trusted_proxies (tuple): the networks of the trusted proxies.
+
+    Returns:
+        str: the canonical IP address of the client.
+    """
+    if not (remote_ip and forwarded_for and trusted_proxies and
+            in_networks(remote_ip, trusted_proxies)):
+        return remote_ip
+    for ip in reversed(forwarded_for.split(',')):
+        ip = normalize_ip(ip.strip())
+        if ip is None:
+            # Invalid entry (for example "unknown"): stop at the last proxy.
+            break
+        remote_ip = ip
+        if not in_networks(ip, trusted_proxies):
+            break
+    return remote_ip
+
+
+def to_signed(value):
+    """
+    Reinterpret an unsigned 64-bits integer as a signed one.
+
+    Args:
+        value (int): the unsigned (or already signed) integer.
+
+    Returns:
+        int: the signed integer, with the same bits.
+    """
+    value &= _LOW_MASK
+    return value - (1 << 64) if value & _SIGN_BIT else value
+
+
+def split_int(value):
+    """
+    Split a 128-bits integer into two signed 64-bits integers.
+
+    Args:
+        value (int): the integer value (see ``ip_to_int``).
+
+    Returns:
+        tuple: the high and low halves.
+    """
+    return to_signed(value >> 64), to_signed(value)
+
+
+def join_int(high, low):
+    """
+    Join two halves back into a 128-bits integer.
+
+    Args:
+        high (int): the high half, signed or not.
+        low (int): the low half, signed or not.
+
+    Returns:
+        int: the integer value.
+    """
+    return (high & _LOW_MASK) << 64 | low & _LOW_MASK
+
+
+@functools.lru_cache(maxsize=4096)
+def split_ip(ip):
+    """
+    Convert an IP address to two signed 64-bits integers.
+
+    Args:
+        ip (str): the IP address.
+
+    Returns:
+        tuple: the high and low halves (None, None if ip is empty).
+    """
+    if not ip:
+        return None, None
+    return split_int(ip_to_int(ip))
+
+
+def parse_network(network):
+    """
+    Parse a network, mapping IPv4 networks into the IPv6 space.
+
+    Args:
+        network (str): the network in CIDR notation (``203.0.113.0/24``),
+            or a single IP address.
+
+    Returns:
+        tuple: the first address of the network as a 128-bits integer, and
+            its prefix length in the IPv6 space (``/24`` becomes ``/120``).
+
+    Raises:
+        ValueError: if network is not a valid network (host bits must not
+            be set).
+    """
+    network = ipaddress.ip_network(network)
+    first = int(network.network_address)
+    prefix = network.prefixlen
+    if network.version == 4:
+        first |= _IPV4_MAPPED
+        prefix += 96
+    return first, prefix
+
+
+def network_range(network):
+    """
+    Return the first and last addresses of a network.
+
+    Args:
+        network (str): the network in CIDR notation.
+
+    Returns:
+        tuple: the first and last addresses as 128-bits integers.
+    """
+    first, prefix = parse_network(network)
+    return first, first | (1 << 128 - prefix) - 1
+
+
+def network_masks(prefix):
+    """
+    Return the masks of the halves of the addresses of a prefix length.
+
+    Args:
+        prefix (int): the prefix length, in the IPv6 space.
+
+    Returns:
+        tuple: the signed masks of the high and low halves.
+    """
+    return split_int(((1 << prefix) - 1) << 128 - prefix)
+
+
+def network_to_str(value, prefix):
+    """
+    Format a network given as a 128-bits integer and a prefix length.
+
+    Args:
+        value (int): the first address (see ``ip_to_int``).
+        prefix (int): the prefix length, in the IPv6 space.
+
+    Returns:
+        str: the network in CIDR notation (IPv4 networks are unmapped).
+    """
+    if value >> 32 == 0xffff and prefix >= 96:
+        return '%s/%s' % (
+            ipaddress.IPv4Address(value & 0xffffffff), prefix - 96)
+    return '%s/%s' % (ipaddress.IPv6Address(value), prefix)
@@ -2,6 +2,7 @@
 
 """IP information utils."""
 
+import threading
 import time
 from datetime import datetime, timedelta
 
@@ -14,6 +15,7 @@ class BaseRequestRateHandler(object):
     rate = 0
     per = 0
     support_batch = False
+    max_batch_size = 0
 
     def __init__(self, rate=None, per=None):
         self.timedelta_type = type(timedelta())
@@ -25,6 +27,7 @@ class BaseRequestRateHandler(object):
             self.per = timedelta(seconds=self.per)
         self.allowance = self.rate
         self.interval_first_hit = None
+        self.lock = threading.Lock()
 
     def hit(self, number=1):
         now = datetime.now()
@@ -49,10 +52,18 @@ class BaseRequestRateHandler(object):
     def _get(self, ip):
         raise NotImplementedError
 
+    def _take(self, number=1):
+        # Count the hits before the requests so that threads sharing the
+        # handler do not exceed the rate.
+        with self.lock:
+            if self.can_hit(number - 1):
+                self.hit(number)
+                return True
+            return False
+
     def get(self, ip, wait=True):
-        if self.can_hit():
+        if self._take():
             response = self._get(ip)
-            self.hit()
             return self.format(response)
         elif wait:
             time.sleep(self.time_to_wait())
@@ -63,9 +74,8 @@ class BaseRequestRateHandler(object):
         raise NotImplementedError
 
     def batch(self, ips, wait=True):
-        if self.can_hit(len(ips)):
+        if self._take(len(ips)):
             response = self._batch(ips)
-            self.hit(len(ips))
             return self.format_batch(response)
         elif wait:
             time.sleep(self.time_to_wait())
@@ -129,6 +139,7 @@ class IpAPIHandler(BaseRequestRateHandler):
     rate = 150
     per = 60
     support_batch = True
+    max_batch_size = 100
 
     def format(self, data):
         return dict(
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+"""
+Leader election utils.
+
+Several processes (web workers, management commands) can try to run the
+same background task: a lock shared by all of them is acquired without
+blocking, and only the process holding it (the leader) runs the task. The
+lock is released by the system when the leader dies, so another process
+takes over at its next attempt.
+
+Two locks are available: a PostgreSQL session-level advisory lock (the lock
+lives as long as the database connection that took it), and an exclusive
+``flock`` on a file, for other databases when all processes run on the same
+machine.
+"""
+
+import os
+import tempfile
+import zlib
+
+from django.db import connections
+
+from .thread import StoppableThread
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+class AdvisoryLock(object):
+    """PostgreSQL session-level advisory lock."""
+
+    def __init__(self, name, using='default'):
+        """
+        Init method.
+
+        Args:
+            name (str): the lock name, hashed into the lock key.
+            using (str): the database alias.
+        """
+        self.key = zlib.crc32(name.encode('utf-8'))
+        self.using = using
+        self.held = False
+
+    def acquire(self):
+        """
+        Try to acquire the lock without blocking.
+
+        Returns:
+            bool: whether the lock is held.
+        """
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [self.key])
+            self.held = cursor.fetchone()[0]
+        return self.held
+
+    def check(self):
+        """
+        Check that the lock is still held.
+
+        The lock is lost with the connection that acquired it.
+
+        Returns:
+            bool: whether the lock is still held.
+        """
+        if not self.held:
+            return False
+        try:
+            with connections[self.using].cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception:
+            self.held = False
+            connections[self.using].close()
+        return self.held
+
+    def release(self):
+        """Release the lock."""
+        if self.held:
+            self.held = False
+            try:
+                with connections[self.using].cursor() as cursor:
+                    cursor.execute(
+                        'SELECT pg_advisory_unlock(%s)', [self.key])
+            except Exception:
+                connections[self.using].close()
+
+
+class FileLock(object):
+    """Exclusive lock on a file (Unix only)."""
+
+    def __init__(self, path):
+        """
+        Init method.
+
+        Args:
+            path (str): the lock file path (created if needed).
+        """
+        self.path = path
+        self.file = None
+
+    @property
+    def held(self):
+        return self.file is not None
+
+    def acquire(self):
+        """
+        Try to acquire the lock without blocking.
+
+        Returns:
+            bool: whether the lock is held.
+        """
+        if fcntl is None:  # pragma: no cover
+            raise OSError('File locks are not supported on this platform')
+        if self.file is None:
+            lock_file = open(self.path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self.file = lock_file
+        return True
+
+    def check(self):
+        """
+        Check that the lock is still held.
+
+        Returns:
+            bool: whether the lock is still held.
+        """
+        return self.held
+
+    def release(self):
+        """Release the lock."""
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+
+def get_lock(name, using='default', path=None):
+    """
+    Return the lock fitting the database backend.
+
+    Args:
+        name (str): the lock name.
+        using (str): the database alias.
+        path (str): the lock file path, for databases other than PostgreSQL
+            (default: ``<name>.lock`` in the temporary directory).
+
+    Returns:
+        AdvisoryLock/FileLock: the lock.
+    """
+    if connections[using].vendor == 'postgresql':
+        return AdvisoryLock(name, using)
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), '%s.lock' % name)
+    return FileLock(path)
+
+
+class LeaderElector(StoppableThread):
+    """
+    Thread running a task only while holding a lock.
+
+    The task is another thread, created by a factory each time the
+    leadership is acquired, and stopped when it is lost.
+    """
+
+    def __init__(self, lock, task_factory, interval=5, *args, **kwargs):
+        """
+        Init method.
+
+        Args:
+            lock (AdvisoryLock/FileLock): the shared lock.
+            task_factory (callable): return a new (not started)
+                StoppableThread to run while leading.
+            interval (int): seconds between two attempts (or checks).
+        """
+        super(LeaderElector, self).__init__(*args, **kwargs)
+        self.lock = lock
+        self.task_factory = task_factory
+        self.interval = interval
+        self.task = None
+
+    @property
+    def leading(self):
+        """
+        Whether this thread is the leader.
+
+        Returns:
+            bool: True if the task is running.
+        """
+        return self.task is not None and self.task.is_alive()
+
+    def step(self):
+        """Acquire or check the leadership, and start or stop the task."""
+        if self.task is None:
+            if self.lock.acquire():
+                self.task = self.task_factory()
+                self.task.start()
+        elif not self.lock.check() or not self.task.is_alive():
+            self.stop_task()
+
+    def stop_task(self):
+        """Stop the task and release the lock."""
+        if self.task is not None:
+            self.task.stop()
+            self.task.join()
+            self.task = None
+        self.lock.release()
+
+    def run(self):
+        try:
+            while not self.stopped():
+                self.step()
+                self._stopped.wait(self.interval)
+        finally:
+            self.stop_task()
+            connections.close_all()
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+"""
+Metrics utils.
+
+Counters, gauges and histograms, identified by a name and optional label
+values, and rendered in the Prometheus text exposition format. Values are
+kept in memory (one registry per process) and can be exported as a
+snapshot, to be merged with the snapshots of other processes.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"').replace('\n', '\\n'))
+        for name, value in labels)
+
+
+class Metric(object):
+    """Base class for metrics."""
+
+    type = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        """
+        Init method.
+
+        Args:
+            name (str): the metric name.
+            help_text (str): the metric description.
+            labelnames (tuple): the names of the labels.
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        """
+        Return a copy of the values.
+
+        Returns:
+            dict: values by tuple of label values.
+        """
+        with self.lock:
+            return {key: self._copy(value)
+                    for key, value in self.values.items()}
+
+    def _copy(self, value):
+        return value
+
+    def merge(self, values, other):
+        """
+        Merge the values of two snapshots.
+
+        Args:
+            values (dict): values of a snapshot (modified in place).
+            other (dict): values of another snapshot.
+        """
+        for key, value in other.items():
+            if key in values:
+                values[key] = values[key] + value
+            else:
+                values[key] = value
+
+    def samples(self, values):
+        """
+        Yield the samples of a snapshot.
+
+        Args:
+            values (dict): the values of a snapshot.
+
+        Yields:
+            tuple: suffix, labels (tuple of pairs) and value.
+        """
+        for key, value in sorted(values.items()):
+            yield '', tuple(zip(self.labelnames, key)), value
+
+    def render(self, values):
+        """
+        Render a snapshot in Prometheus text format.
+
+        Args:
+            values (dict): the values of a snapshot.
+
+        Returns:
+            str: the rendered metric.
+        """
+        lines = ['# HELP %s %s' % (self.name, self.help_text),
+                 '# TYPE %s %s' % (self.name, self.type)]
+        for suffix, labels, value in self.samples(values):
+            lines.append('%s%s%s %s' % (
+                self.name, suffix, _format_labels(labels),
+                _format_value(value)))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """
+        Increment the counter.
+
+        Args:
+            amount (int/float): the increment.
+            **labels: the label values.
+        """
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that can go up and down."""
+
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        """
+        Set the gauge value.
+
+        Args:
+            value (int/float): the value.
+            **labels: the label values.
+        """
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def merge(self, values, other):
+        # Gauges are not additive: keep the local values.
+        for key, value in other.items():
+            values.setdefault(key, value)
+
+
+class Histogram(Metric):
+    """Observations counted in cumulative buckets."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        """
+        Init method.
+
+        Args:
+            name (str): the metric name.
+            help_text (str): the metric description.
+            labelnames (tuple): the names of the labels.
+            buckets (tuple): the sorted upper bounds of the buckets.
+        """
+        super(Histogram, self).__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'), )
+
+    def _copy(self, value):
+        return list(value)
+
+    def observe(self, value, **labels):
+        """
+        Count an observation.
+
+        Args:
+            value (int/float): the observed value.
+            **labels: the label values.
+        """
+        key = self._key(labels)
+        with self.lock:
+            # Per-bucket counts, then count and sum.
+            counts = self.values.get(key, None)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 2)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the duration of a block of code, in seconds.
+
+        Args:
+            **labels: the label values.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def merge(self, values, other):
+        for key, value in other.items():
+            if key in values:
+                values[key] = [a + b for a, b in zip(values[key], value)]
+            else:
+                values[key] = list(value)
+
+    def samples(self, values):
+        for key, counts in sorted(values.items()):
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield '_bucket', labels + (('le', _format_value(
+                    float(bound))), ), cumulative
+            yield '_count', labels, counts[-2]
+            yield '_sum', labels, counts[-1]
+
+
+class Registry(object):
+    """A collection of metrics."""
+
+    def __init__(self):
+        """Init method."""
+        self.metrics = []
+
+    def register(self, metric):
+        """
+        Register a metric.
+
+        Args:
+            metric (Metric): the metric.
+
+        Returns:
+            Metric: the same metric.
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        """Create and register a counter (see Counter)."""
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        """Create and register a gauge (see Gauge)."""
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        """Create and register a histogram (see Histogram)."""
+        return self.register(Histogram(*args, **kwargs))
+
+    def snapshot(self):
+        """
+        Return a copy of the values of every metric.
+
+        Returns:
+            dict: snapshots by metric name (picklable).
+        """
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+    def render(self, *others):
+        """
+        Render every metric in Prometheus text format.
+
+        Args:
+            *others (dict): snapshots of other processes to merge in.
+
+        Returns:
+            str: the rendered metrics.
+        """
+        blocks = []
+        for metric in self.metrics:
+            values = metric.snapshot()
+            for other in others:
+                metric.merge(values, other.get(metric.name, {}))
+            blocks.append(metric.render(values))
+        return '\n'.join(blocks) + '\n'
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""
+Ring buffer utils.
+
+A ring buffer keeps the last items appended to it, each one with an
+increasing sequence number. Readers remember the last sequence number they
+have seen and wait for newer items, so one buffer can feed any number of
+readers without copying data for each of them.
+
+Sequence numbers only make sense for the buffer that gave them: each
+buffer has a random token, so that readers can tell whether a sequence
+number comes from another buffer (another process, or before a restart).
+"""
+
+import collections
+import threading
+import uuid
+
+
+class RingBuffer(object):
+    """Thread-safe ring buffer with sequence numbers."""
+
+    def __init__(self, capacity=1000):
+        """
+        Init method.
+
+        Args:
+            capacity (int): the maximum number of items kept.
+        """
+        self.capacity = capacity
+        self.items = collections.deque(maxlen=capacity)
+        self.last_seq = 0
+        self.token = uuid.uuid4().hex[:8]
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        return len(self.items)
+
+    def extend(self, items):
+        """
+        Append items and wake up the waiting readers.
+
+        Args:
+            items (iterable): the items to append.
+        """
+        with self.condition:
+            for item in items:
+                self.last_seq += 1
+                self.items.append((self.last_seq, item))
+            self.condition.notify_all()
+
+    def append(self, item):
+        """
+        Append an item and wake up the waiting readers.
+
+        Args:
+            item (object): the item to append.
+        """
+        self.extend((item, ))
+
+    def since(self, seq):
+        """
+        Return the items newer than a sequence number.
+
+        Args:
+            seq (int): the last sequence number seen by the reader.
+
+        Returns:
+            tuple: the last sequence number and the list of newer items
+                (items that were already dropped from the buffer are lost).
+        """
+        with self.condition:
+            if seq >= self.last_seq:
+                return self.last_seq, []
+            newer = self.last_seq - seq
+            if newer >= len(self.items):
+                items = [item for _, item in self.items]
+            else:
+                items = [item for _, item in list(self.items)[-newer:]]
+            return self.last_seq, items
+
+    def resume(self, seq, token):
+        """
+        Return the sequence number to resume reading from.
+
+        Args:
+            seq (int): the last sequence number seen by the reader.
+            token (str): the token of the buffer that gave seq.
+
+        Returns:
+            int: seq if it was given by this buffer, else the last sequence
+                number (only newer items will be read).
+        """
+        with self.condition:
+            if token != self.token or not 0 <= seq <= self.last_seq:
+                return self.last_seq
+            return seq
+
+    def wait(self, seq, timeout=None):
+        """
+        Wait for items newer than a sequence number.
+
+        Args:
+            seq (int): the last sequence number seen by the reader.
+            timeout (float): maximum number of seconds to wait.
+
+        Returns:
+            bool: whether newer items are available.
+        """
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: self.last_seq > seq, timeout)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sliding window utils.
+
+Counters over a sliding time window, for many keys (for example one per IP
+address). Each key keeps a small ring of per-second buckets, holding only
+the seconds with hits (at most one bucket per second of the window), and
+the running totals of its buckets: adding a hit and reading the totals
+cost O(1) amortized, each bucket being dropped once when it leaves the
+window.
+
+Keys are kept in least recently used order: keys idle for a whole window
+are evicted, and the least recently used keys are evicted when there are
+more keys than the capacity, so memory stays bounded whatever the number of
+distinct keys.
+"""
+
+import bisect
+import collections
+
+
+class _Counters(object):
+    __slots__ = ('last', 'totals', 'buckets')
+
+    def __init__(self, slots):
+        self.last = None
+        self.totals = [0] * slots
+        self.buckets = []
+
+
+class SlidingWindowCounters(object):
+    """Per-key counters over a sliding window of seconds."""
+
+    def __init__(self, window=60, slots=1, capacity=100000):
+        """
+        Init method.
+
+        Args:
+            window (int): the window length in seconds.
+            slots (int): the number of counters per key (for example one
+                per class of status codes).
+            capacity (int): the maximum number of keys.
+        """
+        self.window = window
+        self.slots = slots
+        self.capacity = capacity
+        self.now = None
+        self.keys = collections.OrderedDict()
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def add(self, key, second, slots=(0, )):
+        """
+        Count a hit for a key.
+
+        Hits older than the last bucket of the key (out of order input) are
+        counted in the bucket of their second, and hits older than the
+        window of the key are not counted at all.
+
+        Args:
+            key (hashable): the key.
+            second (int): the timestamp of the hit, in seconds.
+            slots (tuple): the counters to increment.
+
+        Returns:
+            list: the totals of the key in the window (do not modify),
+                zeros if the hit was too old to be counted.
+        """
+        counters = self.keys.get(key, None)
+        if counters is None:
+            counters = self.keys[key] = _Counters(self.slots)
+        else:
+            self.keys.move_to_end(key)
+        if counters.last is None or second > counters.last:
+            counters.last = second
+            self._expire(counters, second - self.window)
+            bucket = [second] + [0] * self.slots
+            counters.buckets.append(bucket)
+        elif second > counters.last - self.window:
+            bucket = self._bucket(counters.buckets, second)
+        else:
+            return [0] * self.slots
+        for slot in slots:
+            bucket[slot + 1] += 1
+            counters.totals[slot] += 1
+        self.now = second if self.now is None else max(self.now, second)
+        self._evict()
+        return counters.totals
+
+    def _expire(self, counters, limit):
+        buckets = counters.buckets
+        expired = 0
+        for bucket in buckets:
+            if bucket[0] > limit:
+                break
+            expired += 1
+            totals = counters.totals
+            for slot in range(self.slots):
+                totals[slot] -= bucket[slot + 1]
+        if expired:
+            del buckets[:expired]
+
+    def _bucket(self, buckets, second):
+        # Buckets are sorted by second: find or insert the one of second.
+        index = bisect.bisect_left(buckets, [second])
+        if index < len(buckets) and buckets[index][0] == second:
+            return buckets[index]
+        bucket = [second] + [0] * self.slots
+        buckets.insert(index, bucket)
+        return bucket
+
+    def get(self, key):
+        """
+        Return the totals of a key.
+
+        Args:
+            key (hashable): the key.
+
+        Returns:
+            list: the totals (zeros if the key is unknown or idle).
+        """
+        totals = [0] * self.slots
+        counters = self.keys.get(key, None)
+        if counters is None:
+            return totals
+        limit = self.now - self.window
+        for bucket in counters.buckets:
+            if bucket[0] > limit:
+                for slot in range(self.slots):
+                    totals[slot] += bucket[slot + 1]
+        return totals
+
+    def _evict(self):
+        # Keys are in LRU order: evict the least recently used keys beyond
+        # the capacity, then every idle key at the head.
+        keys = self.keys
+        while len(keys) > self.capacity:
+            keys.popitem(last=False)
+            self.evicted += 1
+        limit = self.now - self.window
+        while keys:
+            key, counters = next(iter(keys.items()))
+            if counters.last > limit:
+                break
+            del keys[key]
+            self.evicted += 1
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""
+Space-Saving utils.
+
+The Space-Saving algorithm finds the most frequent items of a stream
+(the heavy hitters) while monitoring at most ``capacity`` items. When a new
+item arrives and the capacity is reached, the least frequent monitored item
+is replaced by the new one, which inherits its count as an error bound.
+Every item occurring more than N / capacity times is guaranteed to be
+monitored, N being the length of the stream.
+"""
+
+import heapq
+
+
+class SpaceSaving(object):
+    """Space-Saving top-k counter with bounded memory."""
+
+    def __init__(self, capacity=1000):
+        """
+        Init method.
+
+        Args:
+            capacity (int): maximum number of monitored items.
+        """
+        if capacity < 1:
+            raise ValueError('capacity must be positive')
+        self.capacity = capacity
+        self.total = 0
+        self.counters = {}
+        self._heap = []
+
+    def __len__(self):
+        return len(self.counters)
+
+    def add(self, item, count=1):
+        """
+        Count an item.
+
+        Args:
+            item (hashable): the item to count.
+            count (int): how many times to count it.
+        """
+        self.total += count
+        counters = self.counters
+        counter = counters.get(item, None)
+        if counter is not None:
+            counter[0] += count
+        elif len(counters) < self.capacity:
+            counter = counters[item] = [count, 0]
+        else:
+            minimum, evicted = self._pop_minimum()
+            del counters[evicted]
+            counter = counters[item] = [minimum + count, minimum]
+        heapq.heappush(self._heap, (counter[0], item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c[0], i) for i, c in counters.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_minimum(self):
+        # Heap entries are not updated in place: skip the outdated ones.
+        heap = self._heap
+        while True:
+            count, item = heapq.heappop(heap)
+            counter = self.counters.get(item, None)
+            if counter is not None and counter[0] == count:
+                return count, item
+
+    def top(self, n=None):
+        """
+        Return the most frequent items.
+
+        Args:
+            n (int): number of items to return (default: all monitored).
+
+        Returns:
+            list: tuples (item, count, error), by decreasing count. The real
+                count of an item is between count - error and count.
+        """
+        items = sorted(self.counters.items(),
+                       key=lambda x: x[1][0], reverse=True)
+        if n is not None:
+            items = items[:n]
+        return [(item, count, error) for item, (count, error) in items]
+
+    def clear(self):
+        """Forget every monitored item."""
+        self.total = 0
+        self.counters.clear()
+        self._heap = []
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+"""
+T-Digest utils.
+
+A t-digest summarizes a distribution of values with a small list of
+centroids (mean and weight), smaller near the tails, so that extreme
+quantiles (p95, p99) stay accurate. Digests can be merged, which allows
+to compute quantiles over any union of buckets without sorting raw values.
+
+This is the merging variant of the algorithm: values are buffered, then
+merged with the centroids when the buffer is full, using the
+``k1`` scale function.
+"""
+
+import math
+import struct
+
+_HEADER = struct.Struct('<ddd')
+_CENTROID = struct.Struct('<dd')
+
+
+class TDigest(object):
+    """Merging t-digest."""
+
+    def __init__(self, compression=100):
+        """
+        Init method.
+
+        Args:
+            compression (int): the compression parameter: a digest keeps
+                at most about ``compression`` centroids.
+        """
+        self.compression = compression
+        self.centroids = []
+        self.buffer = []
+        self.buffer_size = 5 * compression
+        self.total = 0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def __len__(self):
+        return int(self.total + sum(w for _, w in self.buffer))
+
+    def add(self, value, weight=1):
+        """
+        Add a value to the digest.
+
+        Args:
+            value (float): the value to add.
+            weight (int): the weight of the value.
+        """
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.buffer.append((value, weight))
+        if len(self.buffer) >= self.buffer_size:
+            self.compress()
+
+    def merge(self, other):
+        """
+        Merge another digest into this one.
+
+        Args:
+            other (TDigest): the digest to merge.
+
+        Returns:
+            TDigest: self, updated.
+        """
+        other.compress()
+        if other.centroids:
+            self.buffer.extend(tuple(c) for c in other.centroids)
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self.compress()
+        return self
+
+    def _k_inverse(self, k):
+        angle = min(k * 2 * math.pi / self.compression, math.pi / 2)
+        return (math.sin(angle) + 1) / 2
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def compress(self):
+        """Merge the buffered values with the centroids."""
+        if not self.buffer:
+            return
+        values = self.centroids + [list(v) for v in self.buffer]
+        self.buffer = []
+        values.sort(key=lambda c: c[0])
+        total = float(sum(w for _, w in values))
+        result = []
+        current = values[0]
+        q0 = 0
+        q_limit = self._k_inverse(self._k(q0) + 1)
+        for mean, weight in values[1:]:
+            q = q0 + (current[1] + weight) / total
+            if q <= q_limit:
+                merged_weight = current[1] + weight
+                current[0] += (mean - current[0]) * weight / merged_weight
+                current[1] = merged_weight
+            else:
+                result.append(current)
+                q0 += current[1] / total
+                q_limit = self._k_inverse(self._k(q0) + 1)
+                current = [mean, weight]
+        result.append(current)
+        self.centroids = result
+        self.total = total
+
+    def quantile(self, q):
+        """
+        Estimate a quantile.
+
+        Args:
+            q (float): the quantile, between 0 and 1.
+
+        Returns:
+            float: the estimated value (None if the digest is empty).
+        """
+        self.compress()
+        centroids = self.centroids
+        if not centroids:
+            return None
+        if len(centroids) == 1:
+            return centroids[0][0]
+        target = q * self.total
+        cumulative = 0
+        previous_mean, previous_center = self.min, 0
+        for mean, weight in centroids:
+            center = cumulative + weight / 2.0
+            if target < center:
+                if center == previous_center:
+                    return mean
+                return previous_mean + (target - previous_center) * (
+                    mean - previous_mean) / (center - previous_center)
+            cumulative += weight
+            previous_mean, previous_center = mean, center
+        if self.total == previous_center:
+            return self.max
+        return previous_mean + (target - previous_center) * (
+            self.max - previous_mean) / (self.total - previous_center)
+
+    def to_bytes(self):
+        """
+        Serialize the digest.
+
+        Returns:
+            bytes: the serialized digest.
+        """
+        self.compress()
+        return _HEADER.pack(self.compression, self.min, self.max) + b''.join(
+            _CENTROID.pack(mean, weight) for mean, weight in self.centroids)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Build a digest from its serialization.
+
+        Args:
+            data (bytes): the serialized digest (see ``to_bytes``).
+
+        Returns:
+            TDigest: the digest.
+        """
+        data = bytes(data)
+        compression, minimum, maximum = _HEADER.unpack_from(data)
+        digest = cls(int(compression))
+        digest.min, digest.max = minimum, maximum
+        digest.centroids = [
+            list(c) for c in _CENTROID.iter_unpack(data[_HEADER.size:])]
+        digest.total = float(sum(w for _, w in digest.centroids))
+        return digest
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import collections
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
 
 class StoppableThread(threading.Thread):
@@ -16,3 +18,42 @@ class StoppableThread(threading.Thread):
 
     def stopped(self):
         return self._stopped.isSet()
+
+
+def map_in_threads(func, items, workers=1, window=None):
+    """
+    Apply a function to items in threads, with a bounded number of calls.
+
+    At most ``window`` calls are submitted and not consumed yet, so that
+    items are not all submitted up front. When the consumer stops (for
+    example on an exception raised by a call), the pending calls are
+    cancelled.
+
+    Args:
+        func (callable): the function, taking an item as only argument.
+        items (iterable): the items.
+        workers (int): the number of threads.
+        window (int): the maximum number of pending calls
+            (default: twice the number of threads).
+
+    Yields:
+        tuple: each item and its result, in the order of the items.
+    """
+    if window is None:
+        window = 2 * workers
+    items = iter(items)
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            while True:
+                for item in items:
+                    pending.append((item, executor.submit(func, item)))
+                    if len(pending) >= window:
+                        break
+                if not pending:
+                    return
+                item, future = pending.popleft()
+                yield item, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
@@ -18,6 +18,19 @@ def ms_since_epoch(dt):
     return (dt - datetime(1970, 1, 1)).total_seconds() * 1000
 
 
+def datetime_from_ms(ms):
+    """
+    Get the date and time corresponding to milliseconds since epoch.
+
+    Args:
+        ms (int): number of milliseconds (see ``ms_since_epoch``).
+
+    Returns:
+        datetime: the (naive) date and time.
+    """
+    return datetime(1970, 1, 1) + timedelta(milliseconds=ms)
+
+
 def daterange(start_date, end_date):
     """
     Yield one date per day from starting date to ending date.
@@ -5,10 +5,34 @@ from django.utils.translation import ugettext as _
 from suit_dashboard import Column, DashboardView, Grid, Row
 
 
+class LazyGrid(object):
+    """
+    Descriptor building a grid on first access.
+
+    The grid (and its boxes) is then memoized for the whole process, so
+    that importing views and URLs does not build any box.
+    """
+
+    def __init__(self, builder):
+        """
+        Init method.
+
+        Args:
+            builder (callable): function returning the Grid instance.
+        """
+        self.builder = builder
+        self.grid = None
+
+    def __get__(self, instance, owner):
+        if self.grid is None:
+            self.grid = self.builder()
+        return self.grid
+
+
 class HomeView(DashboardView):
     """Main view. Parent class and entry point for other views."""
 
     template_name = 'meerkat/main.html'
     crumbs = ({'name': _('Home'), 'url': 'admin:index'}, )
     # TODO: find a way to add menu boxes for each meerkat plugin
-    grid = Grid(Row(Column()))
+    grid = LazyGrid(lambda: Grid(Row(Column())))
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+"""Admin tests."""
+
+import datetime
+from types import SimpleNamespace
+
+from django.contrib import admin
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from meerkat.logs.admin import (
+    CachedAllValuesFieldListFilter, EstimatedCountPaginator, LogInline,
+    RequestLogAdmin)
+from meerkat.logs.models import DailyRequestCount, IPInfo, RequestLog
+from meerkat.templatetags.meerkat_admin import rollup_date_hierarchy
+
+
+def changelist(**params):
+    def get_query_string(new_params, remove):
+        return '?%s' % urlencode(sorted(new_params.items()))
+    return SimpleNamespace(date_hierarchy='datetime', params=params,
+                           get_query_string=get_query_string)
+
+
+class EstimatedCountPaginatorTestCase(TestCase):
+    """Estimated count paginator test case."""
+
+    def setUp(self):
+        """Setup method."""
+        RequestLog.objects.bulk_create([
+            RequestLog(client_ip_address='1.2.3.4', datetime=timezone.now(),
+                       url='/', status_code=status_code, bytes_sent=10)
+            for status_code in (200, 200, 404)])
+
+    def count(self, queryset=None, **attributes):
+        if queryset is None:
+            queryset = RequestLog.objects.order_by('-id')
+        paginator = EstimatedCountPaginator(queryset, 100)
+        for name, value in attributes.items():
+            setattr(paginator, name, value)
+        return paginator.count
+
+    def test_fallback(self):
+        """Without a usable rollup (SQLite), rows are counted."""
+        assert self.count() == 3
+        DailyRequestCount.objects.create(date=datetime.date.today(), count=0)
+        assert self.count() == 3
+        assert self.count(count_limit=2) == 2
+
+    def test_estimate(self):
+        """Large unfiltered tables are estimated with the rollup."""
+        DailyRequestCount.objects.create(
+            date=datetime.date.today(), count=200000)
+        with self.assertNumQueries(1):
+            assert self.count() == 200000
+        assert self.count(
+            RequestLog.objects.filter(status_code=404).order_by('-id')) == 1
+        # Estimations of small tables are not trusted.
+        assert self.count(exact_limit=10 ** 6) == 3
+
+
+class CachedAllValuesFieldListFilterTestCase(TestCase):
+    """Cached distinct values filter test case."""
+
+    def setUp(self):
+        """Setup method."""
+        cache.clear()
+        RequestLog.objects.bulk_create([
+            RequestLog(client_ip_address='1.2.3.4', datetime=timezone.now(),
+                       url='/', verb=verb, status_code=200, bytes_sent=10)
+            for verb in ('GET', 'POST', 'GET')])
+
+    def get_filter(self):
+        return CachedAllValuesFieldListFilter(
+            RequestLog._meta.get_field('verb'), RequestFactory().get('/'),
+            {}, RequestLog, RequestLogAdmin(RequestLog, admin.site), 'verb')
+
+    def test_cache(self):
+        """Distinct values are computed once."""
+        assert self.get_filter().lookup_choices == ['GET', 'POST']
+        RequestLog.objects.update(verb='PUT')
+        with self.assertNumQueries(0):
+            assert self.get_filter().lookup_choices == ['GET', 'POST']
+
+
+class RollupDateHierarchyTestCase(TestCase):
+    """Date hierarchy from rollups test case."""
+
+    def titles(self, **params):
+        return [choice['title'] for choice in rollup_date_hierarchy(
+            changelist(**params))['choices']]
+
+    def test_empty(self):
+        """Without days, there are no choices."""
+        assert self.titles() == []
+        assert rollup_date_hierarchy(
+            SimpleNamespace(date_hierarchy=None)) == {}
+
+    def test_drill_down(self):
+        """Years, months and days are read from the rollup."""
+        for date, count in (('2017-12-31', 5), ('2018-01-02', 3),
+                            ('2018-01-20', 0), ('2018-02-01', 1)):
+            DailyRequestCount.objects.create(date=date, count=count)
+        assert self.titles() == ['2017', '2018']
+        assert self.titles(datetime__year='2018') == [
+            'January 2018', 'February 2018']
+        # Days without request logs are not listed.
+        assert self.titles(datetime__year='2018',
+                           datetime__month='1') == ['January 2']
+        context = rollup_date_hierarchy(changelist(
+            datetime__year='2018', datetime__month='1', datetime__day='2'))
+        assert context['back']['link'] == (
+            '?datetime__month=1&datetime__year=2018')
+
+    def test_single_month(self):
+        """Days are listed directly when all of them are in one month."""
+        DailyRequestCount.objects.create(date='2018-03-04', count=1)
+        assert self.titles() == ['March 4']
+
+
+class LogInlineTestCase(TestCase):
+    """Lazy request logs inline test case."""
+
+    def setUp(self):
+        """Setup method."""
+        self.ip_info = IPInfo.objects.create(ip_address='1.2.3.4')
+        now = timezone.now()
+        # Request logs with the same datetime are ordered by ID.
+        RequestLog.objects.bulk_create([
+            RequestLog(client_ip_address='1.2.3.4', ip_info=self.ip_info,
+                       datetime=now - datetime.timedelta(seconds=i // 2),
+                       url='/', status_code=status_code, bytes_sent=10)
+            for i, status_code in enumerate((200, 404, 404, 500, 200))])
+        RequestLog.objects.bulk_create([RequestLog(
+            client_ip_address='5.6.7.8', datetime=now, url='/',
+            status_code=200, bytes_sent=10)])
+
+    def test_pages(self):
+        """Pages follow each other without gaps nor duplicates."""
+        inline = LogInline()
+        inline.page_size = 2
+        queryset = inline.get_queryset(self.ip_info)
+        expected = list(queryset.values_list('status_code', flat=True))
+        assert len(expected) == 5
+        status_codes, after = [], None
+        while True:
+            rows, after = inline.get_page(queryset, after)
+            status_codes.extend(int(row[2]) for row in rows)
+            if after is None:
+                break
+        assert status_codes == expected
+
+    def test_summary(self):
+        """The summary is computed in one query."""
+        inline = LogInline()
+        with self.assertNumQueries(1):
+            summary = dict(inline.get_summary(
+                inline.get_queryset(self.ip_info)))
+        assert [summary[label] for label in (
+            'Total', '4xx responses', '5xx responses')] == [5, 2, 1]
+
+    def test_index(self):
+        """Pages are served by an index on (ip_info, datetime, id)."""
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, RequestLog._meta.db_table)
+        assert ['ip_info_id', 'datetime', 'id'] in [
+            constraint['columns'] for constraint in constraints.values()
+            if constraint['index']]
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+"""Columnar engine tests."""
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from meerkat.logs import columnar, stats
+from meerkat.logs.models import RequestLog
+
+
+@unittest.skipIf(columnar.np is None, 'NumPy is not installed')
+class ColumnarLogsTestCase(TestCase):
+    """Columnar engine test case."""
+
+    def setUp(self):
+        """Setup method."""
+        now = timezone.now()
+        for i, (ip, status, url) in enumerate((
+                ('1.2.3.4', 200, '/a'), ('1.2.3.4', 404, '/b'),
+                ('::1', 200, '/a'), (None, 502, '/a'))):
+            RequestLog.objects.create(
+                client_ip_address=ip, status_code=status, url=url,
+                datetime=now - datetime.timedelta(days=i), bytes_sent=10)
+
+    def test_group_count(self):
+        """Group counts match the database."""
+        logs = columnar.ColumnarLogs.from_queryset()
+        assert len(logs) == 4
+        assert logs.group_count('status_code') == {200: 2, 404: 1, 502: 1}
+        assert logs.group_count('url') == {'/a': 3, '/b': 1}
+        mask = logs.isin('status_code', (404, 502))
+        assert logs.group_count('url', mask) == {'/a': 1, '/b': 1}
+        days, edges = logs.day_bins()
+        assert logs.histogram('timestamp', edges).sum() == 4
+
+    def test_status_codes_by_date(self):
+        """The columnar engine and SQL give the same buckets."""
+        RequestLog.objects.create(
+            client_ip_address='1.2.3.4', status_code=101, url='/a',
+            datetime=timezone.now(), bytes_sent=10, signatures=1)
+        RequestLog.objects.create(
+            client_ip_address='1.2.3.4', status_code=101, url='/a',
+            datetime=timezone.now(), bytes_sent=10)
+        self.addCleanup(columnar.reset_columnar_logs)
+        with timezone.override('America/Chicago'):
+            for bucket in (60, 3 * 3600, 86400, 7 * 86400):
+                expected = stats.status_codes_by_date_stats(bucket=bucket)
+                assert sum(counts[200] for _, counts in expected) == 2
+                with override_settings(MEERKAT_LOGS_COLUMNAR_ENGINE=True):
+                    columnar.reset_columnar_logs()
+                    assert stats.status_codes_by_date_stats(
+                        bucket=bucket) == expected
+
+    def test_extend(self):
+        """Refreshes append to buffers which grow geometrically."""
+        logs = columnar.ColumnarLogs.from_queryset()
+        buffer = logs._buffers['id']
+        RequestLog.objects.create(
+            client_ip_address='1.2.3.4', status_code=200, url='/c',
+            datetime=timezone.now(), bytes_sent=10)
+        assert logs.extend(RequestLog.objects.filter(
+            id__gt=logs.last_id)) == 1
+        assert len(logs._buffers['id']) == 2 * len(buffer)
+        buffer = logs._buffers['id']
+        assert list(logs['id']) == list(RequestLog.objects.order_by(
+            'id').values_list('id', flat=True))
+        assert logs.group_count('url') == {'/a': 3, '/b': 1, '/c': 1}
+        # Other rows fit in the buffer: columns are not copied.
+        RequestLog.objects.create(
+            client_ip_address='1.2.3.4', status_code=200, url='/c',
+            datetime=timezone.now(), bytes_sent=10)
+        logs.extend(RequestLog.objects.filter(id__gt=logs.last_id))
+        assert len(logs) == 6
+        assert logs._buffers['id'] is buffer
+        assert logs['id'].base is buffer
+
+    def test_snapshot(self):
+        """Refreshes save the snapshot, resets delete it."""
+        path = os.path.join(tempfile.mkdtemp(), 'snapshot')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        self.addCleanup(columnar.reset_columnar_logs)
+        with override_settings(MEERKAT_LOGS_COLUMNAR_SNAPSHOT=path), \
+                mock.patch.object(columnar, 'SNAPSHOT_ROWS', 2):
+            columnar.reset_columnar_logs()
+            assert len(columnar.get_columnar_logs()) == 4
+            saved = columnar.ColumnarLogs.load(path)
+            assert saved.group_count('url') == {'/a': 3, '/b': 1}
+            # A new process loads the snapshot and the new request logs.
+            RequestLog.objects.create(
+                client_ip_address='1.2.3.4', status_code=200, url='/c',
+                datetime=timezone.now(), bytes_sent=10)
+            columnar._columnar_logs = None
+            logs = columnar.get_columnar_logs()
+            assert logs.group_count('url') == {'/a': 3, '/b': 1, '/c': 1}
+            # Deletions are only seen after a reset.
+            RequestLog.objects.filter(url='/b').delete()
+            assert len(columnar.get_columnar_logs()) == 5
+            columnar.reset_columnar_logs()
+            assert not os.path.exists(path)
+            assert len(columnar.get_columnar_logs()) == 4
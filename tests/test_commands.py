@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+"""Management commands tests."""
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from meerkat.logs.generator import LogGenerator
+from meerkat.logs.models import (
+    DailyRequestCount, IPInfoCheck, RequestLog, Visit)
+
+
+class RollupCommandTestCase(TestCase):
+    """Rollup command test case."""
+
+    def setUp(self):
+        """Setup method."""
+        now = timezone.now()
+        RequestLog.objects.bulk_create([
+            RequestLog(client_ip_address='1.2.3.4', url='/', status_code=200,
+                       bytes_sent=10,
+                       datetime=now - datetime.timedelta(days=i % 2))
+            for i in range(5)])
+
+    def test_rollup(self):
+        """Daily counts are rebuilt and statistics are printed."""
+        DailyRequestCount.objects.create(
+            date=datetime.date(2000, 1, 1), count=10)
+        out = StringIO()
+        call_command('meerkat_rollup', '--aggregates', 'daily_count',
+                     stdout=out, stderr=StringIO())
+        stats = json.loads(out.getvalue())
+        assert stats['command'] == 'meerkat_rollup'
+        assert stats['logs'] == 5 and stats['deleted'] == 1
+        assert sorted(DailyRequestCount.objects.values_list(
+            'count', flat=True)) == [2, 3]
+
+    def test_dry_run(self):
+        """Nothing is written with --dry-run."""
+        out = StringIO()
+        call_command('meerkat_rollup', '--dry-run', stdout=out,
+                     stderr=StringIO())
+        assert json.loads(out.getvalue())['logs'] == 5
+        assert not DailyRequestCount.objects.exists()
+
+
+class AutocompleteCommandTestCase(TestCase):
+    """Autocomplete command test case."""
+
+    def setUp(self):
+        """Setup method."""
+        now = timezone.now()
+        RequestLog.objects.bulk_create([
+            RequestLog(client_ip_address='1.2.3.4', status_code=200,
+                       bytes_sent=10, datetime=now,
+                       request='GET /page-%s.%s HTTP/1.1' % (
+                           i, 'css' if i % 2 else 'js'))
+            for i in range(5)])
+
+    def test_autocomplete(self):
+        """Only modified logs are written, by batches of IDs."""
+        RequestLog.objects.filter(request__contains='page-0').update(
+            verb='GET', url='/page-0.js', protocol='HTTP/1.1',
+            file_type='JS', suspicious=False)
+        out = StringIO()
+        call_command('meerkat_autocomplete', '--batch-size', '2',
+                     stdout=out, stderr=StringIO())
+        stats = json.loads(out.getvalue())
+        assert stats['logs'] == 5 and stats['modified'] == 4
+        assert sorted(RequestLog.objects.values_list(
+            'url', 'file_type')) == [
+            ('/page-0.js', 'JS'), ('/page-1.css', 'CSS'),
+            ('/page-2.js', 'JS'), ('/page-3.css', 'CSS'),
+            ('/page-4.js', 'JS')]
+
+
+class DryRunTestCase(TestCase):
+    """Dry runs of the commands test case."""
+
+    def setUp(self):
+        """Setup method."""
+        self.directory = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.directory, 'access.log')
+        with open(self.log_file, 'w') as f:
+            f.writelines(
+                '%s\n' % line for line in LogGenerator(seed=1).lines(20))
+
+    def tearDown(self):
+        """Tear down method."""
+        shutil.rmtree(self.directory)
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command(*args, '--dry-run', stdout=out, stderr=StringIO())
+        stats = json.loads(out.getvalue())
+        assert stats['dry_run']
+        return stats
+
+    def create_logs(self):
+        now = timezone.now()
+        RequestLog.objects.bulk_create([
+            RequestLog(client_ip_address='10.0.0.%s' % (i % 3), url='/',
+                       status_code=200, bytes_sent=10,
+                       user_agent='Mozilla/5.0',
+                       datetime=now - datetime.timedelta(minutes=i))
+            for i in range(6)])
+
+    def test_import(self):
+        """Lines are parsed but not inserted."""
+        stats = self.run_command(
+            'meerkat_import', '--files', self.log_file)
+        assert (stats['lines'], stats['parsed'], stats['created']) == (
+            20, 20, 0)
+        assert not RequestLog.objects.exists()
+
+    def test_follow(self):
+        """Followed lines are parsed but not inserted."""
+        # The command runs until its thread is stopped.
+        start = RequestLog.ParseToDBThread.start
+
+        def start_and_stop(thread):
+            threading.Timer(1.5, thread.stop).start()
+            start(thread)
+
+        with mock.patch.object(
+                RequestLog.ParseToDBThread, 'start', start_and_stop):
+            stats = self.run_command(
+                'meerkat_follow', '--files', self.log_file, '--from-start')
+        assert (stats['lines'], stats['created']) == (20, 0)
+        assert not RequestLog.objects.exists()
+
+    def test_enrich(self):
+        """IP addresses to check are counted without requesting the API."""
+        self.create_logs()
+        stats = self.run_command('meerkat_enrich')
+        assert (stats['ips'], stats['checked'], stats['updated']) == (
+            3, 0, 0)
+        assert not IPInfoCheck.objects.exists()
+
+    def test_visits(self):
+        """Visits are computed but not written."""
+        self.create_logs()
+        Visit.objects.create(
+            client_ip_address='10.0.0.9', user_agent_hash=0,
+            start=timezone.now(), end=timezone.now(), last_log_id=0)
+        stats = self.run_command('meerkat_visits')
+        assert stats['logs'] == 6
+        stats = self.run_command('meerkat_visits', '--rebuild')
+        assert (stats['logs'], stats['deleted']) == (6, 1)
+        assert Visit.objects.count() == 1
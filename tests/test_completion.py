@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+"""Request logs completion tests."""
+
+from django.test import TestCase
+
+from meerkat.logs.completion import complete_data, url_details
+from meerkat.logs.models import RequestLog
+
+
+class CompletionTestCase(TestCase):
+    """Completion test case."""
+
+    def test_complete_data(self):
+        """Parsed data is completed from the request line."""
+        data = complete_data({'request': 'GET /static/app.js?v=2 HTTP/1.1'})
+        assert data['verb'] == 'GET'
+        assert data['url'] == '/static/app.js?v=2'
+        assert data['protocol'] == 'HTTP/1.1'
+        assert data['file_type'] == 'JS'
+        assert 'port' not in data
+        data = complete_data({'request': 'GET http://host/page:8080 HTTP/1.0'})
+        assert data['file_type'] == ''
+        assert data['port'] == 8080
+
+    def test_file_types(self):
+        """Client controlled file types are normalized or ignored."""
+        for url, file_type in (
+                ('/shop/item.jsp;jsessionid=9F2A1C7E', 'JSP'),
+                ('/img/photo.jpg%20copy', 'JPG'), ('/a.c#frag-123', 'C'),
+                ('/page.html:8080', 'HTML'), ('/a.tar.gz', 'GZ'),
+                ('/a.verylongextension', ''), ('/a.p-h-p', ''),
+                ('/a.', ''), ('/a.\u00e9', '')):
+            assert url_details(url)[0] == file_type, url
+
+    def test_complete_instance(self):
+        """Request logs are only modified when information changes."""
+        log = RequestLog(request='POST /form.php HTTP/1.1', url='/old')
+        assert log.complete(rewrite=False, save=False)
+        assert (log.verb, log.url, log.file_type) == ('POST', '/old', '')
+        assert log.complete(save=False)
+        assert (log.url, log.file_type) == ('/form.php', 'PHP')
+        assert not log.complete(save=False)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""Dimension tables tests."""
+
+import json
+from io import StringIO
+
+from django.contrib import admin
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from meerkat.logs import dimensions, live
+from meerkat.logs.admin import RequestLogAdmin
+from meerkat.logs.models import URL, RequestLog, UserAgent
+
+
+def request_log(url, user_agent='Mozilla/5.0', referrer='-'):
+    return RequestLog(
+        client_ip_address='1.2.3.4', datetime=timezone.now(),
+        request='GET %s HTTP/1.1' % url, verb='GET', url=url,
+        protocol='HTTP/1.1', status_code=200, bytes_sent=10,
+        user_agent=user_agent, referrer=referrer)
+
+
+class InternerTestCase(TestCase):
+    """Interner test case."""
+
+    def test_get_ids(self):
+        """Strings are inserted once, collisions are not interned."""
+        interner = dimensions.Interner(URL)
+        ids = interner.get_ids(['/a', '/b'])
+        assert URL.objects.count() == 2
+        assert interner.get_ids(['/b', '/a']) == ids
+        URL.objects.create(hash=dimensions.text_hash('/c'), value='/d')
+        assert interner.get_ids(['/c']) == {'/c': None}
+
+
+class NormalizeTestCase(TestCase):
+    """Normalization test case."""
+
+    def setUp(self):
+        """Setup method."""
+        dimensions.clear_interners()
+        logs = [request_log('/page/%s' % (i % 3)) for i in range(9)]
+        logs.append(request_log('/x', user_agent=''))
+        assert dimensions.normalize(logs, force=True) == 29
+        RequestLog.objects.bulk_create(logs)
+
+    def test_reads(self):
+        """Reads follow the foreign keys."""
+        assert UserAgent.objects.count() == 1
+        assert not RequestLog.objects.filter(url__gt='').exists()
+        log = RequestLog.objects.get(url_ref__value='/x')
+        assert (log.get_text('url'), log.get_text('user_agent')) == (
+            '/x', '')
+        urls = RequestLog.objects.annotate(
+            **dimensions.texts()).values_list('url_text', flat=True)
+        assert sorted(set(urls)) == ['/page/0', '/page/1', '/page/2', '/x']
+        # Completion does not bring the strings back.
+        RequestLog.autocomplete(RequestLog.objects.all(), progress=False)
+        assert not RequestLog.objects.filter(url__gt='').exists()
+        # Normalized and inline strings are counted together.
+        RequestLog.objects.bulk_create([request_log('/x')])
+        assert dimensions.count_texts(RequestLog.objects.all(), 'url') == {
+            '/page/0': 3, '/page/1': 3, '/page/2': 3, '/x': 2}
+
+    def test_live(self):
+        """The live view sends the normalized strings."""
+        log = RequestLog.objects.select_related(
+            'url_ref', 'user_agent_ref').filter(url_ref__value='/page/1')[0]
+        data = live.serialize(log)
+        assert (data['url'], data['user_agent']) == ('/page/1', 'Mozilla/5.0')
+
+    def test_admin_ordering(self):
+        """The admin orders strings on their text, normalized or not."""
+        RequestLog.objects.bulk_create([request_log('/a')])
+        model_admin = RequestLogAdmin(RequestLog, admin.site)
+        queryset = model_admin.get_queryset(RequestFactory().get('/'))
+        urls = queryset.order_by(
+            RequestLogAdmin.url_text.admin_order_field).values_list(
+                'url_text', flat=True)
+        assert list(urls)[:2] == ['/a', '/page/0']
+
+    def test_command(self):
+        """Request logs already in the database are normalized."""
+        RequestLog.objects.bulk_create([request_log('/page/0')])
+        out = StringIO()
+        call_command('meerkat_normalize', stdout=out, stderr=StringIO())
+        stats = json.loads(out.getvalue())
+        assert (stats['logs'], stats['modified'], stats['strings']) == (
+            1, 1, 3)
+        assert URL.objects.count() == 4
+        assert not RequestLog.objects.filter(url__gt='').exists()
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+"""Downsampling tests."""
+
+from django.test import TestCase
+
+from meerkat.utils.downsample import lttb
+
+
+class LTTBTestCase(TestCase):
+    """LTTB test case."""
+
+    def test_keeps_spikes(self):
+        """Spikes and extremities are kept."""
+        points = [(x, 1) for x in range(1000)]
+        points[500] = (500, 100)
+        sampled = lttb(points, 50)
+        assert len(sampled) == 50
+        assert sampled[0] == points[0] and sampled[-1] == points[-1]
+        assert (500, 100) in sampled
+
+    def test_small_series(self):
+        """Series smaller than the threshold are not changed."""
+        points = [(x, x) for x in range(10)]
+        assert lttb(points, 50) == points
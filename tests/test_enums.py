@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+"""Enumerated fields tests."""
+
+from unittest import mock
+
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase
+from django.utils import timezone
+
+from meerkat.logs import enums
+from meerkat.logs.completion import VERBS
+from meerkat.logs.enums import OTHER_VALUE, clear_enumerations
+from meerkat.logs.models import EnumValue, RequestLog
+
+
+class EnumFieldTestCase(TestCase):
+    """Enumerated fields test case."""
+
+    def setUp(self):
+        """Setup method."""
+        clear_enumerations()
+        RequestLog.objects.bulk_create([
+            RequestLog(datetime=timezone.now(), status_code=200,
+                       bytes_sent=0, verb=verb, protocol='HTTP/1.1',
+                       timezone='+0200', file_type=file_type)
+            for verb, file_type in (('GET', 'JS'), ('GET', ''),
+                                    ('PUT', 'PHP'), ('BREW', 'JS'))])
+
+    def test_codes(self):
+        """Values are stored as codes and read as strings."""
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT verb, protocol FROM meerkat_requestlog '
+                           'ORDER BY id')
+            codes = cursor.fetchall()
+        assert codes[:3] == [(2, 2), (2, 2), (6, 2)]
+        # Values which are not seeds get new codes.
+        assert codes[3][0] > len(VERBS)
+        assert sorted(EnumValue.objects.values_list('enum', 'value')) == [
+            ('file_type', 'JS'), ('file_type', 'PHP'), ('timezone', '+0200'),
+            ('verb', 'BREW')]
+        assert list(RequestLog.objects.order_by('id').values_list(
+            'verb', 'file_type')) == [
+                ('GET', 'JS'), ('GET', ''), ('PUT', 'PHP'), ('BREW', 'JS')]
+        log = RequestLog.objects.get(verb='BREW')
+        assert (log.protocol, log.timezone) == ('HTTP/1.1', '+0200')
+
+    def test_lookups(self):
+        """Lookups and groups use strings."""
+        assert RequestLog.objects.filter(file_type='JS').count() == 2
+        assert RequestLog.objects.filter(verb__in=['PUT', 'BREW']).count() == 2
+        assert not RequestLog.objects.filter(verb='TRACE').exists()
+        assert not RequestLog.objects.filter(file_type='CSS').exists()
+        assert not EnumValue.objects.filter(value='CSS').exists()
+        assert dict(RequestLog.objects.values_list('verb').annotate(
+            Count('id'))) == {'GET': 2, 'PUT': 1, 'BREW': 1}
+        # New values are also encoded in updates.
+        clear_enumerations()
+        RequestLog.objects.filter(verb='PUT').update(file_type='CSS')
+        assert RequestLog.objects.filter(file_type='CSS').count() == 1
+
+    def test_other(self):
+        """Values beyond the maximum number of codes share one code."""
+        with mock.patch.object(enums, 'MAX_VALUES', 2):
+            RequestLog.objects.filter(verb='PUT').update(file_type='CSS')
+            RequestLog.objects.filter(verb='BREW').update(file_type='GIF')
+        assert not EnumValue.objects.filter(value__in=['CSS', 'GIF']).exists()
+        assert RequestLog.objects.filter(file_type=OTHER_VALUE).count() == 2
+        assert not RequestLog.objects.filter(file_type='CSS').exists()
+        assert set(RequestLog.objects.values_list(
+            'file_type', flat=True)) == {'JS', '', OTHER_VALUE}
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""Logs generator tests."""
+
+from django.test import TestCase
+
+from meerkat.logs.generator import LogGenerator
+from meerkat.logs.parsers import NginXAccessLogParser, NginXErrorLogParser
+
+
+class LogGeneratorTestCase(TestCase):
+    """Logs generator test case."""
+
+    def test_deterministic(self):
+        """The same seed gives the same lines."""
+        assert (list(LogGenerator(seed=1).lines(50)) ==
+                list(LogGenerator(seed=1).lines(50)))
+        assert (list(LogGenerator(seed=1).lines(50)) !=
+                list(LogGenerator(seed=2).lines(50)))
+
+    def test_parsable(self):
+        """Generated lines are parsed by the NginX parsers."""
+        generator = LogGenerator(ips=20, urls=10, attacks=0.5)
+        parser = NginXAccessLogParser()
+        for line in generator.lines(200):
+            data = parser.format_data(parser.parse_string(line))
+            assert data['client_ip_address'] in (
+                generator.ips + generator.attackers)
+        parser = NginXErrorLogParser()
+        for line in generator.lines(20, kind='error'):
+            assert parser.parse_string(line)['level'] == 'error'
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""Heavy hitters tests."""
+
+import datetime
+import random
+from collections import Counter
+from unittest import mock
+
+from django.test import TestCase
+
+from meerkat.logs import stats
+from meerkat.logs.collectors import HeavyHittersCollector
+from meerkat.logs.models import HeavyHitter, RequestLog
+from meerkat.utils.space_saving import SpaceSaving
+from meerkat.utils.url import SUSPICIOUS
+
+
+class SpaceSavingTestCase(TestCase):
+    """Space-Saving test case."""
+
+    def test_error_bounds(self):
+        """Real counts are within the error, frequent items are kept."""
+        rand = random.Random(1)
+        stream = [rand.choice('abc') for _ in range(300)] + [
+            str(rand.randint(0, 1000)) for _ in range(700)]
+        rand.shuffle(stream)
+        real = Counter(stream)
+        summary = SpaceSaving(capacity=20)
+        for item in stream:
+            summary.add(item)
+        assert len(summary) == 20 and summary.total == len(stream)
+        for item, count, error in summary.top():
+            assert count - error <= real[item] <= count
+        # Items occurring more than N / capacity times are monitored.
+        assert {'a', 'b', 'c'} <= {item for item, _, _ in summary.top(3)}
+
+    def test_capacity(self):
+        """Capacity must be positive."""
+        with self.assertRaises(ValueError):
+            SpaceSaving(capacity=0)
+
+
+class HeavyHittersTestCase(TestCase):
+    """Heavy hitters collector and stats test case."""
+
+    def setUp(self):
+        """Setup method."""
+        self.start = datetime.datetime(
+            2018, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def collect(self, collector, ip, seconds):
+        collector.collect(RequestLog(
+            client_ip_address=ip, url='/', user_agent='UA',
+            datetime=self.start + datetime.timedelta(seconds=seconds)))
+
+    def test_flush(self):
+        """Windows are written when flushed, and merged by the stats."""
+        collector = HeavyHittersCollector(window=60, capacity=10, top=2)
+        for i in range(10):
+            self.collect(collector, '1.1.1.%s' % (i % 3), i)
+        # A second window: the first one is finished.
+        for i in range(5):
+            self.collect(collector, '1.1.1.0', 60 + i)
+        collector.flush(force=True)
+        assert HeavyHitter.objects.filter(dimension='ip').count() == 3
+        top = stats.heavy_hitters_stats(since=self.start)
+        assert top['ip'][0] == ('1.1.1.0', 9, 0)
+        assert top['url'] == [('/', 15, 0)]
+        # Without since, only the last window is used.
+        assert stats.heavy_hitters_stats()['ip'] == [('1.1.1.0', 5, 0)]
+        # Flushing again replaces the snapshot of the current window.
+        self.collect(collector, '1.1.1.0', 70)
+        collector.flush(force=True)
+        assert stats.heavy_hitters_stats()['ip'] == [('1.1.1.0', 6, 0)]
+
+    def test_late(self):
+        """Late lines are counted in their window until it is written."""
+        collector = HeavyHittersCollector(window=60, capacity=10, top=2)
+        for seconds in (0, 1, 60, 61):
+            self.collect(collector, '1.1.1.1', seconds)
+        self.collect(collector, '1.1.1.2', 30)
+        collector.flush(force=True)
+        self.collect(collector, '1.1.1.3', 30)
+        self.collect(collector, '1.1.1.3', 62)
+        collector.flush(force=True)
+        assert collector.dropped == 1
+        assert sorted(HeavyHitter.objects.filter(dimension='ip').values_list(
+            'window_start', 'value', 'count')) == [
+                (self.start, '1.1.1.1', 2), (self.start, '1.1.1.2', 1),
+                (self.start + datetime.timedelta(seconds=60), '1.1.1.1', 2),
+                (self.start + datetime.timedelta(seconds=60), '1.1.1.3', 1)]
+
+    def test_empty(self):
+        """Stats are empty when nothing was collected."""
+        assert stats.heavy_hitters_stats() == {
+            'since': None, 'ip': [], 'url': [], 'user_agent': []}
+
+
+class MostVisitedPagesTestCase(TestCase):
+    """Most visited pages stats test case."""
+
+    def test_bounds(self):
+        """Pages are listed by bound, rare pages are counted by type."""
+        counter = Counter({'/a': 10000, '/b': 1500, '/c': 100, '/d': 99,
+                           '/e': 3})
+        with mock.patch.object(stats, 'count_texts', return_value=counter), \
+                mock.patch.object(stats, 'url_is_project',
+                                  return_value=False):
+            result = stats.most_visited_pages_stats()
+        assert result['more_than_10'] == [
+            {'bound': 10000, 'subset': [['/a', 10000, SUSPICIOUS]]},
+            {'bound': 1000, 'subset': [['/b', 1500, SUSPICIOUS]]},
+            {'bound': 100, 'subset': [['/c', 100, SUSPICIOUS]]}]
+        assert result['less_than_10'][SUSPICIOUS] == {
+            'distinct': 2, 'total': 102}
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+"""HyperLogLog tests."""
+
+import datetime
+
+from django.test import TestCase
+
+from meerkat.logs.models import UniqueVisitorsSketch
+from meerkat.logs.stats import unique_visitors_stats
+from meerkat.utils.hyperloglog import HyperLogLog
+
+
+class HyperLogLogTestCase(TestCase):
+    """HyperLogLog test case."""
+
+    def test_count(self):
+        """Estimations stay within three standard errors."""
+        for n in (10, 1000, 50000):
+            sketch = HyperLogLog(12)
+            for i in range(n):
+                sketch.add('192.168.%d.%d' % divmod(i, 256))
+            assert abs(sketch.count() - n) <= 3 * sketch.error * n + 1
+
+    def test_merge_and_serialization(self):
+        """Merged sketches equal the sketch of the union."""
+        union, left, right = HyperLogLog(10), HyperLogLog(10), HyperLogLog(10)
+        for i in range(5000):
+            union.add(i)
+            (left if i % 3 else right).add(i)
+        left = HyperLogLog.from_bytes(left.to_bytes(), 10)
+        assert left.merge(right).registers == union.registers
+
+    def test_reduce(self):
+        """Reduced sketches equal the sketches built at that precision."""
+        for n in (10, 5000):
+            high, low = HyperLogLog(12), HyperLogLog(10)
+            for i in range(n):
+                high.add(i)
+                low.add(i)
+            assert high.reduce(10).registers == low.registers
+        self.assertRaises(ValueError, low.reduce, 12)
+        # Sketches of different precisions are merged at the lowest one.
+        assert HyperLogLog(12).merge(low).registers == low.registers
+        assert low.merge(high).precision == 10
+
+
+class UniqueVisitorsSketchTestCase(TestCase):
+    """Unique visitors sketch test case."""
+
+    def test_merge_into(self):
+        """Long URLs and different precisions are merged in one bucket."""
+        date = datetime.date(2018, 1, 1)
+        url = '/%s' % ('a' * 3000)
+        high, low = HyperLogLog(12), HyperLogLog(10)
+        for i in range(100):
+            (high if i % 2 else low).add(i)
+        UniqueVisitorsSketch.merge_into(date, '', url, high)
+        UniqueVisitorsSketch.merge_into(date, '', url, low)
+        sketch = UniqueVisitorsSketch.objects.get()
+        assert (sketch.precision, sketch.url) == (10, url)
+        stats = unique_visitors_stats(url=url)
+        assert abs(stats['total'] - 100) <= 3 * sketch.sketch.error * 100
+
+    def test_merge_all(self):
+        """Existing buckets are updated and new ones created in bulk."""
+        date = datetime.date(2018, 1, 1)
+        sketches = {}
+        for key in ((date, '', ''), (date, 'h', ''), (date, 'h', '/a')):
+            sketches[key] = HyperLogLog(12)
+            sketches[key].add('1.2.3.4')
+        UniqueVisitorsSketch.merge_all(dict(list(sketches.items())[:2]))
+        for sketch in sketches.values():
+            sketch.add('5.6.7.8')
+        # One select, one update and one insert, in a savepoint.
+        with self.assertNumQueries(5):
+            UniqueVisitorsSketch.merge_all(sketches)
+        assert sorted(
+            (obj.host, obj.url, obj.sketch.count())
+            for obj in UniqueVisitorsSketch.objects.all()) == [
+                ('', '', 2), ('h', '', 2), ('h', '/a', 2)]
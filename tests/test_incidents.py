@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""Incidents detection tests."""
+
+import datetime
+
+from django.test import TestCase
+
+from meerkat.logs.collectors import IncidentsCollector
+from meerkat.logs.models import Incident, RequestLog
+from meerkat.logs.signatures import RATE_EXCEEDED
+from meerkat.utils.sliding_window import SlidingWindowCounters
+
+
+class SlidingWindowCountersTestCase(TestCase):
+    """Sliding window counters test case."""
+
+    def test_window(self):
+        """Hits leave the window after its length."""
+        counters = SlidingWindowCounters(window=10, slots=2)
+        for second in range(20):
+            slots = (0, 1) if second % 2 else (0, )
+            totals = counters.add('a', second, slots)
+        assert totals == [10, 5]
+        assert counters.add('a', 15) == [11, 5]
+        assert counters.add('a', 40) == [1, 0]
+        assert counters.get('b') == [0, 0]
+
+    def test_out_of_order(self):
+        """Late hits go in their bucket, hits out of the window are dropped."""
+        counters = SlidingWindowCounters(window=10)
+        for second in (100, 105, 109):
+            counters.add('a', second)
+        assert counters.add('a', 102) == [4]
+        assert counters.add('a', 80) == [0]
+        # The late bucket expires with the others.
+        assert counters.add('a', 113) == [3]
+        assert [bucket[0] for bucket in counters.keys['a'].buckets] == [
+            105, 109, 113]
+
+    def test_eviction(self):
+        """Idle and least recently used keys are evicted."""
+        counters = SlidingWindowCounters(window=10, capacity=3)
+        for key in 'abcd':
+            counters.add(key, 0)
+        assert 'a' not in counters and len(counters) == 3
+        counters.add('b', 5)
+        counters.add('e', 12)
+        assert list(counters.keys) == ['b', 'e']
+        # All the idle keys at the head are evicted at once.
+        counters = SlidingWindowCounters(window=10, capacity=10)
+        for second, key in enumerate('abcd'):
+            counters.add(key, second)
+        counters.add('e', 13)
+        assert list(counters.keys) == ['e']
+        assert counters.evicted == 4
+
+
+class IncidentsCollectorTestCase(TestCase):
+    """Incidents collector test case."""
+
+    def test_incidents(self):
+        """Request logs over a threshold are flagged and recorded."""
+        collector = IncidentsCollector(window=60, thresholds={'4xx': 5})
+        start = datetime.datetime(2018, 1, 1, tzinfo=datetime.timezone.utc)
+        logs = []
+        for i in range(20):
+            log = RequestLog(
+                client_ip_address='1.2.3.4', status_code='404',
+                datetime=start + datetime.timedelta(seconds=i))
+            collector.collect(log)
+            logs.append(log)
+        other = RequestLog(client_ip_address='5.6.7.8', status_code=404,
+                           datetime=start)
+        collector.collect(other)
+        assert [log.suspicious for log in logs] == [None] * 5 + [True] * 15
+        assert logs[-1].signatures == RATE_EXCEEDED
+        assert other.suspicious is None
+        collector.flush(force=True)
+        incident = Incident.objects.get()
+        assert (incident.kind, incident.count, incident.peak) == (
+            '4xx', 15, 20)
+        # A second burst after a quiet window is a new incident.
+        for i in range(10):
+            collector.collect(RequestLog(
+                client_ip_address='1.2.3.4', status_code=403,
+                datetime=start + datetime.timedelta(seconds=200 + i)))
+        collector.flush(force=True)
+        assert Incident.objects.count() == 2
+        # Incidents are forgotten once they are over.
+        collector.collect(RequestLog(
+            client_ip_address='5.6.7.8', status_code=200,
+            datetime=start + datetime.timedelta(seconds=400)))
+        collector.flush(force=True)
+        assert not collector.incidents
+
+    def test_rotated_files(self):
+        """A newer file read before an older one flags nothing."""
+        collector = IncidentsCollector(window=60, thresholds={'all': 10})
+        start = datetime.datetime(2018, 1, 1, tzinfo=datetime.timezone.utc)
+        logs = []
+        # 6 requests per minute, the second day before the first one.
+        for day in (1, 0):
+            for i in range(6 * 60):
+                log = RequestLog(
+                    client_ip_address='1.2.3.4', status_code=200,
+                    datetime=start + datetime.timedelta(days=day,
+                                                        seconds=10 * i))
+                collector.collect(log)
+                logs.append(log)
+        assert not any(log.suspicious for log in logs)
+        collector.flush(force=True)
+        assert not Incident.objects.exists()
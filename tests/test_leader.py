@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""Leader election tests."""
+
+import os
+import tempfile
+import threading
+
+from django.test import TestCase
+
+from meerkat.logs.models import IngestionState, IPInfo, IPInfoCheck, RequestLog
+from meerkat.logs.parsers import NginXAccessLogParser
+from meerkat.utils.leader import FileLock, LeaderElector
+from meerkat.utils.thread import StoppableThread
+
+
+class Task(StoppableThread):
+    def run(self):
+        self._stopped.wait()
+
+
+class LeaderElectionTestCase(TestCase):
+    """Leader election test case."""
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'test.lock')
+
+    def test_file_lock(self):
+        """Only one file lock is held at a time."""
+        first, second = FileLock(self.path), FileLock(self.path)
+        assert first.acquire()
+        assert not second.acquire()
+        first.release()
+        assert second.acquire()
+        second.release()
+
+    def test_failover(self):
+        """The follower takes over when the leader stops."""
+        leader = LeaderElector(FileLock(self.path), Task)
+        follower = LeaderElector(FileLock(self.path), Task)
+        leader.step()
+        follower.step()
+        assert leader.leading and not follower.leading
+        leader.stop_task()
+        follower.step()
+        assert follower.leading
+        follower.stop_task()
+
+
+class ResumeTestCase(TestCase):
+    """Ingestion resume test case."""
+
+    def setUp(self):
+        """Setup method."""
+        self.path = os.path.join(tempfile.mkdtemp(), 'access.log')
+        self.lines = [
+            '203.0.113.5 - - [19/Oct/2026:10:00:0%s +0200] "GET /%s '
+            'HTTP/1.1" 200 5 "-" "Mozilla/5.0"\n' % (i, i) for i in range(3)]
+        with open(self.path, 'w') as f:
+            f.writelines(self.lines)
+        IPInfoCheck.objects.create(ip_address='203.0.113.5',
+                                   ip_info=IPInfo.objects.create(
+                                       ip_address='203.0.113.5'))
+
+    def follow(self):
+        thread = RequestLog.ParseToDBThread(
+            NginXAccessLogParser(), file_name=self.path, resume=True)
+        threading.Timer(1.5, thread.stop).start()
+        thread.run()
+        return thread.stats['created']
+
+    def test_resume(self):
+        """A new thread resumes from the saved offset."""
+        offset = len(self.lines[0])
+        IngestionState.set_value(IngestionState.key('offset', self.path),
+                                 offset)
+        IngestionState.set_value(IngestionState.key('inode', self.path),
+                                 os.stat(self.path).st_ino)
+        assert self.follow() == 2
+        assert sorted(RequestLog.objects.values_list('url', flat=True)) == [
+            '/1', '/2']
+        assert IngestionState.get_value(
+            IngestionState.key('offset', self.path)) == os.path.getsize(
+                self.path)
+
+    def test_rotated(self):
+        """A rotated file is read from the start."""
+        IngestionState.set_value(IngestionState.key('offset', self.path), 5)
+        IngestionState.set_value(IngestionState.key('inode', self.path), -1)
+        assert self.follow() == 3
+
+    def test_first_run(self):
+        """Without saved offset, the file is read from the end."""
+        assert self.follow() == 0
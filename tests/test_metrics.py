@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""Metrics tests."""
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from meerkat.logs import metrics
+from meerkat.logs.views import metrics_view
+from meerkat.utils.metrics import Registry
+
+
+class MetricsTestCase(TestCase):
+    """Metrics test case."""
+
+    def test_render(self):
+        """Counters and histograms are rendered in Prometheus format."""
+        registry = Registry()
+        counter = registry.counter('lines_total', 'Lines.')
+        histogram = registry.histogram(
+            'stage_seconds', 'Stages.', labelnames=('stage', ),
+            buckets=(0.1, 1))
+        counter.inc()
+        counter.inc(2)
+        histogram.observe(0.05, stage='regex')
+        histogram.observe(2, stage='regex')
+        lines = registry.render().splitlines()
+        assert '# TYPE lines_total counter' in lines
+        assert 'lines_total 3' in lines
+        assert 'stage_seconds_bucket{stage="regex",le="0.1"} 1' in lines
+        assert 'stage_seconds_bucket{stage="regex",le="1"} 1' in lines
+        assert 'stage_seconds_bucket{stage="regex",le="+Inf"} 2' in lines
+        assert 'stage_seconds_count{stage="regex"} 2' in lines
+        assert 'stage_seconds_sum{stage="regex"} 2.05' in lines
+
+    def test_merge(self):
+        """Snapshots of other processes are added, gauges are kept."""
+        registry = Registry()
+        counter = registry.counter('lines_total', 'Lines.')
+        gauge = registry.gauge('offset', 'Offset.')
+        counter.inc(2)
+        gauge.set(10)
+        other = {'lines_total': {(): 3}, 'offset': {(): 20}}
+        lines = registry.render(other).splitlines()
+        assert 'lines_total 5' in lines
+        assert 'offset 10' in lines
+
+
+class PublishedMetricsTestCase(TestCase):
+    """Metrics published in the cache test case."""
+
+    def setUp(self):
+        """Setup method."""
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_render(self):
+        """Snapshots of every other process are merged."""
+        local = metrics.lines_read.snapshot().get((), 0)
+        metrics.publish(force=True)
+        assert cache.get(metrics.INDEX_KEY) == [metrics.process_id()]
+        for pid, lines in (('a:1', 5), ('b:2', 7)):
+            cache.set(metrics.CACHE_KEY % pid,
+                      {metrics.lines_read.name: {(): lines}})
+        cache.set(metrics.INDEX_KEY, cache.get(metrics.INDEX_KEY) + [
+            'a:1', 'b:2', 'expired:3'])
+        lines = metrics.render().splitlines()
+        assert '%s %s' % (metrics.lines_read.name, local + 12) in lines
+        assert cache.get(metrics.INDEX_KEY) == [
+            metrics.process_id(), 'a:1', 'b:2']
+        # This process registers again if the index was overwritten.
+        cache.set(metrics.INDEX_KEY, ['a:1'])
+        metrics.publish(force=True)
+        assert cache.get(metrics.INDEX_KEY) == ['a:1', metrics.process_id()]
+
+    @override_settings(MEERKAT_LOGS_METRICS_TOKEN='secret')
+    def test_view(self):
+        """Scrapers are authorized with the token."""
+        view = metrics_view(lambda func: lambda request: HttpResponse(
+            status=403))
+        factory = RequestFactory()
+        response = view(factory.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer secret'))
+        assert response.status_code == 200
+        assert metrics.lines_read.name in response.content.decode()
+        assert view(factory.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer wrong')).status_code == 403
+        assert view(factory.get('/metrics')).status_code == 403
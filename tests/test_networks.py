@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+"""Network queries tests."""
+
+from django.test import TestCase
+from django.utils import timezone
+
+from meerkat.logs.models import IPInfo, IPInfoCheck, RequestLog
+from meerkat.logs.networks import (
+    collapse_networks, count_networks, filter_networks)
+from meerkat.utils.ip import int_to_ip, ip_to_int, join_int, split_ip
+
+IPS = ('203.0.113.1', '203.0.113.200', '203.0.114.1', '198.51.100.7',
+       '2001:db8:1::1', '2001:db8:1:ff::2', '2001:db8:2::1',
+       'ffff::1', '::1')
+
+
+class NetworksTestCase(TestCase):
+    """Network queries test case."""
+
+    def setUp(self):
+        """Setup method."""
+        now = timezone.now()
+        RequestLog.objects.bulk_create([
+            RequestLog(client_ip_address=ip, datetime=now, status_code=200,
+                       bytes_sent=0) for ip in IPS + (None, )])
+
+    def test_conversion(self):
+        """IP addresses are split into halves and joined back."""
+        for ip in IPS:
+            assert int_to_ip(ip_to_int(ip)) == ip
+            assert int_to_ip(join_int(*split_ip(ip))) == ip
+        log = RequestLog.objects.get(client_ip_address='ffff::1')
+        assert (log.client_ip_high, log.client_ip_low) == split_ip('ffff::1')
+        assert log.client_ip_high < 0
+        ip_info = IPInfo.objects.create(ip_address='::1')
+        check = IPInfoCheck.objects.create(ip_address='::1', ip_info=ip_info)
+        assert (check.ip_high, check.ip_low) == (0, 1)
+
+    def test_filter(self):
+        """Networks are filtered by range."""
+        logs = RequestLog.objects.all()
+
+        def ips(*networks):
+            return set(filter_networks(logs, networks).values_list(
+                'client_ip_address', flat=True))
+
+        assert ips('203.0.113.0/24') == {'203.0.113.1', '203.0.113.200'}
+        assert ips('203.0.112.0/22', '198.51.100.7') == {
+            '203.0.113.1', '203.0.113.200', '203.0.114.1', '198.51.100.7'}
+        assert ips('0.0.0.0/0') == set(IPS[:4])
+        assert ips('2001:db8:1::/48') == {'2001:db8:1::1',
+                                          '2001:db8:1:ff::2'}
+        assert ips('2001:db8:1::/64') == {'2001:db8:1::1'}
+        assert ips('8000::/1') == {'ffff::1'}
+        assert ips('::/0') == set(IPS)
+        assert ips() == set()
+        assert collapse_networks(
+            ['2001:db8::/33', '10.0.1.0/24', '10.0.0.0/24',
+             '2001:db8:8000::/33']) == ['10.0.0.0/23', '2001:db8::/32']
+
+    def test_count(self):
+        """Rows are counted by network prefix."""
+        assert count_networks(RequestLog.objects.all()) == {
+            '203.0.113.0/24': 2, '203.0.114.0/24': 1, '198.51.100.0/24': 1,
+            '2001:db8:1::/48': 2, '2001:db8:2::/48': 1, 'ffff::/48': 1,
+            '::/48': 1}
+        assert count_networks(
+            RequestLog.objects.all(), ipv4_prefix=16, ipv6_prefix=120)[
+                '203.0.0.0/16'] == 3
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+"""NginX parsers tests."""
+
+import ipaddress
+import os
+import random
+import tempfile
+import timeit
+
+from django.test import TestCase
+
+from meerkat.logs.generator import LogGenerator
+from meerkat.logs.parsers import NginXAccessLogParser, tokenize_access_line
+
+LINE = ('%s - - [19/Oct/2026:10:00:00 +0200] "GET /a HTTP/1.1" 200 5 '
+        '"-" "Mozilla/5.0 (X11)"%s')
+
+SEEDS = (
+    LINE % ('203.0.113.5', ''),
+    '2001:db8::1 - bob_1 [01/jan/2026:00:00:59 -0000] "POST /b HTTP/2.0" '
+    '404 0 "http://x/" "UA" "1.2.3.4, 10.0.0.1" 0.150 0.100, 0.2 : 3',
+    '10.0.0.1 - - [19/Oct/2026:10:00:00 +0200] "" 200 5 "" "" "" - -',
+    '1.2.3.4 - - [19/OCT/2026:10:00:00 +0200] "GET / HTTP/1.1" 200 1 '
+    '"-" "x" 1.5. 2., 3',
+)
+# Separators, classes boundaries, and non-ASCII characters matched by the
+# regex classes (Unicode digits, case-insensitive letters).
+ALPHABET = list(' "-[]/:.,+0123456789aAfFgZz_\n') + [
+    '\u0663', '\u00b2', '\u212a', '\u017f', '\u0130', '\uff11']
+
+
+class NginXAccessLogParserTestCase(TestCase):
+    """NginX access log parser test case."""
+
+    def setUp(self):
+        """Setup method."""
+        self.parser = NginXAccessLogParser(trusted_proxies=(
+            ipaddress.ip_network('10.0.0.0/8'),
+            ipaddress.ip_network('fd00::/8')))
+
+    def client_ip(self, ip, suffix=''):
+        data = self.parser.format_data(
+            self.parser.parse_string(LINE % (ip, suffix)))
+        assert data['user_agent'] == 'Mozilla/5.0 (X11)'
+        return data.get('client_ip_address', None)
+
+    def test_matching_files(self):
+        """Log files are sorted chronologically."""
+        with tempfile.TemporaryDirectory() as directory:
+            for mtime, name in ((300, 'access.log'), (200, 'access.log.1'),
+                                (100, 'access.log.2')):
+                path = os.path.join(directory, name)
+                open(path, 'w').close()
+                os.utime(path, (mtime, mtime))
+            parser = NginXAccessLogParser(top_dir=directory)
+            assert [os.path.basename(path)
+                    for path in parser.matching_files()] == [
+                        'access.log.2', 'access.log.1', 'access.log']
+
+    def test_addresses(self):
+        """IPv4 and IPv6 addresses are parsed and normalized."""
+        assert self.client_ip('203.0.113.5') == '203.0.113.5'
+        assert self.client_ip('2001:DB8:0:0::1') == '2001:db8::1'
+        assert self.client_ip('::ffff:203.0.113.5') == '203.0.113.5'
+        assert self.client_ip('999.1.1.1') is None
+
+    def test_forwarded_for(self):
+        """The client is the last untrusted address of the chain."""
+        assert self.client_ip(
+            '10.0.0.1', ' "203.0.113.5, 198.51.100.1, 10.1.1.1"'
+        ) == '198.51.100.1'
+        assert self.client_ip('fd00::1', ' "2001:db8::1"') == '2001:db8::1'
+        assert self.client_ip('10.0.0.1', ' "10.1.1.1"') == '10.1.1.1'
+        assert self.client_ip('10.0.0.1', ' "unknown, 10.1.1.1"') == (
+            '10.1.1.1')
+        assert self.client_ip('10.0.0.1', ' "-"') == '10.0.0.1'
+        # Untrusted peers cannot forge their address.
+        assert self.client_ip('203.0.113.5', ' "198.51.100.1"') == (
+            '203.0.113.5')
+        # Times follow the forwarded addresses.
+        data = self.parser.format_data(self.parser.parse_string(
+            LINE % ('10.0.0.1', ' "2001:db8::1" 0.150 0.100')))
+        assert data['client_ip_address'] == '2001:db8::1'
+        assert data['request_time'] == 150
+
+
+class TokenizerTestCase(TestCase):
+    """Access log tokenizer test case."""
+
+    regex = NginXAccessLogParser.log_format_regex
+
+    def assert_same(self, line):
+        match = self.regex.match(line)
+        assert tokenize_access_line(line) == (
+            match.groupdict() if match else None), line
+
+    def mutate(self, rand, line):
+        chars = list(line)
+        for _ in range(rand.randint(1, 4)):
+            index = rand.randint(0, len(chars))
+            operation = rand.random()
+            if operation < 0.4 and index < len(chars):
+                chars[index] = rand.choice(ALPHABET)
+            elif operation < 0.7:
+                chars.insert(index, rand.choice(ALPHABET) * rand.randint(1, 3))
+            else:
+                del chars[index:index + rand.randint(1, 3)]
+        return ''.join(chars)
+
+    def test_lines(self):
+        """Real lines give the groups of the regex."""
+        for line in LogGenerator(attacks=0.5).lines(300):
+            self.assert_same(line)
+            self.assert_same(line + '\n')
+        for seed in SEEDS:
+            for end in range(len(seed) + 1):
+                self.assert_same(seed[:end])
+
+    def test_fuzz(self):
+        """Mutated lines give the groups of the regex."""
+        rand = random.Random(0)
+        for _ in range(5000):
+            line = rand.choice(SEEDS)
+            if rand.random() < 0.1:
+                other = rand.choice(SEEDS)
+                line = (line[:rand.randint(0, len(line))] +
+                        other[rand.randint(0, len(other)):])
+            self.assert_same(self.mutate(rand, line))
+
+    def test_linear(self):
+        """Hostile lines are split in linear time."""
+        prefix = SEEDS[0][:SEEDS[0].index('"-"')]
+        builders = (
+            lambda n: '1' * n,
+            lambda n: prefix[:45] + 'a' * n,
+            lambda n: prefix + '"' + '" "' * n,
+            lambda n: prefix + '"-" "' + 'a" "' * n,
+            lambda n: prefix + '"-" "x" ' + '1' * n + '.',
+            lambda n: prefix + '"-" "x" 1 1' + ', 1' * n + ', ',
+        )
+        for build in builders:
+            small, large = build(5000), build(40000)
+            times = [min(timeit.repeat(
+                lambda: tokenize_access_line(line), number=1, repeat=3))
+                for line in (small, large)]
+            assert times[1] < 20 * times[0] + 0.05
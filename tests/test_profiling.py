@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""Profiling tests."""
+
+import pstats
+import tempfile
+import tracemalloc
+
+from django.test import TestCase
+
+from meerkat.logs.profiling import Profiler, batch_profiled
+
+
+class ProfilerTestCase(TestCase):
+    """Profiler test case."""
+
+    def test_batches(self):
+        """Subscribers receive the timings of each batch."""
+        events = []
+
+        def receiver(sender, **kwargs):
+            events.append(kwargs)
+
+        batch_profiled.connect(receiver)
+        try:
+            profiler = Profiler()
+            for _ in range(3):
+                profiler.tick()
+                profiler.add('regex', 0.5)
+            profiler.end_batch('access.log')
+            profiler.tick()
+            profiler.add('regex', 1)
+            profiler.end_batch('access.log')
+        finally:
+            batch_profiled.disconnect(receiver)
+        assert [e['lines'] for e in events] == [3, 1]
+        assert [e['timings'] for e in events] == [
+            {'regex': 1.5}, {'regex': 1}]
+        assert profiler.totals == {'regex': (4, 2.5)}
+        assert 'regex' in profiler.summary()
+        assert profiler.dump() == []
+
+    def test_dump(self):
+        """cProfile and tracemalloc run on the first lines only."""
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = Profiler(lines=2, memory=True, output_dir=directory)
+            for _ in range(4):
+                profiler.tick()
+                ' '.join(['line'] * 1000).split()
+            assert not tracemalloc.is_tracing()
+            pstats_path, tracemalloc_path = profiler.dump()
+            assert pstats_path.startswith(directory)
+            assert any("'split'" in function for _, _, function in
+                       pstats.Stats(pstats_path).stats)
+            snapshot = tracemalloc.Snapshot.load(tracemalloc_path)
+            assert snapshot.statistics('filename')
+        assert profiler.peak_memory > 0
+        assert 'peak traced memory' in profiler.summary()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+"""Ring buffer tests."""
+
+from django.test import TestCase
+
+from meerkat.logs import live
+from meerkat.utils.ring_buffer import RingBuffer
+
+
+class RingBufferTestCase(TestCase):
+    """Ring buffer test case."""
+
+    def test_since(self):
+        """Readers get the items newer than their sequence number."""
+        buffer = RingBuffer(3)
+        buffer.extend(range(5))
+        assert len(buffer) == 3
+        assert buffer.since(0) == (5, [2, 3, 4])
+        assert buffer.since(3) == (5, [3, 4])
+        assert buffer.since(5) == (5, [])
+
+    def test_wait(self):
+        """Waiting returns immediately if newer items are available."""
+        buffer = RingBuffer()
+        assert not buffer.wait(0, timeout=0.01)
+        buffer.append('item')
+        assert buffer.wait(0, timeout=0.01)
+
+    def test_resume(self):
+        """Sequence numbers of other buffers do not replay wrong items."""
+        buffer = RingBuffer()
+        buffer.extend(range(5))
+        assert buffer.resume(3, buffer.token) == 3
+        assert buffer.resume(3, 'other') == 5
+        # A number from before a restart is greater than the last one.
+        assert buffer.resume(10, buffer.token) == 5
+        assert live.resume_seq(buffer, None) == 0
+        assert live.resume_seq(buffer, live.event_id(buffer, 2)) == 2
+        assert live.resume_seq(buffer, 'garbage') == 5
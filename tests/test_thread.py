@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+"""Thread utils tests."""
+
+from django.test import TestCase
+
+from meerkat.utils.thread import map_in_threads
+
+
+class MapInThreadsTestCase(TestCase):
+    """Map in threads test case."""
+
+    def test_window(self):
+        """Calls are submitted as results are consumed, then cancelled."""
+        called = []
+
+        def func(item):
+            called.append(item)
+            if item == 3:
+                raise ValueError
+            return item * 2
+
+        results = []
+        with self.assertRaises(ValueError):
+            for item, result in map_in_threads(
+                    func, range(100), workers=1, window=2):
+                results.append(result)
+        assert results == [0, 2, 4]
+        # Only the window was submitted after the failing call.
+        assert len(called) <= 5
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+"""Data views tests."""
+
+import datetime
+import gzip
+import importlib
+import json
+import sys
+import threading
+import time
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from meerkat.logs import charts, live
+from meerkat.logs.collectors import flush_collectors, get_collectors
+from meerkat.logs.models import RequestLog
+from meerkat.logs.views import live_stream, status_codes_by_date_data
+from meerkat.middleware import GZipMiddleware
+from meerkat.utils.ring_buffer import RingBuffer
+from meerkat.utils.time import ms_since_epoch
+
+
+class DataViewTestCase(TestCase):
+    """Data view test case."""
+
+    def setUp(self):
+        """Setup method."""
+        self.factory = RequestFactory()
+
+    def get(self, data=None, **headers):
+        return status_codes_by_date_data(
+            self.factory.get('/status_codes_by_date/data', data, **headers))
+
+    def test_etag(self):
+        """Unchanged data is not computed again, changed data is."""
+        response = self.get()
+        etag = response['ETag']
+        assert response.status_code == 200
+        # Revalidation reads the watermark only.
+        with self.assertNumQueries(2):
+            assert self.get(HTTP_IF_NONE_MATCH=etag).status_code == 304
+        # Aggregates written without new request logs change the ETag.
+        log = RequestLog(client_ip_address='1.2.3.4', datetime=timezone.now(),
+                         url='/', status_code=200)
+        for collector in get_collectors():
+            collector.collect(log)
+        assert flush_collectors(force=True)
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response['ETag'] != etag
+
+    def test_gzip(self):
+        """Content is gzipped with a distinct ETag."""
+        plain = self.get()
+        response = self.get(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        assert response['Content-Encoding'] == 'gzip'
+        assert response['ETag'] == plain['ETag'][:-1] + '-gzip"'
+        assert json.loads(gzip.decompress(response.content).decode()) == (
+            json.loads(plain.content.decode()))
+        assert self.get(HTTP_ACCEPT_ENCODING='gzip',
+                        HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
+
+    def test_dst_bounds(self):
+        """Bounds in daylight saving time changes are valid."""
+        with timezone.override('America/Chicago'):
+            # Ambiguous, then non-existent local times.
+            for start in (datetime.datetime(2017, 11, 5, 1, 30),
+                          datetime.datetime(2017, 3, 12, 2, 30)):
+                response = self.get({
+                    'start': ms_since_epoch(start),
+                    'end': ms_since_epoch(start + datetime.timedelta(
+                        days=1))})
+                assert response.status_code == 200
+
+
+class LiveStreamTestCase(TestCase):
+    """Live stream test case."""
+
+    def setUp(self):
+        """Setup method."""
+        self.factory = RequestFactory()
+        self.buffer = RingBuffer()
+        for name, value in (('_buffer', self.buffer),
+                            ('subscribe', lambda: None),
+                            ('KEEPALIVE_DELAY', 0.5)):
+            patcher = mock.patch.object(live, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def log(self, status_code, host='example.com', ip='1.2.3.4'):
+        return RequestLog(client_ip_address=ip, host=host, url='/',
+                          status_code=status_code, datetime=timezone.now())
+
+    def stream(self, data=None, **headers):
+        response = live_stream(self.factory.get('/live', data, **headers))
+        assert response['Content-Type'] == 'text/event-stream'
+        assert response['X-Accel-Buffering'] == 'no'
+        assert not response.has_header('Content-Encoding')
+        self.addCleanup(response.close)
+        stream = iter(response.streaming_content)
+        assert next(stream) == b'retry: 2000\n\n'
+        return stream
+
+    def event(self, stream):
+        event_id, data = next(stream).decode().split('\n')[:2]
+        return (event_id[len('id: '):],
+                [item['status_code'] for item in json.loads(
+                    data[len('data: '):])])
+
+    def test_filters(self):
+        """Only the request logs matching the filters are sent."""
+        self.buffer.extend([
+            self.log(200), self.log(404), self.log(500, host='other.com'),
+            self.log(502, ip='5.6.7.8'), self.log(503)])
+        stream = self.stream({'status': '4,5', 'host': 'example.com',
+                              'ip': '1.2.3.4'})
+        assert self.event(stream)[1] == [404, 503]
+        assert live_stream(self.factory.get(
+            '/live', {'status': 'x'})).status_code == 400
+
+    def test_batches(self):
+        """Request logs arriving within the batch delay are sent at once."""
+        stream = self.stream()
+        for delay, status_code in ((0.05, 200), (0.15, 404)):
+            threading.Timer(delay, self.buffer.append,
+                            (self.log(status_code), )).start()
+        start = time.time()
+        assert self.event(stream)[1] == [200, 404]
+        assert time.time() - start >= 0.05 + live.BATCH_DELAY
+
+    def test_resume(self):
+        """Reconnecting streams resume after the last event received."""
+        self.buffer.extend([self.log(200), self.log(404)])
+        event_id, status_codes = self.event(self.stream())
+        assert status_codes == [200, 404]
+        self.buffer.append(self.log(500))
+        stream = self.stream(HTTP_LAST_EVENT_ID=event_id)
+        assert self.event(stream)[1] == [500]
+        # Ids of another buffer only resume with new request logs.
+        stream = self.stream(HTTP_LAST_EVENT_ID='other-1')
+        assert next(stream) == b': keepalive\n\n'
+
+
+class GZipMiddlewareTestCase(TestCase):
+    """GZip middleware test case."""
+
+    def test_event_stream(self):
+        """Event streams are not compressed, other responses are."""
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        for content_type, encoding in (('text/event-stream', None),
+                                       ('text/html', 'gzip')):
+            response = GZipMiddleware().process_response(
+                request, HttpResponse('a' * 1000, content_type=content_type))
+            assert response.get('Content-Encoding') == encoding
+
+
+class LazyImportTestCase(TestCase):
+    """Lazy dashboards test case."""
+
+    def test_import(self):
+        """Importing the admin site and URLs computes no chart."""
+        names = [name for name in dir(charts) if name.endswith(
+            ('_chart', '_charts', '_series'))]
+        assert 'most_visited_pages_legend_chart' in names
+        modules = ('meerkat.sites', 'meerkat.views', 'meerkat.logs.urls',
+                   'meerkat.logs.views', 'meerkat.logs.boxes')
+        with mock.patch.dict(sys.modules), mock.patch.multiple(
+                charts, **{name: mock.DEFAULT for name in names}) as mocks, \
+                self.assertNumQueries(0):
+            for module in modules:
+                sys.modules.pop(module, None)
+            sites = importlib.import_module('meerkat.sites')
+            urls = importlib.import_module('meerkat.logs.urls')
+            assert urls.logs_urlpatterns()
+            assert sites.DashboardSite().urls
+        assert not any(chart.called for chart in mocks.values())
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+"""Visits tests."""
+
+import datetime
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from meerkat.logs.models import RequestLog, Visit
+from meerkat.logs.visits import Sessionizer, update_visits
+
+START = datetime.datetime(2018, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def minutes(value):
+    return START + datetime.timedelta(minutes=value)
+
+
+class SessionizerTestCase(TestCase):
+    """Sessionizer test case."""
+
+    def test_timeout(self):
+        """Sessions are split by visitor and closed after the timeout."""
+        sessionizer = Sessionizer(timeout=600)
+        sessionizer.add(1, '1.2.3.4', 'a', minutes(0), '/', 10)
+        sessionizer.add(2, '1.2.3.4', 'b', minutes(1), '/b', 10)
+        sessionizer.add(3, '1.2.3.4', 'a', minutes(5), '/x', 20)
+        sessionizer.add(4, '1.2.3.4', 'a', minutes(14), '/y', 30)
+        closed = sessionizer.pop_closed()
+        assert [session.user_agent for session in closed] == ['b']
+        sessionizer.add(5, '5.6.7.8', 'a', minutes(20), '/', 0)
+        sessionizer.add(6, '1.2.3.4', 'a', minutes(30), '/z', 0)
+        assert len(sessionizer) == 2
+        session, = sessionizer.pop_closed()
+        assert (session.hits, session.bytes_sent, session.entry_url,
+                session.exit_url, session.last_log_id) == (3, 60, '/', '/y', 4)
+
+
+class VisitsTestCase(TestCase):
+    """Visits update test case."""
+
+    def add_logs(self, *times, ip='1.2.3.4'):
+        RequestLog.objects.bulk_create([
+            RequestLog(client_ip_address=ip, user_agent='ua', url='/%s' % time,
+                       status_code=200, bytes_sent=1,
+                       datetime=minutes(time))
+            for time in times])
+
+    def test_incremental(self):
+        """Open visits are resumed by the next update."""
+        self.add_logs(0, 10, 20)
+        stats = update_visits(timeout=1800)
+        assert stats == {'logs': 3, 'visits': 1, 'open': 1}
+        self.add_logs(40, 100)
+        stats = update_visits(timeout=1800)
+        assert stats == {'logs': 2, 'visits': 1, 'open': 1}
+        first, second = Visit.objects.order_by('start')
+        assert (first.hits, first.entry_url, first.exit_url) == (
+            4, '/0', '/40')
+        assert first.closed and not second.closed
+        assert first.duration == datetime.timedelta(minutes=40)
+        assert update_visits(timeout=1800)['logs'] == 0
+
+    def test_resume_order(self):
+        """Open visits are resumed in order of last activity."""
+        self.add_logs(50)
+        update_visits(timeout=1800)
+        # A late request log: its visit is created after the other one.
+        self.add_logs(10, ip='5.6.7.8')
+        update_visits(timeout=1800)
+        self.add_logs(45, ip='9.9.9.9')
+        update_visits(timeout=1800)
+        assert dict(Visit.objects.values_list(
+            'client_ip_address', 'closed')) == {
+                '1.2.3.4': False, '5.6.7.8': True, '9.9.9.9': False}
+
+    def test_rebuild(self):
+        """Visits are rebuilt by partitions of IP addresses."""
+        self.add_logs(0, 10, 100)
+        self.add_logs(0, 5, ip='5.6.7.8')
+        update_visits(timeout=1800)
+        Visit.objects.update(hits=0)
+        out = StringIO()
+        call_command('meerkat_visits', '--rebuild', '--workers', '2',
+                     stdout=out, stderr=StringIO())
+        stats = json.loads(out.getvalue())
+        assert (stats['deleted'], stats['logs'], stats['visits']) == (
+            3, 5, 3)
+        assert sorted(Visit.objects.values_list('hits', 'closed')) == [
+            (1, False), (2, True), (2, True)]
+
+    def test_rebuild_range(self):
+        """Visits crossing the range are rebuilt entirely."""
+        self.add_logs(0, 10, 20, 100)
+        update_visits(timeout=1800)
+        out = StringIO()
+        call_command('meerkat_visits', '--rebuild', '--timeout', '1800',
+                     '--since', minutes(15).isoformat(), '--batch-size', '1',
+                     stdout=out, stderr=StringIO())
+        stats = json.loads(out.getvalue())
+        assert (stats['deleted'], stats['logs'], stats['visits']) == (
+            2, 4, 2)
+        assert sorted(Visit.objects.values_list('hits', flat=True)) == [1, 3]